@@ -13,6 +13,7 @@ import control.gxipy as gx
 import numpy
 
 import os
+import multiprocessing
 from datetime import datetime
 
 @TypecheckFunction
@@ -78,6 +79,7 @@ class Logger:
         file_name:Optional[str]
     ):
         # self.lines=[]
+        self.file_backing=None
         if not file_name is None:
             self.file_backing=open(file_name,mode="x",buffering=1)
     
@@ -97,7 +99,8 @@ class Logger:
             self.file_backing.flush()
 
 current_timestamp=create_current_timestamp()
-MAIN_LOG=Logger(file_name=f"./{current_timestamp}.log")
+# worker processes (e.g. of the image saver process pool) import this module again, but only log to the console
+MAIN_LOG=Logger(file_name=f"./{current_timestamp}.log" if multiprocessing.current_process().name=="MainProcess" else None)
 
 class AcquisitionImageData:
     image:numpy.ndarray
@@ -170,6 +173,11 @@ class AcquisitionStartResult:
         else:
             _=self.type # make sure that self.type has been set        
 
+class AbortAcquisitionException(Exception):
+    """ raised inside the acquisition (e.g. while waiting for the microcontroller or the camera) once an abort has been requested """
+    def __init__(self):
+        super().__init__()
+
 class AcqusitionProgress:
     total_steps:int
     completed_steps:int
@@ -177,6 +185,8 @@ class AcqusitionProgress:
     last_imaged_coordinates:Tuple[float,float]
     last_step_completion_time:float
     _last_completed_action:str
+    storage_projection:Optional[Any]
+    """ projected storage use of the acquisition (see control.core.storage_projection.StorageProjection) """
 
     def __init__(self,
         total_steps:int,
@@ -190,6 +200,7 @@ class AcqusitionProgress:
         self.start_time=start_time
         self.last_imaged_coordinates=last_imaged_coordinates
         self.last_step_completion_time=last_step_completion_time
+        self.storage_projection=None
 
     @property
     def last_completed_action(self)->float:
@@ -208,11 +219,133 @@ class ImageFormat(Enum):
     BMP=0
     TIFF=1
     TIFF_COMPRESSED=2
+    ZARR=3
+    """ chunked, compressed OME-Zarr array (t,c,z,y,x) per well and site, instead of one file per image """
+    TIFF_PER_WELL=4
+    """ all images of a well appended to a single (uncompressed) BigTIFF file, with a page index written next to it """
+
+class DirectorySharding(str,Enum):
+    """ how images of a time point are distributed over subdirectories """
+
+    NONE="none"
+    """ all images in the same directory """
+    PER_WELL="per_well"
+    """ one subdirectory per well """
+    HASHED="hashed"
+    """ sites are distributed over a number of subdirectories (buckets) by a hash of their name, so that each holds at most ImageSaver.max_num_image_per_folder images """
+
+class ZStackMode(str,Enum):
+    """ how the planes of a z stack are acquired """
+
+    STEPWISE="stepwise"
+    """ move to each plane, wait for the stage to settle, then image all channels """
+    SWEEP="sweep"
+    """ move through all planes at constant velocity (once per channel) and trigger images on the way, falls back to stepwise if the exposure time is too long for a sweep """
+    ADAPTIVE="adaptive"
+    """ stepwise, but stop once the focus measure has decayed on both sides of its peak (see control.core.adaptive_z). the number of planes of each site is recorded in the manifest. """
+
+class XYScanMode(str,Enum):
+    """ how the fields of view in a well are visited """
+
+    STOP_AND_GO="stop_and_go"
+    """ move to each field of view, wait for the stage to settle, then image it """
+    CONTINUOUS_ROWS="continuous_rows"
+    """ move along each row at constant velocity and trigger the camera (with an illumination pulse) when passing a field of view. only used with a single channel, no z stack and no autofocus, falls back to stop-and-go otherwise """
+
+class FocusMapScope(str,Enum):
+    """ where the focus is measured to build a focus map (see control.core.focus_map) """
+
+    NONE="none"
+    """ no focus map, the laser autofocus runs at every position """
+    PLATE="plate"
+    """ measure a sparse set of wells across the plate before the acquisition starts """
+    WELL="well"
+    """ measure the corners and center of the imaging grid when entering each well """
+
+class ImageConsumerPolicy(str,Enum):
+    """ what happens to an acquired image when the queue of a consumer (e.g. the display) is full, see control.core.image_consumer """
+
+    DROP="drop"
+    """ the new image is not passed to the consumer """
+    LATEST_ONLY="latest_only"
+    """ only the most recent image waits for the consumer, it replaces the image that is waiting (e.g. for displays) """
+    BLOCK="block"
+    """ the acquisition waits until the consumer has caught up (e.g. for analyses that need every image) """
+
+class TimelapseScheduling(str,Enum):
+    """ order in which the wells of a time-lapse acquisition are imaged """
+
+    TIME_POINTS="time_points"
+    """ image all wells, then wait for the next time point """
+    EARLIEST_DEADLINE="earliest_deadline"
+    """ each well is due at its own period, the well with the earliest deadline is imaged next (see control.core.timelapse_scheduler). a delayed well does not delay the others. """
+
+class FocusSurfaceModel(str,Enum):
+    PLANE="plane"
+    THIN_PLATE_SPLINE="thin_plate_spline"
+
+class WellOrder(str,Enum):
+    """ order in which the wells of an acquisition are visited """
+
+    AS_GIVEN="as_given"
+    """ order of the well list, each well entered at its top left corner (the route of acquisitions before routes were planned) """
+    SERPENTINE_ROWS="serpentine_rows"
+    """ row by row, alternating the direction within each row """
+    SERPENTINE_COLUMNS="serpentine_columns"
+    """ column by column, alternating the direction within each column """
+    SHORTEST_PATH="shortest_path"
+    """ nearest neighbour tour, improved by 2-opt (works well for irregular well selections) """
+
+ZARR_STORE_NAME:str="images.zarr"
+""" name of the zarr hierarchy inside the experiment folder (for ImageFormat.ZARR) """
+
+class ImageBitDepthMode(str,Enum):
+    """ representation of pixel values of images with fewer than 16 bits per pixel (e.g. Mono12) in saved images """
+
+    SHIFTED="shifted"
+    """ shifted into the high bits of 16 bit pixels, as returned by the camera """
+    NATIVE="native"
+    """ native bit depth in 16 bit pixels, i.e. the unused high bits are zero (which compresses well with a predictor/bit shuffle) """
+    PACKED="packed"
+    """ 12 bit pixels packed into 3 bytes per 2 pixels. only possible for 12 bit images saved as individual tiff files, otherwise NATIVE is used instead """
+
+@TypecheckClass
+class ImageLocation:
+    """ logical position of an image within an acquisition """
+
+    well_name:str
+    site:int
+    """ index of the site within the well (starts at 1) """
+    x:int
+    """ grid column index of the site within the well """
+    y:int
+    """ grid row index of the site within the well """
+    z:int
+    time_point:int
+    channel_name:str
+    channel_index:int
+    """ index of the channel in the (user-specified) list of imaging channels """
+    z_mm:Optional[float]=None
+    """ measured z position of the stage during the exposure, if it differs from the nominal position of plane z (e.g. in a z sweep) """
+
+@TypecheckClass
+class AcquisitionLayout:
+    """ dimensions of an acquisition, used by image containers that store more than one image per file """
+
+    channel_names:List[str]
+    num_z:int
+    num_time_points:int
+    z_step_um:float=1.0
+    time_step_s:float=1.0
+    bit_depth:int=16
+    """ number of significant bits per pixel, as recorded by the camera """
+    bit_depth_mode:ImageBitDepthMode=ImageBitDepthMode.SHIFTED
 
 @TypecheckClass(create_str=True)
 class CameraPixelFormat:
     name:str
     num_bytes_per_pixel:int
+    bit_depth:int
     gx_pixel_format:Union[gx.GxPixelFormatEntry,int] # instances of gx.GxPixelFormatEntry are represented as an int
 
 import time
@@ -225,10 +358,13 @@ class Profiler:
 
         if (not self.parent is None) and (self.msg in self.parent.named_children):
             self.duration=self.parent.named_children[self.msg].duration
+            self.count=self.parent.named_children[self.msg].count
             self.named_children=self.parent.named_children[self.msg].named_children
 
         else:
             self.duration=0.0
+            self.count=0
+            """ number of times this section has been entered """
             self.named_children=dict()
 
         self.start_time=0.0
@@ -237,6 +373,7 @@ class Profiler:
         return self
     def __exit__(self,*args,**kwargs):
         self.duration+=time.monotonic()-self.start_time
+        self.count+=1
         if self.parent is None:
             if not self.discard_if_parent_none:
                 print( \
@@ -248,7 +385,7 @@ class Profiler:
             self.parent.named_children[self.msg]=self
 
     def to_text(self,indent:int,of_total:float)->str:
-        text=f"{' '*indent} ({(self.duration/of_total*100):6.2f}%) {self.duration:10.3f} : {self.msg}\n"
+        text=f"{' '*indent} ({(self.duration/of_total*100):6.2f}%) {self.duration:10.3f} {self.count:6d}x : {self.msg}\n"
         for child in self.named_children.values():
             text+=child.to_text(indent=indent+2,of_total=of_total)
 
@@ -258,36 +395,43 @@ class CAMERA_PIXEL_FORMATS(Enum):
     MONO8=CameraPixelFormat(
         name='Mono8',
         num_bytes_per_pixel=1,
+        bit_depth=8,
         gx_pixel_format=gx.GxPixelFormatEntry.MONO8,
     )
     MONO10=CameraPixelFormat(
         name='Mono10',
         num_bytes_per_pixel=2,
+        bit_depth=10,
         gx_pixel_format=gx.GxPixelFormatEntry.MONO10,
     )
     MONO12=CameraPixelFormat(
         name='Mono12',
         num_bytes_per_pixel=2,
+        bit_depth=12,
         gx_pixel_format=gx.GxPixelFormatEntry.MONO12,
     )
     MONO14=CameraPixelFormat(
         name='Mono14',
         num_bytes_per_pixel=2,
+        bit_depth=14,
         gx_pixel_format=gx.GxPixelFormatEntry.MONO14,
     )
     MONO16=CameraPixelFormat(
         name='Mono16',
         num_bytes_per_pixel=2,
+        bit_depth=16,
         gx_pixel_format=gx.GxPixelFormatEntry.MONO16,
     )
     BAYER_RG8=CameraPixelFormat(
         name='BAYER_RG8',
         num_bytes_per_pixel=1,
+        bit_depth=8,
         gx_pixel_format=gx.GxPixelFormatEntry.BAYER_RG8,
     )
     BAYER_RG12=CameraPixelFormat(
         name='BAYER_RG12',
         num_bytes_per_pixel=2,
+        bit_depth=12,
         gx_pixel_format=gx.GxPixelFormatEntry.BAYER_RG12,
     )
 
@@ -302,8 +446,130 @@ class Acquisition:
     NUMBER_OF_FOVS_PER_AF:int = 3
     IMAGE_FORMAT:ImageFormat = ImageFormat.TIFF_COMPRESSED
     """ file format used for images saved after multi point image acquisition """
+    IMAGE_SAVER_NUM_WORKERS:int = 4
+    """ number of workers that encode and write images in parallel """
+    IMAGE_SAVER_USE_PROCESS_POOL:bool = False
+    """ encode and write images in worker processes instead of threads (compression then does not contend for the GIL).
+    opt-in: the worker processes are spawned, i.e. each one imports the program again when the pool is started. """
+    IMAGE_SAVER_QUEUE_BUDGET_MB:float = 2048.0
+    """ max. memory occupied by images that wait to be saved. the acquisition blocks when it would exceed this budget """
+    WELL_ORDER:WellOrder = WellOrder.AS_GIVEN
+    """ default order in which wells are visited. for all orders but AS_GIVEN, the entry corner of each well is chosen to minimize travel (see control.core.route_planner) """
+    STAGE_DIRECTION_REVERSAL_TIME_S:float = 0.05
+    """ estimated time lost when a stage axis reverses its direction of movement (backlash, settling), used to plan the route across the plate """
+    Z_STACK_MODE:ZStackMode = ZStackMode.STEPWISE
+    """ how z stacks are acquired """
+    Z_SWEEP_MAX_BLUR_FRACTION:float = 0.2
+    """ maximum distance the objective may move during an exposure in a z sweep, as fraction of the z step size """
+    Z_SWEEP_FRAME_OVERHEAD_S:float = 0.04
+    """ time between the end of an exposure and the earliest next trigger in a z sweep (readout, transfer) """
+    ADAPTIVE_Z_CHANNEL:str = ""
+    """ name of the channel whose focus measure decides when an adaptive z stack stops (the first selected channel if empty) """
+    ADAPTIVE_Z_DECAY_FRACTION:float = 0.5
+    """ an adaptive z stack stops once the focus measure has dropped below this fraction of its peak on both sides of the peak """
+    ADAPTIVE_Z_MIN_NUM_PLANES:int = 3
+    """ minimum number of planes of an adaptive z stack (the configured number of planes is the maximum) """
+    XY_SCAN_MODE:XYScanMode = XYScanMode.STOP_AND_GO
+    """ how the fields of view in a well are visited """
+    ROW_SCAN_MAX_BLUR_PX:float = 1.0
+    """ maximum distance the stage may move during an exposure in a continuous row scan, in pixels """
+    ROW_SCAN_FRAME_OVERHEAD_S:float = 0.04
+    """ time between the end of an exposure and the earliest next trigger in a continuous row scan (readout, transfer) """
+    TIMELAPSE_SCHEDULING:TimelapseScheduling = TimelapseScheduling.TIME_POINTS
+    """ how the wells are scheduled in acquisitions with more than one time point (acquisitions with per-well intervals are always scheduled by earliest deadline) """
+    FOCUS_MAP_SCOPE:FocusMapScope = FocusMapScope.NONE
+    """ move to the z predicted by a focus map at each position instead of running the laser autofocus there (requires laser autofocus) """
+    FOCUS_MAP_SURFACE:FocusSurfaceModel = FocusSurfaceModel.THIN_PLATE_SPLINE
+    FOCUS_MAP_NUM_PLATE_POINTS:int = 9
+    """ number of wells measured for a focus map across the plate """
+    FOCUS_MAP_OUTLIER_THRESHOLD_UM:float = 10.0
+    """ points that are further than this from the surface through the other points are not used for the focus map """
+    FOCUS_MAP_TPS_SMOOTHING:float = 0.0
+    """ smoothing of the thin-plate spline (0 interpolates the points exactly) """
+    FOCUS_MAP_REFRESH_THRESHOLD_UM:float = 2.0
+    """ the prediction is checked with a single laser autofocus measurement at the first position of each well. if it is off by more than this, the position is focused with the laser autofocus and added to the map """
+    LASER_AF_ADAPTIVE:bool = False
+    """ skip the laser autofocus measurement (or use a single image) where z can be predicted confidently from nearby measurements in the same well, see control.core.laser_af_policy """
+    LASER_AF_SKIP_UNCERTAINTY_UM:float = 1.0
+    """ skip the measurement if the uncertainty of the predicted z is below this """
+    LASER_AF_SINGLE_IMAGE_UNCERTAINTY_UM:float = 2.5
+    """ measure with a single image (instead of averaging LASER_AF_AVERAGING_N_FAST) if the uncertainty of the predicted z is below this """
+    LASER_AF_MAX_CONSECUTIVE_SKIPS:int = 3
+    """ measure after this many positions without a measurement """
+    LASER_AF_UNCERTAINTY_UM_PER_MM:float = 2.0
+    """ increase of the uncertainty of the predicted z with the distance to the nearest measured position """
+    PRESCAN:bool = False
+    """ image every planned site in one channel first, and acquire only the sites that contain objects (see control.core.prescan). the selected sites are saved to prescan.json in the output directory. """
+    PRESCAN_CHANNEL:str = ""
+    """ name of the channel imaged in the prescan (the first selected channel if empty) """
+    PRESCAN_DOWNSAMPLE_FACTOR:int = 4
+    """ prescan images are binned by this factor (in software) before objects are counted """
+    PRESCAN_THRESHOLD_NUM_MAD:float = 5.0
+    """ pixels brighter than the median by this many (scaled) median absolute deviations are considered part of an object """
+    PRESCAN_MIN_OBJECT_AREA_PX:int = 4
+    """ smaller objects (in pixels of the binned image) are ignored """
+    PRESCAN_MIN_NUM_OBJECTS:int = 1
+    """ sites with fewer objects are not acquired """
+    PRESCAN_MIN_NUM_SITES_PER_WELL:int = 1
+    """ at least this many sites (with the most objects) are acquired in each well, even if they contain fewer than PRESCAN_MIN_NUM_OBJECTS """
+    WELL_TARGET_NUM_OBJECTS:int = 0
+    """ stop imaging a well once this many objects have been counted in it, and image the sites from the centre of the well outwards (see control.core.well_object_count). 0 images all sites. """
+    WELL_TARGET_CHANNEL:str = ""
+    """ name of the channel whose images are counted (the first selected channel if empty). objects are counted like in the prescan (PRESCAN_DOWNSAMPLE_FACTOR, PRESCAN_THRESHOLD_NUM_MAD, PRESCAN_MIN_OBJECT_AREA_PX) """
+    OPTIMIZE_CHANNEL_ORDER:bool = False
+    """ image the channels at each position in the order that minimizes z offset moves and channel switches (reversed at every other position), instead of the selected order """
+    CHANNEL_CAMERA_SETTINGS_TIME_S:float = 0.02
+    """ estimated time to change exposure time/analog gain between channels, used to optimize the channel order """
+    CHANNEL_ILLUMINATION_COMMAND_TIME_S:float = 0.015
+    """ estimated time to set up the illumination of a channel, used to optimize the channel order """
+    LASER_AF_TIME_S:float = 0.35
+    """ estimated time of one laser autofocus, used to estimate the duration of an acquisition until it has been measured (see MEASURED_LATENCIES_PATH) """
+    SOFTWARE_AF_TIME_S:float = 4.0
+    """ estimated time of one software (contrast) autofocus, used to estimate the duration of an acquisition until it has been measured """
+    SNAP_OVERHEAD_S:float = 0.05
+    """ estimated time to take an image in addition to the exposure time (trigger, readout, transfer), used to estimate the duration of an acquisition until it has been measured """
+    MEASURED_LATENCIES_PATH:Optional[str] = "measured_latencies.json"
+    """ latencies measured during acquisitions are accumulated in this file, and used to estimate the duration of future acquisitions (see control.core.acquisition_plan). None disables this. """
+    DIRECTORY_SHARDING:DirectorySharding = DirectorySharding.NONE
+    """ default distribution of images of a time point over subdirectories (only applies to image formats with one file per image) """
+    STORAGE_ESTIMATE_COMPRESSION_RATIO:float = 1.5
+    """ compression ratio assumed for compressed image formats before any image has been saved """
+    STORAGE_PROJECTION_SAMPLE_FOVS:int = 2
+    """ number of FOVs to save before the projected storage use is based on the measured compression ratio (and may abort the acquisition) """
+    STORAGE_RESERVE_GB:float = 1.0
+    """ storage that must remain free on the output device. the acquisition is aborted if it would use up this reserve. """
+    STAGING_PATH:Optional[str] = None
+    """ if set, images are saved to this (fast, local) directory first, and moved to the output path in the background once a well is complete.
+    not used for ImageFormat.ZARR, which is always saved to the output path directly. """
+    STAGING_MIGRATION_BANDWIDTH_MB_PER_S:float = 200.0
+    """ max. bandwidth used to move images from the staging directory to the output path """
+    IMAGE_BIT_DEPTH_MODE:ImageBitDepthMode = ImageBitDepthMode.SHIFTED
+    """ how pixel values of images with fewer than 16 bits per pixel are stored (the bit depth is recorded in the image metadata) """
+    IMAGE_CODEC:str = "lzw"
+    """ name of the codec used to compress images (see control.core.image_codecs, and tools/benchmark_codecs.py to compare them) """
+    IMAGE_CODEC_PER_CHANNEL:Dict[str,str] = {}
+    """ codec overrides for individual channels, by channel name """
+    IMAGE_CODEC_TILE_SIZE:int = 512
+    """ compressed tiff images are split into tiles of this size, which are compressed in parallel (only for codecs that support tiling,
+    see ImageCodec.tiled, i.e. zstd and deflate. lzw images are always saved in strips). 0 disables tiling. """
+    IMAGE_CODEC_NUM_THREADS:int = 2
+    """ number of threads used to compress the tiles of a single image """
     IMAGE_DISPLAY_SCALING_FACTOR:ClosedRange[float](0.0,1.0) = 1.0
     """ this _crops_ the image display for the multi point acquisition """
+    PIPELINED_ACQUISITION:bool = False
+    """ process (crop, rotate, convert), display and save images on a separate thread, so that the stage can move to the next position while the images of the previous one are processed """
+    PIPELINE_MAX_PENDING_IMAGES:int = 16
+    """ maximum number of images waiting to be processed in pipelined acquisition before the acquisition waits for processing to catch up """
+    COORDINATE_LOG_FLUSH_NUM_ROWS:int = 64
+    """ positions logged to coordinates.csv are written to disk in batches of this many rows (see control.core.coordinate_log) """
+    COORDINATE_LOG_FLUSH_INTERVAL_S:float = 10.0
+    """ buffered positions are written to disk at least this often, while the acquisition is running """
+    IMAGE_RETURN_POLICY:ImageConsumerPolicy = ImageConsumerPolicy.LATEST_ONLY
+    """ how acquired images are passed to the image_return callback of an acquisition (the image display in the gui) when it cannot keep up """
+    IMAGE_CONSUMER_QUEUE_SIZE:int = 8
+    """ number of images that may wait for an image consumer (see control.core.image_consumer) before its policy applies """
+    RUN_WORKER_ASYNC:bool = True
+    """ run the acquisition on a separate thread, so that the gui stays responsive and an abort takes effect within the current stage movement or frame read. if False, the acquisition runs on the gui thread. """
 
 class DefaultMultiPointGrid:
     """ multi point grid defaults """
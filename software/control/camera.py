@@ -1,4 +1,5 @@
 import time
+import threading
 import numpy
 import importlib
 
@@ -6,7 +7,7 @@ import control.gxipy as gx
 from control.gxipy import gxiapi
 
 from control._def import *
-from typing import Optional, Any
+from typing import Optional, Any, List, Tuple
 
 from control.typechecker import TypecheckFunction
 
@@ -499,16 +500,31 @@ class Camera(object):
         return numpy_image
 
     @TypecheckFunction
-    def read_frame(self,timeout_overhead_s:float=1.0)->numpy.ndarray:
+    def read_frame(self,timeout_overhead_s:float=1.0,cancel_event:Optional[threading.Event]=None)->numpy.ndarray:
+        """
+        wait for the next frame
+
+        if cancel_event is set while waiting, the frame is discarded (so that it is not returned by the next read) and AbortAcquisitionException is raised.
+        """
         if self.camera is None:
             raise RuntimeError("camera (connection) is suddenly gone")
 
+        data_stream=self.camera.data_stream[self.device_index]
+
         start_time=time.time()
         raw_image=None
         while True:
-            time.sleep(0.005) # arbitrary short sleep
-            QApplication.processEvents()
-            raw_image = self.camera.data_stream[self.device_index].get_image()
+            if cancel_event is None:
+                time.sleep(0.005) # arbitrary short sleep
+                QApplication.processEvents()
+                raw_image = data_stream.get_image()
+            else:
+                if cancel_event.wait(0.005):
+                    data_stream.flush_queue()
+                    raise AbortAcquisitionException()
+                QApplication.processEvents()
+                # short timeout (in ms), so that cancel_event is checked while the frame is still being exposed
+                raw_image = data_stream.get_image(timeout=10)
 
             image_recording_incomplete=(raw_image is None) or (raw_image.get_status()==gx.GxFrameStatusList.INCOMPLETE)
             if not image_recording_incomplete:
@@ -630,4 +646,116 @@ class Camera(object):
         self.camera.LineMode.set(gx.GxLineModeEntry.OUTPUT)
         self.camera.LineSource.set(gx.GxLineSourceEntry.EXPOSURE_ACTIVE)
 
-    
\ No newline at end of file
+    
+class SimulatedFeature:
+    """ camera feature (e.g. ExposureTime) of the simulated camera, which only stores the value that has been set """
+
+    def __init__(self,value:Any=None,value_range:Optional[dict]=None):
+        self.value=value
+        self.value_range=value_range or {}
+
+    def is_implemented(self)->bool:
+        return True
+
+    def is_writable(self)->bool:
+        return True
+
+    def get(self)->Any:
+        return self.value
+
+    def set(self,value:Any):
+        self.value=value
+
+    def get_range(self)->dict:
+        return self.value_range
+
+class SimulatedRawImage:
+    """ frame of the simulated camera (the parts of gxiapi.RawImage that are used by Camera) """
+
+    def __init__(self,image:numpy.ndarray):
+        self.image=image
+
+    def get_status(self)->int:
+        return 0 # gx.GxFrameStatusList.SUCCESS
+
+    def get_numpy_array(self)->numpy.ndarray:
+        return self.image
+
+class SimulatedDataStream:
+    """ frames that have been triggered, each of which can be read once its exposure has ended """
+
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.frames:List[Tuple[float,SimulatedRawImage]]=[]
+        """ time.monotonic() at which the exposure of the frame ends, and the frame """
+
+    def queue_frame(self,ready_time:float,raw_image:SimulatedRawImage):
+        with self.lock:
+            self.frames.append((ready_time,raw_image))
+
+    def get_image(self,timeout:int=1000)->Optional[SimulatedRawImage]:
+        """ wait for the next frame for at most timeout ms, returns None if it is not ready by then """
+        end_time=time.monotonic()+timeout/1000
+        while True:
+            with self.lock:
+                if len(self.frames)>0 and self.frames[0][0]<=time.monotonic():
+                    return self.frames.pop(0)[1]
+            if time.monotonic()>=end_time:
+                return None
+            time.sleep(0.001)
+
+    def flush_queue(self):
+        with self.lock:
+            self.frames.clear()
+
+class SimulatedCameraDevice:
+    """ stand-in for gxiapi.Device, with the features used by Camera """
+
+    def __init__(self,width:int,height:int):
+        self.width=width
+        self.height=height
+        self.data_stream=[SimulatedDataStream()]
+        self.is_streaming=False
+
+        self.ExposureTime=SimulatedFeature(value=10_000.0,value_range={'min':20.0,'max':1_000_000.0})
+        self.Gain=SimulatedFeature(value=0.0,value_range={'min':0.0,'max':24.0})
+        self.TriggerMode=SimulatedFeature()
+        self.TriggerSource=SimulatedFeature()
+        self.PixelFormat=SimulatedFeature(value_range={CAMERA_PIXEL_FORMATS.MONO12.value.name:CAMERA_PIXEL_FORMATS.MONO12.value.gx_pixel_format})
+        self.TriggerSoftware=self
+
+    def send_command(self):
+        """ software trigger: the frame can be read once the exposure time has passed """
+        if self.is_streaming:
+            self.data_stream[0].queue_frame(time.monotonic()+self.ExposureTime.get()/1e6,SimulatedRawImage(numpy.zeros((self.height,self.width),dtype=numpy.uint16)))
+
+    def stream_on(self):
+        self.is_streaming=True
+
+    def stream_off(self):
+        self.is_streaming=False
+        self.data_stream[0].flush_queue()
+
+    def close_device(self):
+        self.stream_off()
+
+class CameraSimulation(Camera):
+    """
+    stand-in for Camera without hardware, e.g. to test how the acquisition reacts to the camera (see MicrocontrollerSimulation)
+
+    only software triggers are simulated: each one produces an all-zero frame that can be read once the exposure time has passed.
+    """
+
+    def open_default(self):
+        MAIN_LOG.log('startup - using simulated camera')
+        self.camera=SimulatedCameraDevice(width=self.ROI_width,height=self.ROI_height)
+        self.is_color=False
+        self.set_pixel_format(CAMERA_PIXEL_FORMATS.MONO12.value.name)
+        self.start_streaming()
+
+    def open(self,index:int=0):
+        self.device_index=index
+        self.open_default()
+
+    def rescale_raw_image(self,raw_image:SimulatedRawImage)->numpy.ndarray:
+        return raw_image.get_numpy_array() << 4
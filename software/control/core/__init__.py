@@ -240,6 +240,12 @@ class AcquisitionConfig:
 
     image_file_format:ImageFormat
 
+    directory_sharding:DirectorySharding = Acquisition.DIRECTORY_SHARDING
+    well_order:WellOrder = Acquisition.WELL_ORDER
+
+    well_time_point_intervals_s:Dict[str,float] = field(default_factory=dict)
+    """ interval between time points for individual wells (by well name), the other wells use grid_config.t.d """
+
     objective:str = ""
     timestamp:str = ""
 
@@ -289,6 +295,10 @@ class AcquisitionConfig:
             channels_config=[Configuration.from_json(config_dict) for config_dict in data["channels_config"]],
 
             image_file_format=[image_format for image_format in ImageFormat if image_format.name==data["image_file_format"]][0],
+            directory_sharding=DirectorySharding(data["directory_sharding"]) if "directory_sharding" in data else DirectorySharding.NONE,
+            # configs saved before these settings existed are replayed as they were acquired back then (not with the current defaults)
+            well_order=WellOrder(data["well_order"]) if "well_order" in data else WellOrder.AS_GIVEN,
+            well_time_point_intervals_s={well_name:float(interval_s) for well_name,interval_s in data.get("well_time_point_intervals_s",{}).items()},
 
             timestamp=timestamp,
             objective=objective,
@@ -309,6 +319,9 @@ class AcquisitionConfig:
             "cell_line":self.cell_line,
 
             "image_file_format":self.image_file_format.name,
+            "directory_sharding":self.directory_sharding.value,
+            "well_order":self.well_order.value,
+            "well_time_point_intervals_s":self.well_time_point_intervals_s,
             "trigger_mode":self.trigger_mode,
             "pixel_format":self.pixel_format,
             "plate_type":self.plate_type,
@@ -326,6 +339,66 @@ class AcquisitionConfig:
             "well_list":well_list,
         }
 
+    def plan_route(self,start_position_mm:Optional[Tuple[float,float]]=None)->Tuple["AcquisitionRoute","AcquisitionRoute"]:
+        """
+        dry-run of the route the acquisition takes across the plate
+
+        returns the planned route (following well_order) and the naive route (wells in the order of well_list, each entered at the top left corner), see route_report
+        """
+
+        wellplate_format=WELLPLATE_FORMATS[self.plate_type]
+        grid=WellGridGeometry(
+            num_x=self.grid_config.x.N,
+            num_y=self.grid_config.y.N,
+            delta_x_mm=float(self.grid_config.x.d),
+            delta_y_mm=float(self.grid_config.y.d),
+        )
+
+        route=plan_route(self.well_list,wellplate_format,grid,well_order=self.well_order,start_position_mm=start_position_mm,optimize_entry_corners=self.well_order!=WellOrder.AS_GIVEN)
+        naive_route=plan_route(self.well_list,wellplate_format,grid,well_order=WellOrder.AS_GIVEN,start_position_mm=start_position_mm,optimize_entry_corners=False)
+
+        return route,naive_route
+
+    def compile_plan(self,start_position_mm:Optional[Tuple[float,float]]=None,route:Optional["AcquisitionRoute"]=None,max_num_images_per_folder:int=1000)->"AcquisitionPlan":
+        """
+        compile the ordered actions of the acquisition (see control.core.acquisition_plan)
+
+        route defaults to the planned route from start_position_mm (see plan_route).
+        """
+
+        if route is None:
+            route,_naive_route=self.plan_route(start_position_mm=start_position_mm)
+
+        channels_by_name={channel.name:channel for channel in self.channels_config}
+        channels=[channels_by_name[channel_name] for channel_name in self.channels_ordered]
+
+        channel_order=None
+        if Acquisition.OPTIMIZE_CHANNEL_ORDER:
+            channel_order=optimize_channel_order(channels,ChannelSwitchCostModel.from_machine_config(clear_z_backlash_mm=clear_z_backlash_mm()))
+
+        return compile_acquisition_plan(
+            route=route,
+            wellplate_format=WELLPLATE_FORMATS[self.plate_type],
+            plate_type=self.plate_type,
+            num_x=self.grid_config.x.N,
+            num_y=self.grid_config.y.N,
+            delta_x_mm=float(self.grid_config.x.d),
+            delta_y_mm=float(self.grid_config.y.d),
+            grid_mask=self.grid_config.mask,
+            num_z=self.grid_config.z.N,
+            delta_z_mm=float(self.grid_config.z.d),
+            num_time_points=self.grid_config.t.N,
+            time_point_interval_s=float(self.grid_config.t.d),
+            channels=channels,
+            af_laser_on=self.af_laser_on,
+            af_software_on=not self.af_software_channel is None,
+            directory_sharding=self.directory_sharding,
+            max_num_images_per_folder=max_num_images_per_folder,
+            start_position_mm=start_position_mm,
+            channel_order=channel_order,
+            well_time_point_intervals_s=self.well_time_point_intervals_s,
+        )
+
     def save_json(self,file_path:Union[str,Path],well_index_to_name:bool=False):
         json_tree_string=json.encoder.JSONEncoder(indent=2).encode(self.as_json(well_index_to_name=well_index_to_name))
 
@@ -360,6 +433,9 @@ from .navigation import NavigationController
 from .autofocus import AutoFocusController
 from .multi_point import MultiPointController
 from .laser_autofocus import LaserAutofocusController
+from .route_planner import AcquisitionRoute, WellGridGeometry, plan_route, route_report
+from .channel_order import ChannelSwitchCostModel, optimize_channel_order
+from .acquisition_plan import AcquisitionPlan, AcquisitionCostModel, AcquisitionEstimate, compile_acquisition_plan, clear_z_backlash_mm
 
 from qtpy.QtCore import Qt, QThread, QObject
 from qtpy.QtWidgets import QApplication
@@ -628,7 +704,15 @@ class Core(QObject):
         additional_data:Optional[dict]=None,
 
         image_return:Optional[Any]=None,
+
+        resume:bool=False,
     )->Optional[QThread]:
+        """
+        start acquisition
+
+        resume continues an interrupted acquisition in config.output_path, skipping all sites that have already been imaged (as recorded in its manifest).
+        the config of the interrupted acquisition can be loaded with interrupted_acquisition_config.
+        """
 
         # calculate physical imaging positions on wellplate given plate type and well selection
         plate_type=config.plate_type
@@ -655,8 +739,21 @@ class Core(QObject):
                 if well_column>=(wellplate_format.columns-wellplate_format.number_of_skip):
                     raise ValueError(f"well {well_column=} out of bounds {wellplate_format}")
 
-        well_list_names:List[str]=[wellplate_format.well_index_to_name(*c) for c in config.well_list]
-        well_list_physical_pos:List[Tuple[float,float]]=[wellplate_format.well_index_to_mm(*c) for c in config.well_list]
+        # visit the wells in an order (and enter each well at a corner) that minimizes stage travel
+        route,naive_route=config.plan_route(start_position_mm=(float(self.navigation.x_pos_mm),float(self.navigation.y_pos_mm)))
+        MAIN_LOG.log(f"acquisition route\n{route_report(route,naive_route)}")
+
+        # set file format for saved images (the plan contains the paths the images are saved to)
+        Acquisition.IMAGE_FORMAT=config.image_file_format # not super ergonomic, but currently the image file format is globally specified via this variable
+        self.multipointController.directory_sharding=config.directory_sharding
+
+        plan=config.compile_plan(
+            start_position_mm=(float(self.navigation.x_pos_mm),float(self.navigation.y_pos_mm)),
+            route=route,
+            max_num_images_per_folder=self.imageSaver.max_num_image_per_folder,
+        )
+        MAIN_LOG.log(plan.as_text())
+        MAIN_LOG.log(AcquisitionCostModel.from_machine_config().estimate(plan).as_text())
 
         # set autofocus parameters
         self.multipointController.set_software_af_flag(not config.af_software_channel is None)
@@ -667,16 +764,6 @@ class Core(QObject):
 
         self.multipointController.set_laser_af_flag(config.af_laser_on)
 
-        # set grid data per well
-        self.multipointController.set_NX(config.grid_config.x.N)
-        self.multipointController.set_NY(config.grid_config.y.N)
-        self.multipointController.set_NZ(config.grid_config.z.N)
-        self.multipointController.set_Nt(config.grid_config.t.N)
-        self.multipointController.set_deltaX(config.grid_config.x.d)
-        self.multipointController.set_deltaY(config.grid_config.y.d)
-        self.multipointController.set_deltaZ(config.grid_config.z.d)
-        self.multipointController.set_deltat(config.grid_config.t.d)
-
         for well_row,well_column in config.well_list:
             for x_grid_item,y_grid_item in config.grid_config.grid_positions_for_well(well_row,well_column,plate_type=wellplate_format):
                 if wellplate_format.fov_exceeds_well_boundary(well_row,well_column,x_grid_item,y_grid_item):
@@ -687,23 +774,39 @@ class Core(QObject):
 
         # set image saving location
         acquisition_data=config.as_json(well_index_to_name=True)
+        acquisition_data["max_num_image_per_folder"]=self.imageSaver.max_num_image_per_folder
         acquisition_data.update(additional_data)
 
         self.prepare_folder_for_new_experiment(output_path=config.output_path,complete_experiment_data=acquisition_data ) # todo change this to a callback (so that each image can be handled in a callback, not as batch or whatever)
-
-        # set file format for saved images
-        Acquisition.IMAGE_FORMAT=config.image_file_format # not super ergonomic, but currently the image file format is globally specified via this variable
+        plan.save(str(Path(config.output_path)/"acquisition_plan.json"))
 
         # start experiment, and return thread that actually does the imaging (thread.finished can be connected to some callback)
         return self.multipointController.run_experiment(
-            well_selection = ( well_list_names, well_list_physical_pos ),
-            grid_mask = config.grid_config.mask,
+            plan=plan,
 
             on_new_acquisition = on_new_acquisition,
             image_return=image_return,
 
-            plate_type=config.plate_type,
+            resume=resume,
+        )
+
+    @TypecheckFunction
+    def interrupted_acquisition_config(self,output_path:str)->AcquisitionConfig:
+        """ config of the acquisition in output_path (as saved to its parameters.json), to resume it (see acquire) """
+
+        config=AcquisitionConfig.from_json(Path(output_path)/'parameters.json')
+        # the folder may have been moved since
+        config.output_path=output_path
+        return config
+
+    @TypecheckFunction
+    def estimate_duration(self,config:AcquisitionConfig)->AcquisitionEstimate:
+        """ estimated duration of an acquisition, without starting it (see control.core.acquisition_plan) """
+        plan=config.compile_plan(
+            start_position_mm=(float(self.navigation.x_pos_mm),float(self.navigation.y_pos_mm)),
+            max_num_images_per_folder=self.imageSaver.max_num_image_per_folder,
         )
+        return AcquisitionCostModel.from_machine_config().estimate(plan)
 
     @TypecheckFunction
     def prepare_folder_for_new_experiment(self,output_path:str,complete_experiment_data:dict):
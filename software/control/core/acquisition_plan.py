@@ -0,0 +1,630 @@
+from control._def import *
+from control.core.configuration import Configuration
+
+import json
+import numpy
+import os
+
+from typing import Optional, List, Tuple, Dict, Set
+from control.typechecker import TypecheckFunction, TypecheckClass
+from control.core.route_planner import AcquisitionRoute, StageMotionModel
+from control.core.channel_order import ChannelSwitchCostModel, channel_order_for_position
+from control.core.directory_sharding import num_shard_buckets, shard_directory_name
+
+# an acquisition plan is the compiled form of an acquisition config: the wells in the order they are visited (and the corner each is entered at),
+# the sites imaged in each well, and the ordered list of actions (moves, autofocus, channel switches, snaps with the path the image is saved to)
+# the multipoint worker performs in each time point. the plan is saved next to the images, and the worker takes the wells and sites it images from it.
+#
+# the duration of an acquisition is estimated from the plan with a cost model: stage moves and channel switches are modelled from the machine
+# config, while the latencies of autofocus and snaps (in addition to the exposure) are measured during acquisitions, and accumulated across
+# acquisitions in Acquisition.MEASURED_LATENCIES_PATH.
+#
+# the plan describes stop-and-go imaging, i.e. z sweeps (Acquisition.Z_STACK_MODE) and continuous row scans (Acquisition.XY_SCAN_MODE) are
+# estimated as if each image was taken at rest.
+
+class PlanActionKind(str,Enum):
+    MOVE="move"
+    AUTOFOCUS="autofocus"
+    CHANNEL_SWITCH="channel_switch"
+    SNAP="snap"
+
+class PlanAutofocus(str,Enum):
+    LASER="laser"
+    SOFTWARE="software"
+
+class PlanAction:
+    """
+    single step of an acquisition plan
+
+    (not a TypecheckClass, because a plan contains an action per image, and compiling a plan should be fast enough to answer a remote call right away)
+    """
+
+    __slots__=("kind","well_name","site","x_mm","y_mm","dz_mm","z_index","channel_name","autofocus","save_path")
+
+    def __init__(self,
+        kind:PlanActionKind,
+        well_name:str="",
+        site:int=0,
+        x_mm:Optional[float]=None,
+        y_mm:Optional[float]=None,
+        dz_mm:float=0.0,
+        z_index:int=0,
+        channel_name:str="",
+        autofocus:Optional[PlanAutofocus]=None,
+        save_path:str="",
+    ):
+        self.kind=kind
+        self.well_name=well_name
+        self.site=site
+        self.x_mm=x_mm
+        """ target of an xy move (None if the move is along z only) """
+        self.y_mm=y_mm
+        self.dz_mm=dz_mm
+        """ relative z move (e.g. between the planes of a z stack) """
+        self.z_index=z_index
+        self.channel_name=channel_name
+        self.autofocus=autofocus
+        self.save_path=save_path
+        """ path of the image relative to the directory of the time point, without file extension """
+
+    def as_json(self)->dict:
+        # only the fields that apply to the kind of action, to keep plans of large acquisitions small
+        json_data:dict={"kind":self.kind.value,"well_name":self.well_name,"site":self.site}
+        if self.kind==PlanActionKind.MOVE:
+            if not self.x_mm is None:
+                json_data.update(x_mm=self.x_mm,y_mm=self.y_mm)
+            if self.dz_mm!=0.0:
+                json_data.update(dz_mm=self.dz_mm)
+            json_data.update(z_index=self.z_index)
+        elif self.kind==PlanActionKind.AUTOFOCUS:
+            json_data.update(autofocus=self.autofocus.value if not self.autofocus is None else None)
+        elif self.kind==PlanActionKind.CHANNEL_SWITCH:
+            json_data.update(channel_name=self.channel_name)
+        else:
+            json_data.update(z_index=self.z_index,channel_name=self.channel_name,save_path=self.save_path)
+        return json_data
+
+    def from_json(json_data:dict)->"PlanAction":
+        return PlanAction(
+            kind=PlanActionKind(json_data["kind"]),
+            well_name=json_data.get("well_name",""),
+            site=int(json_data.get("site",0)),
+            x_mm=json_data.get("x_mm",None),
+            y_mm=json_data.get("y_mm",None),
+            dz_mm=float(json_data.get("dz_mm",0.0)),
+            z_index=int(json_data.get("z_index",0)),
+            channel_name=json_data.get("channel_name",""),
+            autofocus=PlanAutofocus(json_data["autofocus"]) if not json_data.get("autofocus",None) is None else None,
+            save_path=json_data.get("save_path",""),
+        )
+
+@TypecheckClass
+class PlannedSite:
+    site:int
+    """ site index, 1 + x index + y index * number of columns of the grid """
+    i:int
+    """ y index in the grid """
+    j:int
+    """ x index in the grid """
+    x_mm:float
+    y_mm:float
+
+    def as_json(self)->dict:
+        return {"site":self.site,"i":self.i,"j":self.j,"x_mm":self.x_mm,"y_mm":self.y_mm}
+
+    def from_json(json_data:dict)->"PlannedSite":
+        return PlannedSite(site=int(json_data["site"]),i=int(json_data["i"]),j=int(json_data["j"]),x_mm=float(json_data["x_mm"]),y_mm=float(json_data["y_mm"]))
+
+@TypecheckClass
+class PlannedWell:
+    well_name:str
+    row:int
+    column:int
+    center_mm:Tuple[float,float]
+    x_scan_direction:int
+    """ direction of the first row scan in the well (1 = left to right) """
+    y_scan_direction:int
+    """ direction in which rows are scanned (1 = top to bottom) """
+    sites:List[PlannedSite]
+    """ sites imaged in the well, in the order they are visited """
+    time_point_interval_s:Optional[float]=None
+    """ interval between time points in this well, if it differs from the interval of the plan """
+
+    @property
+    def site_indices(self)->Set[int]:
+        return {site.site for site in self.sites}
+
+    def as_json(self)->dict:
+        return {
+            "well_name":self.well_name,
+            "row":self.row,
+            "column":self.column,
+            "center_mm":list(self.center_mm),
+            "x_scan_direction":self.x_scan_direction,
+            "y_scan_direction":self.y_scan_direction,
+            "sites":[site.as_json() for site in self.sites],
+            "time_point_interval_s":self.time_point_interval_s,
+        }
+
+    def from_json(json_data:dict)->"PlannedWell":
+        return PlannedWell(
+            well_name=json_data["well_name"],
+            row=int(json_data["row"]),
+            column=int(json_data["column"]),
+            center_mm=(float(json_data["center_mm"][0]),float(json_data["center_mm"][1])),
+            x_scan_direction=int(json_data["x_scan_direction"]),
+            y_scan_direction=int(json_data["y_scan_direction"]),
+            sites=[PlannedSite.from_json(site) for site in json_data["sites"]],
+            time_point_interval_s=float(json_data["time_point_interval_s"]) if not json_data.get("time_point_interval_s") is None else None,
+        )
+
+class AcquisitionPlan:
+    """ compiled acquisition config, see compile_acquisition_plan """
+
+    def __init__(self,
+        plate_type:str,
+        num_x:int,
+        num_y:int,
+        delta_x_mm:float,
+        delta_y_mm:float,
+        num_z:int,
+        delta_z_mm:float,
+        num_time_points:int,
+        time_point_interval_s:float,
+        channels:List[Configuration],
+        wells:List[PlannedWell],
+        actions:List[PlanAction],
+        start_position_mm:Optional[Tuple[float,float]]=None,
+    ):
+        self.plate_type=plate_type
+        self.num_x=num_x
+        self.num_y=num_y
+        self.delta_x_mm=delta_x_mm
+        self.delta_y_mm=delta_y_mm
+        self.num_z=num_z
+        self.delta_z_mm=delta_z_mm
+        self.num_time_points=num_time_points
+        self.time_point_interval_s=time_point_interval_s
+        """ time between the starts of consecutive time points (0 to start each time point right after the previous one) """
+        self.channels=channels
+        """ imaging channels, in the selected order (file names use the index in this list, independent of the order they are imaged in) """
+        self.wells=wells
+        self.actions=actions
+        """ actions performed in each time point """
+        self.start_position_mm=start_position_mm
+
+    @property
+    def num_sites(self)->int:
+        return sum(len(well.sites) for well in self.wells)
+
+    @property
+    def num_images_per_time_point(self)->int:
+        return self.num_sites*self.num_z*len(self.channels)
+
+    def channel_by_name(self,channel_name:str)->Configuration:
+        for channel in self.channels:
+            if channel.name==channel_name:
+                return channel
+        raise ValueError(f"channel {channel_name} is not part of the acquisition plan")
+
+    def as_text(self)->str:
+        num_actions={kind:0 for kind in PlanActionKind}
+        for action in self.actions:
+            num_actions[action.kind]+=1
+        return (
+            f"acquisition plan: {len(self.wells)} wells, {self.num_sites} sites, {self.num_z} z planes, {len(self.channels)} channels, {self.num_time_points} time points - "
+            f"per time point {num_actions[PlanActionKind.MOVE]} moves, {num_actions[PlanActionKind.AUTOFOCUS]} autofocus, "
+            f"{num_actions[PlanActionKind.CHANNEL_SWITCH]} channel switches, {num_actions[PlanActionKind.SNAP]} images"
+        )
+
+    def as_json(self)->dict:
+        return {
+            "plate_type":self.plate_type,
+            "grid":{"num_x":self.num_x,"num_y":self.num_y,"delta_x_mm":self.delta_x_mm,"delta_y_mm":self.delta_y_mm,"num_z":self.num_z,"delta_z_mm":self.delta_z_mm},
+            "num_time_points":self.num_time_points,
+            "time_point_interval_s":self.time_point_interval_s,
+            "start_position_mm":list(self.start_position_mm) if not self.start_position_mm is None else None,
+            "channels":[channel.as_dict() for channel in self.channels],
+            "wells":[well.as_json() for well in self.wells],
+            "actions":[action.as_json() for action in self.actions],
+        }
+
+    def from_json(json_data:dict)->"AcquisitionPlan":
+        grid=json_data["grid"]
+        start_position_mm=json_data.get("start_position_mm",None)
+        return AcquisitionPlan(
+            plate_type=json_data["plate_type"],
+            num_x=int(grid["num_x"]),
+            num_y=int(grid["num_y"]),
+            delta_x_mm=float(grid["delta_x_mm"]),
+            delta_y_mm=float(grid["delta_y_mm"]),
+            num_z=int(grid["num_z"]),
+            delta_z_mm=float(grid["delta_z_mm"]),
+            num_time_points=int(json_data["num_time_points"]),
+            time_point_interval_s=float(json_data["time_point_interval_s"]),
+            channels=[Configuration.from_json(channel) for channel in json_data["channels"]],
+            wells=[PlannedWell.from_json(well) for well in json_data["wells"]],
+            actions=[PlanAction.from_json(action) for action in json_data["actions"]],
+            start_position_mm=(float(start_position_mm[0]),float(start_position_mm[1])) if not start_position_mm is None else None,
+        )
+
+    def save(self,path:str):
+        with open(path,"w",encoding="utf-8") as plan_file:
+            json.dump(self.as_json(),plan_file)
+
+    def load(path:str)->"AcquisitionPlan":
+        with open(path,"r",encoding="utf-8") as plan_file:
+            return AcquisitionPlan.from_json(json.load(plan_file))
+
+@TypecheckFunction
+def compile_acquisition_plan(
+    route:AcquisitionRoute,
+    wellplate_format:WellplateFormatPhysical,
+    plate_type:str,
+    num_x:int,
+    num_y:int,
+    delta_x_mm:float,
+    delta_y_mm:float,
+    grid_mask:numpy.ndarray,
+    num_z:int,
+    delta_z_mm:float,
+    num_time_points:int,
+    time_point_interval_s:float,
+    channels:List[Configuration],
+    af_laser_on:bool,
+    af_software_on:bool,
+    directory_sharding:DirectorySharding,
+    max_num_images_per_folder:int,
+    start_position_mm:Optional[Tuple[float,float]]=None,
+    channel_order:Optional[List[int]]=None,
+    well_time_point_intervals_s:Optional[Dict[str,float]]=None,
+)->AcquisitionPlan:
+    """
+    compile the actions of an acquisition along a planned route (see AcquisitionConfig.compile_plan)
+
+    follows the order in which MultiPointWorker moves and images: rows of the grid in alternating directions, starting at the corner each well
+    is entered at, and the channels in channel_order (indices into channels, reversed at every other position if Acquisition.OPTIMIZE_CHANNEL_ORDER).
+    """
+
+    # image formats that store all images of a well/site in one container do not produce many files per directory
+    if Acquisition.IMAGE_FORMAT in (ImageFormat.ZARR,ImageFormat.TIFF_PER_WELL):
+        directory_sharding=DirectorySharding.NONE
+
+    if channel_order is None:
+        channel_order=list(range(len(channels)))
+
+    wells:List[PlannedWell]=[]
+    for visit in route.visits:
+        center_x_mm,center_y_mm=wellplate_format.well_index_to_mm(visit.row,visit.column)
+        left_x_mm=center_x_mm-delta_x_mm*(num_x-1)/2
+        top_y_mm=center_y_mm-delta_y_mm*(num_y-1)/2
+
+        sites=[]
+        x_scan_direction=visit.x_scan_direction
+        for i in range(num_y):
+            i_actual=i if visit.y_scan_direction==1 else num_y-1-i
+            for j in range(num_x):
+                j_actual=j if x_scan_direction==1 else num_x-1-j
+                if grid_mask[i_actual][j_actual]:
+                    sites.append(PlannedSite(
+                        site=1+j_actual+i_actual*num_x,
+                        i=i_actual,
+                        j=j_actual,
+                        x_mm=float(left_x_mm+j_actual*delta_x_mm),
+                        y_mm=float(top_y_mm+i_actual*delta_y_mm),
+                    ))
+            x_scan_direction=-x_scan_direction
+
+        wells.append(PlannedWell(
+            well_name=visit.well_name,
+            row=visit.row,
+            column=visit.column,
+            center_mm=(float(center_x_mm),float(center_y_mm)),
+            x_scan_direction=visit.x_scan_direction,
+            y_scan_direction=visit.y_scan_direction,
+            sites=sites,
+            time_point_interval_s=(well_time_point_intervals_s or {}).get(visit.well_name),
+        ))
+
+    num_images_per_time_point=sum(len(well.sites) for well in wells)*num_z*len(channels)
+    num_buckets=num_shard_buckets(num_images_per_time_point,max_num_images_per_folder)
+
+    # z stack origin relative to the focus plane, see MultiPointWorker.image_zstack_here
+    z_stack_start_mm=0.0
+    if num_z>1 and MACHINE_CONFIG.Z_STACKING_CONFIG=='FROM CENTER':
+        z_stack_start_mm=-delta_z_mm*round((num_z-1)/2)
+
+    actions:List[PlanAction]=[]
+    num_channel_passes=0
+    previous_channel_name:Optional[str]=None
+    for well in wells:
+        # the software autofocus runs at the first position of each row, and then every Acquisition.NUMBER_OF_FOVS_PER_AF positions
+        last_row=-1
+        fov_counter=0
+
+        for site in well.sites:
+            coordinate_name=f"{well.well_name}_s{site.site}_x{site.j}_y{site.i}"
+            image_directory=shard_directory_name(directory_sharding,well.well_name,site.site,num_buckets)
+
+            actions.append(PlanAction(PlanActionKind.MOVE,well_name=well.well_name,site=site.site,x_mm=site.x_mm,y_mm=site.y_mm))
+
+            if site.i!=last_row:
+                last_row=site.i
+                fov_counter=0
+            if af_laser_on:
+                actions.append(PlanAction(PlanActionKind.AUTOFOCUS,well_name=well.well_name,site=site.site,autofocus=PlanAutofocus.LASER))
+            elif af_software_on and (num_z==1 or MACHINE_CONFIG.Z_STACKING_CONFIG=='FROM CENTER') and fov_counter%Acquisition.NUMBER_OF_FOVS_PER_AF==0:
+                actions.append(PlanAction(PlanActionKind.AUTOFOCUS,well_name=well.well_name,site=site.site,autofocus=PlanAutofocus.SOFTWARE))
+            fov_counter+=1
+
+            if z_stack_start_mm!=0.0:
+                actions.append(PlanAction(PlanActionKind.MOVE,well_name=well.well_name,site=site.site,dz_mm=z_stack_start_mm))
+
+            for k in range(num_z):
+                if k>0:
+                    actions.append(PlanAction(PlanActionKind.MOVE,well_name=well.well_name,site=site.site,dz_mm=delta_z_mm,z_index=k))
+
+                file_id=f"{coordinate_name}_z{k}" if num_z>1 else coordinate_name
+                position_channel_order=channel_order_for_position(channel_order,num_channel_passes) if Acquisition.OPTIMIZE_CHANNEL_ORDER else channel_order
+                num_channel_passes+=1
+
+                for imaging_index,channel_index in enumerate(position_channel_order):
+                    channel=channels[channel_index]
+                    # the first channel of a position is always moved to (z offset), even if it did not change
+                    if imaging_index==0 or channel.name!=previous_channel_name:
+                        actions.append(PlanAction(PlanActionKind.CHANNEL_SWITCH,well_name=well.well_name,site=site.site,channel_name=channel.name))
+                    previous_channel_name=channel.name
+
+                    actions.append(PlanAction(
+                        PlanActionKind.SNAP,
+                        well_name=well.well_name,
+                        site=site.site,
+                        z_index=k,
+                        channel_name=channel.name,
+                        save_path=os.path.join(image_directory,file_id+"_"+str(channel.name).replace(" ","_")),
+                    ))
+
+            # back to the z stack origin
+            if num_z>1:
+                actions.append(PlanAction(PlanActionKind.MOVE,well_name=well.well_name,site=site.site,dz_mm=-(z_stack_start_mm+delta_z_mm*(num_z-1)),z_index=0))
+
+    return AcquisitionPlan(
+        plate_type=plate_type,
+        num_x=num_x,
+        num_y=num_y,
+        delta_x_mm=delta_x_mm,
+        delta_y_mm=delta_y_mm,
+        num_z=num_z,
+        delta_z_mm=delta_z_mm,
+        num_time_points=num_time_points,
+        time_point_interval_s=time_point_interval_s,
+        channels=channels,
+        wells=wells,
+        actions=actions,
+        start_position_mm=start_position_mm,
+    )
+
+class MeasuredLatency(str,Enum):
+    LASER_AUTOFOCUS="laser_autofocus"
+    SOFTWARE_AUTOFOCUS="software_autofocus"
+    SNAP_OVERHEAD="snap_overhead"
+    """ time to take an image in addition to the exposure time """
+    STAGE_MOVE_OVERHEAD="stage_move_overhead"
+    """ time of an xy move between sites in addition to the time predicted by StageMotionModel """
+
+class MeasuredLatencies:
+    """ mean latency of recurring actions, measured during acquisitions """
+
+    def __init__(self,max_count:int=1000):
+        self.max_count=max_count
+        """ older measurements are weighted down so that no more than this many count, to follow changes of the hardware """
+        self.total_s:Dict[MeasuredLatency,float]={}
+        self.count:Dict[MeasuredLatency,float]={}
+
+    def record(self,latency:MeasuredLatency,duration_s:float,count:float=1.0):
+        total_s=self.total_s.get(latency,0.0)+duration_s
+        total_count=self.count.get(latency,0.0)+count
+        if total_count>self.max_count:
+            total_s*=self.max_count/total_count
+            total_count=float(self.max_count)
+        self.total_s[latency]=total_s
+        self.count[latency]=total_count
+
+    def mean_s(self,latency:MeasuredLatency)->Optional[float]:
+        if self.count.get(latency,0.0)<=0.0:
+            return None
+        return self.total_s[latency]/self.count[latency]
+
+    def merge(self,other:"MeasuredLatencies"):
+        """ add the measurements of other (more recent) to this """
+        for latency,total_s in other.total_s.items():
+            self.record(latency,total_s,count=other.count[latency])
+
+    def as_text(self)->str:
+        means=[(latency,self.mean_s(latency)) for latency in MeasuredLatency]
+        measured=[f"{latency.value} {mean_s*1000:.1f}ms ({self.count[latency]:.0f}x)" for latency,mean_s in means if not mean_s is None]
+        return "measured latencies: "+(", ".join(measured) if len(measured)>0 else "none")
+
+    def as_json(self)->dict:
+        return {latency.value:{"total_s":self.total_s[latency],"count":self.count[latency]} for latency in self.total_s.keys()}
+
+    def from_json(json_data:dict)->"MeasuredLatencies":
+        measured_latencies=MeasuredLatencies()
+        for name,measurement in json_data.items():
+            try:
+                latency=MeasuredLatency(name)
+            except ValueError:
+                continue
+            measured_latencies.total_s[latency]=float(measurement["total_s"])
+            measured_latencies.count[latency]=float(measurement["count"])
+        return measured_latencies
+
+    def load(path:Optional[str]=None)->"MeasuredLatencies":
+        """ load from path (default Acquisition.MEASURED_LATENCIES_PATH), empty if the file does not exist (yet) """
+        path=path or Acquisition.MEASURED_LATENCIES_PATH
+        if path is None or not os.path.exists(path):
+            return MeasuredLatencies()
+        try:
+            with open(path,"r",encoding="utf-8") as latencies_file:
+                return MeasuredLatencies.from_json(json.load(latencies_file))
+        except (OSError,ValueError,KeyError) as e:
+            MAIN_LOG.log(f"warning - could not read measured latencies from {path}: {e}")
+            return MeasuredLatencies()
+
+    def save_merged(self,path:Optional[str]=None):
+        """ merge into the measurements in path (default Acquisition.MEASURED_LATENCIES_PATH) """
+        path=path or Acquisition.MEASURED_LATENCIES_PATH
+        if path is None:
+            return
+        merged=MeasuredLatencies.load(path)
+        merged.merge(self)
+        try:
+            with open(path,"w",encoding="utf-8") as latencies_file:
+                json.dump(merged.as_json(),latencies_file,indent=2)
+        except OSError as e:
+            MAIN_LOG.log(f"warning - could not save measured latencies to {path}: {e}")
+
+def clear_z_backlash_mm()->float:
+    """ same as Microcontroller.clear_z_backlash_mm, without a microcontroller """
+    mm_per_ustep_z=MACHINE_CONFIG.SCREW_PITCH_Z_MM/(MACHINE_CONFIG.MICROSTEPPING_DEFAULT_Z*MACHINE_CONFIG.FULLSTEPS_PER_REV_Z)
+    return max(160,20*MACHINE_CONFIG.MICROSTEPPING_DEFAULT_Z)*mm_per_ustep_z
+
+@TypecheckClass
+class AcquisitionEstimate:
+    total_s:float
+    time_point_s:float
+    """ duration of imaging a single time point """
+    stage_s:float
+    """ xy and z stack moves, per time point """
+    autofocus_s:float
+    channel_switch_s:float
+    exposure_s:float
+    snap_overhead_s:float
+    waiting_s:float
+    """ time spent waiting for the next time point """
+
+    def as_text(self)->str:
+        return (
+            f"estimated duration {self.total_s/60:.1f}min ({self.time_point_s:.1f}s per time point: stage {self.stage_s:.1f}s, autofocus {self.autofocus_s:.1f}s, "
+            f"channel switches {self.channel_switch_s:.1f}s, exposure {self.exposure_s:.1f}s, snap overhead {self.snap_overhead_s:.1f}s; "
+            f"{self.waiting_s:.1f}s waiting between time points)"
+        )
+
+    def as_json(self)->dict:
+        return {
+            "total_s":self.total_s,
+            "time_point_s":self.time_point_s,
+            "stage_s":self.stage_s,
+            "autofocus_s":self.autofocus_s,
+            "channel_switch_s":self.channel_switch_s,
+            "exposure_s":self.exposure_s,
+            "snap_overhead_s":self.snap_overhead_s,
+            "waiting_s":self.waiting_s,
+        }
+
+class AcquisitionCostModel:
+    """ estimate of the duration of an acquisition plan """
+
+    def __init__(self,
+        stage:StageMotionModel,
+        channel_switch:ChannelSwitchCostModel,
+        laser_autofocus_time_s:float,
+        software_autofocus_time_s:float,
+        snap_overhead_s:float,
+        stage_move_overhead_s:float=0.0,
+    ):
+        self.stage=stage
+        self.channel_switch=channel_switch
+        self.laser_autofocus_time_s=laser_autofocus_time_s
+        self.software_autofocus_time_s=software_autofocus_time_s
+        self.snap_overhead_s=snap_overhead_s
+        self.stage_move_overhead_s=stage_move_overhead_s
+
+    def from_machine_config(measured_latencies:Optional[MeasuredLatencies]=None)->"AcquisitionCostModel":
+        """ cost model from the machine config, with the latencies measured in previous acquisitions (loaded from Acquisition.MEASURED_LATENCIES_PATH by default) """
+
+        if measured_latencies is None:
+            measured_latencies=MeasuredLatencies.load()
+
+        def measured_or(latency:MeasuredLatency,default_s:float)->float:
+            mean_s=measured_latencies.mean_s(latency)
+            return mean_s if not mean_s is None else default_s
+
+        return AcquisitionCostModel(
+            stage=StageMotionModel.from_machine_config(),
+            channel_switch=ChannelSwitchCostModel.from_machine_config(clear_z_backlash_mm=clear_z_backlash_mm()),
+            laser_autofocus_time_s=measured_or(MeasuredLatency.LASER_AUTOFOCUS,Acquisition.LASER_AF_TIME_S),
+            software_autofocus_time_s=measured_or(MeasuredLatency.SOFTWARE_AUTOFOCUS,Acquisition.SOFTWARE_AF_TIME_S),
+            snap_overhead_s=measured_or(MeasuredLatency.SNAP_OVERHEAD,Acquisition.SNAP_OVERHEAD_S),
+            stage_move_overhead_s=measured_or(MeasuredLatency.STAGE_MOVE_OVERHEAD,0.0),
+        )
+
+    def xy_move_time_s(self,dx_mm:float,dy_mm:float)->float:
+        if abs(dx_mm)<1e-6 and abs(dy_mm)<1e-6:
+            return 0.0
+        return self.stage.move_time_s(dx_mm,dy_mm)+self.stage_move_overhead_s
+
+    @TypecheckFunction
+    def estimate(self,plan:AcquisitionPlan)->AcquisitionEstimate:
+        channels={channel.name:channel for channel in plan.channels}
+
+        stage_s=0.0
+        autofocus_s=0.0
+        channel_switch_s=0.0
+        exposure_s=0.0
+        snap_overhead_s=0.0
+
+        position=plan.start_position_mm
+        previous_channel:Optional[Configuration]=None
+        imaging_index=0
+        z_deviation_um=0.0
+        for action in plan.actions:
+            if action.kind==PlanActionKind.MOVE:
+                if not action.x_mm is None and not action.y_mm is None:
+                    if not position is None:
+                        stage_s+=self.xy_move_time_s(action.x_mm-position[0],action.y_mm-position[1])
+                    position=(action.x_mm,action.y_mm)
+                if action.dz_mm!=0.0:
+                    stage_s+=self.channel_switch.z_move_time_s(action.dz_mm)
+                # channel z offsets are relative to the focus plane at each position (and each plane of a z stack)
+                imaging_index=0
+                z_deviation_um=0.0
+
+            elif action.kind==PlanActionKind.AUTOFOCUS:
+                autofocus_s+=self.laser_autofocus_time_s if action.autofocus==PlanAutofocus.LASER else self.software_autofocus_time_s
+                imaging_index=0
+                z_deviation_um=0.0
+
+            elif action.kind==PlanActionKind.CHANNEL_SWITCH:
+                channel=channels[action.channel_name]
+                switch_time_s,z_deviation_um=self.channel_switch.switch_time_s(channel,previous_channel,imaging_index,z_deviation_um)
+                channel_switch_s+=switch_time_s
+                previous_channel=channel
+
+            else:
+                exposure_s+=channels[action.channel_name].exposure_time_ms/1000
+                snap_overhead_s+=self.snap_overhead_s
+                imaging_index+=1
+
+        time_point_s=stage_s+autofocus_s+channel_switch_s+exposure_s+snap_overhead_s
+
+        # each time point starts time_point_interval_s after the previous one, or right after it if imaging takes longer than that
+        total_s=0.0
+        waiting_s=0.0
+        for time_point in range(plan.num_time_points):
+            if time_point>0 and plan.time_point_interval_s>0.0:
+                start_s=max(total_s,time_point*plan.time_point_interval_s)
+                waiting_s+=start_s-total_s
+                total_s=start_s
+            total_s+=time_point_s
+
+        return AcquisitionEstimate(
+            total_s=total_s,
+            time_point_s=time_point_s,
+            stage_s=stage_s,
+            autofocus_s=autofocus_s,
+            channel_switch_s=channel_switch_s,
+            exposure_s=exposure_s,
+            snap_overhead_s=snap_overhead_s,
+            waiting_s=waiting_s,
+        )
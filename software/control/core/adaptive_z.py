@@ -0,0 +1,71 @@
+from control._def import *
+
+import cv2
+import numpy
+
+from typing import List
+import control.utils as utils
+
+# thin samples are only in focus in a few planes of a deep z stack, the planes further away contain nothing but blur. in an adaptive
+# z stack, the focus measure (see control.utils.calculate_focus_measure) of one channel is evaluated for each plane while the stack is
+# acquired, and the stack stops once the measure has dropped below a fraction of its peak on both sides of the peak:
+#   - before the peak, any plane may have dropped below the threshold (the stack starts on one side of the peak for thin samples),
+#   - after the peak, the most recent plane must have dropped below the threshold.
+# the configured stack (number of planes, step size) is the upper bound, and at least a minimum number of planes is always acquired.
+# if the measure does not decay (e.g. thick samples, or a noise floor above the threshold), the whole configured stack is acquired.
+
+class AdaptiveZStack:
+    """ decides when a z stack can stop, from the focus measure of each plane acquired so far, see ZStackMode.ADAPTIVE """
+
+    def __init__(self,
+        max_num_planes:int,
+        min_num_planes:int,
+        decay_fraction:float,
+        focus_measure_operator:FocusMeasureOperators,
+        downsample_factor:int=4,
+    ):
+        self.max_num_planes=max_num_planes
+        self.min_num_planes=min(min_num_planes,max_num_planes)
+        self.decay_fraction=decay_fraction
+        self.focus_measure_operator=focus_measure_operator
+        self.downsample_factor=downsample_factor
+
+        self.focus_measures:List[float]=[]
+        """ focus measure of each plane acquired so far, in the order they were acquired """
+
+    def from_machine_config(max_num_planes:int)->"AdaptiveZStack":
+        return AdaptiveZStack(
+            max_num_planes=max_num_planes,
+            min_num_planes=Acquisition.ADAPTIVE_Z_MIN_NUM_PLANES,
+            decay_fraction=Acquisition.ADAPTIVE_Z_DECAY_FRACTION,
+            focus_measure_operator=MACHINE_CONFIG.MUTABLE_STATE.FOCUS_MEASURE_OPERATOR,
+        )
+
+    def add_plane(self,image:numpy.ndarray):
+        """ record the focus measure of the next plane """
+
+        if self.downsample_factor>1:
+            height,width=image.shape[:2]
+            image=cv2.resize(image,(max(width//self.downsample_factor,1),max(height//self.downsample_factor,1)),interpolation=cv2.INTER_AREA)
+
+        self.focus_measures.append(utils.calculate_focus_measure(image,self.focus_measure_operator))
+
+    @property
+    def num_planes(self)->int:
+        return len(self.focus_measures)
+
+    @property
+    def done(self)->bool:
+        """ no more planes are required """
+
+        if self.num_planes>=self.max_num_planes:
+            return True
+        if self.num_planes<self.min_num_planes:
+            return False
+
+        peak_index=int(numpy.argmax(self.focus_measures))
+        threshold=self.decay_fraction*self.focus_measures[peak_index]
+
+        decayed_below_peak=any(focus_measure<=threshold for focus_measure in self.focus_measures[:peak_index])
+        decayed_above_peak=peak_index<self.num_planes-1 and self.focus_measures[-1]<=threshold
+        return decayed_below_peak and decayed_above_peak
@@ -0,0 +1,112 @@
+from control._def import *
+
+import numpy
+
+from typing import Optional, Tuple, List
+from control.typechecker import TypecheckFunction
+
+# the camera returns images with fewer than 16 bits per pixel shifted into the high bits of uint16 (see Camera.rescale_raw_image),
+# so that they use the full uint16 range for display and processing. the functions below convert images to and from the
+# representation they are stored in.
+
+@TypecheckFunction
+def to_native_bit_depth(image:numpy.ndarray,bit_depth:int)->numpy.ndarray:
+    """ shift pixel values back to the native bit depth of the camera, i.e. set the unused high bits to zero """
+    if image.dtype!=numpy.uint16 or bit_depth>=16:
+        return image
+    return image>>(16-bit_depth)
+
+@TypecheckFunction
+def from_native_bit_depth(image:numpy.ndarray,bit_depth:int)->numpy.ndarray:
+    """ inverse of to_native_bit_depth """
+    if image.dtype!=numpy.uint16 or bit_depth>=16:
+        return image
+    return image<<(16-bit_depth)
+
+@TypecheckFunction
+def pack_12bit(image:numpy.ndarray)->numpy.ndarray:
+    """
+    pack 12 bit pixel values (in native bit depth, i.e. high 4 bits are zero) into 3 bytes per 2 pixels
+
+    pixels a and b are stored as [a bits 0-7], [a bits 8-11 | b bits 0-3], [b bits 4-11] (same as the GenICam Mono12p format).
+    an odd number of pixels is padded with one zero pixel.
+    """
+    pixels=image.reshape(-1).astype(numpy.uint16)
+    if pixels.size%2==1:
+        pixels=numpy.append(pixels,numpy.uint16(0))
+
+    a=pixels[0::2]
+    b=pixels[1::2]
+
+    packed=numpy.empty((a.size,3),dtype=numpy.uint8)
+    packed[:,0]=a&0xFF
+    packed[:,1]=((a>>8)&0x0F)|((b&0x0F)<<4)
+    packed[:,2]=(b>>4)&0xFF
+
+    return packed.reshape(-1)
+
+@TypecheckFunction
+def unpack_12bit(packed:numpy.ndarray,shape:List[int])->numpy.ndarray:
+    """ inverse of pack_12bit, returns uint16 image with pixel values in native bit depth """
+    triplets=packed.reshape(-1,3).astype(numpy.uint16)
+
+    pixels=numpy.empty(triplets.shape[0]*2,dtype=numpy.uint16)
+    pixels[0::2]=triplets[:,0]|((triplets[:,1]&0x0F)<<8)
+    pixels[1::2]=(triplets[:,1]>>4)|(triplets[:,2]<<4)
+
+    num_pixels=int(numpy.prod(shape))
+    return pixels[:num_pixels].reshape(tuple(shape))
+
+@TypecheckFunction
+def storage_representation(image:numpy.ndarray,bit_depth:int,mode:ImageBitDepthMode,allow_packing:bool=True)->Tuple[numpy.ndarray,dict]:
+    """
+    convert image (as returned by the camera) into the representation it is saved in
+
+    returns the converted image, and metadata that describes how to restore the original pixel values.
+    packing is only possible for 12 bit images, and only for containers that store raw bytes (allow_packing). if packing is not possible,
+    the image is stored in native bit depth instead.
+    """
+
+    if image.dtype!=numpy.uint16 or bit_depth>=16 or mode==ImageBitDepthMode.SHIFTED:
+        return image,{"bit_depth":bit_depth,"bit_depth_mode":ImageBitDepthMode.SHIFTED.value}
+
+    native_image=to_native_bit_depth(image,bit_depth)
+
+    if mode==ImageBitDepthMode.PACKED and bit_depth==12 and allow_packing:
+        packed_image=pack_12bit(native_image)
+        # keep one row of packed bytes per image row if possible, so that the packed image can still be split into tiles
+        if image.ndim>=2 and packed_image.size%image.shape[0]==0:
+            packed_image=packed_image.reshape(image.shape[0],-1)
+        # (not "shape", which tifffile uses for the shape of the stored array)
+        return packed_image,{"bit_depth":bit_depth,"bit_depth_mode":ImageBitDepthMode.PACKED.value,"unpacked_shape":list(image.shape)}
+
+    return native_image,{"bit_depth":bit_depth,"bit_depth_mode":ImageBitDepthMode.NATIVE.value}
+
+@TypecheckFunction
+def restore_from_storage(stored:numpy.ndarray,metadata:dict,shifted:bool=False)->numpy.ndarray:
+    """
+    inverse of storage_representation. returns the image in native bit depth, or shifted into the high bits (like the camera returns it) if shifted is True
+    """
+
+    bit_depth=int(metadata.get("bit_depth",16))
+    mode=ImageBitDepthMode(metadata.get("bit_depth_mode",ImageBitDepthMode.SHIFTED.value))
+
+    if mode==ImageBitDepthMode.PACKED:
+        image=unpack_12bit(stored,list(metadata["unpacked_shape"]))
+    elif mode==ImageBitDepthMode.NATIVE:
+        image=stored
+    else:
+        return stored if shifted else to_native_bit_depth(stored,bit_depth)
+
+    return from_native_bit_depth(image,bit_depth) if shifted else image
+
+@TypecheckFunction
+def read_tiff_image(path:str,shifted:bool=False)->numpy.ndarray:
+    """ read a tiff image saved by the image saver, undoing packing if required (see restore_from_storage) """
+    import tifffile
+
+    with tifffile.TiffFile(path) as tiff_file:
+        stored=tiff_file.asarray()
+        metadata=tiff_file.shaped_metadata[0] if not tiff_file.shaped_metadata is None else {}
+
+    return restore_from_storage(stored,metadata,shifted=shifted)
@@ -0,0 +1,154 @@
+from control._def import *
+from control.core.configuration import Configuration
+
+import itertools
+import math
+
+from typing import Optional, List, Tuple
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# switching between channels costs time in three places:
+#   - changing exposure time and analog gain of the camera (skipped by the camera if unchanged)
+#   - sending the illumination command to the microcontroller (skipped by LiveController.set_microscope_mode if unchanged)
+#   - moving to the z offset of the channel, which is done in two steps (with backlash compensation) when moving down
+# all of these depend on the order the channels are imaged in, and the optimizer below picks an order that minimizes their sum.
+
+@TypecheckClass
+class ChannelSwitchCostModel:
+    """ estimate of the time it takes to switch from one channel to another """
+
+    camera_settings_time_s:float
+    """ time to change exposure time and/or analog gain """
+    illumination_command_time_s:float
+    """ time to set up a different illumination """
+    z_velocity_mm_per_s:float
+    z_acceleration_mm_per_s2:float
+    z_move_overhead_s:float
+    """ fixed cost of each z move (command round trip, settling) """
+    clear_z_backlash_mm:float
+    """ overshoot of the two-step move that compensates backlash """
+    z_move_threshold_um:float
+    """ z offset changes below this threshold are not executed (see MultiPointWorker.image_config) """
+
+    def from_machine_config(clear_z_backlash_mm:float)->"ChannelSwitchCostModel":
+        return ChannelSwitchCostModel(
+            camera_settings_time_s=Acquisition.CHANNEL_CAMERA_SETTINGS_TIME_S,
+            illumination_command_time_s=Acquisition.CHANNEL_ILLUMINATION_COMMAND_TIME_S,
+            z_velocity_mm_per_s=MACHINE_CONFIG.MAX_VELOCITY_Z_mm,
+            z_acceleration_mm_per_s2=MACHINE_CONFIG.MAX_ACCELERATION_Z_mm,
+            z_move_overhead_s=MACHINE_CONFIG.SCAN_STABILIZATION_TIME_MS_Z/1000,
+            clear_z_backlash_mm=clear_z_backlash_mm,
+            z_move_threshold_um=MACHINE_CONFIG.LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM,
+        )
+
+    def z_move_time_s(self,distance_mm:float)->float:
+        distance_mm=abs(distance_mm)
+        if distance_mm<1e-9:
+            return 0.0
+        if distance_mm<self.z_velocity_mm_per_s**2/self.z_acceleration_mm_per_s2:
+            travel_time_s=2*math.sqrt(distance_mm/self.z_acceleration_mm_per_s2)
+        else:
+            travel_time_s=distance_mm/self.z_velocity_mm_per_s+self.z_velocity_mm_per_s/self.z_acceleration_mm_per_s2
+        return travel_time_s+self.z_move_overhead_s
+
+    def pass_time_s(self,configurations:List[Configuration],previous:Optional[Configuration])->float:
+        """
+        time spent switching channels while imaging configurations in the given order at a single position (starting in the focus plane)
+
+        previous is the channel the microscope is set up for before the first channel is imaged.
+        """
+
+        time_s=0.0
+        z_deviation_um=0.0
+        for imaging_index,configuration in enumerate(configurations):
+            switch_time_s,z_deviation_um=self.switch_time_s(configuration,previous,imaging_index,z_deviation_um)
+            time_s+=switch_time_s
+            previous=configuration
+
+        return time_s
+
+    def switch_time_s(self,configuration:Configuration,previous:Optional[Configuration],imaging_index:int,z_deviation_um:float)->Tuple[float,float]:
+        """
+        time to set up configuration as the imaging_index-th channel at a position, and the deviation from the focus plane (in um) afterwards
+
+        z_deviation_um is the deviation from the focus plane before the switch (i.e. the z offset of the channel imaged before, if it was moved to).
+        """
+
+        time_s=0.0
+        if previous is None or (previous.exposure_time_ms,previous.analog_gain)!=(configuration.exposure_time_ms,configuration.analog_gain):
+            time_s+=self.camera_settings_time_s
+        if previous is None or (previous.illumination_source,previous.illumination_intensity)!=(configuration.illumination_source,configuration.illumination_intensity):
+            time_s+=self.illumination_command_time_s
+
+        target_um=configuration.channel_z_offset or 0.0
+        um_to_move=target_um-z_deviation_um
+        if abs(um_to_move)>self.z_move_threshold_um:
+            z_deviation_um=target_um
+            if channel_needs_backlash_compensation(imaging_index,um_to_move):
+                time_s+=self.z_move_time_s(um_to_move/1000-self.clear_z_backlash_mm)+self.z_move_time_s(self.clear_z_backlash_mm)
+            else:
+                time_s+=self.z_move_time_s(um_to_move/1000)
+
+        return time_s,z_deviation_um
+
+    def alternating_time_s(self,configurations:List[Configuration],order:List[int])->float:
+        """ time spent switching channels per two positions, if the order is reversed at every other position """
+        forward=[configurations[i] for i in order]
+        backward=forward[::-1]
+        # the last channel of each position is the first one of the next position
+        return self.pass_time_s(forward,previous=backward[-1])+self.pass_time_s(backward,previous=forward[-1])
+
+def channel_needs_backlash_compensation(imaging_index:int,um_to_move:float)->bool:
+    """
+    z moves to a channel offset approach the target from below, to avoid backlash. this requires two steps if the move goes down.
+    the first channel at a position is always approached in two steps, because the direction of the last move (e.g. by the autofocus) is not known.
+    """
+    return imaging_index==0 or um_to_move<0
+
+@TypecheckFunction
+def optimize_channel_order(configurations:List[Configuration],cost_model:ChannelSwitchCostModel,max_num_channels_exhaustive:int=7)->List[int]:
+    """
+    order (indices into configurations) to image the channels in at each position, where every other position uses the reversed order (see channel_order_for_position)
+
+    all orders are compared if there are at most max_num_channels_exhaustive channels, otherwise the given order is improved by swapping pairs of channels.
+    ties are resolved in favour of the given order.
+    """
+
+    num_channels=len(configurations)
+    identity=list(range(num_channels))
+    if num_channels<=2:
+        return identity
+
+    best_order=identity
+    best_time_s=cost_model.alternating_time_s(configurations,identity)
+
+    if num_channels<=max_num_channels_exhaustive:
+        for order in itertools.permutations(identity):
+            # reversing an order results in the same cost
+            if order[0]>order[-1]:
+                continue
+            time_s=cost_model.alternating_time_s(configurations,list(order))
+            if time_s<best_time_s-1e-9:
+                best_order,best_time_s=list(order),time_s
+        return best_order
+
+    improved=True
+    while improved:
+        improved=False
+        for i in range(num_channels-1):
+            for j in range(i+1,num_channels):
+                order=list(best_order)
+                order[i],order[j]=order[j],order[i]
+                time_s=cost_model.alternating_time_s(configurations,order)
+                if time_s<best_time_s-1e-9:
+                    best_order,best_time_s=order,time_s
+                    improved=True
+
+    return best_order
+
+@TypecheckFunction
+def channel_order_for_position(order:List[int],position_index:int)->List[int]:
+    """ alternate the direction of the channel order between consecutive positions, so that the microscope does not need to switch channels between them """
+    if position_index%2==1:
+        return order[::-1]
+    return list(order)
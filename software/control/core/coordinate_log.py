@@ -0,0 +1,107 @@
+from control._def import *
+
+import os
+import csv
+import time
+
+from typing import Optional, List, Any
+from control.typechecker import TypecheckFunction
+
+COORDINATE_LOG_FILE_NAME:str="coordinates.csv"
+""" name of the coordinate log inside each time point directory """
+
+COORDINATE_LOG_COLUMNS:List[str]=['i','j','k','x (mm)','y (mm)','z (um)','skipped']
+""" 'skipped' is empty for imaged positions, and the reason for sites that were skipped (e.g. 'target object count reached') """
+
+class CoordinateLog:
+    """
+    append-only csv file with the stage position at which each image (z plane) of a site has been taken
+
+    rows are buffered and written in batches (see Acquisition.COORDINATE_LOG_FLUSH_NUM_ROWS and COORDINATE_LOG_FLUSH_INTERVAL_S),
+    so that logging a site takes constant time no matter how many sites have been imaged, and a crash loses at most the last batch.
+    """
+
+    @TypecheckFunction
+    def __init__(self,
+        path:str,
+        append:bool=False,
+        columns:List[str]=COORDINATE_LOG_COLUMNS,
+        flush_num_rows:int=Acquisition.COORDINATE_LOG_FLUSH_NUM_ROWS,
+        flush_interval_s:float=Acquisition.COORDINATE_LOG_FLUSH_INTERVAL_S,
+    ):
+        """ if append is True, rows are added to the existing file at path (e.g. when resuming an acquisition), otherwise the file is replaced """
+
+        self.path:str=path
+        self.flush_num_rows:int=flush_num_rows
+        self.flush_interval_s:float=flush_interval_s
+
+        write_header=True
+        if append and os.path.exists(path):
+            existing_columns=self._truncate_incomplete_row()
+            if not existing_columns is None:
+                # keep the columns of the existing file
+                columns=existing_columns
+                write_header=False
+
+        self.columns:List[str]=list(columns)
+        self.file=open(path,"a" if not write_header else "w",newline="")
+        self.writer=csv.DictWriter(self.file,fieldnames=self.columns,restval="",extrasaction="ignore",lineterminator="\n")
+        if write_header:
+            self.writer.writeheader()
+            self._sync()
+
+        self.buffer:List[dict]=[]
+        self.last_flush_time:float=time.monotonic()
+
+    def _truncate_incomplete_row(self)->Optional[List[str]]:
+        """ remove a partially written last row (e.g. after a crash), returns the header of the file (None if there is none) """
+
+        with open(self.path,"rb+") as file:
+            content=file.read()
+            complete_length=content.rfind(b"\n")+1
+            if complete_length<len(content):
+                MAIN_LOG.log(f"warning - removing incomplete last row from {self.path}")
+                file.truncate(complete_length)
+
+        if complete_length==0:
+            return None
+
+        header_line=content[:content.find(b"\n")].decode("utf-8")
+        return next(csv.reader([header_line]))
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self,rows:List[dict]):
+        """ add rows (dicts with the column names as keys), written to disk once enough rows (or time) have accumulated """
+
+        self.buffer.extend(rows)
+
+        if len(self.buffer)>=self.flush_num_rows or (time.monotonic()-self.last_flush_time)>=self.flush_interval_s:
+            self.flush()
+
+    def flush(self):
+        """ write buffered rows to disk """
+
+        if len(self.buffer)>0:
+            self.writer.writerows(self.buffer)
+            self.buffer.clear()
+            self._sync()
+
+        self.last_flush_time=time.monotonic()
+
+    def close(self):
+        """ write buffered rows and close the file. may be called more than once. """
+
+        if self.file.closed:
+            return
+
+        self.flush()
+        self.file.close()
+
+    def __enter__(self)->"CoordinateLog":
+        return self
+
+    def __exit__(self,*args:Any):
+        self.close()
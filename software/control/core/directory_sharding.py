@@ -0,0 +1,33 @@
+from control._def import *
+
+import math
+import zlib
+
+from control.typechecker import TypecheckFunction
+
+# images of a time point are distributed over subdirectories (shards), so that no single directory contains tens of thousands of files.
+# the shard directory is always exactly one level below the time point directory.
+
+SHARD_BUCKET_HEADROOM:float=1.2
+""" hashing does not distribute sites perfectly evenly, so more buckets than strictly necessary are used to stay below the limit of images per folder """
+
+@TypecheckFunction
+def num_shard_buckets(num_images:int,max_num_images_per_folder:int)->int:
+    """ number of buckets for DirectorySharding.HASHED, for num_images images per time point """
+    return max(1,math.ceil(SHARD_BUCKET_HEADROOM*num_images/max_num_images_per_folder))
+
+@TypecheckFunction
+def shard_directory_name(policy:DirectorySharding,well_name:str,site:int,num_buckets:int=1)->str:
+    """
+    name of the subdirectory that the images of a site are saved in ("" if images are not sharded)
+
+    all images of a site (all z planes and channels) are placed in the same directory.
+    """
+    if policy==DirectorySharding.NONE:
+        return ""
+    if policy==DirectorySharding.PER_WELL:
+        return well_name
+
+    assert policy==DirectorySharding.HASHED
+    bucket=zlib.crc32(f"{well_name}_s{site}".encode("utf-8"))%num_buckets
+    return f"bucket_{bucket:04}"
@@ -0,0 +1,238 @@
+from control._def import *
+
+import json
+import numpy
+
+from typing import Optional, List, Tuple
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# a focus map predicts the focus position z(x,y) from a sparse set of positions where the focus has been measured (with the laser autofocus),
+# so that the acquisition can move straight to the predicted z at each position instead of running the autofocus there.
+#
+# the surface is either a least squares plane, or a thin-plate spline, i.e. the smoothest surface (minimal bending energy) through the points.
+# points that do not fit the surface of the remaining points (leave-one-out residual above a threshold, e.g. the autofocus locked onto
+# the wrong interface) are rejected one at a time, worst first.
+
+@TypecheckClass
+class FocusMapPoint:
+    x_mm:float
+    y_mm:float
+    z_mm:float
+    well_name:str=""
+    """ well the point has been measured in (empty if unknown) """
+
+    def as_json(self)->dict:
+        return {"x_mm":self.x_mm,"y_mm":self.y_mm,"z_mm":self.z_mm,"well_name":self.well_name}
+
+    def from_json(json_data:dict)->"FocusMapPoint":
+        return FocusMapPoint(
+            x_mm=float(json_data["x_mm"]),
+            y_mm=float(json_data["y_mm"]),
+            z_mm=float(json_data["z_mm"]),
+            well_name=str(json_data.get("well_name","")),
+        )
+
+def _thin_plate_kernel(r:numpy.ndarray)->numpy.ndarray:
+    """ radial basis function of the thin-plate spline, r^2*log(r) (0 at r=0) """
+    with numpy.errstate(divide="ignore",invalid="ignore"):
+        return numpy.where(r>0.0,r**2*numpy.log(r),0.0)
+
+class FocusSurface:
+    """ surface fitted to a set of points, see fit_focus_surface """
+
+    def __init__(self,model:FocusSurfaceModel,center:numpy.ndarray,plane:numpy.ndarray,control_points:Optional[numpy.ndarray]=None,weights:Optional[numpy.ndarray]=None):
+        self.model=model
+        self.center=center
+        """ mean (x,y) of the points, coordinates are relative to it to keep the fit well conditioned """
+        self.plane=plane
+        """ (offset,slope x,slope y) """
+        self.control_points=control_points
+        self.weights=weights
+
+    def predict(self,x_mm:numpy.ndarray,y_mm:numpy.ndarray)->numpy.ndarray:
+        dx=numpy.asarray(x_mm,dtype=float)-self.center[0]
+        dy=numpy.asarray(y_mm,dtype=float)-self.center[1]
+        z=self.plane[0]+self.plane[1]*dx+self.plane[2]*dy
+        if not self.weights is None:
+            assert not self.control_points is None
+            r=numpy.hypot(dx[...,None]-self.control_points[:,0],dy[...,None]-self.control_points[:,1])
+            z=z+_thin_plate_kernel(r)@self.weights
+        return z
+
+@TypecheckFunction
+def fit_focus_surface(points:List[FocusMapPoint],model:FocusSurfaceModel,smoothing:float=0.0)->FocusSurface:
+    """
+    fit a surface to the points (at least one)
+
+    fewer than 3 points only determine a constant z (and a spline needs at least 3 points that are not on a line, otherwise a plane is fitted).
+    smoothing>0 lets the spline deviate from the points to reduce bending (in mm^2, i.e. relative to the squared point distances).
+    """
+
+    assert len(points)>0
+
+    xy=numpy.array([(p.x_mm,p.y_mm) for p in points],dtype=float)
+    z=numpy.array([p.z_mm for p in points],dtype=float)
+    center=xy.mean(axis=0)
+    xy=xy-center
+
+    if len(points)<3:
+        return FocusSurface(model=FocusSurfaceModel.PLANE,center=center,plane=numpy.array([z.mean(),0.0,0.0]))
+
+    P=numpy.column_stack([numpy.ones(len(points)),xy])
+    plane,_residuals,rank,_singular_values=numpy.linalg.lstsq(P,z,rcond=None)
+
+    if model==FocusSurfaceModel.PLANE or rank<3:
+        return FocusSurface(model=FocusSurfaceModel.PLANE,center=center,plane=plane)
+
+    # thin-plate spline: solve [K+smoothing*I P; P^T 0] [w; a] = [z; 0]
+    n=len(points)
+    K=_thin_plate_kernel(numpy.hypot(xy[:,None,0]-xy[None,:,0],xy[:,None,1]-xy[None,:,1]))
+    A=numpy.zeros((n+3,n+3))
+    A[:n,:n]=K+smoothing*numpy.eye(n)
+    A[:n,n:]=P
+    A[n:,:n]=P.T
+    b=numpy.concatenate([z,numpy.zeros(3)])
+    solution=numpy.linalg.lstsq(A,b,rcond=None)[0]
+
+    return FocusSurface(model=FocusSurfaceModel.THIN_PLATE_SPLINE,center=center,plane=solution[n:],control_points=xy,weights=solution[:n])
+
+class FocusMap:
+    """ focus position z(x,y) predicted from positions where the focus has been measured (see Acquisition.FOCUS_MAP_SCOPE) """
+
+    def __init__(self,model:FocusSurfaceModel,outlier_threshold_um:float,smoothing:float=0.0):
+        self.model=model
+        self.outlier_threshold_um=outlier_threshold_um
+        self.smoothing=smoothing
+
+        self.points:List[FocusMapPoint]=[]
+        """ all measured points, including outliers """
+        self.outliers:List[FocusMapPoint]=[]
+        """ points that have been rejected by the last fit """
+        self.inliers:List[FocusMapPoint]=[]
+        """ points the surface has been fitted to """
+        self.surface:Optional[FocusSurface]=None
+        self.num_refreshes:int=0
+        """ number of points added because the map was off by more than Acquisition.FOCUS_MAP_REFRESH_THRESHOLD_UM """
+
+    def from_machine_config()->"FocusMap":
+        return FocusMap(
+            model=Acquisition.FOCUS_MAP_SURFACE,
+            outlier_threshold_um=Acquisition.FOCUS_MAP_OUTLIER_THRESHOLD_UM,
+            smoothing=Acquisition.FOCUS_MAP_TPS_SMOOTHING,
+        )
+
+    @property
+    def is_ready(self)->bool:
+        return not self.surface is None
+
+    def has_points_in_well(self,well_name:str)->bool:
+        return any(p.well_name==well_name for p in self.points)
+
+    def add_point(self,point:FocusMapPoint,refit:bool=True):
+        self.points.append(point)
+        if refit:
+            self.fit()
+
+    def fit(self):
+        """ fit the surface to all points, rejecting outliers one at a time (largest leave-one-out residual first) """
+
+        inliers=list(self.points)
+        self.outliers=[]
+
+        # at least 4 points are required to tell which one of them does not fit
+        while len(inliers)>=4:
+            loo_residuals_um=[
+                abs(fit_focus_surface(inliers[:i]+inliers[i+1:],self.model,self.smoothing).predict(p.x_mm,p.y_mm)-p.z_mm)*1000
+                for i,p in enumerate(inliers)
+            ]
+            worst=int(numpy.argmax(loo_residuals_um))
+            if loo_residuals_um[worst]<=self.outlier_threshold_um:
+                break
+
+            MAIN_LOG.log(f"focus map - rejecting point at ({inliers[worst].x_mm:.3f},{inliers[worst].y_mm:.3f})mm, off by {loo_residuals_um[worst]:.1f}um from the surface through the other points")
+            self.outliers.append(inliers.pop(worst))
+
+        self.inliers=inliers
+        self.surface=fit_focus_surface(inliers,self.model,self.smoothing) if len(inliers)>0 else None
+
+    def predict(self,x_mm:float,y_mm:float)->float:
+        assert not self.surface is None, "focus map has not been fitted"
+        return float(self.surface.predict(numpy.array(x_mm),numpy.array(y_mm)))
+
+    def residuals_um(self)->List[float]:
+        """ residual of each inlier (0 for an interpolating spline) """
+        return [(p.z_mm-self.predict(p.x_mm,p.y_mm))*1000 for p in self.inliers]
+
+    def as_text(self)->str:
+        residuals_um=self.residuals_um() if self.is_ready else []
+        max_residual_um=max((abs(r) for r in residuals_um),default=0.0)
+        z_values_mm=[p.z_mm for p in self.inliers]
+        return (
+            f"focus map ({self.model.value}): {len(self.points)} points, {len(self.outliers)} rejected as outliers, "
+            + (f"z range {min(z_values_mm):.4f}-{max(z_values_mm):.4f}mm, " if len(z_values_mm)>0 else "")
+            + f"max residual {max_residual_um:.2f}um, refreshed {self.num_refreshes} times"
+        )
+
+    def as_json(self)->dict:
+        return {
+            "model":self.model.value,
+            "outlier_threshold_um":self.outlier_threshold_um,
+            "smoothing":self.smoothing,
+            "num_refreshes":self.num_refreshes,
+            "points":[p.as_json() for p in self.points],
+            "outliers":[p.as_json() for p in self.outliers],
+        }
+
+    def from_json(json_data:dict)->"FocusMap":
+        focus_map=FocusMap(
+            model=FocusSurfaceModel(json_data["model"]),
+            outlier_threshold_um=float(json_data["outlier_threshold_um"]),
+            smoothing=float(json_data.get("smoothing",0.0)),
+        )
+        focus_map.num_refreshes=int(json_data.get("num_refreshes",0))
+        focus_map.points=[FocusMapPoint.from_json(p) for p in json_data["points"]]
+        if len(focus_map.points)>0:
+            focus_map.fit()
+        return focus_map
+
+    def save(self,path:str):
+        with open(path,"w",encoding="utf-8") as focus_map_file:
+            json.dump(self.as_json(),focus_map_file,indent=2)
+
+    def load(path:str)->"FocusMap":
+        with open(path,"r",encoding="utf-8") as focus_map_file:
+            return FocusMap.from_json(json.load(focus_map_file))
+
+@TypecheckFunction
+def select_prescan_points(positions_mm:List[Tuple[float,float]],num_points:int)->List[int]:
+    """
+    indices of num_points positions that cover the area spanned by all positions (farthest point sampling, starting at the position closest to the center)
+
+    returned in the order of positions_mm, so that a route through the positions also visits the selected ones in a sensible order.
+    """
+
+    if num_points>=len(positions_mm):
+        return list(range(len(positions_mm)))
+    if num_points<=0:
+        return []
+
+    positions=numpy.array(positions_mm,dtype=float)
+    center=positions.mean(axis=0)
+    selected=[int(numpy.argmin(numpy.hypot(*(positions-center).T)))]
+    distance_to_selected=numpy.hypot(*(positions-positions[selected[0]]).T)
+    while len(selected)<num_points:
+        next_index=int(numpy.argmax(distance_to_selected))
+        selected.append(next_index)
+        distance_to_selected=numpy.minimum(distance_to_selected,numpy.hypot(*(positions-positions[next_index]).T))
+
+    return sorted(selected)
+
+@TypecheckFunction
+def well_prescan_points(center_mm:Tuple[float,float],grid_width_mm:float,grid_height_mm:float)->List[Tuple[float,float]]:
+    """ positions to measure in a well for a per-well focus map: the corners of the imaging grid (in a loop) and its center """
+
+    cx,cy=center_mm
+    hw,hh=grid_width_mm/2,grid_height_mm/2
+    if hw<1e-6 and hh<1e-6:
+        return [(cx,cy)]
+    return [(cx-hw,cy-hh),(cx+hw,cy-hh),(cx+hw,cy+hh),(cx-hw,cy+hh),(cx,cy)]
@@ -0,0 +1,92 @@
+from control._def import *
+
+from typing import Optional, Dict, List
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+@TypecheckClass
+class ImageCodec:
+    """
+    lossless compression method for saved images
+
+    tiff_compression is the name of the tifffile.COMPRESSION member used for tiff files (None if the codec cannot be used in tiff files).
+    blosc_cname is the name of the blosc compressor used for zarr arrays (None if the codec cannot be used in zarr arrays).
+
+    the horizontal differencing predictor (tiff) or bit shuffle (zarr) makes the slowly varying high bits of 12/16 bit images much more
+    compressible, at almost no cost.
+
+    tiled codecs split tiff images into tiles (see Acquisition.IMAGE_CODEC_TILE_SIZE), the others always write strips, like before tiling was added.
+    """
+
+    name:str
+    tiff_compression:Optional[str]
+    blosc_cname:Optional[str]
+    level:Optional[int]=None
+    predictor:bool=False
+    tiled:bool=False
+
+    def tiff_kwargs(self,tile_size:int,num_threads:int)->dict:
+        """ keyword arguments for tifffile.imwrite """
+
+        import tifffile
+
+        if self.tiff_compression is None:
+            raise ValueError(f"codec {self.name} cannot be used to save tiff files")
+
+        kwargs:dict={}
+        if self.tiff_compression!="NONE":
+            kwargs["compression"]=tifffile.COMPRESSION[self.tiff_compression]
+            if not self.level is None:
+                kwargs["compressionargs"]={"level":self.level}
+            if self.predictor:
+                kwargs["predictor"]=tifffile.PREDICTOR.HORIZONTAL
+
+            # tiles are compressed independently of each other, so tifffile can compress them in parallel
+            if self.tiled and tile_size>0:
+                kwargs["tile"]=(tile_size,tile_size)
+                kwargs["maxworkers"]=num_threads
+
+        return kwargs
+
+    def blosc_compressor(self):
+        """ compressor for zarr arrays """
+
+        from numcodecs import Blosc
+
+        if self.blosc_cname is None:
+            raise ValueError(f"codec {self.name} cannot be used to save zarr arrays")
+
+        return Blosc(cname=self.blosc_cname,clevel=self.level or 5,shuffle=Blosc.BITSHUFFLE if self.predictor else Blosc.NOSHUFFLE)
+
+_CODEC_REGISTRY:Dict[str,ImageCodec]={}
+
+@TypecheckFunction
+def register_codec(codec:ImageCodec):
+    """ make codec available for selection by name (replaces a codec with the same name) """
+    _CODEC_REGISTRY[codec.name]=codec
+
+@TypecheckFunction
+def get_codec(name:str)->ImageCodec:
+    codec=_CODEC_REGISTRY.get(name)
+    if codec is None:
+        raise ValueError(f"unknown image codec {name}. available codecs are: {', '.join(list_codecs())}")
+    return codec
+
+@TypecheckFunction
+def list_codecs()->List[str]:
+    return list(_CODEC_REGISTRY.keys())
+
+@TypecheckFunction
+def codec_for_channel(channel_name:Optional[str])->ImageCodec:
+    """ codec used to save images of the specified channel, as configured in Acquisition """
+    if not channel_name is None and channel_name in Acquisition.IMAGE_CODEC_PER_CHANNEL:
+        return get_codec(Acquisition.IMAGE_CODEC_PER_CHANNEL[channel_name])
+    return get_codec(Acquisition.IMAGE_CODEC)
+
+register_codec(ImageCodec(name="none",tiff_compression="NONE",blosc_cname=None))
+register_codec(ImageCodec(name="lzw",tiff_compression="LZW",blosc_cname=None))
+for level in (1,6,9):
+    register_codec(ImageCodec(name=f"deflate-{level}",tiff_compression="ADOBE_DEFLATE",blosc_cname="zlib",level=level,predictor=True,tiled=True))
+for level in (1,3,9):
+    register_codec(ImageCodec(name=f"zstd-{level}",tiff_compression="ZSTD",blosc_cname="zstd",level=level,predictor=True,tiled=True))
+# there is no (widely supported) tiff compression scheme for lz4, so it can only be used for zarr arrays
+register_codec(ImageCodec(name="lz4",tiff_compression=None,blosc_cname="lz4",level=5,predictor=True))
@@ -0,0 +1,245 @@
+from qtpy.QtCore import QObject, QThread, Signal, Qt # type: ignore
+
+from control._def import *
+
+import threading
+import time
+import traceback
+import collections
+
+from typing import Optional, Callable, List, Dict, Deque, Tuple
+
+# every image acquired in a multipoint acquisition is passed to a number of consumers, e.g. the display in the gui, or an analysis.
+# a consumer that is called directly on the acquisition path delays the next stage move by however long it takes (the gui redraws two
+# image views per image), and one that is called through a queued qt signal accumulates an unbounded backlog of images when it cannot
+# keep up. instead, each consumer has a bounded queue, and is fed on its own thread (or on a given qt thread, for consumers that
+# touch widgets). when the queue is full, the consumer policy (see ImageConsumerPolicy) decides whether the image is
+# dropped, replaces the pending one, or the acquisition waits.
+# consumers run on threads rather than processes: the callbacks are arbitrary (unpicklable) callables, and numpy/opencv release the gil.
+
+IMAGE_RETURN_CONSUMER_NAME:str="image_return"
+""" name of the consumer that calls the image_return callback of an acquisition (see MultiPointController.run_experiment) """
+
+class ImageConsumerMetrics:
+    """ delivery statistics of a consumer """
+
+    def __init__(self):
+        self.num_submitted:int=0
+        self.num_delivered:int=0
+        self.num_dropped:int=0
+        self.num_failed:int=0
+        """ deliveries where the callback raised an exception """
+        self.total_lag_s:float=0.0
+        """ sum over all delivered images of the time between submission and the start of the callback """
+        self.max_lag_s:float=0.0
+        self.total_blocked_s:float=0.0
+        """ time the acquisition has waited for the consumer (ImageConsumerPolicy.BLOCK only) """
+
+    @property
+    def mean_lag_s(self)->float:
+        return self.total_lag_s/self.num_delivered if self.num_delivered>0 else 0.0
+
+    def as_json(self)->dict:
+        return {
+            "num_submitted":self.num_submitted,
+            "num_delivered":self.num_delivered,
+            "num_dropped":self.num_dropped,
+            "num_failed":self.num_failed,
+            "mean_lag_s":self.mean_lag_s,
+            "max_lag_s":self.max_lag_s,
+            "total_blocked_s":self.total_blocked_s,
+        }
+
+class _QtDelivery(QObject):
+    """ runs deliver on qt_thread """
+
+    wake=Signal()
+
+    def __init__(self,deliver:Callable[[],None],qt_thread:QThread):
+        super().__init__()
+        self.deliver=deliver
+        # the object is created on whichever thread starts the acquisition (e.g. a plain thread of the web service, which has no event
+        # loop), so it is moved to the thread that is supposed to run the callback
+        self.moveToThread(qt_thread)
+        # always queued, so that images submitted on the same thread are delivered once control returns to the event loop
+        self.wake.connect(self.on_wake,Qt.QueuedConnection)
+
+    def on_wake(self):
+        self.deliver()
+
+class ImageConsumer:
+    """ calls callback with the submitted images on a separate thread (or on qt_thread, if given), with a bounded queue """
+
+    def __init__(self,
+        name:str,
+        callback:Callable[[AcquisitionImageData],None],
+        policy:ImageConsumerPolicy=ImageConsumerPolicy.LATEST_ONLY,
+        max_queue_size:int=Acquisition.IMAGE_CONSUMER_QUEUE_SIZE,
+        qt_thread:Optional[QThread]=None,
+    ):
+        self.name=name
+        self.callback=callback
+        self.policy=policy
+        # only the most recent image is kept for latest-only consumers
+        self.max_queue_size=1 if policy==ImageConsumerPolicy.LATEST_ONLY else max(max_queue_size,1)
+
+        self.condition=threading.Condition()
+        self.queue:Deque[Tuple[float,AcquisitionImageData]]=collections.deque()
+        """ submitted images, with the time they were submitted (time.monotonic) """
+        self.metrics=ImageConsumerMetrics()
+        self.closed:bool=False
+
+        self.qt_delivery:Optional[_QtDelivery]=None
+        self.thread:Optional[threading.Thread]=None
+        if not qt_thread is None:
+            self.qt_delivery=_QtDelivery(self._deliver_queued,qt_thread)
+            self.wake_pending:bool=False
+        else:
+            self.thread=threading.Thread(target=self._run,name=f"image_consumer_{name}",daemon=True)
+            self.thread.start()
+
+    def submit(self,image_data:AcquisitionImageData,cancel_event:Optional[threading.Event]=None):
+        """ queue an image for the consumer (may wait for the consumer to catch up, see ImageConsumerPolicy.BLOCK, until cancel_event is set) """
+
+        # a qt consumer cannot be waited for on its own thread (e.g. when the acquisition runs on the gui thread), it is called directly instead
+        if self.policy==ImageConsumerPolicy.BLOCK and not self.qt_delivery is None and QThread.currentThread() is self.qt_delivery.thread():
+            self._deliver_queued()
+            with self.condition:
+                self.metrics.num_submitted+=1
+            self._deliver(time.monotonic(),image_data)
+            return
+
+        with self.condition:
+            self.metrics.num_submitted+=1
+
+            if len(self.queue)>=self.max_queue_size:
+                if self.policy==ImageConsumerPolicy.DROP:
+                    self.metrics.num_dropped+=1
+                    return
+                elif self.policy==ImageConsumerPolicy.LATEST_ONLY:
+                    self.queue.popleft()
+                    self.metrics.num_dropped+=1
+                else:
+                    wait_start_time=time.monotonic()
+                    while len(self.queue)>=self.max_queue_size and not self.closed:
+                        if not cancel_event is None and cancel_event.is_set():
+                            break
+                        self.condition.wait(timeout=0.05)
+                    self.metrics.total_blocked_s+=time.monotonic()-wait_start_time
+
+                    if len(self.queue)>=self.max_queue_size:
+                        self.metrics.num_dropped+=1
+                        return
+
+            self.queue.append((time.monotonic(),image_data))
+
+            if self.qt_delivery is None:
+                self.condition.notify_all()
+                return
+
+            wake=not self.wake_pending
+            self.wake_pending=True
+
+        if wake:
+            self.qt_delivery.wake.emit()
+
+    def _deliver(self,submit_time:float,image_data:AcquisitionImageData):
+        lag_s=time.monotonic()-submit_time
+        try:
+            self.callback(image_data)
+            failed=False
+        except Exception:
+            MAIN_LOG.log(f"error - image consumer {self.name} failed: {traceback.format_exc()}")
+            failed=True
+
+        with self.condition:
+            self.metrics.num_delivered+=1
+            self.metrics.num_failed+=int(failed)
+            self.metrics.total_lag_s+=lag_s
+            self.metrics.max_lag_s=max(self.metrics.max_lag_s,lag_s)
+
+    def _deliver_queued(self):
+        """ deliver all queued images (qt consumers) """
+
+        with self.condition:
+            self.wake_pending=False
+            queued=list(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+
+        for submit_time,image_data in queued:
+            self._deliver(submit_time,image_data)
+
+    def _run(self):
+        """ deliver queued images until the consumer is closed (thread consumers) """
+
+        while True:
+            with self.condition:
+                while len(self.queue)==0 and not self.closed:
+                    self.condition.wait()
+                if len(self.queue)==0:
+                    return
+                submit_time,image_data=self.queue.popleft()
+                self.condition.notify_all()
+
+            self._deliver(submit_time,image_data)
+
+    def close(self,timeout_s:float=5.0):
+        """ stop accepting images. images that are already queued are still delivered (a thread consumer gets up to timeout_s to finish them). """
+
+        with self.condition:
+            self.closed=True
+            self.condition.notify_all()
+
+        if not self.thread is None:
+            self.thread.join(timeout=timeout_s)
+            if self.thread.is_alive():
+                MAIN_LOG.log(f"warning - image consumer {self.name} did not finish within {timeout_s}s")
+
+class ImageDispatcher:
+    """ passes every submitted image to all consumers """
+
+    def __init__(self):
+        self.consumers:Dict[str,ImageConsumer]={}
+        self.lock=threading.Lock()
+
+    def add_consumer(self,consumer:ImageConsumer):
+        """ add (or replace, by name) a consumer """
+
+        with self.lock:
+            previous_consumer=self.consumers.get(consumer.name)
+            self.consumers[consumer.name]=consumer
+
+        if not previous_consumer is None:
+            previous_consumer.close()
+
+    def remove_consumer(self,name:str):
+        with self.lock:
+            consumer=self.consumers.pop(name,None)
+
+        if not consumer is None:
+            consumer.close()
+
+    def submit(self,image_data:AcquisitionImageData,cancel_event:Optional[threading.Event]=None):
+        with self.lock:
+            consumers=list(self.consumers.values())
+
+        for consumer in consumers:
+            consumer.submit(image_data,cancel_event=cancel_event)
+
+    def metrics(self)->Dict[str,ImageConsumerMetrics]:
+        """ delivery statistics by consumer name """
+
+        with self.lock:
+            return {name:consumer.metrics for name,consumer in self.consumers.items()}
+
+    def as_text(self)->str:
+        with self.lock:
+            consumers=list(self.consumers.values())
+
+        consumer_texts=[
+            f"{consumer.name} ({consumer.policy.value}): {consumer.metrics.num_delivered}/{consumer.metrics.num_submitted} images delivered, {consumer.metrics.num_dropped} dropped, "
+            f"lag mean {consumer.metrics.mean_lag_s*1000:.1f}ms max {consumer.metrics.max_lag_s*1000:.1f}ms, acquisition blocked {consumer.metrics.total_blocked_s:.3f}s"
+            for consumer in consumers
+        ]
+        return "image consumers: "+("; ".join(consumer_texts) if len(consumer_texts)>0 else "none")
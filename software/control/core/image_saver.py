@@ -5,110 +5,635 @@ import control.utils as utils
 from control._def import *
 
 from queue import Queue, Empty
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
+from collections import deque
+import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import traceback
 import time
+import zlib
 import numpy as np
 from datetime import datetime
 import os
+import shutil
 import numpy
 
 import imageio as iio
 import tifffile
 
-from typing import Optional, List, Union, Tuple
-from control.typechecker import TypecheckFunction
+from control.core.well_tiff_writer import WellTiffWriter
+from control.core.image_codecs import ImageCodec, get_codec, codec_for_channel
+from control.core.bit_depth import storage_representation
+from control.core.manifest import AcquisitionManifest, ManifestEntry, MANIFEST_FILE_NAME
+from control.core.storage_migrator import StorageMigrator
+
+from typing import Optional, List, Union, Tuple, Dict, Set
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+@TypecheckClass
+class ImageSaverWorkerStats:
+    """ throughput statistics of a single image saver worker """
+
+    worker_index:int
+    num_images:int=0
+    num_bytes:int=0
+    num_raw_bytes:int=0
+    """ size of the images in memory, before compression/encoding """
+    busy_time_s:float=0.0
+
+    def throughput_mb_per_s(self)->float:
+        if self.busy_time_s<=0.0:
+            return 0.0
+        return self.num_bytes/1024**2/self.busy_time_s
+
+    def as_text(self)->str:
+        return f"worker {self.worker_index}: {self.num_images} images, {self.num_bytes/1024**2:.1f}MB in {self.busy_time_s:.3f}s busy ({self.throughput_mb_per_s():.1f}MB/s)"
+
+class RateMeter:
+    """ rate of some quantity (e.g. bytes) over a sliding time window """
+
+    def __init__(self,window_s:float=5.0):
+        self.window_s=window_s
+        self.samples:deque=deque()
+        self.lock=Lock()
+
+    def add(self,amount:float):
+        now=time.monotonic()
+        with self.lock:
+            self.samples.append((now,amount))
+            self._drop_old_samples(now)
+
+    def _drop_old_samples(self,now:float):
+        while len(self.samples)>0 and self.samples[0][0]<now-self.window_s:
+            self.samples.popleft()
+
+    def rate_per_s(self)->float:
+        now=time.monotonic()
+        with self.lock:
+            self._drop_old_samples(now)
+            if len(self.samples)==0:
+                return 0.0
+            # use the whole window length (not just the span of the samples), so that a single sample does not result in an infinite rate
+            return sum(amount for _,amount in self.samples)/self.window_s
+
+@TypecheckClass
+class ImageSaverQueueStats:
+    """ snapshot of the fill state of the image saver queue """
+
+    budget_bytes:int
+    queued_bytes:int
+    queued_images:int
+    enqueue_wait_total_s:float
+    """ total time the acquisition has spent waiting for the queue to have enough free space """
+    enqueue_wait_last_s:float
+    fill_rate_bytes_per_s:float
+    drain_rate_bytes_per_s:float
+    time_to_full_s:float
+    """ time until the queue is full at the current fill and drain rates (inf if the queue is not filling up) """
+
+    def as_dict(self)->dict:
+        return dict(
+            budget_bytes=self.budget_bytes,
+            queued_bytes=self.queued_bytes,
+            queued_images=self.queued_images,
+            enqueue_wait_total_s=self.enqueue_wait_total_s,
+            enqueue_wait_last_s=self.enqueue_wait_last_s,
+            fill_rate_bytes_per_s=self.fill_rate_bytes_per_s,
+            drain_rate_bytes_per_s=self.drain_rate_bytes_per_s,
+            time_to_full_s=self.time_to_full_s,
+        )
+
+    def as_text(self)->str:
+        return f"queue: {self.queued_images} images, {self.queued_bytes/1024**2:.1f}/{self.budget_bytes/1024**2:.1f}MB, filling at {self.fill_rate_bytes_per_s/1024**2:.1f}MB/s, draining at {self.drain_rate_bytes_per_s/1024**2:.1f}MB/s, full in {self.time_to_full_s:.1f}s, waited {self.enqueue_wait_total_s:.3f}s in total"
+
+class ImageSaverBackpressureEventType(str,Enum):
+    Blocked="blocked"
+    """ the acquisition is waiting because the image saver queue is full """
+    Resumed="resumed"
+    """ the acquisition could submit the image it was waiting on """
+
+@TypecheckClass
+class ImageSaverBackpressureEvent:
+    """ emitted when the acquisition is blocked on the image saver (and again once it is not blocked anymore) """
+
+    type:ImageSaverBackpressureEventType
+    path:str
+    image_bytes:int
+    wait_time_s:float
+    """ time spent waiting so far (always 0 for blocked events) """
+    queue:ImageSaverQueueStats
+    target_free_space_bytes:int
+    local_free_space_bytes:int
+
+    def as_dict(self)->dict:
+        return dict(
+            type=self.type.value,
+            path=self.path,
+            image_bytes=self.image_bytes,
+            wait_time_s=self.wait_time_s,
+            queue=self.queue.as_dict(),
+            target_free_space_bytes=self.target_free_space_bytes,
+            local_free_space_bytes=self.local_free_space_bytes,
+        )
+
+@TypecheckFunction
+def save_image_file(path:str,image:numpy.ndarray,file_format:ImageFormat,codec:ImageCodec,bit_depth:int,bit_depth_mode:ImageBitDepthMode,tile_size:int,num_threads:int)->int:
+    """
+    write image to disk, returns number of bytes written (see ImageSaver.save_image)
+
+    this is the function run by the worker processes of the image saver process pool, which import it from this module. the codec and its settings
+    are passed in because worker processes do not see changes made to them in the main process.
+    """
+
+    # need to use tiff when saving 16 bit images
+    if image.dtype == np.uint16 and file_format != ImageFormat.TIFF_COMPRESSED:
+        file_format=ImageFormat.TIFF
+
+    # use tifffile to save tiff images
+    if file_format in (ImageFormat.TIFF_COMPRESSED,ImageFormat.TIFF):
+        image,bit_depth_metadata=storage_representation(image,bit_depth,bit_depth_mode)
+
+        file_path=path + '.tiff'
+        if file_format==ImageFormat.TIFF_COMPRESSED:
+            tifffile.imwrite(file_path,image,metadata=bit_depth_metadata,**codec.tiff_kwargs(tile_size=tile_size,num_threads=num_threads))
+        else:
+            tifffile.imwrite(file_path,image,metadata=bit_depth_metadata) # takes 7ms
+    # use imageio to save other formats
+    else:
+        assert file_format==ImageFormat.BMP
+        file_path=path + '.bmp'
+        iio.imwrite(file_path,image)
+
+    return os.path.getsize(file_path)
 
 class ImageSaver(QObject):
+    """
+    saves images in the background
+
+    images are distributed over num_workers workers, each with its own queue. all images with the same ordering key (the file path by default)
+    are handled by the same worker, so writes to the same file always happen in the order they were enqueued.
+
+    if use_process_pool is True, each worker hands the actual encoding/writing to a process pool, so that compression (e.g. LZW) runs outside of this
+    process and does not serialize on the GIL. the worker threads then only wait for the result.
+
+    images saved as ImageFormat.ZARR are not written to individual files, but streamed into a zarr hierarchy that is opened by begin_acquisition
+    (and closed by end_acquisition). these images are ordered by well and site, and written from the worker threads directly.
+    images saved as ImageFormat.TIFF_PER_WELL are appended to one file per well, which stays open until finish_well is called for that well.
+
+    the memory occupied by images waiting to be saved is bounded by queue_budget_mb. enqueue blocks while the budget is exhausted, and emits
+    a backpressure event when it starts and stops blocking. queue_stats() returns live gauges of the queue state.
+    """
 
     stop_recording = Signal()
+    backpressure = Signal(ImageSaverBackpressureEvent)
 
     @TypecheckFunction
-    def __init__(self,image_format:ImageFormat=Acquisition.IMAGE_FORMAT):
+    def __init__(self,
+        image_format:ImageFormat=Acquisition.IMAGE_FORMAT,
+        num_workers:int=Acquisition.IMAGE_SAVER_NUM_WORKERS,
+        use_process_pool:bool=Acquisition.IMAGE_SAVER_USE_PROCESS_POOL,
+        queue_budget_mb:float=Acquisition.IMAGE_SAVER_QUEUE_BUDGET_MB,
+    ):
         QObject.__init__(self)
         self.base_path:str = './'
         self.experiment_ID:str = ''
         self.image_format:ImageFormat = image_format
         self.max_num_image_per_folder:int = 1000
-        self.queue_size_max=256 # max this many items in the queue
-        self.queue:Queue = Queue(self.queue_size_max)
+        self.directory_sharding:DirectorySharding = DirectorySharding.NONE
+        self.num_workers:int = max(1,num_workers)
+        # the queues themselves are unbounded, the amount of memory occupied by queued images is limited by queue_budget_bytes instead
+        self.queues:List[Queue] = [Queue() for _ in range(self.num_workers)]
+        self.queue_budget_bytes:int = int(queue_budget_mb*1024**2)
+        self.queued_bytes:int = 0
+        self.queue_condition:Condition = Condition()
+        self.enqueue_wait_total_s:float = 0.0
+        self.enqueue_wait_last_s:float = 0.0
+        self.fill_rate:RateMeter = RateMeter()
+        self.drain_rate:RateMeter = RateMeter()
+        # bytes written to storage (i.e. after compression)
+        self.write_rate:RateMeter = RateMeter(window_s=30.0)
+        # statistics of the images saved during the current acquisition (summed over all workers)
+        self.acquisition_stats:ImageSaverWorkerStats = ImageSaverWorkerStats(worker_index=-1)
+        self.worker_stats:List[ImageSaverWorkerStats] = [ImageSaverWorkerStats(worker_index=i) for i in range(self.num_workers)]
         self.image_lock:Lock = Lock()
         self.stop_signal_received:bool = False
-        self.thread = Thread(target=self.process_queue) # type: ignore
-        self.thread.start()
+
+        # the worker processes are spawned (not forked), because forking a process that already runs qt and camera sdk threads can deadlock the
+        # forked workers (e.g. on a lock held by one of those threads at the time of the fork)
+        self.process_pool:Optional[ProcessPoolExecutor]=None
+        if use_process_pool:
+            self.process_pool=ProcessPoolExecutor(max_workers=self.num_workers,mp_context=multiprocessing.get_context("spawn"))
+
+        self.threads:List[Thread] = [Thread(target=self.process_queue,args=(worker_index,)) for worker_index in range(self.num_workers)] # type: ignore
+        for thread in self.threads:
+            thread.start()
+
         self.counter:int = 0
         self.recording_start_time:float = 0.0
         self.recording_time_limit:float = -1.0
 
+        self.zarr_writer:Optional[Any] = None
+        self.well_tiff_writer:WellTiffWriter = WellTiffWriter()
+
+        # bit depth of the images of the current acquisition, and how to store them
+        self.bit_depth:int = 16
+        self.bit_depth_mode:ImageBitDepthMode = ImageBitDepthMode.SHIFTED
+
+        # record of all images written during the current acquisition
+        self.manifest:Optional[AcquisitionManifest] = None
+        # manifest entries of images in per-well files are only committed once the file of the well has been closed
+        self.pending_manifest_entries:Dict[str,List[ManifestEntry]] = {}
+
+        # number of images (and other queue items) per well that have not been handled yet, by well key (see _well_key)
+        self.outstanding_well_items:Dict[str,int] = {}
+        # keys of wells for which finish_well has been called, but that still have outstanding items
+        self.finishing_wells:Set[str] = set()
+        # sites that images have been enqueued for, by well key (used to find the files of a well)
+        self.well_sites:Dict[str,Set[int]] = {}
+        self.well_lock:Lock = Lock()
+
+        # moves completed wells from the staging directory to the output path (only if staging is used)
+        self.migrator:Optional[StorageMigrator] = None
+        self.previous_migrators:List[StorageMigrator] = []
+
     @TypecheckFunction
     def path_from(base_path:str,experiment_ID:str,folder_ID:str,file_ID:str,frame_ID:str)->str:
         p=os.path.join(base_path,experiment_ID,str(folder_ID),str(file_ID) + '_' + str(frame_ID))
         return p
 
     @TypecheckFunction
-    def save_image(path:str,image:numpy.ndarray,file_format:ImageFormat):
-        # need to use tiff when saving 16 bit images
-        if image.dtype == np.uint16 and file_format != ImageFormat.TIFF_COMPRESSED:
-            file_format=ImageFormat.TIFF
-
-        # use tifffile to save tiff images
-        if file_format in (ImageFormat.TIFF_COMPRESSED,ImageFormat.TIFF):
-            if file_format==ImageFormat.TIFF_COMPRESSED:
-                tifffile.imwrite(path + '.tiff',image,compression=tifffile.COMPRESSION.LZW) # lossless and should be widely supported
-            else:
-                tifffile.imwrite(path + '.tiff',image) # takes 7ms
-        # use imageio to save other formats
-        else:
-            assert file_format==ImageFormat.BMP
-            iio.imwrite(path + '.bmp',image)
+    def save_image(path:str,image:numpy.ndarray,file_format:ImageFormat,codec_name:str=Acquisition.IMAGE_CODEC,bit_depth:int=16,bit_depth_mode:ImageBitDepthMode=ImageBitDepthMode.SHIFTED)->int:
+        """
+        write image to disk, returns number of bytes written. codec_name is the name of the codec used for ImageFormat.TIFF_COMPRESSED.
+
+        bit_depth is the number of significant bits per pixel, which is recorded in the tiff metadata, and determines how pixels are stored (see ImageBitDepthMode).
+        """
+        return save_image_file(path,image,file_format,get_codec(codec_name),bit_depth,bit_depth_mode,Acquisition.IMAGE_CODEC_TILE_SIZE,Acquisition.IMAGE_CODEC_NUM_THREADS)
 
     @TypecheckFunction
-    def process_queue(self):
-        while True:
-            # process the queue
+    def worker_index_for(self,ordering_key:str)->int:
+        """ index of the worker responsible for all images with this ordering key """
+        return zlib.crc32(ordering_key.encode("utf-8"))%self.num_workers
+
+    @TypecheckFunction
+    def _save_image_with_backend(self,path:str,image:numpy.ndarray,file_format:ImageFormat,location:Optional[ImageLocation],codec_name:str)->int:
+        if file_format==ImageFormat.ZARR:
+            if self.zarr_writer is None or location is None:
+                raise RuntimeError(f"cannot save {path} in zarr format outside of an acquisition (image location is unknown)")
+            image,bit_depth_metadata=storage_representation(image,self.bit_depth,self.bit_depth_mode,allow_packing=False)
+            return self.zarr_writer.write(location,image,bit_depth_metadata)
+
+        if file_format==ImageFormat.TIFF_PER_WELL:
+            if location is None:
+                raise RuntimeError(f"cannot save {path} in per-well tiff format without knowing the well it belongs to")
+            # (packing would prevent readers from memory mapping the images)
+            image,bit_depth_metadata=storage_representation(image,self.bit_depth,self.bit_depth_mode,allow_packing=False)
+            return self.well_tiff_writer.write(path,location,image,bit_depth_metadata)
+
+        if not self.process_pool is None:
             try:
-                [path,image,file_format] = self.queue.get(timeout=0.1)
-                self.image_lock.acquire(True)
+                return self.process_pool.submit(save_image_file,path,image,file_format,get_codec(codec_name),self.bit_depth,self.bit_depth_mode,Acquisition.IMAGE_CODEC_TILE_SIZE,Acquisition.IMAGE_CODEC_NUM_THREADS).result()
+            except BrokenProcessPool:
+                MAIN_LOG.log("warning - image saver process pool is broken. falling back to saving images in threads.")
+                self.process_pool=None
 
-                # this can throw if the package that is required for the compression method is not installed, in which case this queue deadlocks because self.image_lock has been acquired, but not released
-                ImageSaver.save_image(path,image,file_format)
+        return ImageSaver.save_image(path,image,file_format,codec_name,self.bit_depth,self.bit_depth_mode)
 
-                self.counter = self.counter + 1
-                self.queue.task_done()
+    @TypecheckFunction
+    def process_queue(self,worker_index:int):
+        queue=self.queues[worker_index]
+        stats=self.worker_stats[worker_index]
 
-                self.image_lock.release()
+        while True:
+            # process the queue
+            try:
+                [path,image,file_format,location,codec_name] = queue.get(timeout=0.1)
             except Empty:
                 # if queue is empty, and signal was received, terminate the thread
                 if self.stop_signal_received:
                     return
-        
+                continue
+
+            # an item without image marks the end of a well, i.e. the file containing the images of the well can be closed
+            if image is None:
+                try:
+                    self.well_tiff_writer.finish_well(os.path.dirname(path),location.well_name)
+
+                    pending_entries=self.pending_manifest_entries.pop(path,[])
+                    if not self.manifest is None and len(pending_entries)>0:
+                        self.manifest.add(pending_entries)
+                except Exception:
+                    MAIN_LOG.log(f"error - image saver worker {worker_index} failed to close file of well {location.well_name}: {traceback.format_exc()}")
+                finally:
+                    self._well_item_done(path)
+                    queue.task_done()
+                continue
+
+            try:
+                save_start_time=time.monotonic()
+                num_bytes_written=self._save_image_with_backend(path,image,file_format,location,codec_name)
+
+                stats.num_images+=1
+                stats.num_bytes+=num_bytes_written
+                stats.num_raw_bytes+=image.nbytes
+                stats.busy_time_s+=time.monotonic()-save_start_time
+                self.write_rate.add(num_bytes_written)
+
+                with self.image_lock:
+                    self.counter = self.counter + 1
+                    self.acquisition_stats.num_images+=1
+                    self.acquisition_stats.num_bytes+=num_bytes_written
+                    self.acquisition_stats.num_raw_bytes+=image.nbytes
+
+                if not self.manifest is None and not location is None:
+                    self._record_in_manifest(path,image,file_format,location,num_bytes_written)
+            except Exception:
+                # this can throw e.g. if the package that is required for the compression method is not installed
+                MAIN_LOG.log(f"error - image saver worker {worker_index} failed to save {path}: {traceback.format_exc()}")
+            finally:
+                self._release_queue_budget(image.nbytes)
+                if not location is None:
+                    self._well_item_done(ImageSaver._well_key(self._image_base_directory(path),location.well_name))
+                queue.task_done()
+
+    def _well_key(directory:str,well_name:str)->str:
+        return os.path.join(directory,well_name)
+
+    def _image_base_directory(self,path:str)->str:
+        """ directory of the time point an image belongs to, i.e. without the shard subdirectory (see directory_sharding) """
+        directory=os.path.dirname(path)
+        if self.directory_sharding!=DirectorySharding.NONE:
+            directory=os.path.dirname(directory)
+        return directory
+
+    def _well_item_added(self,well_key:str,site:Optional[int]=None):
+        with self.well_lock:
+            self.outstanding_well_items[well_key]=self.outstanding_well_items.get(well_key,0)+1
+            if not site is None:
+                self.well_sites.setdefault(well_key,set()).add(site)
+
+    def _well_item_done(self,well_key:str):
+        with self.well_lock:
+            self.outstanding_well_items[well_key]-=1
+            well_complete=self.outstanding_well_items[well_key]==0 and well_key in self.finishing_wells
+            if well_complete:
+                del self.outstanding_well_items[well_key]
+                self.finishing_wells.remove(well_key)
+                sites=self.well_sites.pop(well_key,set())
+
+        if well_complete:
+            self._on_well_saved(well_key,sites)
+
+    def _on_well_saved(self,well_key:str,sites:Set[int]):
+        """ called once all images of a well have been saved (after finish_well has been called for the well) """
+        directory,well_name=os.path.split(well_key)
+
+        zarr_writer=self.zarr_writer
+        if not zarr_writer is None:
+            zarr_writer.finish_well(well_name)
+
+        if not self.migrator is None:
+            self.migrator.migrate_well(os.path.relpath(directory,self.migrator.staging_path),well_name,sorted(sites))
+
+    def _record_in_manifest(self,path:str,image:numpy.ndarray,file_format:ImageFormat,location:ImageLocation,num_bytes:int):
+        entry=ManifestEntry(
+            path=self.manifest.relative_path(path),
+            well_name=location.well_name,
+            site=location.site,
+            x=location.x,
+            y=location.y,
+            z=location.z,
+            time_point=location.time_point,
+            channel_name=location.channel_name,
+            timestamp=datetime.now().isoformat(),
+            num_bytes=num_bytes,
+            checksum=f"crc32:{zlib.crc32(numpy.ascontiguousarray(image)):08x}",
+            z_mm=location.z_mm,
+        )
+
+        if file_format==ImageFormat.TIFF_PER_WELL:
+            # (same key as the item that closes the file of the well, see finish_well)
+            self.pending_manifest_entries.setdefault(os.path.join(os.path.dirname(path),location.well_name),[]).append(entry)
+        else:
+            self.manifest.add([entry])
+
+    def _release_queue_budget(self,num_bytes:int):
+        with self.queue_condition:
+            self.queued_bytes-=num_bytes
+            self.queue_condition.notify_all()
+        self.drain_rate.add(num_bytes)
+
+    @property
+    def num_queued_images(self)->int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def queue_stats(self)->ImageSaverQueueStats:
+        """ live gauges of the queue fill state """
+
+        fill_rate=self.fill_rate.rate_per_s()
+        drain_rate=self.drain_rate.rate_per_s()
+        queued_bytes=self.queued_bytes
+
+        time_to_full_s=float("inf")
+        if fill_rate>drain_rate:
+            time_to_full_s=max(0.0,(self.queue_budget_bytes-queued_bytes)/(fill_rate-drain_rate))
+
+        return ImageSaverQueueStats(
+            budget_bytes=self.queue_budget_bytes,
+            queued_bytes=queued_bytes,
+            queued_images=self.num_queued_images,
+            enqueue_wait_total_s=self.enqueue_wait_total_s,
+            enqueue_wait_last_s=self.enqueue_wait_last_s,
+            fill_rate_bytes_per_s=fill_rate,
+            drain_rate_bytes_per_s=drain_rate,
+            time_to_full_s=time_to_full_s,
+        )
+
+    def _emit_backpressure_event(self,event_type:ImageSaverBackpressureEventType,path:str,image_bytes:int,wait_time_s:float):
+        event=ImageSaverBackpressureEvent(
+            type=event_type,
+            path=path,
+            image_bytes=image_bytes,
+            wait_time_s=wait_time_s,
+            queue=self.queue_stats(),
+            target_free_space_bytes=get_storage_size_in_directory(os.path.dirname(path) or ".").free_space_bytes,
+            local_free_space_bytes=get_storage_size_in_directory(".").free_space_bytes,
+        )
+        MAIN_LOG.log(f"image saver backpressure {json.dumps(event.as_dict())}")
+        self.backpressure.emit(event)
+
     @TypecheckFunction
-    def enqueue(self,path:str,image:numpy.ndarray,file_format:ImageFormat):
-        log_msg=f"submitting image {path} to storage queue ({self.queue.qsize()}/{self.queue_size_max} slots in queue occupied)"
-        MAIN_LOG.log(log_msg)
+    def begin_acquisition(self,output_path:str,layout:AcquisitionLayout,file_format:ImageFormat,staging_path:Optional[str]=None,directory_sharding:DirectorySharding=DirectorySharding.NONE,num_shard_buckets:int=1):
+        """
+        prepare saving images of a new acquisition into output_path
+
+        opens the manifest of the acquisition (or re-opens it, if the acquisition is resumed), and the containers of image formats that store more than one image per file.
+
+        if staging_path is set, images are enqueued with paths in staging_path (instead of output_path). the manifest and containers are also placed there.
+        all files of a well are moved to output_path in the background once the well has been completely saved, and all remaining files once the acquisition has ended.
+
+        directory_sharding is the policy the paths of enqueued images follow (images are placed in a subdirectory of the time point directory, unless it is NONE),
+        with num_shard_buckets buckets for DirectorySharding.HASHED.
+        """
+        self.directory_sharding=directory_sharding
+        with self.image_lock:
+            self.acquisition_stats=ImageSaverWorkerStats(worker_index=-1)
+
+        if not staging_path is None:
+            # files of a previous acquisition into the same folder (e.g. one that was aborted and is now resumed) may still be on their way
+            # from staging to output_path, and must have arrived before they are looked up
+            for migrator in [migrator for migrator in self.previous_migrators if migrator.output_path==output_path]:
+                migrator.close()
+                self.previous_migrators.remove(migrator)
+
+            # the manifest of a previous acquisition has been migrated to output_path together with its images. it is copied back into staging
+            # so that a resumed acquisition knows which sites are complete (the copy replaces the original once this acquisition has ended)
+            staged_manifest_path=os.path.join(staging_path,MANIFEST_FILE_NAME)
+            migrated_manifest_path=os.path.join(output_path,MANIFEST_FILE_NAME)
+            os.makedirs(staging_path,exist_ok=True)
+            if (not os.path.exists(staged_manifest_path)) and os.path.exists(migrated_manifest_path):
+                shutil.copyfile(migrated_manifest_path,staged_manifest_path)
+
+            self.migrator=StorageMigrator(staging_path=staging_path,output_path=output_path,directory_sharding=directory_sharding,num_shard_buckets=num_shard_buckets)
+            output_path=staging_path
+
+        self.image_format=file_format
+        self.manifest=AcquisitionManifest(output_path)
+        self.pending_manifest_entries.clear()
+        self.bit_depth=layout.bit_depth
+        self.bit_depth_mode=layout.bit_depth_mode
+
+        if file_format==ImageFormat.ZARR:
+            # imported here so that zarr is only required when it is actually used
+            from control.core.zarr_writer import ZarrImageWriter
+
+            # one array holds all channels of a site, so per-channel codecs cannot be used here
+            codec=codec_for_channel(None)
+            if codec.blosc_cname is None:
+                MAIN_LOG.log(f"warning - codec {codec.name} cannot be used for zarr arrays. using zstd-3 instead.")
+                codec=get_codec("zstd-3")
+
+            self.zarr_writer=ZarrImageWriter(output_path,layout,compressor=codec.blosc_compressor())
+        elif file_format==ImageFormat.TIFF_COMPRESSED:
+            # make sure the configured codecs exist and can be used for tiff files before any image is acquired
+            for channel_name in [None,*layout.channel_names]:
+                codec=codec_for_channel(channel_name)
+                if codec.tiff_compression is None:
+                    raise ValueError(f"codec {codec.name} (used for channel {channel_name or 'default'}) cannot be used to save tiff files")
+
+    @TypecheckFunction
+    def end_acquisition(self):
+        """ wait for all images of the current acquisition to be saved, then close open containers """
+        for queue in self.queues:
+            queue.join()
+
+        if not self.zarr_writer is None:
+            self.zarr_writer.close()
+            self.zarr_writer=None
+
+        self.well_tiff_writer.close()
+        # images of wells that were not finished are not recorded, because their files may be incomplete
+        self.pending_manifest_entries.clear()
+
+        if not self.manifest is None:
+            self.manifest.close()
+            self.manifest=None
+
+        with self.well_lock:
+            self.outstanding_well_items.clear()
+            self.finishing_wells.clear()
+            self.well_sites.clear()
+
+        if not self.migrator is None:
+            # the migration of the remaining files continues in the background, while the next acquisition can already start
+            self.migrator.migrate_remaining()
+            self.previous_migrators.append(self.migrator)
+            self.migrator=None
+
+    @TypecheckFunction
+    def finish_well(self,directory:str,well_name:str):
+        """
+        signal that no more images of this well (in this directory) will be enqueued, so that files spanning the whole well can be closed,
+        and the well can be moved out of the staging directory once all of its images have been saved
+        """
+        well_key=ImageSaver._well_key(directory,well_name)
+
+        if self.image_format==ImageFormat.TIFF_PER_WELL:
+            self._well_item_added(well_key)
+
+            # the item is handled by the same worker that writes the images of the well, after all of them have been written
+            location=ImageLocation(well_name=well_name,site=0,x=0,y=0,z=0,time_point=0,channel_name="",channel_index=0)
+            self.queues[self.worker_index_for(well_key)].put([well_key,None,self.image_format,location,""])
+
+        with self.well_lock:
+            well_complete=self.outstanding_well_items.get(well_key,0)==0
+            if well_complete:
+                self.outstanding_well_items.pop(well_key,None)
+                sites=self.well_sites.pop(well_key,set())
+            else:
+                self.finishing_wells.add(well_key)
+
+        if well_complete:
+            self._on_well_saved(well_key,sites)
+
+    @TypecheckFunction
+    def enqueue(self,path:str,image:numpy.ndarray,file_format:ImageFormat,ordering_key:Optional[str]=None,location:Optional[ImageLocation]=None,codec_name:Optional[str]=None):
+        """
+        submit image for saving. images with the same ordering_key (defaults to path) are written in the order they are enqueued.
+
+        location is required for image formats that store more than one image per file. for these, all images of a site are ordered together.
+
+        codec_name defaults to the codec configured for the channel of the image (see Acquisition.IMAGE_CODEC_PER_CHANNEL).
+        """
+        if codec_name is None:
+            codec_name=codec_for_channel(location.channel_name if not location is None else None).name
+
+        if ordering_key is None and not location is None:
+            if file_format==ImageFormat.ZARR:
+                ordering_key=f"{location.well_name}_s{location.site}"
+            elif file_format==ImageFormat.TIFF_PER_WELL:
+                ordering_key=os.path.join(os.path.dirname(path),location.well_name)
+        queue=self.queues[self.worker_index_for(ordering_key or path)]
 
         if self.stop_signal_received:
             MAIN_LOG.log('! critical - attempted to save image even though stop signal was received!')
-        
-        try:
-            self.queue.put_nowait([path,image,file_format])
-        except:
-            storage_on_device=get_storage_size_in_directory("/".join(path.split("/")[:-1]))
-            free_space_gb=storage_on_device.free_space_bytes/1024**3
-            total_space_gb=storage_on_device.total_space_bytes/1024**3
-
-            storage_on_self=get_storage_size_in_directory(".")
-            self_free_space_gb=storage_on_self.free_space_bytes/1024**3
-            self_total_space_gb=storage_on_self.total_space_bytes/1024**3
-
-            log_msg=f"warning - image saver queue is full, waiting for free slot to submit {path}. (on target storage {free_space_gb:.3f}/{total_space_gb:.3f}GB are currently available. on this computer {self_free_space_gb:.3f}/{self_total_space_gb:.3f}GB are available.)"
-            MAIN_LOG.log(log_msg)
-
-            # if putting in image in there fails initially, try again but wait for a free slot this time
-            self.queue.put([path,image,file_format])
-            
-            # log this incident properly, to be able to trace if submitting has worked again later, and when
-            log_msg=f"warning - submitted {path} to previously full storage queue"
-            MAIN_LOG.log(log_msg)
+
+        image_bytes=image.nbytes
+        wait_start_time=time.monotonic()
+
+        def exceeds_budget()->bool:
+            # an image that is larger than the whole budget is still accepted once the queue is empty
+            return self.queued_bytes>0 and self.queued_bytes+image_bytes>self.queue_budget_bytes
+
+        with self.queue_condition:
+            was_blocked=exceeds_budget()
+        # (emitted without holding the lock, so that slow receivers do not stall the workers)
+        if was_blocked:
+            self._emit_backpressure_event(ImageSaverBackpressureEventType.Blocked,path,image_bytes,0.0)
+
+        with self.queue_condition:
+            while exceeds_budget():
+                self.queue_condition.wait()
+
+            self.queued_bytes+=image_bytes
+
+        self.enqueue_wait_last_s=time.monotonic()-wait_start_time
+        self.enqueue_wait_total_s+=self.enqueue_wait_last_s
+        self.fill_rate.add(image_bytes)
+
+        if not location is None:
+            self._well_item_added(ImageSaver._well_key(self._image_base_directory(path),location.well_name),site=location.site)
+
+        queue.put([path,image,file_format,location,codec_name])
+
+        if was_blocked:
+            self._emit_backpressure_event(ImageSaverBackpressureEventType.Resumed,path,image_bytes,self.enqueue_wait_last_s)
+
+    @TypecheckFunction
+    def throughput_report(self)->str:
+        return "\n".join([stats.as_text() for stats in self.worker_stats]+[self.queue_stats().as_text()])
 
     @TypecheckFunction
     def set_base_path(self,path:str):
@@ -120,6 +645,15 @@ class ImageSaver(QObject):
 
     @TypecheckFunction
     def close(self):
-        self.queue.join()
+        self.end_acquisition()
         self.stop_signal_received = True
-        self.thread.join()
+        for thread in self.threads:
+            thread.join()
+
+        for migrator in self.previous_migrators:
+            migrator.close()
+
+        if not self.process_pool is None:
+            self.process_pool.shutdown()
+
+        MAIN_LOG.log(f"image saver throughput:\n{self.throughput_report()}")
@@ -0,0 +1,137 @@
+from control._def import *
+
+import collections
+import math
+import numpy
+
+from typing import Optional, List, Tuple
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# the laser autofocus measures the focus offset at every position, which costs a few hundred ms (several images of the laser spot, plus
+# one or more z moves). within a well, the focus position usually changes smoothly (tilt and curvature of the plate bottom), so it can be
+# predicted from the positions that have already been measured nearby.
+#
+# the policy below predicts z at a new position from a plane through the nearest measured positions in the same well, and estimates the
+# uncertainty of that prediction from how far off previous predictions were (when they were checked by a measurement), plus a term that
+# grows with the distance to the nearest measured position. depending on the uncertainty, the measurement is
+#   - skipped (move straight to the predicted z),
+#   - cheapened (move to the predicted z, then run the laser autofocus with a single image instead of averaging several), or
+#   - run as usual.
+# a full measurement is forced at the first position of each well, and after a number of consecutive skips.
+
+class LaserAFDecision(str,Enum):
+    SKIP="skip"
+    SINGLE_IMAGE="single_image"
+    FULL="full"
+
+@TypecheckClass
+class LaserAFMeasurement:
+    x_mm:float
+    y_mm:float
+    z_mm:float
+    """ z after focusing with the laser autofocus """
+
+class AdaptiveLaserAFPolicy:
+    """ decides whether the laser autofocus has to measure at a position, see Acquisition.LASER_AF_ADAPTIVE """
+
+    def __init__(self,
+        skip_uncertainty_um:float,
+        single_image_uncertainty_um:float,
+        max_consecutive_skips:int,
+        uncertainty_um_per_mm:float,
+        num_neighbours:int=6,
+        num_prediction_errors:int=16,
+    ):
+        self.skip_uncertainty_um=skip_uncertainty_um
+        self.single_image_uncertainty_um=single_image_uncertainty_um
+        self.max_consecutive_skips=max_consecutive_skips
+        self.uncertainty_um_per_mm=uncertainty_um_per_mm
+        self.num_neighbours=num_neighbours
+
+        self.current_well_name:Optional[str]=None
+        self.measurements:List[LaserAFMeasurement]=[]
+        """ measurements in the current well """
+        self.prediction_errors_um:collections.deque=collections.deque(maxlen=num_prediction_errors)
+        """ recent differences between measured and predicted z (across wells) """
+        self.num_consecutive_skips:int=0
+
+        self.num_decisions={decision:0 for decision in LaserAFDecision}
+
+    def from_machine_config()->"AdaptiveLaserAFPolicy":
+        return AdaptiveLaserAFPolicy(
+            skip_uncertainty_um=Acquisition.LASER_AF_SKIP_UNCERTAINTY_UM,
+            single_image_uncertainty_um=Acquisition.LASER_AF_SINGLE_IMAGE_UNCERTAINTY_UM,
+            max_consecutive_skips=Acquisition.LASER_AF_MAX_CONSECUTIVE_SKIPS,
+            uncertainty_um_per_mm=Acquisition.LASER_AF_UNCERTAINTY_UM_PER_MM,
+        )
+
+    def predict(self,x_mm:float,y_mm:float)->Optional[Tuple[float,float]]:
+        """ predicted z (mm) and its uncertainty (um) at a position in the current well, or None if nothing has been measured in the well yet """
+
+        if len(self.measurements)==0:
+            return None
+
+        positions=numpy.array([(m.x_mm,m.y_mm) for m in self.measurements])
+        z=numpy.array([m.z_mm for m in self.measurements])
+        distances=numpy.hypot(positions[:,0]-x_mm,positions[:,1]-y_mm)
+        nearest=numpy.argsort(distances)[:self.num_neighbours]
+
+        predicted_z_mm=float(z[nearest[0]])
+        if len(nearest)>=3:
+            # local plane through the nearest positions (relative to the position to predict, so that the offset is the prediction)
+            P=numpy.column_stack([numpy.ones(len(nearest)),positions[nearest]-(x_mm,y_mm)])
+            plane,_residuals,rank,_singular_values=numpy.linalg.lstsq(P,z[nearest],rcond=None)
+            if rank==3:
+                predicted_z_mm=float(plane[0])
+        elif len(nearest)==2:
+            predicted_z_mm=float(z[nearest].mean())
+
+        # the model is not trusted until it has been checked against measurements
+        if len(self.prediction_errors_um)<2:
+            return predicted_z_mm,float("inf")
+
+        rms_error_um=math.sqrt(sum(e**2 for e in self.prediction_errors_um)/len(self.prediction_errors_um))
+        uncertainty_um=math.hypot(rms_error_um,float(distances[nearest[0]])*self.uncertainty_um_per_mm)
+        return predicted_z_mm,uncertainty_um
+
+    def start_well(self,well_name:str):
+        """ forget the measurements of the previous well, so that the first position of the well is measured """
+        self.current_well_name=well_name
+        self.measurements=[]
+        self.num_consecutive_skips=0
+
+    def decide(self,x_mm:float,y_mm:float)->Tuple[LaserAFDecision,Optional[float]]:
+        """ decision for the position, and the predicted z (mm) if there is one """
+
+        prediction=self.predict(x_mm,y_mm)
+        predicted_z_mm=None if prediction is None else prediction[0]
+
+        if prediction is None or self.num_consecutive_skips>=self.max_consecutive_skips:
+            decision=LaserAFDecision.FULL
+        elif prediction[1]<=self.skip_uncertainty_um:
+            decision=LaserAFDecision.SKIP
+        elif prediction[1]<=self.single_image_uncertainty_um:
+            decision=LaserAFDecision.SINGLE_IMAGE
+        else:
+            decision=LaserAFDecision.FULL
+
+        self.num_decisions[decision]+=1
+        return decision,predicted_z_mm
+
+    def record_skip(self):
+        self.num_consecutive_skips+=1
+
+    def record_measurement(self,x_mm:float,y_mm:float,z_mm:float,predicted_z_mm:Optional[float]):
+        self.measurements.append(LaserAFMeasurement(x_mm=x_mm,y_mm=y_mm,z_mm=z_mm))
+        if not predicted_z_mm is None:
+            self.prediction_errors_um.append((z_mm-predicted_z_mm)*1000)
+        self.num_consecutive_skips=0
+
+    def as_text(self)->str:
+        num_total=max(sum(self.num_decisions.values()),1)
+        rms_error_um=math.sqrt(sum(e**2 for e in self.prediction_errors_um)/len(self.prediction_errors_um)) if len(self.prediction_errors_um)>0 else float("nan")
+        return (
+            f"adaptive laser autofocus: {self.num_decisions[LaserAFDecision.SKIP]} skipped ({self.num_decisions[LaserAFDecision.SKIP]/num_total*100:.1f}%), "
+            f"{self.num_decisions[LaserAFDecision.SINGLE_IMAGE]} measured with a single image, {self.num_decisions[LaserAFDecision.FULL]} measured in full, "
+            f"recent rms prediction error {rms_error_um:.2f}um"
+        )
@@ -137,12 +137,18 @@ class LaserAutofocusController(QObject):
 
         return displacement_um
 
-    def move_to_target(self,target_um:float,max_repeats:int=MACHINE_CONFIG.LASER_AUTOFOCUS_MOVEMENT_MAX_REPEATS,counter_backlash:bool=True):
+    def move_to_target(self,target_um:float,max_repeats:int=MACHINE_CONFIG.LASER_AUTOFOCUS_MOVEMENT_MAX_REPEATS,counter_backlash:bool=True,num_images:Optional[int]=None)->bool:
+        """
+        move z until the measured displacement is within LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM of target_um. returns False if the target was not reached.
+
+        num_images overrides the number of laser spot images averaged per measurement (LASER_AF_AVERAGING_N_FAST)
+        """
+        reached_target=True
         with self.camera.wrapper.ensure_streaming():
-            current_displacement_um = self.measure_displacement()
+            current_displacement_um = self.measure_displacement(override_num_images=num_images)
             if math.isnan(current_displacement_um):
                 MAIN_LOG.log("Laser Reflection Autofocus: failed with NaN")
-                return
+                return False
             
             total_movement_um=0.0
 
@@ -150,6 +156,7 @@ class LaserAutofocusController(QObject):
             while np.abs(um_to_move := target_um - current_displacement_um) >= MACHINE_CONFIG.LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM:
                 if math.isnan(current_displacement_um):
                     MAIN_LOG.log("Laser Reflection Autofocus: failed with NaN after {num_repeat} iterations moving {total_movement_um:.3f}um")
+                    reached_target=False
                     break
 
                 # limit the range of movement
@@ -163,16 +170,19 @@ class LaserAutofocusController(QObject):
                 else:
                     self.navigation.move_z(um_to_move/1000,wait_for_completion={})
 
-                current_displacement_um = self.measure_displacement()
+                current_displacement_um = self.measure_displacement(override_num_images=num_images)
                 num_repeat+=1
                 total_movement_um+=um_to_move
 
                 if num_repeat==max_repeats:
                     MAIN_LOG.log(f"Laser Reflection Autofocus: failed with measured offset {current_displacement_um:.3f}um and target {target_um}um")
+                    reached_target=False
                     break
 
             MAIN_LOG.log(f"Laser Reflection Autofocus: done after {num_repeat} iterations and moving {total_movement_um:.3f}um")
 
+        return reached_target
+
     @TypecheckFunction()
     def set_reference(self,z_pos_mm:float):
         assert self.is_initialized
@@ -4,6 +4,7 @@ from qtpy.QtWidgets import QApplication
 
 from control._def import *
 import time
+import threading
 import numpy
 
 from typing import Optional, List, Union, Tuple
@@ -80,9 +81,15 @@ class LiveController(QObject):
         override_crop_height:Optional[int]=None,
         move_to_target:bool=False,
         profiler:Optional[Profiler]=None,
+        postprocess:bool=True,
+        cancel_event:Optional[threading.Event]=None,
     )->numpy.ndarray:
         """
         if 'crop' is True, the image will be cropped to the streamhandlers requested height and width. 'override_crop_[height,width]' override the respective value
+
+        if 'postprocess' is False, the raw camera image is returned, and postprocess_snap must be called on it (e.g. on another thread, while the stage moves to the next position)
+
+        if 'cancel_event' is set while waiting for the image, the illumination is turned off and AbortAcquisitionException is raised
         """
 
         if move_to_target and not config.channel_z_offset is None:
@@ -111,8 +118,11 @@ class LiveController(QObject):
                     num_imaging_attempts+=1
 
                     try:
-                        image = self.camera.read_frame()
+                        image = self.camera.read_frame(cancel_event=cancel_event)
                         break
+                    except AbortAcquisitionException:
+                        self.end_acquisition()
+                        raise
                     except RuntimeError as e:
                         MAIN_LOG.log("camera image read timeout. triggering another acquisition.")
                         self.image_acquisition_in_progress=False
@@ -149,6 +159,20 @@ class LiveController(QObject):
             }[image.dtype]
             print(f"recorded image in channel {config.name} with {config.exposure_time_ms:.2f}ms exposure time, {config.analog_gain:.2f} analog gain and got image with mean brightness {(image.mean()/max_value*100):.2f}%")
 
+        if not postprocess:
+            return image
+
+        return self.postprocess_snap(image,crop=crop,override_crop_width=override_crop_width,override_crop_height=override_crop_height,profiler=profiler)
+
+    def postprocess_snap(self,
+        image:numpy.ndarray,
+        crop:bool=True,
+        override_crop_width:Optional[int]=None,
+        override_crop_height:Optional[int]=None,
+        profiler:Optional[Profiler]=None,
+    )->numpy.ndarray:
+        """ crop, rotate and flip an image returned by the camera (see snap). does not access any hardware, so it may be called from any thread. """
+
         with Profiler("postprocess snap",parent=profiler) as postprocesssnap:
             # cropping etc. takes about 3.5ms
             crop_height=override_crop_height or self.stream_handler.crop_height
@@ -292,10 +316,14 @@ class LiveController(QObject):
             illumination_source=configuration.illumination_source
             intensity=configuration.illumination_intensity
 
+            # skip the command if the illumination is already set up this way (e.g. consecutive channels with the same light source)
             if illumination_source < 10: # LED matrix
-                self.microcontroller.set_illumination_led_matrix(illumination_source,r=(intensity/100)*MACHINE_CONFIG.LED_MATRIX_R_FACTOR,g=(intensity/100)*MACHINE_CONFIG.LED_MATRIX_G_FACTOR,b=(intensity/100)*MACHINE_CONFIG.LED_MATRIX_B_FACTOR)
+                r,g,b=(intensity/100)*MACHINE_CONFIG.LED_MATRIX_R_FACTOR,(intensity/100)*MACHINE_CONFIG.LED_MATRIX_G_FACTOR,(intensity/100)*MACHINE_CONFIG.LED_MATRIX_B_FACTOR
+                if self.microcontroller.illumination_setting!=(illumination_source,r,g,b):
+                    self.microcontroller.set_illumination_led_matrix(illumination_source,r=r,g=g,b=b)
             else:
-                self.microcontroller.set_illumination(illumination_source,intensity) # this takes 15 ms ?!
+                if self.microcontroller.illumination_setting!=(illumination_source,intensity):
+                    self.microcontroller.set_illumination(illumination_source,intensity) # this takes 15 ms ?!
 
         # restart live 
         if self.is_live is True:
@@ -0,0 +1,158 @@
+from control._def import *
+
+import os
+import sqlite3
+from threading import Lock
+
+from typing import Optional, List, Set, Tuple, Dict
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+MANIFEST_FILE_NAME:str="manifest.sqlite"
+""" name of the manifest file inside the experiment folder """
+
+@TypecheckClass
+class ManifestEntry:
+    """ record of an image that has been written to disk """
+
+    path:str
+    """ path of the image, relative to the experiment folder (without file extension) """
+    well_name:str
+    site:int
+    x:int
+    y:int
+    z:int
+    time_point:int
+    channel_name:str
+    timestamp:str
+    num_bytes:int
+    checksum:str
+    """ checksum of the pixel data (not of the file, which depends on the file format) """
+    z_mm:Optional[float]=None
+    """ measured z position during the exposure, if known (see ImageLocation.z_mm) """
+
+class AcquisitionManifest:
+    """
+    sqlite database in the experiment folder, with one row per image that has been written successfully
+
+    this is the authoritative record of what has been acquired, and is used to resume an interrupted acquisition.
+    entries can be added from any thread.
+    """
+
+    @TypecheckFunction
+    def __init__(self,output_path:str):
+        self.output_path:str=output_path
+        self.file_path:str=os.path.join(output_path,MANIFEST_FILE_NAME)
+
+        self.lock:Lock=Lock()
+        self.connection=sqlite3.connect(self.file_path,check_same_thread=False)
+        # write ahead log: commits do not rewrite the database file, and readers (e.g. for analysis during the acquisition) do not block the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                well_name TEXT NOT NULL,
+                site INTEGER NOT NULL,
+                x INTEGER NOT NULL,
+                y INTEGER NOT NULL,
+                z INTEGER NOT NULL,
+                time_point INTEGER NOT NULL,
+                channel_name TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                num_bytes INTEGER NOT NULL,
+                checksum TEXT NOT NULL,
+                z_mm REAL
+            )
+        """)
+        # manifests written before z_mm was recorded
+        if not "z_mm" in [row[1] for row in self.connection.execute("PRAGMA table_info(images)")]:
+            self.connection.execute("ALTER TABLE images ADD COLUMN z_mm REAL")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS images_by_site ON images (time_point,well_name,site)")
+        # acquisition-wide information that is required to interpret the image paths (e.g. directory sharding)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # number of z planes acquired at sites where it differs from the configured stack (adaptive z stacks)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS z_planes (
+                time_point INTEGER NOT NULL,
+                well_name TEXT NOT NULL,
+                site INTEGER NOT NULL,
+                num_z_planes INTEGER NOT NULL,
+                PRIMARY KEY (time_point,well_name,site)
+            )
+        """)
+        self.connection.commit()
+
+    @TypecheckFunction
+    def relative_path(self,path:str)->str:
+        return os.path.relpath(path,self.output_path)
+
+    @TypecheckFunction
+    def add(self,entries:List[ManifestEntry]):
+        """ record images (an image that is written again replaces the previous entry) """
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                [(e.path,e.well_name,e.site,e.x,e.y,e.z,e.time_point,e.channel_name,e.timestamp,e.num_bytes,e.checksum,e.z_mm) for e in entries]
+            )
+            self.connection.commit()
+
+    @TypecheckFunction
+    def set_metadata(self,key:str,value:str):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO metadata VALUES (?,?)",(key,value))
+            self.connection.commit()
+
+    @TypecheckFunction
+    def get_metadata(self,key:str)->Optional[str]:
+        with self.lock:
+            row=self.connection.execute("SELECT value FROM metadata WHERE key=?",(key,)).fetchone()
+        return row[0] if not row is None else None
+
+    @TypecheckFunction
+    def set_num_z_planes(self,time_point:int,well_name:str,site:int,num_z_planes:int):
+        """ record the number of z planes acquired at a site (only required if it differs from the configured stack) """
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO z_planes VALUES (?,?,?,?)",(time_point,well_name,site,num_z_planes))
+            self.connection.commit()
+
+    @TypecheckFunction
+    def num_z_planes(self,time_point:int)->Dict[Tuple[str,int],int]:
+        """ number of z planes by (well_name,site), for the sites where it has been recorded """
+        with self.lock:
+            rows=self.connection.execute("SELECT well_name,site,num_z_planes FROM z_planes WHERE time_point=?",(time_point,)).fetchall()
+        return {(well_name,site):num_z_planes for well_name,site,num_z_planes in rows}
+
+    @TypecheckFunction
+    def completed_sites(self,time_point:int,num_images_per_site:int,num_images_per_z_plane:Optional[int]=None)->Set[Tuple[str,int]]:
+        """
+        (well_name,site) of all sites where all images of the time point have been written
+
+        sites with a recorded number of z planes (see set_num_z_planes) are complete with num_images_per_z_plane images per plane.
+        """
+        with self.lock:
+            rows=self.connection.execute(
+                "SELECT images.well_name,images.site,COUNT(*),MAX(z_planes.num_z_planes) FROM images "
+                "LEFT JOIN z_planes ON z_planes.time_point=images.time_point AND z_planes.well_name=images.well_name AND z_planes.site=images.site "
+                "WHERE images.time_point=? GROUP BY images.well_name,images.site",
+                (time_point,)
+            ).fetchall()
+
+        completed_sites:Set[Tuple[str,int]]=set()
+        for well_name,site,num_images,num_z_planes in rows:
+            if not num_z_planes is None and not num_images_per_z_plane is None:
+                num_required_images=num_z_planes*num_images_per_z_plane
+            else:
+                num_required_images=num_images_per_site
+            if num_images>=num_required_images:
+                completed_sites.add((well_name,site))
+        return completed_sites
+
+    @TypecheckFunction
+    def num_images(self)->int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    @TypecheckFunction
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -5,11 +5,20 @@ from qtpy.QtWidgets import QApplication
 from control._def import *
 
 import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
 
 class ExcQtThread(QThread):
-    """ QThread with an exception signal to catch signals thrown from inside """
+    """ QThread that runs func, with an exception signal to catch signals thrown from inside """
     error_signal = Signal(Exception)
 
+    def __init__(self,func):
+        super().__init__()
+        self.func=func
+
+    def run(self):
+        # func processes the events of this thread itself (QApplication.processEvents), while it waits for the hardware
+        self.run_try(self.func)
+
     def run_try(self,func):
         try:
             func()
@@ -19,17 +28,34 @@ class ExcQtThread(QThread):
 
 import os
 import time
+import math
+import copy
+import threading
 import cv2
 
 import json
-import pandas as pd
+import shutil
 import numpy
 
-from typing import Optional, List, Union, Tuple, Callable
+from typing import Optional, List, Union, Tuple, Callable, Set, Dict
 
 import control.camera as camera
 from control.core import Configuration, NavigationController, LiveController, AutoFocusController, ConfigurationManager, ImageSaver #, LaserAutofocusController
 from control.typechecker import TypecheckFunction
+from control.core.directory_sharding import num_shard_buckets, shard_directory_name
+from control.core.storage_projection import StorageProjection, initial_storage_estimate_bytes
+from control.core.channel_order import ChannelSwitchCostModel, optimize_channel_order, channel_order_for_position, channel_needs_backlash_compensation
+from control.core.z_sweep import ZSweepPlan, plan_z_sweep, interpolate_position
+from control.core.row_scan import RowScanPlan, plan_row_scan, execute_row_scan
+from control.core.focus_map import FocusMap, FocusMapPoint, select_prescan_points, well_prescan_points
+from control.core.laser_af_policy import AdaptiveLaserAFPolicy, LaserAFDecision
+from control.core.acquisition_plan import AcquisitionPlan, AcquisitionCostModel, MeasuredLatencies, MeasuredLatency
+from control.core.coordinate_log import CoordinateLog, COORDINATE_LOG_FILE_NAME
+from control.core.timelapse_scheduler import ScheduledRegion, TimelapseScheduler
+from control.core.prescan import PrescanResult, PrescanSite, SiteSelector, PRESCAN_FILE_NAME
+from control.core.well_object_count import WellObjectCounter, center_out_order
+from control.core.adaptive_z import AdaptiveZStack
+from control.core.image_consumer import ImageDispatcher, ImageConsumer, IMAGE_RETURN_CONSUMER_NAME
 
 ENABLE_TQDM_STUFF:bool=False
 if ENABLE_TQDM_STUFF:
@@ -42,10 +68,17 @@ from pathlib import Path
 
 from control.gui import *
 
-class AbortAcquisitionException(Exception):
-    def __init__(self):
-        super().__init__()
+TIMELAPSE_SCHEDULE_FILE_NAME:str="timelapse_schedule.json"
+""" report on how well the time-lapse schedule has been kept (see MultiPointWorker.run_scheduled), saved in the output directory """
+
+class TimePointOutput:
+    """ where the images and positions of one time point are written """
 
+    def __init__(self,path:str,coordinate_log:CoordinateLog,completed_sites:Set[Tuple[str,int]]):
+        self.path=path
+        self.coordinate_log=coordinate_log
+        # sites that have already been imaged in this time point (only non-empty if an interrupted acquisition is resumed)
+        self.completed_sites=completed_sites
 
 class MultiPointWorker(QObject):
 
@@ -55,13 +88,14 @@ class MultiPointWorker(QObject):
     image_to_display_multi = Signal(numpy.ndarray,int)
     signal_register_current_fov = Signal(float,float)
     signal_new_acquisition=Signal(AcqusitionProgress)
+    # emitted from the image processing thread in pipelined acquisition, received on the thread the worker lives on
+    image_processed=Signal(AcquisitionImageData)
 
     def __init__(self,
         multiPointController,
-        scan_coordinates:Tuple[List[str],List[Tuple[float,float]]],
+        plan:AcquisitionPlan,
         total_num_acquisitions:int,
         is_async:bool=True,
-        image_return:Optional[Callable[[Any],None]]=None,
     ):
         super().__init__()
         self.multiPointController:MultiPointController = multiPointController
@@ -92,22 +126,47 @@ class MultiPointWorker(QObject):
         self.crop_height = self.multiPointController.crop_height
         self.counter = self.multiPointController.counter
         self.selected_configurations = self.multiPointController.selected_configurations
-        self.grid_mask=self.multiPointController.grid_mask
         self.output_path:str=self.multiPointController.output_path
+        # images are written to the staging directory (if configured), and moved to the output path by the image saver
+        self.staging_path:Optional[str]=self.multiPointController.staging_path
+        self.image_output_path:str=self.staging_path or self.output_path
         self.plate_type=self.multiPointController.plate_type
         self.image_saver=self.multiPointController.image_saver
-        self.image_return=image_return
+        # every acquired image is passed to the image consumers (e.g. the display) after it has been submitted for saving
+        self.image_dispatcher:ImageDispatcher=self.multiPointController.image_dispatcher
+        self.resume=self.multiPointController.resume
+        # sites that have already been imaged in the current time point (only non-empty if an interrupted acquisition is resumed)
+        self.completed_sites:Set[Tuple[str,int]]=set()
 
-        if not self.grid_mask is None:
-            assert len(self.grid_mask)==self.NY
-            assert len(self.grid_mask[0])==self.NX
+        # set from any thread to abort the acquisition. waits for the stage, the camera and the next time point return as soon as it is set.
+        self.abort_event:threading.Event=self.multiPointController.abort_event
+        self.wait_for_completion:dict={"cancel_event":self.abort_event}
 
         self.reflection_af_initialized = self.multiPointController.laserAutofocusController.is_initialized and not self.multiPointController.laserAutofocusController.x_reference is None
 
         self.timestamp_acquisition_started = self.multiPointController.timestamp_acquisition_started
         self.time_point:int = 0
-
-        self.scan_coordinates_name,self.scan_coordinates_mm = scan_coordinates
+        # positions imaged in the current time point (see select_time_point)
+        self.coordinate_log:Optional[CoordinateLog]=None
+        # time points that have been begun but not ended yet (more than one if wells are visited by deadline, see run_scheduled)
+        self.time_point_outputs:Dict[int,TimePointOutput]={}
+        # well (and its directory) whose images may still be processed (pipelined acquisition only), see finish_unfinished_well
+        self.unfinished_well:Optional[Tuple[str,str]]=None
+
+        # wells in the order they are visited, the corner each is entered at ((x_scan_direction,y_scan_direction), see control.core.route_planner), and the sites imaged in each
+        self.plan=plan
+        assert (plan.num_x,plan.num_y,plan.num_z)==(self.NX,self.NY,self.NZ)
+        self.scan_coordinates_name:List[str]=[well.well_name for well in plan.wells]
+        self.scan_coordinates_mm:List[Tuple[float,float]]=[well.center_mm for well in plan.wells]
+        self.well_scan_directions:List[Tuple[int,int]]=[(well.x_scan_direction,well.y_scan_direction) for well in plan.wells]
+        self.planned_sites:Dict[str,Set[int]]={well.well_name:well.site_indices for well in plan.wells}
+
+        # image formats that store all images of a well/site in one container do not produce many files per directory
+        self.directory_sharding:DirectorySharding=self.multiPointController.directory_sharding
+        if Acquisition.IMAGE_FORMAT in (ImageFormat.ZARR,ImageFormat.TIFF_PER_WELL):
+            self.directory_sharding=DirectorySharding.NONE
+
+        self.num_shard_buckets:int=num_shard_buckets(plan.num_images_per_time_point,self.image_saver.max_num_image_per_folder)
 
         self.progress=AcqusitionProgress(
             total_steps=total_num_acquisitions,
@@ -115,56 +174,219 @@ class MultiPointWorker(QObject):
             start_time=0.0,
             last_imaged_coordinates=(float("nan"),float("nan")),
         )
+        self.num_fovs_imaged:int=0
+
+        # order in which the channels are imaged at each position (indices into selected_configurations), reversed at every other position
+        self.channel_order:List[int]=list(range(len(self.selected_configurations)))
+        if Acquisition.OPTIMIZE_CHANNEL_ORDER:
+            cost_model=ChannelSwitchCostModel.from_machine_config(clear_z_backlash_mm=self.microcontroller.clear_z_backlash_mm)
+            self.channel_order=optimize_channel_order(self.selected_configurations,cost_model)
+            MAIN_LOG.log(
+                f"channel order: {[self.selected_configurations[i].name for i in self.channel_order]} "
+                f"(estimated switching time per two positions {cost_model.alternating_time_s(self.selected_configurations,self.channel_order)*1000:.1f}ms, "
+                f"{cost_model.alternating_time_s(self.selected_configurations,list(range(len(self.selected_configurations))))*1000:.1f}ms in selected order)"
+            )
+        self.num_channel_passes:int=0
+        self.z_sweep_fallback_logged:bool=False
+
+        # each grid row is imaged in one continuous move if possible (see Acquisition.XY_SCAN_MODE)
+        self.row_scan_plan:Optional[RowScanPlan]=None
+        if Acquisition.XY_SCAN_MODE==XYScanMode.CONTINUOUS_ROWS:
+            self.row_scan_plan=self.plan_continuous_row_scan()
+
+        # z at each position is predicted from a focus map instead of running the laser autofocus there (see Acquisition.FOCUS_MAP_SCOPE)
+        self.focus_map:Optional[FocusMap]=None
+        self.focus_map_path:str=os.path.join(self.output_path,"focus_map.json")
+        self.verify_focus_map_at_next_position:bool=False
+
+        # only the sites that contain objects in a single channel prescan are acquired (see Acquisition.PRESCAN)
+        self.prescan_path:str=os.path.join(self.output_path,PRESCAN_FILE_NAME)
+
+        # imaging a well stops once enough objects have been counted in it (see Acquisition.WELL_TARGET_NUM_OBJECTS)
+        self.object_counter:Optional[WellObjectCounter]=None
+        if Acquisition.WELL_TARGET_NUM_OBJECTS>0:
+            counted_channel_name=Acquisition.WELL_TARGET_CHANNEL or self.selected_configurations[0].name
+            if counted_channel_name in [config.name for config in self.selected_configurations]:
+                self.object_counter=WellObjectCounter(channel_name=counted_channel_name,target_num_objects=Acquisition.WELL_TARGET_NUM_OBJECTS,selector=SiteSelector.from_machine_config())
+            else:
+                MAIN_LOG.log(f"warning - channel {counted_channel_name} is not imaged, objects are not counted and all sites are imaged")
+        # objects are counted in the focus plane of the z stack only
+        self.object_count_z_index:int=int(round((self.NZ-1)/2)) if MACHINE_CONFIG.Z_STACKING_CONFIG=='FROM CENTER' else 0
+
+        # z stacks stop once the focus measure of this channel has decayed on both sides of its peak (see ZStackMode.ADAPTIVE)
+        self.adaptive_z_channel_name:Optional[str]=None
+        if self.NZ > 1 and Acquisition.Z_STACK_MODE==ZStackMode.ADAPTIVE:
+            self.adaptive_z_channel_name=Acquisition.ADAPTIVE_Z_CHANNEL or self.selected_configurations[0].name
+            if not self.adaptive_z_channel_name in [config.name for config in self.selected_configurations]:
+                MAIN_LOG.log(f"warning - channel {self.adaptive_z_channel_name} is not imaged, acquiring all {self.NZ} z planes at each site")
+                self.adaptive_z_channel_name=None
+
+        # the laser autofocus measurement is skipped where z can be predicted from nearby measurements (see Acquisition.LASER_AF_ADAPTIVE)
+        self.laser_af_policy:Optional[AdaptiveLaserAFPolicy]=AdaptiveLaserAFPolicy.from_machine_config() if Acquisition.LASER_AF_ADAPTIVE and self.do_reflection_af else None
+
+        # latencies measured during the acquisition improve the duration estimate of future acquisitions (see Acquisition.MEASURED_LATENCIES_PATH)
+        self.cost_model:AcquisitionCostModel=AcquisitionCostModel.from_machine_config()
+        self.measured_latencies:MeasuredLatencies=MeasuredLatencies()
+
+        # images are processed, displayed and saved on a separate thread while the acquisition continues (see Acquisition.PIPELINED_ACQUISITION)
+        self.pipelined:bool=Acquisition.PIPELINED_ACQUISITION
+        self.image_processing_executor:Optional[ThreadPoolExecutor]=None
+        self.pending_image_processing:List[Future]=[]
+        self.image_processed.connect(self._on_image_processed)
 
     def run(self):
         self.progress.start_time=time.time()
         MAIN_LOG.log("acquisition started")
+        estimate=self.cost_model.estimate(self.plan)
+        MAIN_LOG.log(estimate.as_text())
+
+        if not self.staging_path is None:
+            os.makedirs(self.staging_path,exist_ok=True)
+
+        self.image_saver.begin_acquisition(
+            output_path=str(self.output_path),
+            staging_path=self.staging_path,
+            layout=AcquisitionLayout(
+                channel_names=[config.name for config in self.selected_configurations],
+                num_z=self.NZ,
+                num_time_points=self.Nt,
+                z_step_um=float(self.deltaZ*1000),
+                time_step_s=float(self.dt),
+                bit_depth=self.camera.pixel_format.value.bit_depth if not self.camera.pixel_format is None else 8*self.camera.pixel_size_byte,
+                bit_depth_mode=Acquisition.IMAGE_BIT_DEPTH_MODE,
+            ),
+            file_format=Acquisition.IMAGE_FORMAT,
+            directory_sharding=self.directory_sharding,
+            num_shard_buckets=self.num_shard_buckets,
+        )
+        self.image_saver.manifest.set_metadata("directory_sharding",self.directory_sharding.value)
+        self.image_saver.manifest.set_metadata("max_num_image_per_folder",str(self.image_saver.max_num_image_per_folder))
+        self.image_saver.manifest.set_metadata("num_shard_buckets",str(self.num_shard_buckets))
+
+        if self.pipelined:
+            # single thread, so that images are saved in the order they were taken
+            self.image_processing_executor=ThreadPoolExecutor(max_workers=1,thread_name_prefix="multipoint_image_processing")
+
         try:
-            while self.time_point < self.Nt:
-                MAIN_LOG.log(f"time-point {self.time_point}: starting")
-                self.run_single_time_point()
-                MAIN_LOG.log(f"time-point {self.time_point}: done")
-
-                if self.multiPointController.abort_acqusition_requested:
-                    raise AbortAcquisitionException()
-
-                self.time_point = self.time_point + 1
-
-                # continous acquisition
-                if self.dt != 0.0:
-                    if self.Nt==1:
-                        self.time_point -= 1
-                        break
-
-                    if self.time_point == self.Nt:
-                        break # no waiting after taking the last time point
-
-                    # wait until it's time to do the next acquisition
-                    next_timepoint_start_time=self.timestamp_acquisition_started + self.time_point*self.dt
-                    remaining_time_s=next_timepoint_start_time-time.time()
-                    MAIN_LOG.log(f"waiting for next time point in {remaining_time_s:.3f}s")
-
-                    wait_time_step_length=1/30
-                    while (remaining_time_s := next_timepoint_start_time-time.time())>0:
-                        if self.multiPointController.abort_acqusition_requested:
-                            MAIN_LOG.log("cancelled acquisition during waiting for next time point")
-                            raise AbortAcquisitionException()
-                        time.sleep(wait_time_step_length)
-                        QApplication.processEvents()
+            if Acquisition.FOCUS_MAP_SCOPE!=FocusMapScope.NONE:
+                self.prepare_focus_map()
+
+            if Acquisition.PRESCAN:
+                self.run_prescan()
+
+            # per-well intervals can only be kept by scheduling each well on its own
+            has_well_intervals=any(not well.time_point_interval_s is None for well in self.plan.wells)
+            if self.Nt > 1 and (Acquisition.TIMELAPSE_SCHEDULING==TimelapseScheduling.EARLIEST_DEADLINE or has_well_intervals):
+                self.run_scheduled()
+            else:
+                while self.time_point < self.Nt:
+                    MAIN_LOG.log(f"time-point {self.time_point}: starting")
+                    self.run_single_time_point()
+                    MAIN_LOG.log(f"time-point {self.time_point}: done")
+                    if not self.laser_af_policy is None:
+                        MAIN_LOG.log(self.laser_af_policy.as_text())
+
+                    if self.abort_event.is_set():
+                        raise AbortAcquisitionException()
+
+                    self.time_point = self.time_point + 1
+
+                    # continous acquisition
+                    if self.dt != 0.0:
+                        if self.Nt==1:
+                            self.time_point -= 1
+                            break
+
+                        if self.time_point == self.Nt:
+                            break # no waiting after taking the last time point
+
+                        # wait until it's time to do the next acquisition
+                        next_timepoint_start_time=self.timestamp_acquisition_started + self.time_point*self.dt
+                        MAIN_LOG.log(f"waiting for next time point in {next_timepoint_start_time-time.time():.3f}s")
+                        self.wait_until(next_timepoint_start_time)
 
             self.progress.last_completed_action="finished acquisition"
-            self.signal_new_acquisition.emit(self.progress)
+            self.signal_new_acquisition.emit(copy.copy(self.progress))
                         
         except AbortAcquisitionException:
-            MAIN_LOG.log("acquisition successfully cancelled")
+            MAIN_LOG.log(f"acquisition successfully cancelled ({self.multiPointController.abort_latency_s()*1000:.0f}ms after the abort was requested)")
 
             self.progress.last_completed_action="acquisition_cancelled"
-            self.signal_new_acquisition.emit(self.progress)
+            self.signal_new_acquisition.emit(copy.copy(self.progress))
+
+        finally:
+            for time_point_output in self.time_point_outputs.values():
+                time_point_output.coordinate_log.close()
+
+            if not self.image_processing_executor is None:
+                try:
+                    self.wait_for_image_processing()
+                finally:
+                    self.image_processing_executor.shutdown(wait=True)
+                    self.image_processing_executor=None
+
+            if not self.object_counter is None:
+                self.object_counter.shutdown()
+
+            # flush images that are still queued, and close containers that span more than one image
+            self.image_saver.end_acquisition()
+
+            MAIN_LOG.log(f"acquisition took {(time.time()-self.progress.start_time)/60:.1f}min (estimated {estimate.total_s/60:.1f}min), {self.measured_latencies.as_text()}")
+            MAIN_LOG.log(self.image_dispatcher.as_text())
+            self.measured_latencies.save_merged()
             
         self.finished.emit()
 
         MAIN_LOG.log("\nfinished multipoint acquisition\n")
 
+    def wait_until(self,timestamp:float):
+        """ wait until time.time() has reached timestamp, raises AbortAcquisitionException if the acquisition is aborted in the meantime """
+
+        wait_time_step_length=1/30
+        while (remaining_time_s := timestamp-time.time())>0:
+            if self.abort_event.wait(min(remaining_time_s,wait_time_step_length)):
+                MAIN_LOG.log("cancelled acquisition during waiting for next time point")
+                raise AbortAcquisitionException()
+            QApplication.processEvents()
+
+    def all_sites_completed(self,well_name:str)->bool:
+        """ check if all sites of the well have already been imaged in the current time point """
+        return all((well_name,site) in self.completed_sites for site in self.planned_sites[well_name])
+
+    def check_storage_projection(self):
+        """ update the projected storage use of the acquisition, and abort it if the output device would run out of space """
+
+        self.num_fovs_imaged+=1
+
+        # images that have not been acquired yet (progress steps also count images that are skipped, e.g. on resume or after a prescan),
+        # and those that have been acquired but not saved yet
+        num_images_not_acquired=max(0,self.progress.total_steps-self.progress.completed_steps)
+        num_images_not_saved=self.image_saver.num_queued_images+sum(1 for future in self.pending_image_processing if not future.done())
+
+        saver_stats=self.image_saver.acquisition_stats
+        projection=StorageProjection(
+            num_images_saved=saver_stats.num_images,
+            num_bytes_saved=saver_stats.num_bytes,
+            num_raw_bytes_saved=saver_stats.num_raw_bytes,
+            num_images_remaining=num_images_not_acquired+num_images_not_saved,
+            free_space_bytes=get_storage_size_in_directory(self.image_output_path).free_space_bytes,
+            write_rate_bytes_per_s=self.image_saver.write_rate.rate_per_s(),
+        )
+        self.progress.storage_projection=projection
+
+        if self.num_fovs_imaged%10==1:
+            MAIN_LOG.log(projection.as_text())
+
+        reserve_bytes=int(Acquisition.STORAGE_RESERVE_GB*1024**3)
+
+        # until enough images have been saved to measure the compression ratio, only make sure that the reserve is not used up.
+        # with staging, the staging directory is emptied continuously, so it only needs to keep the reserve free as well.
+        enough_samples=self.num_fovs_imaged>=Acquisition.STORAGE_PROJECTION_SAMPLE_FOVS and projection.num_images_saved>0
+        if projection.free_space_bytes<reserve_bytes or (enough_samples and self.staging_path is None and not projection.fits(reserve_bytes)):
+            MAIN_LOG.log(f"error - aborting acquisition, the output device would run out of space. {projection.as_text()}")
+            self.multiPointController.request_abort_aquisition()
+            raise AbortAcquisitionException()
+
     def perform_software_autofocus(self):
         """ run software autofocus to focus on current fov """
 
@@ -180,6 +402,8 @@ class MultiPointWorker(QObject):
         counter_backlash:bool=True,
         # the params below are just for gui display purposes
         x:Optional[int]=None,y:Optional[int]=None,z:Optional[int]=None,well_name:Optional[str]=None,
+        # position of the image within the acquisition, required for image formats that store more than one image per file
+        location:Optional[ImageLocation]=None,
     ):
         """ take image for specified configuration and save to specified path """
         
@@ -195,25 +419,73 @@ class MultiPointWorker(QObject):
             if numpy.abs(um_to_move)>MACHINE_CONFIG.LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM:
                 self.movement_deviation_from_focusplane=target_um
                 if counter_backlash:
-                    self.navigation.move_z(um_to_move/1000-self.microcontroller.clear_z_backlash_mm,wait_for_completion={})
-                    self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion={})#,wait_for_stabilization=True)
+                    self.navigation.move_z(um_to_move/1000-self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+                    self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)#,wait_for_stabilization=True)
                 else:
-                    self.navigation.move_z(um_to_move/1000,wait_for_completion={})#,wait_for_stabilization=True)
+                    self.navigation.move_z(um_to_move/1000,wait_for_completion=self.wait_for_completion)#,wait_for_stabilization=True)
                 
                 MAIN_LOG.log(f"moved to channel offset {um_to_move}um (relative to previous)")
 
         with Profiler("snap",parent=profiler) as snap:
-            image = self.liveController.snap(config,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=snap)
+            snap_start_time=time.monotonic()
+            image = self.liveController.snap(config,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=snap,postprocess=not self.pipelined,cancel_event=self.abort_event)
+            self.measured_latencies.record(MeasuredLatency.SNAP_OVERHEAD,time.monotonic()-snap_start_time-config.exposure_time_ms/1000)
+
+        self.handle_snapped_image(image,config=config,saving_path=saving_path,profiler=profiler,x=x,y=y,z=z,well_name=well_name,location=location)
 
-        with Profiler("display images",parent=profiler) as displayimage:
-            # process the image -  @@@ to move to camera
-            self.image_to_display.emit(image)
-            self.image_to_display_multi.emit(image,config.illumination_source)
+        MAIN_LOG.log(f"imaging channel {config.name}: done")
+
+        return image
+
+    def handle_snapped_image(self,
+        image:numpy.ndarray,
+        config:Configuration,
+        saving_path:str,
+        profiler:Optional[Profiler]=None,
+        x:Optional[int]=None,y:Optional[int]=None,z:Optional[int]=None,well_name:Optional[str]=None,
+        location:Optional[ImageLocation]=None,
+    ):
+        """ display, save and broadcast an image returned by LiveController.snap (on the image processing thread in pipelined acquisition) """
+
+        image_data=AcquisitionImageData(
+            image=image,
+            path=saving_path,
+            config=config,
+            x=x,
+            y=y,
+            z=z,
+            well_name=well_name
+        )
+
+        if not self.object_counter is None and config.name==self.object_counter.channel_name and not location is None and location.z==self.object_count_z_index:
+            self.object_counter.submit(self.time_point,location.well_name,image)
+
+        if self.pipelined:
+            with Profiler("submit image processing",parent=profiler):
+                self.submit_image_processing(image_data,location=location,profiler=profiler)
+        else:
+            with Profiler("display images",parent=profiler) as displayimage:
+                # process the image -  @@@ to move to camera
+                self.image_to_display.emit(image)
+                self.image_to_display_multi.emit(image,config.illumination_source)
+
+            self.save_image(image_data,location=location,profiler=profiler)
+
+            with Profiler("broadcast image",parent=profiler):
+                self.image_dispatcher.submit(image_data,cancel_event=self.abort_event)
+
+        self.progress.completed_steps+=1
+        self.progress.last_completed_action=f"imaged config {config.name}"
+        self.signal_new_acquisition.emit(copy.copy(self.progress))
+
+    def save_image(self,image_data:AcquisitionImageData,location:Optional[ImageLocation]=None,profiler:Optional[Profiler]=None):
+        """ convert image to the format it is saved in (replaces image_data.image), and submit it to the image saver """
 
         with Profiler("enqueue image saving",parent=profiler) as enqueuesaveimages:
+            image=image_data.image
             if self.camera.is_color:
                 with Profiler("convert color image",parent=enqueuesaveimages) as convertcolorimage:
-                    if 'BF LED matrix' in config.name:
+                    if 'BF LED matrix' in image_data.config.name:
                         if MACHINE_CONFIG.MUTABLE_STATE.MULTIPOINT_BF_SAVING_OPTION == BrightfieldSavingMode.RAW and image.dtype!=numpy.uint16:
                             image = cv2.cvtColor(image,cv2.COLOR_RGB2BGR)
                         elif MACHINE_CONFIG.MUTABLE_STATE.MULTIPOINT_BF_SAVING_OPTION == BrightfieldSavingMode.RGB2GRAY:
@@ -224,29 +496,80 @@ class MultiPointWorker(QObject):
                         image = cv2.cvtColor(image,cv2.COLOR_RGB2BGR)
                         
                     image=numpy.asarray(image)
+            image_data.image=image
 
             with Profiler("actual enqueue",parent=enqueuesaveimages) as actualenqueueprof:
-                self.image_saver.enqueue(path=saving_path,image=image,file_format=Acquisition.IMAGE_FORMAT)
+                self.image_saver.enqueue(path=image_data.path,image=image,file_format=Acquisition.IMAGE_FORMAT,location=location)
 
-        if not self.image_return is None:
-            with Profiler("broadcast image",parent=profiler):
-                self.image_return(AcquisitionImageData(
-                    image=image,
-                    path=saving_path,
-                    config=config,
-                    x=x,
-                    y=y,
-                    z=z,
-                    well_name=well_name
-                ))
+    def submit_image_processing(self,image_data:AcquisitionImageData,location:Optional[ImageLocation]=None,profiler:Optional[Profiler]=None):
+        """
+        process, save and display a raw camera image on the image processing thread, so that the acquisition can continue (e.g. move to the next position) in the meantime
 
-        self.progress.completed_steps+=1
-        self.progress.last_completed_action=f"imaged config {config.name}"
-        self.signal_new_acquisition.emit(self.progress)
+        the processing time is recorded in profiler as 'process image (overlapped)', in addition to (not as part of) the time spent on the acquisition thread.
+        """
 
-        MAIN_LOG.log(f"imaging channel {config.name}: done")
+        assert not self.image_processing_executor is None
+
+        # limit the number of raw images held in memory, if processing cannot keep up
+        self.pending_image_processing=[future for future in self.pending_image_processing if not future.done()]
+        while len(self.pending_image_processing)>=Acquisition.PIPELINE_MAX_PENDING_IMAGES:
+            self.pending_image_processing.pop(0).result()
+
+        def process():
+            with Profiler("process image (overlapped)",parent=profiler) as processimage:
+                image_data.image=self.liveController.postprocess_snap(image_data.image,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=processimage)
+
+                self.save_image(image_data,location=location,profiler=processimage)
+
+            # displaying and broadcasting may touch the gui, which must happen on the thread the worker lives on.
+            # the signal is delivered there while the acquisition waits for the next stage movement to complete.
+            self.image_processed.emit(image_data)
+
+        self.pending_image_processing.append(self.image_processing_executor.submit(process))
+
+    def _on_image_processed(self,image_data:AcquisitionImageData):
+        self.image_to_display.emit(image_data.image)
+        self.image_to_display_multi.emit(image_data.image,image_data.config.illumination_source)
+
+        self.image_dispatcher.submit(image_data,cancel_event=self.abort_event)
+
+    def wait_for_image_processing(self):
+        """ wait until all images submitted for processing have been saved and displayed, and raise the first exception that occured during processing (if any) """
 
-    def image_zstack_here(self,x:int,y:int,coordinate_name:str,profiler:Optional[Profiler]=None,well_name:Optional[str]=None):
+        pending_image_processing=self.pending_image_processing
+        self.pending_image_processing=[]
+
+        first_exception:Optional[BaseException]=None
+        for future in pending_image_processing:
+            exception=future.exception()
+            if not exception is None and first_exception is None:
+                first_exception=exception
+
+        # deliver the display signals that have been emitted by the processing thread
+        QApplication.processEvents()
+
+        if not first_exception is None:
+            MAIN_LOG.log(f"error - image processing failed: {first_exception}")
+            raise first_exception
+
+    def finish_well(self,well_name:str,profiler:Optional[Profiler]=None,directory:Optional[str]=None):
+        """ mark all images of the well as submitted for saving. directory defaults to the directory of the current time point. """
+
+        if self.pipelined:
+            with Profiler("wait for image processing",parent=profiler):
+                self.wait_for_image_processing()
+
+        self.image_saver.finish_well(directory=directory or self.current_path,well_name=well_name)
+
+    def finish_unfinished_well(self,profiler:Optional[Profiler]=None):
+        """ finish the well whose images may still be processed (if there is one) """
+
+        if not self.unfinished_well is None:
+            well_name,directory=self.unfinished_well
+            self.unfinished_well=None
+            self.finish_well(well_name,profiler=profiler,directory=directory)
+
+    def image_zstack_here(self,x:int,y:int,coordinate_name:str,profiler:Optional[Profiler]=None,well_name:Optional[str]=None,site:int=1):
         """ x and y are for internal naming stuff only, not for anything position dependent """
 
         MAIN_LOG.log(f"acquiring position {coordinate_name}: started")
@@ -259,6 +582,14 @@ class MultiPointWorker(QObject):
         # use software autofocus to initialize laser autofocus system
         do_perform_initial_software_autofocus=( (self.NZ == 1) or MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM CENTER' ) and (self.do_autofocus) and (self.FOV_counter % Acquisition.NUMBER_OF_FOVS_PER_AF == 0)
 
+        # only autofocus on an initialized laser autofocus (or the software autofocus alone) is measured, initialization is a one-off
+        measured_autofocus:Optional[MeasuredLatency]=None
+        if self.do_reflection_af and self.reflection_af_initialized:
+            measured_autofocus=MeasuredLatency.LASER_AUTOFOCUS
+        elif not self.do_reflection_af and do_perform_initial_software_autofocus:
+            measured_autofocus=MeasuredLatency.SOFTWARE_AUTOFOCUS
+        autofocus_start_time=time.monotonic()
+
         with Profiler("run autofocus",parent=profiler) as autofocusprof:
             # autofocus
             if self.do_reflection_af == False:
@@ -280,23 +611,48 @@ class MultiPointWorker(QObject):
                     # set the current plane as reference
                     self.laserAutofocusController.set_reference(z_pos_mm=0.0) # z pos does not matter here
                     self.reflection_af_initialized = True
+                elif not self.focus_map is None and self.focus_map.is_ready:
+                    self.move_to_focus_map_z(well_name=well_name or coordinate_name,profiler=autofocusprof)
+                elif not self.laser_af_policy is None:
+                    self.run_adaptive_laser_af(profiler=autofocusprof)
                 else:
                     MAIN_LOG.log("Laser Reflection Autofocus: started")
                     self.laserAutofocusController.move_to_target(0.0)
                     MAIN_LOG.log("Laser Reflection Autofocus: done")
 
+        if not measured_autofocus is None:
+            self.measured_latencies.record(measured_autofocus,time.monotonic()-autofocus_start_time)
+
+        if self.NZ > 1 and Acquisition.Z_STACK_MODE==ZStackMode.SWEEP:
+            sweep_plans=self.plan_z_sweeps()
+            if not sweep_plans is None:
+                with Profiler("z sweep",parent=profiler) as zsweepprof:
+                    ret_coords=self.image_zstack_sweep(sweep_plans,x=x,y=y,coordinate_name=coordinate_name,profiler=zsweepprof,well_name=well_name,site=site,z_stack_origin_z_mm=z_stack_origin_z_mm)
+
+                self.FOV_counter = self.FOV_counter + 1
+                MAIN_LOG.log(f"acquiring position {coordinate_name}: done")
+                return ret_coords
+
         if (self.NZ > 1):
             with Profiler("actual zstack (should be 0)",parent=profiler) as zstack:
                 # move to bottom of the z stack
                 if MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM CENTER':
                     base_z=int(-self.deltaZ_usteps*round((self.NZ-1)/2))
-                    self.navigation.move_z_usteps(base_z,wait_for_completion={})
+                    self.navigation.move_z_usteps(base_z,wait_for_completion=self.wait_for_completion)
                 # maneuver for achieving uniform step size and repeatability when using open-loop control
-                self.navigation.move_z(-self.microcontroller.clear_z_backlash_mm,wait_for_completion={})
-                self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion={},wait_for_stabilization=True)
+                self.navigation.move_z(-self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+                self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
 
                 MAIN_LOG.log("moved to target z in z-stack (part 1)")
 
+        image_directory=os.path.join(self.current_path,shard_directory_name(self.directory_sharding,well_name or coordinate_name,site,self.num_shard_buckets))
+        os.makedirs(image_directory,exist_ok=True)
+
+        adaptive_z_stack:Optional[AdaptiveZStack]=None
+        if not self.adaptive_z_channel_name is None:
+            adaptive_z_stack=AdaptiveZStack.from_machine_config(max_num_planes=self.NZ)
+        num_z_planes=self.NZ
+
         # z-stack
         for k in range(self.NZ):
             if self.num_positions_per_well>1:
@@ -311,20 +667,36 @@ class MultiPointWorker(QObject):
 
             with Profiler("image all configs",parent=profiler) as image_all_configs:
 
+                # file names and image locations use the index of the channel in selected_configurations, independent of the order the channels are imaged in
+                channel_order=channel_order_for_position(self.channel_order,self.num_channel_passes) if Acquisition.OPTIMIZE_CHANNEL_ORDER else self.channel_order
+                self.num_channel_passes+=1
+
                 # iterate through selected modes
-                for config_i,config in tqdm(enumerate(self.selected_configurations),desc="channel",unit="channel",leave=False):
-                    saving_path = os.path.join(self.current_path, file_ID + '_' + str(config.name).replace(' ','_'))
+                for imaging_index,config_i in tqdm(enumerate(channel_order),desc="channel",unit="channel",leave=False):
+                    config=self.selected_configurations[config_i]
+                    saving_path = os.path.join(image_directory, file_ID + '_' + str(config.name).replace(' ','_'))
 
-                    if self.multiPointController.abort_acqusition_requested:
+                    if self.abort_event.is_set():
                         raise AbortAcquisitionException()
-                        
-                    counter_backlash=True
-                    if config_i>0:
-                        previous_channel_z_offset=self.selected_configurations[config_i-1].channel_z_offset
-                        current_channel_offset=self.selected_configurations[config_i-1].channel_z_offset
-                        counter_backlash=previous_channel_z_offset<current_channel_offset
 
-                    self.image_config(config=config,saving_path=saving_path,profiler=image_all_configs,counter_backlash=counter_backlash,x=x,y=y,z=k,well_name=well_name)
+                    # approach the channel offset from below
+                    target_um=config.channel_z_offset or 0.0
+                    counter_backlash=channel_needs_backlash_compensation(imaging_index,target_um-self.movement_deviation_from_focusplane)
+
+                    location=ImageLocation(
+                        well_name=well_name or coordinate_name,
+                        site=site,
+                        x=x,y=y,z=k,
+                        time_point=self.time_point,
+                        channel_name=config.name,
+                        channel_index=config_i,
+                    )
+
+                    image=self.image_config(config=config,saving_path=saving_path,profiler=image_all_configs,counter_backlash=counter_backlash,x=x,y=y,z=k,well_name=well_name,location=location)
+
+                    if not adaptive_z_stack is None and config.name==self.adaptive_z_channel_name:
+                        with Profiler("adaptive z focus measure",parent=image_all_configs):
+                            adaptive_z_stack.add_plane(image)
 
             with Profiler("ret coords append",parent=profiler) as retcoordsappend:
                 # add the coordinate of the current location
@@ -339,33 +711,45 @@ class MultiPointWorker(QObject):
             self.signal_register_current_fov.emit(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
 
             # check if the acquisition should be aborted
-            if self.multiPointController.abort_acqusition_requested:
+            if self.abort_event.is_set():
                 raise AbortAcquisitionException()
 
+            stop_z_stack=k < self.NZ - 1 and not adaptive_z_stack is None and adaptive_z_stack.done
+            if stop_z_stack:
+                num_z_planes=k+1
+                MAIN_LOG.log(f"adaptive z stack - focus measure decayed on both sides of its peak, stopping after {num_z_planes} of {self.NZ} planes")
+
             if self.NZ > 1:
                 # move z
-                if k < self.NZ - 1:
-                    self.navigation.move_z_usteps(self.deltaZ_usteps,wait_for_completion={},wait_for_stabilization=True)
+                if k < self.NZ - 1 and not stop_z_stack:
+                    self.navigation.move_z_usteps(self.deltaZ_usteps,wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
                     self.on_abort_dz_usteps = self.on_abort_dz_usteps + self.deltaZ_usteps
 
                 MAIN_LOG.log("moved to target z in z-stack (part 3)")
 
             self.progress.last_completed_action="image z slice"
-            self.signal_new_acquisition.emit(self.progress)
+            self.signal_new_acquisition.emit(copy.copy(self.progress))
+
+            if stop_z_stack:
+                break
+
+        if not adaptive_z_stack is None:
+            self.image_saver.manifest.set_num_z_planes(time_point=self.time_point,well_name=well_name or coordinate_name,site=site,num_z_planes=num_z_planes)
+            self.progress.completed_steps+=(self.NZ-num_z_planes)*len(self.selected_configurations)
         
         if self.NZ > 1:
             # move z back
-            latest_offset=-self.deltaZ_usteps*(self.NZ-1)
+            latest_offset=-self.deltaZ_usteps*(num_z_planes-1)
             if MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM CENTER':
                 latest_offset+=self.deltaZ_usteps*round((self.NZ-1)/2)
 
             self.on_abort_dz_usteps += latest_offset
-            self.navigation.move_z_usteps(latest_offset,wait_for_completion={})
+            self.navigation.move_z_usteps(latest_offset,wait_for_completion=self.wait_for_completion)
 
             MAIN_LOG.log("moved to target z in z-stack (part 2)")
 
         if self.do_reflection_af == False and not do_perform_initial_software_autofocus:
-            self.navigation.move_to_mm(z_mm=z_stack_origin_z_mm,wait_for_completion={})
+            self.navigation.move_to_mm(z_mm=z_stack_origin_z_mm,wait_for_completion=self.wait_for_completion)
 
         # update FOV counter
         self.FOV_counter = self.FOV_counter + 1
@@ -374,15 +758,496 @@ class MultiPointWorker(QObject):
 
         return ret_coords
 
+    def wait_for_timed_move(self,start_time:float,duration_s:float):
+        """
+        wait for a move that was started at start_time (time.monotonic()) and takes duration_s to complete
+
+        the microcontroller only reports completion of the most recent command, so other commands sent during the move (e.g. for illumination) hide whether it is still in progress.
+        this is not cancelled by an abort, because the velocity of the axis can only be restored once the move has completed.
+        """
+        while (remaining_time_s:=start_time+duration_s-time.monotonic())>0:
+            QApplication.processEvents()
+            time.sleep(min(remaining_time_s,MACHINE_CONFIG.SLEEP_TIME_S))
+
+        self.microcontroller.wait_till_operation_is_completed()
+
+    def prepare_focus_map(self):
+        """ load the focus map of the experiment (when resuming), or measure the points across the plate (see Acquisition.FOCUS_MAP_SCOPE) """
+
+        if not self.do_reflection_af:
+            MAIN_LOG.log("focus map requires the laser autofocus, which is disabled. running the selected autofocus at every position instead.")
+            return
+        if not self.reflection_af_initialized:
+            MAIN_LOG.log("focus map requires the laser autofocus to be initialized before the acquisition starts. running the laser autofocus at every position instead.")
+            return
+
+        if self.resume and os.path.exists(self.focus_map_path):
+            self.focus_map=FocusMap.load(self.focus_map_path)
+            MAIN_LOG.log(f"resuming acquisition - loaded {self.focus_map.as_text()}")
+            return
+
+        self.focus_map=FocusMap.from_machine_config()
+
+        if Acquisition.FOCUS_MAP_SCOPE==FocusMapScope.PLATE:
+            self.navigation.move_z_to(z_mm=self.laserAutofocusController.reference_z_height_mm,wait_for_completion=self.wait_for_completion)
+            with Profiler("measure plate focus map",parent=None,discard_if_parent_none=False) as profiler:
+                prescan_indices=select_prescan_points(
+                    [(float(x),float(y)) for x,y in self.scan_coordinates_mm],
+                    Acquisition.FOCUS_MAP_NUM_PLATE_POINTS,
+                )
+                for index in prescan_indices:
+                    if self.abort_event.is_set():
+                        raise AbortAcquisitionException()
+
+                    x_mm,y_mm=self.scan_coordinates_mm[index]
+                    self.measure_focus_map_points([(float(x_mm),float(y_mm))],well_name=self.scan_coordinates_name[index],profiler=profiler)
+
+    def measure_focus_map_points(self,positions_mm:List[Tuple[float,float]],well_name:str,profiler:Optional[Profiler]=None):
+        """ measure the focus (with the laser autofocus) at each position, add them to the focus map and save it """
+
+        assert not self.focus_map is None
+
+        for x_mm,y_mm in positions_mm:
+            with Profiler("measure focus map point",parent=profiler):
+                self.navigation.move_to_mm(x_mm=x_mm,y_mm=y_mm,wait_for_completion=self.wait_for_completion)
+                # the laser autofocus only covers a limited range, so start at the z predicted from the points measured so far
+                if self.focus_map.is_ready:
+                    self.navigation.move_z_to(z_mm=self.focus_map.predict(x_mm,y_mm),wait_for_completion=self.wait_for_completion)
+                self.laserAutofocusController.move_to_target(0.0)
+                self.focus_map.add_point(FocusMapPoint(x_mm=x_mm,y_mm=y_mm,z_mm=float(self.navigation.z_pos_mm),well_name=well_name),refit=False)
+
+        self.focus_map.fit()
+        self.focus_map.save(self.focus_map_path)
+        MAIN_LOG.log(self.focus_map.as_text())
+
+    def prescan_config(self)->Configuration:
+        """ channel imaged in the prescan, see Acquisition.PRESCAN_CHANNEL """
+
+        if Acquisition.PRESCAN_CHANNEL=="":
+            return self.selected_configurations[0]
+        return self.configuration_manager.config_by_name(Acquisition.PRESCAN_CHANNEL)
+
+    def run_prescan(self):
+        """
+        image every planned site in one channel, and acquire only the sites that contain objects (see Acquisition.PRESCAN and control.core.prescan)
+
+        the sites are focused with the focus map or the laser autofocus (if enabled), the software autofocus is not run in the prescan.
+        """
+
+        if self.resume and os.path.exists(self.prescan_path):
+            prescan=PrescanResult.load(self.prescan_path)
+            MAIN_LOG.log(f"resuming acquisition - loaded {prescan.as_text()}")
+        else:
+            config=self.prescan_config()
+            selector=SiteSelector.from_machine_config()
+            wells=[]
+
+            with Profiler("prescan",parent=None,discard_if_parent_none=False) as profiler:
+                if self.reflection_af_initialized:
+                    self.navigation.move_z_to(z_mm=self.laserAutofocusController.reference_z_height_mm,wait_for_completion=self.wait_for_completion)
+
+                with self.camera.wrapper.ensure_streaming():
+                    for well in self.plan.wells:
+                        if not self.focus_map is None:
+                            self.verify_focus_map_at_next_position=True
+
+                        sites:List[PrescanSite]=[]
+                        for site in well.sites:
+                            if self.abort_event.is_set():
+                                raise AbortAcquisitionException()
+
+                            with Profiler("prescan site",parent=profiler) as prescan_site_profiler:
+                                self.navigation.move_to_mm(x_mm=site.x_mm,y_mm=site.y_mm,wait_for_completion=self.wait_for_completion)
+
+                                if not self.focus_map is None and self.focus_map.is_ready:
+                                    self.move_to_focus_map_z(well_name=well.well_name,profiler=prescan_site_profiler)
+                                elif self.do_reflection_af and self.reflection_af_initialized:
+                                    self.laserAutofocusController.move_to_target(0.0)
+
+                                image=self.liveController.snap(config,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=prescan_site_profiler,cancel_event=self.abort_event)
+                                sites.append(PrescanSite(site=site.site,i=site.i,j=site.j,num_objects=selector.count_objects(image)))
+
+                        well_prescan=selector.select(well.well_name,sites)
+                        wells.append(well_prescan)
+                        MAIN_LOG.log(f"prescan - well {well.well_name}: {len(well_prescan.selected_site_indices)} of {len(sites)} sites selected (objects per site: {[site.num_objects for site in sites]})")
+
+            prescan=PrescanResult(num_x=self.NX,num_y=self.NY,channel_name=config.name,wells=wells)
+            prescan.save(self.prescan_path)
+
+        for well_prescan in prescan.wells:
+            num_skipped_sites=len(self.planned_sites[well_prescan.well_name]-well_prescan.selected_site_indices)
+            self.planned_sites[well_prescan.well_name]&=well_prescan.selected_site_indices
+            self.progress.total_steps-=num_skipped_sites*self.NZ*len(self.selected_configurations)*self.Nt
+
+        MAIN_LOG.log(prescan.as_text())
+
+    def move_to_focus_map_z(self,well_name:str,profiler:Optional[Profiler]=None):
+        """
+        move to the z predicted by the focus map at the current position (approaching from below)
+
+        at the first position in a well, the prediction is checked with a single laser autofocus measurement. if it is off by more than
+        Acquisition.FOCUS_MAP_REFRESH_THRESHOLD_UM, the position is focused with the laser autofocus and added to the map.
+        """
+
+        assert not self.focus_map is None
+
+        x_mm,y_mm=float(self.navigation.x_pos_mm),float(self.navigation.y_pos_mm)
+        with Profiler("move to focus map z",parent=profiler):
+            predicted_z_mm=self.focus_map.predict(x_mm,y_mm)
+            self.navigation.move_z_to(z_mm=predicted_z_mm-self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+            self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+
+        if not self.verify_focus_map_at_next_position:
+            return
+        self.verify_focus_map_at_next_position=False
+
+        with Profiler("verify focus map z",parent=profiler):
+            with self.laserAutofocusController.camera.wrapper.ensure_streaming():
+                displacement_um=self.laserAutofocusController.measure_displacement()
+
+        if not math.isnan(displacement_um) and abs(displacement_um)<=Acquisition.FOCUS_MAP_REFRESH_THRESHOLD_UM:
+            return
+
+        with Profiler("refresh focus map",parent=profiler):
+            self.laserAutofocusController.move_to_target(0.0)
+            measured_z_mm=float(self.navigation.z_pos_mm)
+            MAIN_LOG.log(f"focus map - off by {(measured_z_mm-predicted_z_mm)*1000:.2f}um at ({x_mm:.3f},{y_mm:.3f})mm in well {well_name}, adding the position to the map")
+
+            self.focus_map.num_refreshes+=1
+            self.focus_map.add_point(FocusMapPoint(x_mm=x_mm,y_mm=y_mm,z_mm=measured_z_mm,well_name=well_name))
+            self.focus_map.save(self.focus_map_path)
+
+    def run_adaptive_laser_af(self,profiler:Optional[Profiler]=None):
+        """ focus at the current position with the laser autofocus, unless the adaptive policy is confident enough to skip (or cheapen) the measurement """
+
+        assert not self.laser_af_policy is None
+
+        x_mm,y_mm=float(self.navigation.x_pos_mm),float(self.navigation.y_pos_mm)
+        decision,predicted_z_mm=self.laser_af_policy.decide(x_mm,y_mm)
+
+        if not predicted_z_mm is None:
+            # approach the predicted z from below, which also shortens the laser autofocus if it runs
+            with Profiler("move to predicted z",parent=profiler):
+                self.navigation.move_z_to(z_mm=predicted_z_mm-self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+                self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+
+        if decision==LaserAFDecision.SKIP:
+            with Profiler("laser af skipped",parent=profiler):
+                self.laser_af_policy.record_skip()
+            return
+
+        profiler_name="laser af measured (single image)" if decision==LaserAFDecision.SINGLE_IMAGE else "laser af measured"
+        with Profiler(profiler_name,parent=profiler):
+            MAIN_LOG.log("Laser Reflection Autofocus: started")
+            reached_target=self.laserAutofocusController.move_to_target(0.0,num_images=1 if decision==LaserAFDecision.SINGLE_IMAGE else None)
+            MAIN_LOG.log("Laser Reflection Autofocus: done")
+
+            if reached_target:
+                self.laser_af_policy.record_measurement(x_mm,y_mm,float(self.navigation.z_pos_mm),predicted_z_mm)
+
+    def plan_z_sweeps(self)->Optional[List[ZSweepPlan]]:
+        """ sweep plan for each selected channel (in selected order), or None if the z stack has to be acquired stepwise """
+
+        plans=[]
+        for config in self.selected_configurations:
+            plan=plan_z_sweep(
+                num_planes=self.NZ,
+                plane_spacing_mm=abs(self.microcontroller.ustep_to_mm_z(self.deltaZ_usteps)),
+                exposure_time_ms=config.exposure_time_ms,
+                clear_backlash_mm=self.microcontroller.clear_z_backlash_mm,
+            )
+            if plan is None:
+                if not self.z_sweep_fallback_logged:
+                    MAIN_LOG.log(f"z sweep not possible with {config.exposure_time_ms}ms exposure time in channel {config.name} and {self.deltaZ*1000:.3f}um z step size, acquiring z stacks stepwise")
+                    self.z_sweep_fallback_logged=True
+                return None
+            plans.append(plan)
+
+        return plans
+
+    def image_zstack_sweep(self,
+        sweep_plans:List[ZSweepPlan],
+        x:int,y:int,
+        coordinate_name:str,
+        z_stack_origin_z_mm:float,
+        profiler:Optional[Profiler]=None,
+        well_name:Optional[str]=None,
+        site:int=1,
+    )->List[dict]:
+        """
+        acquire the z stack at the current position with one z sweep per channel (see control.core.z_sweep)
+
+        each image is tagged with the z position interpolated from the position telemetry of the microcontroller at the center of its exposure.
+        """
+
+        image_directory=os.path.join(self.current_path,shard_directory_name(self.directory_sharding,well_name or coordinate_name,site,self.num_shard_buckets))
+        os.makedirs(image_directory,exist_ok=True)
+
+        # nominal plane positions relative to the z stack origin, in the same order as stepwise acquisition
+        base_z_usteps=0
+        if MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM CENTER':
+            base_z_usteps=int(-self.deltaZ_usteps*round((self.NZ-1)/2))
+        plane_z_mm=[self.microcontroller.ustep_to_mm_z(base_z_usteps+k*self.deltaZ_usteps) for k in range(self.NZ)]
+        # the sweep always moves up (the direction z moves approach their target from), so the planes are imaged in ascending order
+        sweep_order=sorted(range(self.NZ),key=lambda k:plane_z_mm[k])
+
+        # measured z (um) of the first imaged channel, for the coordinates file
+        measured_z_um:List[Optional[float]]=[None]*self.NZ
+
+        # position relative to the z stack origin
+        current_z_mm=0.0
+
+        for config_i in self.channel_order:
+            config=self.selected_configurations[config_i]
+            plan=sweep_plans[config_i]
+
+            if self.abort_event.is_set():
+                raise AbortAcquisitionException()
+
+            channel_offset_mm=(config.channel_z_offset or 0.0)/1000
+            lowest_plane_mm=plane_z_mm[sweep_order[0]]+channel_offset_mm
+            sweep_start_mm=lowest_plane_mm-plan.lead_in_distance_mm
+
+            with Profiler(f"sweep {config.name}",parent=profiler) as sweepprof:
+                with Profiler("move to sweep start",parent=sweepprof):
+                    self.navigation.move_z(sweep_start_mm-current_z_mm,wait_for_completion=self.wait_for_completion)
+                    current_z_mm=sweep_start_mm
+
+                    self.liveController.set_microscope_mode(config)
+
+                sweep_start_time=time.monotonic()
+                try:
+                    self.microcontroller.set_max_velocity_acceleration(AXIS.Z,plan.velocity_mm_per_s,plan.acceleration_mm_per_s2)
+                    self.microcontroller.wait_till_operation_is_completed()
+
+                    self.navigation.move_z(plan.total_distance_mm,wait_for_completion=None)
+                    sweep_start_time=time.monotonic()
+                    current_z_mm=sweep_start_mm+plan.total_distance_mm
+
+                    for plane_index,k in enumerate(sweep_order):
+                        # wait until the objective is about to pass the plane
+                        trigger_time=sweep_start_time+plan.trigger_time_s(plane_index)
+                        while (remaining_time_s:=trigger_time-time.monotonic())>0:
+                            if self.abort_event.wait(min(remaining_time_s,0.005)):
+                                raise AbortAcquisitionException()
+
+                        triggered_at=time.monotonic()
+                        if triggered_at-trigger_time>plan.frame_interval_s/2:
+                            MAIN_LOG.log(f"warning - z sweep frame {k} in channel {config.name} triggered {(triggered_at-trigger_time)*1000:.1f}ms late")
+
+                        with Profiler("snap",parent=sweepprof) as snap:
+                            image=self.liveController.snap(config,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=snap,postprocess=not self.pipelined,cancel_event=self.abort_event)
+
+                        # z at the center of the exposure, from telemetry if available, otherwise where the objective should have been
+                        z_usteps=interpolate_position(list(self.microcontroller.z_pos_history),triggered_at+plan.exposure_time_s/2)
+                        if not z_usteps is None:
+                            z_mm=self.microcontroller.ustep_to_mm_z(int(round(z_usteps)))
+                        else:
+                            z_mm=z_stack_origin_z_mm+plane_z_mm[k]+channel_offset_mm+(triggered_at-trigger_time)*plan.velocity_mm_per_s
+
+                        if measured_z_um[k] is None:
+                            measured_z_um[k]=z_mm*1000
+
+                        file_ID=f'{coordinate_name}_z{k}'
+                        saving_path=os.path.join(image_directory, file_ID + '_' + str(config.name).replace(' ','_'))
+                        location=ImageLocation(
+                            well_name=well_name or coordinate_name,
+                            site=site,
+                            x=x,y=y,z=k,
+                            time_point=self.time_point,
+                            channel_name=config.name,
+                            channel_index=config_i,
+                            z_mm=z_mm,
+                        )
+                        self.handle_snapped_image(image,config=config,saving_path=saving_path,profiler=sweepprof,x=x,y=y,z=k,well_name=well_name,location=location)
+
+                        if self.num_positions_per_well>1 and config_i==self.channel_order[0]:
+                            _=next(self.well_tqdm_iter,0)
+
+                finally:
+                    self.wait_for_timed_move(sweep_start_time,plan.duration_s)
+                    self.microcontroller.set_max_velocity_acceleration(AXIS.Z,MACHINE_CONFIG.MAX_VELOCITY_Z_mm,MACHINE_CONFIG.MAX_ACCELERATION_Z_mm)
+                    self.microcontroller.wait_till_operation_is_completed()
+
+        # move back to the z stack origin, approaching from below
+        self.navigation.move_z(-current_z_mm-self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion)
+        self.navigation.move_z(self.microcontroller.clear_z_backlash_mm,wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
+
+        self.signal_register_current_fov.emit(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
+
+        return [
+            {
+                'i':y,'j':x,'k':k,
+                'x (mm)':self.navigation.x_pos_mm,
+                'y (mm)':self.navigation.y_pos_mm,
+                'z (um)':measured_z_um[k],
+            }
+            for k in range(self.NZ)
+        ]
+
+    def grid_site(self,well_name:str,i_actual:int,j:int)->Tuple[int,int,str,bool]:
+        """ x index, site index, coordinate name and whether to image the j-th position (in scan order) of grid row i_actual """
+
+        j_actual = j if self.x_scan_direction==1 else self.NX-1-j
+        site_index = 1 + j_actual + i_actual * self.NX
+        coordinate_name = f'{well_name}_s{site_index}_x{j_actual}_y{i_actual}' # _z{k} added later (if needed)
+
+        do_image_this_position=site_index in self.planned_sites[well_name]
+
+        if do_image_this_position and (well_name,site_index) in self.completed_sites:
+            do_image_this_position=False
+            self.progress.completed_steps+=self.NZ*len(self.selected_configurations)
+
+        return j_actual,site_index,coordinate_name,do_image_this_position
+
+    def abort_grid(self):
+        """ clean up after the acquisition has been aborted while imaging a well, then re-raise """
+
+        if ENABLE_TQDM_STUFF:
+            self.well_tqdm_iter.close()
+
+        self.liveController.turn_off_illumination()
+
+        if self.pipelined:
+            self.wait_for_image_processing()
+
+        self.coordinate_log.flush()
+        self.navigation.enable_joystick_button_action = True
+
+        raise AbortAcquisitionException()
+
+    def plan_continuous_row_scan(self)->Optional[RowScanPlan]:
+        """ plan for imaging each grid row in one continuous move, or None if the fields of view have to be imaged stop-and-go """
+
+        reason=None
+        if len(self.selected_configurations)!=1:
+            reason=f"{len(self.selected_configurations)} channels are selected"
+        elif self.NZ>1:
+            reason="a z stack is acquired"
+        elif self.do_autofocus or self.do_reflection_af:
+            reason="autofocus is enabled"
+        elif self.NX<2:
+            reason="there is only one field of view per row"
+
+        plan=None
+        if reason is None:
+            config=self.selected_configurations[0]
+            plan=plan_row_scan(num_fovs=self.NX,fov_spacing_mm=self.deltaX,exposure_time_ms=config.exposure_time_ms)
+            if plan is None:
+                reason=f"the {config.exposure_time_ms}ms exposure time in channel {config.name} does not allow a faster continuous scan"
+
+        if plan is None:
+            MAIN_LOG.log(f"continuous row scan not possible because {reason}, imaging fields of view stop-and-go")
+        else:
+            MAIN_LOG.log(plan.as_text())
+
+        return plan
+
+    def image_row_here(self,row_sites:List[Tuple[int,int,int,str]],y:int,well_name:str,profiler:Optional[Profiler]=None)->List[dict]:
+        """
+        image the fields of view of the current grid row in one continuous move (see control.core.row_scan), starting at the first position of the row (in scan order)
+
+        row_sites contains (index in scan order, x index, site index, coordinate name) of the fields of view to image. the stage ends up at the last position of the row.
+        """
+
+        plan=self.row_scan_plan
+        assert not plan is None
+        config=self.selected_configurations[0]
+        direction=self.x_scan_direction
+
+        row_start_x_mm=self.navigation.x_pos_mm
+        sites_by_fov_index={row_site[0]:row_site for row_site in row_sites}
+        ret_coords:List[dict]=[]
+
+        def on_trigger(fov_index:int,triggered_at:float):
+            _,x,site_index,coordinate_name=sites_by_fov_index[fov_index]
+
+            with Profiler("read frame",parent=profiler):
+                image=self.camera.read_frame()
+            if not self.pipelined:
+                image=self.liveController.postprocess_snap(image,crop=True,override_crop_height=self.crop_height,override_crop_width=self.crop_width,profiler=profiler)
+
+            # x at the center of the exposure, from telemetry if available, otherwise where the stage should have been
+            x_usteps=interpolate_position(list(self.microcontroller.x_pos_history),triggered_at+plan.exposure_time_s/2)
+            if not x_usteps is None:
+                x_mm=self.microcontroller.ustep_to_mm_x(int(round(x_usteps)))
+            else:
+                x_mm=row_start_x_mm+direction*fov_index*plan.fov_spacing_mm
+
+            image_directory=os.path.join(self.current_path,shard_directory_name(self.directory_sharding,well_name,site_index,self.num_shard_buckets))
+            os.makedirs(image_directory,exist_ok=True)
+            saving_path=os.path.join(image_directory,coordinate_name+'_'+str(config.name).replace(' ','_'))
+            location=ImageLocation(
+                well_name=well_name,
+                site=site_index,
+                x=x,y=y,z=0,
+                time_point=self.time_point,
+                channel_name=config.name,
+                channel_index=0,
+            )
+            self.handle_snapped_image(image,config=config,saving_path=saving_path,profiler=profiler,x=x,y=y,z=0,well_name=well_name,location=location)
+
+            ret_coords.append({
+                'i':y,'j':x,'k':0,
+                'x (mm)':x_mm,
+                'y (mm)':self.navigation.y_pos_mm,
+                'z (um)':self.navigation.z_pos_mm*1000,
+            })
+
+            if self.num_positions_per_well>1:
+                _=next(self.well_tqdm_iter,0)
+
+        channel_offset_mm=(config.channel_z_offset or 0.0)/1000
+
+        with self.camera.wrapper.ensure_streaming():
+            with Profiler("prepare row scan",parent=profiler):
+                if abs(channel_offset_mm)*1000>MACHINE_CONFIG.LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM:
+                    self.navigation.move_z(channel_offset_mm,wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
+
+                # start one ramp distance before the first field of view, so that the stage is at scan velocity when it gets there
+                self.navigation.move_x(-direction*plan.ramp_distance_mm,wait_for_completion=self.wait_for_completion)
+
+                self.liveController.set_microscope_mode(config)
+                previous_trigger_mode=self.liveController.get_trigger_mode()
+                self.liveController.set_trigger_mode(TriggerMode.HARDWARE)
+
+            try:
+                completed=execute_row_scan(
+                    plan=plan,
+                    microcontroller=self.microcontroller,
+                    direction=direction,
+                    fov_indices=[row_site[0] for row_site in row_sites],
+                    on_trigger=on_trigger,
+                    abort_requested=self.abort_event.is_set,
+                )
+            finally:
+                self.liveController.set_trigger_mode(previous_trigger_mode)
+
+        # move back from the end of the ramp to the last field of view of the row
+        self.navigation.move_x(-direction*plan.ramp_distance_mm,wait_for_completion={})
+        if abs(channel_offset_mm)*1000>MACHINE_CONFIG.LASER_AUTOFOCUS_TARGET_MOVE_THRESHOLD_UM:
+            self.navigation.move_z(-channel_offset_mm,wait_for_completion={})
+
+        self.signal_register_current_fov.emit(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
+
+        if not completed:
+            raise AbortAcquisitionException()
+
+        return ret_coords
+
     @TypecheckFunction
-    def image_grid_here(self,coordinates_pd:pd.DataFrame,well_name:str,profiler:Optional[Profiler]=None)->pd.DataFrame:
-        """ image xyz grid starting at current position """
+    def image_grid_here(self,well_name:str,profiler:Optional[Profiler]=None):
+        """ image xyz grid starting at current position, and log the positions to the coordinate log """
 
         if self.num_positions_per_well>1:
             # show progress when iterating over all well positions (do not differentiatte between xyz in this progress bar, it's too quick for that)
             well_tqdm=tqdm(range(self.num_positions_per_well),desc="pos in well", unit="pos",leave=False)
             self.well_tqdm_iter=iter(well_tqdm)
 
+        if not self.object_counter is None:
+            self.image_sites_center_out(well_name=well_name,profiler=profiler)
+            return
+
         leftover_x_mm=0.0
         leftover_y_mm=0.0
 
@@ -391,63 +1256,94 @@ class MultiPointWorker(QObject):
 
             self.FOV_counter = 0 # so that Autofocus at the beginning of each new row
 
-            # along x
-            for j in range(self.NX):
-
-                j_actual = j if self.x_scan_direction==1 else self.NX-1-j
-                site_index = 1 + j_actual + i * self.NX
-                coordinate_name = f'{well_name}_s{site_index}_x{j_actual}_y{i}' # _z{k} added later (if needed)
-
-                do_image_this_position=True
+            # rows are scanned bottom to top if the well is entered at a bottom corner
+            i_actual = i if self.y_scan_direction==1 else self.NY-1-i
 
-                if not self.grid_mask is None:
-                    do_image_this_position=self.grid_mask[i][j_actual]
+            if not self.row_scan_plan is None:
+                # fields of view to image in this row, as (index in scan order, x index, site index, coordinate name)
+                row_sites:List[Tuple[int,int,int,str]]=[]
+                for j in range(self.NX):
+                    j_actual,site_index,coordinate_name,do_image_this_position=self.grid_site(well_name,i_actual,j)
+                    if do_image_this_position:
+                        row_sites.append((j,j_actual,site_index,coordinate_name))
 
-                if do_image_this_position:
+                if len(row_sites)>0:
                     with Profiler("move to target location",parent=profiler) as movetotargetposition:
                         self.navigation.move_by_mm(
-                            x_mm=leftover_x_mm if numpy.abs(leftover_x_mm)>1e-5 else None, # only move if moving distance is larger than zero (larger than <zero plus a small value to account for floating-point errors>)
-                            y_mm=leftover_y_mm if numpy.abs(leftover_y_mm)>1e-5 else None, # only move if moving distance is larger than zero (larger than <zero plus a small value to account for floating-point errors>)
-                            wait_for_completion={}
-                        )#,wait_for_stabilization=True)
+                            x_mm=leftover_x_mm if numpy.abs(leftover_x_mm)>1e-5 else None,
+                            y_mm=leftover_y_mm if numpy.abs(leftover_y_mm)>1e-5 else None,
+                            wait_for_completion=self.wait_for_completion
+                        )
                         leftover_y_mm=0.0
                         leftover_x_mm=0.0
 
                     try:
-                        with Profiler("image z stack",parent=profiler) as imagezstack:
-                            # update coordinates before imaging starts, because signal will be emitted for every image recorded, i.e. images would be recorded then signal with outdated position emitted
+                        with Profiler("image row (continuous)",parent=profiler) as imagerow:
                             self.progress.last_imaged_coordinates=(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
-                            imaged_coords_dict_list=self.image_zstack_here(
-                                x=j,y=i,
-                                coordinate_name=coordinate_name,
-                                profiler=imagezstack,
-                                well_name=well_name,
-                            )
-
-                        with Profiler("concat pd",parent=profiler) as concat_pd:
-                            coordinates_pd = pd.concat([
-                                coordinates_pd,
-                                pd.DataFrame(imaged_coords_dict_list)
-                            ])
+                            imaged_coords_dict_list=self.image_row_here(row_sites,y=i_actual,well_name=well_name,profiler=imagerow)
 
-                    except AbortAcquisitionException:
-                        if ENABLE_TQDM_STUFF:
-                            self.well_tqdm_iter.close()
+                        with Profiler("log coordinates",parent=profiler):
+                            self.coordinate_log.append(imaged_coords_dict_list)
 
-                        self.liveController.turn_off_illumination()
+                        with Profiler("check storage projection",parent=profiler):
+                            self.check_storage_projection()
 
-                        coordinates_pd.to_csv(os.path.join(self.current_path,'coordinates.csv'),index=False,header=True)
-                        self.navigation.enable_joystick_button_action = True
+                    except AbortAcquisitionException:
+                        self.abort_grid()
 
-                        raise AbortAcquisitionException()
+                else:
+                    leftover_x_mm+=self.x_scan_direction*self.deltaX*(self.NX-1)
 
-                self.progress.last_completed_action="image x step in well"
-                self.signal_new_acquisition.emit(self.progress)
+                self.progress.last_completed_action="image row in well"
+                self.signal_new_acquisition.emit(copy.copy(self.progress))
 
-                if self.NX > 1:
-                    # move x
-                    if j < self.NX - 1:
-                        leftover_x_mm+=self.x_scan_direction*self.deltaX
+            else:
+                # along x
+                for j in range(self.NX):
+
+                    j_actual,site_index,coordinate_name,do_image_this_position=self.grid_site(well_name,i_actual,j)
+
+                    if do_image_this_position:
+                        with Profiler("move to target location",parent=profiler) as movetotargetposition:
+                            move_start_time=time.monotonic()
+                            self.navigation.move_by_mm(
+                                x_mm=leftover_x_mm if numpy.abs(leftover_x_mm)>1e-5 else None, # only move if moving distance is larger than zero (larger than <zero plus a small value to account for floating-point errors>)
+                                y_mm=leftover_y_mm if numpy.abs(leftover_y_mm)>1e-5 else None, # only move if moving distance is larger than zero (larger than <zero plus a small value to account for floating-point errors>)
+                                wait_for_completion=self.wait_for_completion
+                            )#,wait_for_stabilization=True)
+                            if numpy.abs(leftover_x_mm)>1e-5 or numpy.abs(leftover_y_mm)>1e-5:
+                                self.measured_latencies.record(MeasuredLatency.STAGE_MOVE_OVERHEAD,time.monotonic()-move_start_time-self.cost_model.stage.move_time_s(leftover_x_mm,leftover_y_mm))
+                            leftover_y_mm=0.0
+                            leftover_x_mm=0.0
+
+                        try:
+                            with Profiler("image z stack",parent=profiler) as imagezstack:
+                                # update coordinates before imaging starts, because signal will be emitted for every image recorded, i.e. images would be recorded then signal with outdated position emitted
+                                self.progress.last_imaged_coordinates=(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
+                                imaged_coords_dict_list=self.image_zstack_here(
+                                    x=j_actual,y=i_actual,
+                                    coordinate_name=coordinate_name,
+                                    profiler=imagezstack,
+                                    well_name=well_name,
+                                    site=site_index,
+                                )
+
+                            with Profiler("log coordinates",parent=profiler):
+                                self.coordinate_log.append(imaged_coords_dict_list)
+
+                            with Profiler("check storage projection",parent=profiler):
+                                self.check_storage_projection()
+
+                        except AbortAcquisitionException:
+                            self.abort_grid()
+
+                    self.progress.last_completed_action="image x step in well"
+                    self.signal_new_acquisition.emit(copy.copy(self.progress))
+
+                    if self.NX > 1:
+                        # move x
+                        if j < self.NX - 1:
+                            leftover_x_mm+=self.x_scan_direction*self.deltaX
 
             # move along rows in alternating directions (instead of always starting on left side of row)
             self.x_scan_direction = -self.x_scan_direction
@@ -455,22 +1351,225 @@ class MultiPointWorker(QObject):
             if self.NY > 1:
                 # move y
                 if i < self.NY - 1:
-                    leftover_y_mm+=self.deltaY
+                    leftover_y_mm+=self.y_scan_direction*self.deltaY
 
             self.progress.last_completed_action="image y step in well"
-            self.signal_new_acquisition.emit(self.progress)
+            self.signal_new_acquisition.emit(copy.copy(self.progress))
 
         # exhaust tqdm iterator
         if self.num_positions_per_well>1:
             _=next(self.well_tqdm_iter,0)
 
-        return coordinates_pd
+    def begin_time_point(self,time_point:int)->TimePointOutput:
+        """ create the output directory and the coordinate log of the time point (see select_time_point) """
+
+        if self.Nt > 1:
+            # for each time point, create a new folder
+            path=str(Path(self.image_output_path)/f"t{time_point:02}")
+            os.makedirs(path,exist_ok=self.resume)
+        else:
+            # only one time point, save it directly in the experiment folder
+            path=str(self.image_output_path)
+
+        coordinates_path=os.path.join(path,COORDINATE_LOG_FILE_NAME)
+
+        completed_sites:Set[Tuple[str,int]]=set()
+        if self.resume:
+            completed_sites=self.image_saver.manifest.completed_sites(
+                time_point=time_point,
+                num_images_per_site=self.NZ*len(self.selected_configurations),
+                num_images_per_z_plane=len(self.selected_configurations),
+            )
+            MAIN_LOG.log(f"resuming acquisition - {len(completed_sites)} sites have already been imaged in time point {time_point}")
+
+            # keep the coordinates of the sites that have already been imaged
+            # (the file may already have been moved out of the staging directory)
+            migrated_coordinates_path=os.path.join(path.replace(self.image_output_path,self.output_path,1),COORDINATE_LOG_FILE_NAME)
+            if not os.path.exists(coordinates_path) and os.path.exists(migrated_coordinates_path):
+                shutil.copyfile(migrated_coordinates_path,coordinates_path)
+
+        # positions are logged as they are imaged (closed in end_time_point, or in run if the acquisition is interrupted)
+        time_point_output=TimePointOutput(
+            path=path,
+            coordinate_log=CoordinateLog(coordinates_path,append=self.resume),
+            completed_sites=completed_sites,
+        )
+        self.time_point_outputs[time_point]=time_point_output
+        return time_point_output
+
+    def select_time_point(self,time_point:int):
+        """ write the images and positions of the wells imaged next into this time point (which must have been begun) """
+
+        time_point_output=self.time_point_outputs[time_point]
+        self.time_point=time_point
+        self.current_path=time_point_output.path
+        self.coordinate_log=time_point_output.coordinate_log
+        self.completed_sites=time_point_output.completed_sites
+
+    def end_time_point(self,time_point:int):
+        self.time_point_outputs.pop(time_point).coordinate_log.close()
+
+    def image_well(self,coordinate_id:int,profiler:Optional[Profiler]=None):
+        """ image all sites of a well in the current time point """
+
+        coordinate_mm = self.scan_coordinates_mm[coordinate_id]
+        well_name = self.scan_coordinates_name[coordinate_id]
+
+        if len(self.planned_sites[well_name])==0:
+            MAIN_LOG.log(f"skipping well {well_name}, no site has been selected for acquisition")
+            return
+
+        if self.resume and self.all_sites_completed(well_name):
+            MAIN_LOG.log(f"resuming acquisition - skipping well {well_name}, it has already been imaged")
+            return
+
+        self.num_positions_per_well=len(self.planned_sites[well_name])*self.NZ
+
+        # start at the corner of the grid the well is entered at
+        start_x_scan_direction,self.y_scan_direction=self.well_scan_directions[coordinate_id]
+        base_x=coordinate_mm[0]-start_x_scan_direction*self.deltaX*(self.NX-1)/2
+        base_y=coordinate_mm[1]-self.y_scan_direction*self.deltaY*(self.NY-1)/2
+
+        with Profiler("move_to_well",parent=profiler) as move_to_well_profiler:
+            # this function handles avoiding invalid physical positions etc.
+            self.navigation.move_to_mm(x_mm=base_x,y_mm=base_y,wait_for_completion=self.wait_for_completion)
+
+        self.finish_unfinished_well(profiler=profiler)
+
+        if not self.focus_map is None:
+            if Acquisition.FOCUS_MAP_SCOPE==FocusMapScope.WELL and not self.focus_map.has_points_in_well(well_name):
+                with Profiler("measure well focus map",parent=profiler) as measure_well_focus_map_profiler:
+                    grid_width_mm=self.deltaX*(self.NX-1)
+                    grid_height_mm=self.deltaY*(self.NY-1)
+                    self.measure_focus_map_points(well_prescan_points((float(coordinate_mm[0]),float(coordinate_mm[1])),grid_width_mm,grid_height_mm),well_name=well_name,profiler=measure_well_focus_map_profiler)
+                    self.navigation.move_to_mm(x_mm=base_x,y_mm=base_y,wait_for_completion=self.wait_for_completion)
+
+            # the map may have changed since this well was last imaged (e.g. in the previous time point)
+            self.verify_focus_map_at_next_position=True
+
+        if not self.laser_af_policy is None:
+            self.laser_af_policy.start_well(well_name)
+
+        self.x_scan_direction = start_x_scan_direction # will be flipped between {-1, 1} to alternate movement direction in rows within the same well (instead of moving to same edge of row and wasting time by doing so)
+        self.on_abort_dx_usteps = 0
+        self.on_abort_dy_usteps = 0
+        self.on_abort_dz_usteps = 0
+
+        # z stacking config
+        if MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM TOP':
+            self.deltaZ_usteps = -abs(self.deltaZ_usteps)
+
+        with Profiler("image_grid_here",parent=profiler) as image_grid_here_profiler:
+            self.image_grid_here(well_name=well_name,profiler=image_grid_here_profiler)
+
+        if self.pipelined:
+            # the last images of the well are still being processed, finish the well after the stage has moved on
+            self.unfinished_well=(well_name,self.current_path)
+        else:
+            self.finish_well(well_name)
+
+        if len(self.scan_coordinates_name) == 1:
+            # only move to the start position if there's only one region in the scan
+            if self.NY > 1:
+                # move y back
+                self.navigation.move_y_usteps(-self.y_scan_direction*self.deltaY_usteps*(self.NY-1),wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
+                self.on_abort_dy_usteps = self.on_abort_dy_usteps - self.y_scan_direction*self.deltaY_usteps*(self.NY-1)
+
+            # move x back at the end of the scan (if the last row ended on the other side of the grid)
+            if self.x_scan_direction != start_x_scan_direction:
+                self.navigation.move_x_usteps(-start_x_scan_direction*self.deltaX_usteps*(self.NX-1),wait_for_completion=self.wait_for_completion,wait_for_stabilization=True)
+
+            # move z back
+            self.navigation.microcontroller.move_z_to_usteps(self.z_usteps_before_time_point)
+            self.navigation.microcontroller.wait_till_operation_is_completed(**self.wait_for_completion)
+
+    def image_sites_center_out(self,well_name:str,profiler:Optional[Profiler]=None):
+        """
+        image the sites of the well from the centre of the grid outwards, until the target number of objects has been counted in the well (see Acquisition.WELL_TARGET_NUM_OBJECTS)
+
+        the remaining sites are skipped, and logged as skipped to the coordinate log.
+        """
+
+        assert not self.object_counter is None
+
+        planned_well=[well for well in self.plan.wells if well.well_name==well_name][0]
+        sites=[
+            site for site in center_out_order(planned_well.sites,num_x=self.NX,num_y=self.NY,delta_x_mm=float(self.deltaX),delta_y_mm=float(self.deltaY))
+            if site.site in self.planned_sites[well_name]
+        ]
+
+        # the stage is at the corner of the grid the well is entered at (see image_well)
+        start_x_scan_direction=self.x_scan_direction
+        current_i=0 if self.y_scan_direction==1 else self.NY-1
+        current_j=0 if self.x_scan_direction==1 else self.NX-1
+
+        num_imaged_sites=0
+        for site_order_index,site in enumerate(sites):
+            if (well_name,site.site) in self.completed_sites:
+                self.progress.completed_steps+=self.NZ*len(self.selected_configurations)
+                continue
+
+            if self.object_counter.target_reached(self.time_point,well_name):
+                skipped_sites=[skipped_site for skipped_site in sites[site_order_index:] if not (well_name,skipped_site.site) in self.completed_sites]
+                MAIN_LOG.log(f"well {well_name}: {self.object_counter.num_objects(self.time_point,well_name)} objects counted after {num_imaged_sites} sites, skipping the remaining {len(skipped_sites)} sites")
+
+                self.coordinate_log.append([
+                    {'i':skipped_site.i,'j':skipped_site.j,'x (mm)':skipped_site.x_mm,'y (mm)':skipped_site.y_mm,'skipped':'target object count reached'}
+                    for skipped_site in skipped_sites
+                ])
+                self.progress.completed_steps+=len(skipped_sites)*self.NZ*len(self.selected_configurations)
+                break
+
+            with Profiler("move to target location",parent=profiler):
+                self.navigation.move_by_mm(
+                    x_mm=(site.j-current_j)*self.deltaX if site.j!=current_j else None,
+                    y_mm=(site.i-current_i)*self.deltaY if site.i!=current_i else None,
+                    wait_for_completion=self.wait_for_completion
+                )
+                current_i,current_j=site.i,site.j
+
+            try:
+                with Profiler("image z stack",parent=profiler) as imagezstack:
+                    self.progress.last_imaged_coordinates=(self.navigation.x_pos_mm,self.navigation.y_pos_mm)
+                    imaged_coords_dict_list=self.image_zstack_here(
+                        x=site.j,y=site.i,
+                        coordinate_name=f'{well_name}_s{site.site}_x{site.j}_y{site.i}',
+                        profiler=imagezstack,
+                        well_name=well_name,
+                        site=site.site,
+                    )
+
+                with Profiler("log coordinates",parent=profiler):
+                    self.coordinate_log.append(imaged_coords_dict_list)
+
+                with Profiler("check storage projection",parent=profiler):
+                    self.check_storage_projection()
+
+            except AbortAcquisitionException:
+                self.abort_grid()
+
+            num_imaged_sites+=1
+
+            self.progress.last_completed_action="image site in well"
+            self.signal_new_acquisition.emit(copy.copy(self.progress))
+
+        if len(self.scan_coordinates_name)==1:
+            # end where the row by row scan ends, image_well moves back to the start of the grid from there
+            end_i=self.NY-1 if self.y_scan_direction==1 else 0
+            last_row_x_scan_direction=start_x_scan_direction*(-1)**(self.NY-1)
+            end_j=self.NX-1 if last_row_x_scan_direction==1 else 0
+            self.navigation.move_by_mm(
+                x_mm=(end_j-current_j)*self.deltaX if end_j!=current_j else None,
+                y_mm=(end_i-current_i)*self.deltaY if end_i!=current_i else None,
+                wait_for_completion=self.wait_for_completion
+            )
+            self.x_scan_direction=-last_row_x_scan_direction
 
     def run_single_time_point(self):
         with Profiler("run_single_time_point",parent=None,discard_if_parent_none=False) as profiler:
             if self.reflection_af_initialized:
                 MAIN_LOG.log(f"moving to z reference at {self.laserAutofocusController.reference_z_height_mm:.3f}mm")
-                self.laserAutofocusController.navigation.move_z_to(z_mm=self.laserAutofocusController.reference_z_height_mm,wait_for_completion={})
+                self.laserAutofocusController.navigation.move_z_to(z_mm=self.laserAutofocusController.reference_z_height_mm,wait_for_completion=self.wait_for_completion)
                 MAIN_LOG.log(f"moving to z reference done")
 
             with self.camera.wrapper.ensure_streaming(), self.autofocusController.camera.wrapper.ensure_streaming():
@@ -481,68 +1580,96 @@ class MultiPointWorker(QObject):
 
                 MAIN_LOG.log(f"multipoint acquisition - time point {self.time_point} at {create_current_timestamp()}")
 
-                if self.Nt > 1:
-                    # for each time point, create a new folder
-                    time_point_str=f"t{self.time_point:02}"
-                    current_path = str(Path(self.output_path)/time_point_str)
-                    self.current_path=current_path
-                    os.mkdir(current_path)
-                else:
-                    # only one time point, save it directly in the experiment folder
-                    self.current_path=str(self.output_path)
-
-                # create a dataframe to save coordinates
-                coordinates_pd = pd.DataFrame(columns = ['i', 'j', 'k', 'x (mm)', 'y (mm)', 'z (um)'])
+                self.begin_time_point(self.time_point)
+                self.select_time_point(self.time_point)
 
-                if not self.grid_mask is None:
-                    self.num_positions_per_well=numpy.sum(self.grid_mask)*self.NZ
-                else:
-                    self.num_positions_per_well=self.NX*self.NY*self.NZ
-
-                z_usteps_before_current_position_acquisition=self.navigation.z_pos_usteps
+                self.z_usteps_before_time_point=self.navigation.z_pos_usteps
 
                 # each region is a well
                 n_regions = len(self.scan_coordinates_name)
                 for coordinate_id in range(n_regions) if n_regions==1 else tqdm(range(n_regions),desc="well on plate",unit="well"):
-                    coordinate_mm = self.scan_coordinates_mm[coordinate_id]
-                    well_name = self.scan_coordinates_name[coordinate_id]
-
-                    base_x=coordinate_mm[0]-self.deltaX*(self.NX-1)/2
-                    base_y=coordinate_mm[1]-self.deltaY*(self.NY-1)/2
+                    self.image_well(coordinate_id,profiler=profiler)
 
-                    with Profiler("move_to_well",parent=profiler) as move_to_well_profiler:
-                        # this function handles avoiding invalid physical positions etc.
-                        self.navigation.move_to_mm(x_mm=base_x,y_mm=base_y,wait_for_completion={})
+                self.finish_unfinished_well(profiler=profiler)
 
-                    self.x_scan_direction = 1 # will be flipped between {-1, 1} to alternate movement direction in rows within the same well (instead of moving to same edge of row and wasting time by doing so)
-                    self.on_abort_dx_usteps = 0
-                    self.on_abort_dy_usteps = 0
-                    self.on_abort_dz_usteps = 0
+                self.end_time_point(self.time_point)
+                self.navigation.enable_joystick_button_action = True
 
-                    # z stacking config
-                    if MACHINE_CONFIG.Z_STACKING_CONFIG == 'FROM TOP':
-                        self.deltaZ_usteps = -abs(self.deltaZ_usteps)
+    def run_scheduled(self):
+        """
+        image all time points, visiting each well when it is due instead of imaging all wells per time point (see Acquisition.TIMELAPSE_SCHEDULING)
 
-                    with Profiler("image_grid_here",parent=profiler) as image_grid_here_profiler:
-                        coordinates_pd=self.image_grid_here(coordinates_pd=coordinates_pd,well_name=well_name,profiler=image_grid_here_profiler)
+        the n-th visit of a well is due at the start of the acquisition plus n times its interval (PlannedWell.time_point_interval_s, or the interval of the acquisition),
+        and the due well with the earliest deadline is imaged next (see control.core.timelapse_scheduler).
+        """
 
-                    if n_regions == 1:
-                        # only move to the start position if there's only one region in the scan
-                        if self.NY > 1:
-                            # move y back
-                            self.navigation.move_y_usteps(-self.deltaY_usteps*(self.NY-1),wait_for_completion={},wait_for_stabilization=True)
-                            self.on_abort_dy_usteps = self.on_abort_dy_usteps - self.deltaY_usteps*(self.NY-1)
+        regions:List[ScheduledRegion]=[]
+        for well_index,well in enumerate(self.plan.wells):
+            period_s=float(well.time_point_interval_s if not well.time_point_interval_s is None else self.dt)
+            regions.append(ScheduledRegion(
+                name=well.well_name,
+                index=well_index,
+                period_s=period_s,
+                num_visits=self.Nt,
+                group=f"interval {period_s:g}s",
+            ))
 
-                        # move x back at the end of the scan
-                        if self.x_scan_direction == -1:
-                            self.navigation.move_x_usteps(-self.deltaX_usteps*(self.NX-1),wait_for_completion={},wait_for_stabilization=True)
+        scheduler=TimelapseScheduler(regions,start_time=self.timestamp_acquisition_started)
 
-                        # move z back
-                        self.navigation.microcontroller.move_z_to_usteps(z_usteps_before_current_position_acquisition)
-                        self.navigation.microcontroller.wait_till_operation_is_completed()
+        try:
+            with Profiler("run_scheduled",parent=None,discard_if_parent_none=False) as profiler:
+                if self.reflection_af_initialized:
+                    MAIN_LOG.log(f"moving to z reference at {self.laserAutofocusController.reference_z_height_mm:.3f}mm")
+                    self.laserAutofocusController.navigation.move_z_to(z_mm=self.laserAutofocusController.reference_z_height_mm,wait_for_completion=self.wait_for_completion)
+                    MAIN_LOG.log(f"moving to z reference done")
+
+                with self.camera.wrapper.ensure_streaming(), self.autofocusController.camera.wrapper.ensure_streaming():
+                    # disable joystick button action
+                    self.navigation.enable_joystick_button_action = False
+
+                    self.FOV_counter = 0
+                    self.z_usteps_before_time_point=self.navigation.z_pos_usteps
+
+                    while not scheduler.done:
+                        visit=scheduler.next_visit(time.time())
+                        if visit is None:
+                            # no well is due yet, finish the last one while waiting
+                            self.finish_unfinished_well(profiler=profiler)
+
+                            next_release_time=scheduler.next_release_time()
+                            MAIN_LOG.log(f"waiting for next well in {next_release_time-time.time():.3f}s")
+                            self.wait_until(next_release_time)
+                            continue
+
+                        if not visit.visit_index in self.time_point_outputs:
+                            MAIN_LOG.log(f"time-point {visit.visit_index}: starting at {create_current_timestamp()}")
+                            self.begin_time_point(visit.visit_index)
+                        self.select_time_point(visit.visit_index)
+
+                        scheduler.begin_visit(visit,time.time())
+                        self.image_well(visit.region.index,profiler=profiler)
+
+                        if self.abort_event.is_set():
+                            raise AbortAcquisitionException()
 
-                coordinates_pd.to_csv(os.path.join(self.current_path,'coordinates.csv'),index=False,header=True)
-                self.navigation.enable_joystick_button_action = True
+                        if scheduler.end_visit(visit,time.time())==0:
+                            # last well of the time point
+                            self.finish_unfinished_well(profiler=profiler)
+                            self.end_time_point(visit.visit_index)
+                            MAIN_LOG.log(f"time-point {visit.visit_index}: done")
+                            if not self.laser_af_policy is None:
+                                MAIN_LOG.log(self.laser_af_policy.as_text())
+
+                    self.finish_unfinished_well(profiler=profiler)
+                    self.navigation.enable_joystick_button_action = True
+
+        finally:
+            report=scheduler.report()
+            MAIN_LOG.log(report.as_text())
+            try:
+                report.save(os.path.join(self.output_path,TIMELAPSE_SCHEDULE_FILE_NAME))
+            except OSError as e:
+                MAIN_LOG.log(f"warning - could not save time-lapse schedule report: {e}")
 
 class MultiPointController(QObject):
 
@@ -592,18 +1719,44 @@ class MultiPointController(QObject):
         
         self.counter:int = 0
         self.output_path: Optional[str] = None
+        self.staging_path: Optional[str] = None
+        self.directory_sharding:DirectorySharding = Acquisition.DIRECTORY_SHARDING
         self.selected_configurations = []
-        self.thread:Optional[QThread]=None
+        self.worker_thread:Optional[QThread]=None
+        """ thread the multipoint worker runs on (not to be confused with QObject.thread, the thread the controller lives on) """
         self.parent = parent
 
         self.plate_type:Optional[str]=None
+        self.resume:bool=False
+        self.plan:Optional[AcquisitionPlan]=None
+
+        # set from any thread to abort the acquisition (see request_abort_aquisition)
+        self.abort_event=threading.Event()
+        self.abort_requested_time:Optional[float]=None
+
+        # callback of the running acquisition, called on the thread the controller lives on
+        self.on_new_acquisition:Optional[Callable[[AcqusitionProgress],None]]=None
+        # consumers of the acquired images. the image_return callback of an acquisition is added as consumer on the thread the
+        # controller lives on (see run_experiment), other consumers (e.g. analyses) can be added for all acquisitions.
+        self.image_dispatcher:ImageDispatcher=ImageDispatcher()
 
         # set some default values to avoid introducing new attributes outside constructor
-        self.abort_acqusition_requested = False
         self.configuration_before_running_multipoint:Optional[Configuration] = None
         self.liveController_was_live_before_multipoint = False
         self.camera_callback_was_enabled_before_multipoint = False
 
+    @property
+    def abort_acqusition_requested(self)->bool:
+        return self.abort_event.is_set()
+
+    @abort_acqusition_requested.setter
+    def abort_acqusition_requested(self,requested:bool):
+        if requested:
+            self.request_abort_aquisition()
+        else:
+            self.abort_event.clear()
+            self.abort_requested_time=None
+
     @property
     def autofocus_channel_name(self)->str:
         return MACHINE_CONFIG.MUTABLE_STATE.MULTIPOINT_AUTOFOCUS_CHANNEL
@@ -670,32 +1823,50 @@ class MultiPointController(QObject):
         
     @TypecheckFunction
     def run_experiment(self,
-        well_selection:Tuple[List[str],List[Tuple[float,float]]],
+        plan:AcquisitionPlan,
         on_new_acquisition:Optional[Callable[[AcqusitionProgress],None]],
-        plate_type:str,
 
-        grid_mask:Optional[Any]=None,
         image_return:Optional[Any]=None,
+        resume:bool=False,
     )->Optional[QThread]:
-        while not self.thread is None:
-            time.sleep(0.05)
-            self.thread.quit() # this should result in the self.thread.finished signal being sent, which calls self.on_thread_finished, which sets self.thread=None
-
-        image_positions=well_selection
-
-        num_wells=len(image_positions[0])
-        if grid_mask is None:
-            num_images_per_well=self.NX*self.NY*self.NZ*self.Nt
-        else:
-            num_images_per_well=numpy.sum(grid_mask)*self.NZ*self.Nt
+        """
+        run acquisition
+
+        the wells (in the order they are visited, and the corner each is entered at) and the sites imaged in each well are taken from the plan (see AcquisitionConfig.compile_plan).
+
+        if resume is True, the acquisition continues an interrupted acquisition into the same output path. sites that are recorded as completely imaged
+        in the manifest of that acquisition are skipped.
+        """
+        if not self.worker_thread is None:
+            # wait for the previous acquisition, its finished signal may not have been delivered yet
+            self.worker_thread.wait()
+            self.on_thread_finished()
+
+        self.set_NX(plan.num_x)
+        self.set_NY(plan.num_y)
+        self.set_NZ(plan.num_z)
+        self.set_Nt(plan.num_time_points)
+        self.set_deltaX(plan.delta_x_mm)
+        self.set_deltaY(plan.delta_y_mm)
+        self.set_deltaZ(plan.delta_z_mm)
+        self.set_deltat(plan.time_point_interval_s)
+
+        num_wells=len(plan.wells)
+        num_images_per_well=plan.num_sites*self.NZ*self.Nt/max(num_wells,1)
         num_channels=len(self.selected_configurations)
 
         self.abort_acqusition_requested = False
+        self.on_new_acquisition=on_new_acquisition
+        if not image_return is None:
+            self.image_dispatcher.add_consumer(ImageConsumer(name=IMAGE_RETURN_CONSUMER_NAME,callback=image_return,policy=Acquisition.IMAGE_RETURN_POLICY,qt_thread=self.thread()))
+        else:
+            self.image_dispatcher.remove_consumer(IMAGE_RETURN_CONSUMER_NAME)
         self.liveController_was_live_before_multipoint = False
         self.camera_callback_was_enabled_before_multipoint = False
         self.configuration_before_running_multipoint = self.liveController.currentConfiguration
-        self.grid_mask=grid_mask
-        self.plate_type=plate_type
+        self.plan=plan
+        self.plate_type=plan.plate_type
+        self.resume=resume
 
         if num_wells==0:
             warning_text="No wells have been selected, so nothing to acquire. Consider selecting some wells before starting the multi point acquisition."
@@ -707,58 +1878,73 @@ class MultiPointController(QObject):
             warning_text="Somehow no images would be acquired if acquisition were to start. Maybe all positions were de-selected in the grid mask?"
             raise ValueError(warning_text)
         else:
-            total_num_acquisitions=int(num_wells*num_images_per_well*num_channels)
-            msg=f"starting multipoint with {num_wells} wells, {num_images_per_well} images per well, {num_channels} channels, total={total_num_acquisitions} images (AF is {'on' if self.do_autofocus or self.do_reflection_af else 'off'})"
+            total_num_acquisitions=int(plan.num_sites*self.NZ*self.Nt*num_channels)
+            msg=f"starting multipoint with {num_wells} wells, {num_images_per_well:g} images per well, {num_channels} channels, total={total_num_acquisitions} images (AF is {'on' if self.do_autofocus or self.do_reflection_af else 'off'})"
             MAIN_LOG.log(msg)
 
+            self.staging_path=self.staging_path_for(self.output_path,Acquisition.IMAGE_FORMAT)
+
             storage_on_device=get_storage_size_in_directory(self.output_path)
             free_space_gb=storage_on_device.free_space_bytes/1024**3
             total_space_gb=storage_on_device.total_space_bytes/1024**3
 
-            total_imaging_size_gb=total_num_acquisitions*self.camera.ROI_width*self.camera.ROI_height*self.camera.pixel_size_byte/1024**3
-            msg=f"acquisition will use {total_imaging_size_gb:.3f}GB storage (on device, {free_space_gb:.3f}/{total_space_gb:.3f}GB are availble)"
+            bytes_per_pixel=self.camera.pixel_size_byte
+            if Acquisition.IMAGE_BIT_DEPTH_MODE==ImageBitDepthMode.PACKED and not self.camera.pixel_format is None and self.camera.pixel_format.value.bit_depth==12:
+                bytes_per_pixel=1.5
+            # images are cropped before they are saved
+            total_imaging_size_gb=initial_storage_estimate_bytes(
+                num_images=total_num_acquisitions,
+                image_width=min(self.camera.ROI_width,self.crop_width),
+                image_height=min(self.camera.ROI_height,self.crop_height),
+                bytes_per_pixel=float(bytes_per_pixel),
+                file_format=Acquisition.IMAGE_FORMAT,
+            )/1024**3
+            msg=f"acquisition will use about {total_imaging_size_gb:.3f}GB storage (on device, {free_space_gb:.3f}/{total_space_gb:.3f}GB are availble). the estimate is refined while images are saved."
             MAIN_LOG.log(msg)
-            # check if enough free space is available, and add 1GB extra on top to ensure the system can still operate smoothly once imaging is done. (assuming 1GB is enough to run the OS. might not be enough to run any program, but should be enough to not crash the computer)
-            if total_imaging_size_gb>(free_space_gb+1.0):
+            # check if enough free space is available, and leave some extra space to ensure the system can still operate smoothly once imaging is done. (assuming 1GB is enough to run the OS. might not be enough to run any program, but should be enough to not crash the computer)
+            if total_imaging_size_gb>(free_space_gb-Acquisition.STORAGE_RESERVE_GB):
                 raise RuntimeError(f"error - imaging will use up more storage than is available on the output device! {msg}")
 
+            if not self.staging_path is None:
+                # the staging directory needs to hold at least the well that is being imaged, and the previous one that is being migrated.
+                # (if the output device becomes unavailable for a longer time, images accumulate in the staging directory beyond that)
+                staging_storage=get_storage_size_in_directory(Acquisition.STAGING_PATH)
+                staging_free_space_gb=staging_storage.free_space_bytes/1024**3
+                staging_required_gb=min(total_imaging_size_gb,2*total_imaging_size_gb/num_wells)
+                msg=f"staging directory needs at least {staging_required_gb:.3f}GB (on device, {staging_free_space_gb:.3f}/{staging_storage.total_space_bytes/1024**3:.3f}GB are available)"
+                MAIN_LOG.log(msg)
+                if staging_required_gb>(staging_free_space_gb-Acquisition.STORAGE_RESERVE_GB):
+                    raise RuntimeError(f"error - not enough storage available in the staging directory! {msg}")
+
             self.acquisitionStarted.emit()
 
             # run the acquisition
             self.timestamp_acquisition_started = time.time()
 
-            RUN_WORKER_ASYNC=False
-            self.multiPointWorker = MultiPointWorker(self,image_positions,is_async=RUN_WORKER_ASYNC,total_num_acquisitions=total_num_acquisitions,image_return=image_return)
-            
-            if RUN_WORKER_ASYNC:
-                self.thread = ExcQtThread()
-                self.multiPointWorker.moveToThread(self.thread)
+            self.multiPointWorker = MultiPointWorker(self,plan,is_async=Acquisition.RUN_WORKER_ASYNC,total_num_acquisitions=total_num_acquisitions)
 
-                # connect signals and slots
-                self.thread.started.connect(lambda:self.thread.run_try(self.multiPointWorker.run))
-                if not on_new_acquisition is None:
-                    self.multiPointWorker.signal_new_acquisition.connect(on_new_acquisition)
+            # the worker signals are connected to (bound) methods of this controller, so that they are delivered on the thread the controller
+            # lives on (i.e. the gui thread), no matter which thread the worker runs on. (lambdas and bound signals would run on the worker thread.)
+            self.multiPointWorker.signal_new_acquisition.connect(self._slot_new_acquisition)
+            self.multiPointWorker.image_to_display_multi.connect(self._slot_image_to_display_multi)
+            self.multiPointWorker.spectrum_to_display.connect(self.slot_spectrum_to_display)
+            self.multiPointWorker.signal_register_current_fov.connect(self.slot_register_current_fov)
 
-                self.multiPointWorker.image_to_display.connect(self.image_to_display.emit)
-                self.multiPointWorker.image_to_display_multi.connect(self.image_to_display_multi.emit)
-                self.multiPointWorker.spectrum_to_display.connect(self.slot_spectrum_to_display)
-                self.multiPointWorker.signal_register_current_fov.connect(self.slot_register_current_fov)
+            if Acquisition.RUN_WORKER_ASYNC:
+                self.worker_thread = ExcQtThread(self.multiPointWorker.run)
+                self.multiPointWorker.moveToThread(self.worker_thread)
 
+                self.multiPointWorker.image_to_display.connect(self._slot_image_to_display)
                 self.multiPointWorker.finished.connect(self.on_multipointworker_finished)
+                self.worker_thread.error_signal.connect(self.on_multipointworker_error)
 
-                self.thread.finished.connect(self.on_thread_finished)
+                self.worker_thread.finished.connect(self.on_thread_finished)
                 
-                self.thread.start()
+                self.worker_thread.start()
 
-                return self.thread
+                return self.worker_thread
             else:
-                if not on_new_acquisition is None:
-                    self.multiPointWorker.signal_new_acquisition.connect(on_new_acquisition)
-
                 # self.multiPointWorker.image_to_display.connect(self.image_to_display.emit) # adds an hour or two to the imaging time.. ?!
-                self.multiPointWorker.image_to_display_multi.connect(self.image_to_display_multi.emit)
-                self.multiPointWorker.spectrum_to_display.connect(self.slot_spectrum_to_display)
-                self.multiPointWorker.signal_register_current_fov.connect(self.slot_register_current_fov)
 
                 self.multiPointWorker.finished.connect(self._on_acquisition_completed)
                     
@@ -766,20 +1952,54 @@ class MultiPointController(QObject):
 
     def on_multipointworker_finished(self):
         self._on_acquisition_completed()
-        self.multiPointWorker.deleteLater()
-        self.thread.quit()
+
+    def on_multipointworker_error(self,e:Exception):
+        # the worker does not emit finished if it raised (the error has been logged on the worker thread already)
+        self._on_acquisition_completed()
 
     def on_thread_finished(self):
-        self.thread.quit()
+        # may be delivered after the next acquisition has already been started (see run_experiment)
+        if self.worker_thread is None or self.worker_thread.isRunning():
+            return
         self.multiPointWorker=None
-        self.thread=None
+        self.worker_thread=None
 
     def _on_acquisition_completed(self):        
         # emit the acquisition finished signal to enable the UI
         self.acquisitionFinished.emit()
 
+    def staging_path_for(self,output_path:str,image_format:ImageFormat)->Optional[str]:
+        """
+        local directory that images of the acquisition into output_path are saved to first (None if staging is not configured)
+
+        the directory is specific to the experiment, so that resuming finds it again.
+        """
+        if Acquisition.STAGING_PATH is None:
+            return None
+
+        if image_format==ImageFormat.ZARR:
+            # the consolidated metadata of the zarr hierarchy is written once the acquisition has ended, when the wells that have already been
+            # migrated are no longer in the staging directory, so it would miss them
+            MAIN_LOG.log("warning - staging is not supported for the zarr image format. images are saved to the output path directly.")
+            return None
+
+        return os.path.join(Acquisition.STAGING_PATH,os.path.basename(os.path.normpath(output_path)))
+
     def request_abort_aquisition(self):
-        self.abort_acqusition_requested = True
+        """ may be called from any thread """
+        if not self.abort_event.is_set():
+            self.abort_requested_time=time.monotonic()
+        self.abort_event.set()
+
+    def abort_latency_s(self)->float:
+        """ time since the abort has been requested, i.e. how long the acquisition took to react to it (if called once it has) """
+        if self.abort_requested_time is None:
+            return float("nan")
+        return time.monotonic()-self.abort_requested_time
+
+    def _slot_new_acquisition(self,progress:AcqusitionProgress):
+        if not self.on_new_acquisition is None:
+            self.on_new_acquisition(progress)
 
     def _slot_image_to_display(self,image):
         self.image_to_display.emit(image)
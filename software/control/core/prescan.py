@@ -0,0 +1,166 @@
+from control._def import *
+
+import json
+import cv2
+import numpy
+
+from typing import List, Set
+from control.typechecker import TypecheckClass
+from control.utils_.image_processing import count_objects
+
+# most wells of sparsely seeded plates contain objects (cells, organoids) in only a few fields of view. the prescan images every planned
+# site in a single channel, counts the objects in a binned copy of each image, and only the sites with enough objects are then acquired
+# with all channels (and z planes). counting is kept simple on purpose:
+#   - the threshold is derived from the image itself (median + a multiple of the median absolute deviation), which assumes that the
+#     background covers most of the field of view - true for the sparse wells this is meant for,
+#   - small blobs (noise, debris) are removed by erosion/dilation and a minimum object area.
+# the selected sites are saved per well (as grid mask) to prescan.json in the output directory, and reused when the acquisition is resumed.
+
+PRESCAN_FILE_NAME:str="prescan.json"
+
+@TypecheckClass
+class PrescanSite:
+    site:int
+    """ site index, see PlannedSite """
+    i:int
+    """ y index in the grid """
+    j:int
+    """ x index in the grid """
+    num_objects:int
+    selected:bool=False
+    """ the site is acquired """
+
+@TypecheckClass
+class WellPrescan:
+    well_name:str
+    sites:List[PrescanSite]
+
+    @property
+    def selected_site_indices(self)->Set[int]:
+        return {site.site for site in self.sites if site.selected}
+
+    def grid_mask(self,num_x:int,num_y:int)->numpy.ndarray:
+        """ mask of the selected sites, indexed like WellGridConfig.mask (y index, x index) """
+
+        mask=numpy.zeros((num_y,num_x),dtype=bool)
+        for site in self.sites:
+            if site.selected:
+                mask[site.i,site.j]=True
+        return mask
+
+    def as_json(self)->dict:
+        return {
+            "well_name":self.well_name,
+            "sites":[{"site":site.site,"i":site.i,"j":site.j,"num_objects":site.num_objects,"selected":site.selected} for site in self.sites],
+        }
+
+    def from_json(json_data:dict)->"WellPrescan":
+        return WellPrescan(
+            well_name=json_data["well_name"],
+            sites=[
+                PrescanSite(site=int(site["site"]),i=int(site["i"]),j=int(site["j"]),num_objects=int(site["num_objects"]),selected=bool(site["selected"]))
+                for site in json_data["sites"]
+            ],
+        )
+
+@TypecheckClass
+class PrescanResult:
+    """ object counts and selected sites of all wells """
+
+    num_x:int
+    num_y:int
+    channel_name:str
+    wells:List[WellPrescan]
+
+    @property
+    def num_sites(self)->int:
+        return sum(len(well.sites) for well in self.wells)
+
+    @property
+    def num_selected_sites(self)->int:
+        return sum(len(well.selected_site_indices) for well in self.wells)
+
+    def as_text(self)->str:
+        return f"prescan ({self.channel_name}): {self.num_selected_sites} of {self.num_sites} sites in {len(self.wells)} wells selected for acquisition"
+
+    def as_json(self)->dict:
+        return {
+            "num_x":self.num_x,
+            "num_y":self.num_y,
+            "channel_name":self.channel_name,
+            "wells":[
+                {**well.as_json(),"grid_mask":well.grid_mask(self.num_x,self.num_y).tolist()}
+                for well in self.wells
+            ],
+        }
+
+    def from_json(json_data:dict)->"PrescanResult":
+        return PrescanResult(
+            num_x=int(json_data["num_x"]),
+            num_y=int(json_data["num_y"]),
+            channel_name=json_data["channel_name"],
+            wells=[WellPrescan.from_json(well) for well in json_data["wells"]],
+        )
+
+    def save(self,path:str):
+        with open(path,"w",encoding="utf-8") as prescan_file:
+            json.dump(self.as_json(),prescan_file,indent=2)
+
+    def load(path:str)->"PrescanResult":
+        with open(path,"r",encoding="utf-8") as prescan_file:
+            return PrescanResult.from_json(json.load(prescan_file))
+
+class SiteSelector:
+    """ counts the objects in prescan images, and selects the sites of a well that are acquired, see Acquisition.PRESCAN """
+
+    def __init__(self,
+        downsample_factor:int,
+        threshold_num_mad:float,
+        min_object_area_px:int,
+        min_num_objects:int,
+        min_num_sites_per_well:int,
+    ):
+        self.downsample_factor=downsample_factor
+        self.threshold_num_mad=threshold_num_mad
+        self.min_object_area_px=min_object_area_px
+        self.min_num_objects=min_num_objects
+        self.min_num_sites_per_well=min_num_sites_per_well
+
+    def from_machine_config()->"SiteSelector":
+        return SiteSelector(
+            downsample_factor=Acquisition.PRESCAN_DOWNSAMPLE_FACTOR,
+            threshold_num_mad=Acquisition.PRESCAN_THRESHOLD_NUM_MAD,
+            min_object_area_px=Acquisition.PRESCAN_MIN_OBJECT_AREA_PX,
+            min_num_objects=Acquisition.PRESCAN_MIN_NUM_OBJECTS,
+            min_num_sites_per_well=Acquisition.PRESCAN_MIN_NUM_SITES_PER_WELL,
+        )
+
+    def count_objects(self,image:numpy.ndarray)->int:
+        """ number of objects in a prescan image """
+
+        if image.ndim==3:
+            image=image.mean(axis=2)
+        image=image.astype(numpy.float32)
+
+        if self.downsample_factor>1:
+            height,width=image.shape
+            image=cv2.resize(image,(max(width//self.downsample_factor,1),max(height//self.downsample_factor,1)),interpolation=cv2.INTER_AREA)
+
+        median=float(numpy.median(image))
+        # scaled to match the standard deviation of normally distributed noise, and at least one grey level (e.g. for saturated/flat images)
+        noise=max(1.4826*float(numpy.median(numpy.abs(image-median))),1.0)
+
+        return count_objects(image,median+self.threshold_num_mad*noise,min_area=self.min_object_area_px)
+
+    def select(self,well_name:str,sites:List[PrescanSite])->WellPrescan:
+        """ select the sites with at least min_num_objects objects, and at least min_num_sites_per_well sites (those with the most objects) """
+
+        for site in sites:
+            site.selected=site.num_objects>=self.min_num_objects
+
+        num_missing_sites=self.min_num_sites_per_well-sum(1 for site in sites if site.selected)
+        if num_missing_sites>0:
+            for site in sorted((site for site in sites if not site.selected),key=lambda site:-site.num_objects)[:num_missing_sites]:
+                site.selected=True
+
+        return WellPrescan(well_name=well_name,sites=sites)
@@ -0,0 +1,324 @@
+from control._def import *
+
+import math
+
+from typing import Optional, List, Tuple, Dict
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# the stage is moved one axis at a time (see NavigationController.move_to_mm), so the travel time between two positions is the sum
+# of the travel times along x and y, and the travel distance is the manhattan distance.
+
+@TypecheckClass
+class StageMotionModel:
+    """ estimate of the time the xy stage takes to move """
+
+    max_velocity_x_mm_per_s:float
+    max_velocity_y_mm_per_s:float
+    max_acceleration_x_mm_per_s2:float
+    max_acceleration_y_mm_per_s2:float
+    stabilization_time_s:float
+    """ time to wait for the stage to settle after each move """
+    direction_reversal_time_s:float
+    """ additional time when an axis reverses its direction of movement """
+
+    def from_machine_config()->"StageMotionModel":
+        return StageMotionModel(
+            max_velocity_x_mm_per_s=MACHINE_CONFIG.MAX_VELOCITY_X_mm,
+            max_velocity_y_mm_per_s=MACHINE_CONFIG.MAX_VELOCITY_Y_mm,
+            max_acceleration_x_mm_per_s2=MACHINE_CONFIG.MAX_ACCELERATION_X_mm,
+            max_acceleration_y_mm_per_s2=MACHINE_CONFIG.MAX_ACCELERATION_Y_mm,
+            stabilization_time_s=max(MACHINE_CONFIG.SCAN_STABILIZATION_TIME_MS_X,MACHINE_CONFIG.SCAN_STABILIZATION_TIME_MS_Y)/1000,
+            direction_reversal_time_s=Acquisition.STAGE_DIRECTION_REVERSAL_TIME_S,
+        )
+
+    def axis_travel_time_s(self,distance_mm:float,max_velocity:float,max_acceleration:float)->float:
+        """ travel time with a trapezoidal velocity profile (triangular if the distance is too short to reach max_velocity) """
+        distance_mm=abs(distance_mm)
+        if distance_mm<1e-6:
+            return 0.0
+        if distance_mm<max_velocity**2/max_acceleration:
+            return 2*math.sqrt(distance_mm/max_acceleration)
+        return distance_mm/max_velocity+max_velocity/max_acceleration
+
+    def move_time_s(self,dx_mm:float,dy_mm:float)->float:
+        if abs(dx_mm)<1e-6 and abs(dy_mm)<1e-6:
+            return 0.0
+        return self.axis_travel_time_s(dx_mm,self.max_velocity_x_mm_per_s,self.max_acceleration_x_mm_per_s2) \
+            + self.axis_travel_time_s(dy_mm,self.max_velocity_y_mm_per_s,self.max_acceleration_y_mm_per_s2) \
+            + self.stabilization_time_s
+
+@TypecheckClass
+class PathEstimate:
+    length_mm:float
+    time_s:float
+    num_direction_reversals:int
+
+@TypecheckFunction
+def estimate_path(points:List[Tuple[float,float]],motion_model:StageMotionModel)->PathEstimate:
+    """ travel distance, time and number of direction reversals (per axis) when moving through points in order """
+
+    length_mm=0.0
+    time_s=0.0
+    num_direction_reversals=0
+    last_direction=[0,0]
+
+    for (x0,y0),(x1,y1) in zip(points[:-1],points[1:]):
+        dx,dy=x1-x0,y1-y0
+        length_mm+=abs(dx)+abs(dy)
+        time_s+=motion_model.move_time_s(dx,dy)
+
+        for axis,delta in enumerate((dx,dy)):
+            if abs(delta)<1e-6:
+                continue
+            direction=1 if delta>0 else -1
+            if last_direction[axis]==-direction:
+                num_direction_reversals+=1
+                time_s+=motion_model.direction_reversal_time_s
+            last_direction[axis]=direction
+
+    return PathEstimate(length_mm=length_mm,time_s=time_s,num_direction_reversals=num_direction_reversals)
+
+@TypecheckClass
+class WellGridGeometry:
+    """ grid of imaging positions in each well (see WellGridConfig) """
+
+    num_x:int
+    num_y:int
+    delta_x_mm:float
+    delta_y_mm:float
+
+    @TypecheckFunction
+    def positions(self,center_mm:Tuple[float,float],x_scan_direction:int,y_scan_direction:int)->List[Tuple[float,float]]:
+        """
+        imaging positions in the order the multipoint worker visits them
+
+        the grid is scanned row by row (serpentine), starting at the corner given by the scan directions (1 = towards larger coordinates, i.e. starting left/top)
+        """
+
+        base_x=center_mm[0]-x_scan_direction*self.delta_x_mm*(self.num_x-1)/2
+        base_y=center_mm[1]-y_scan_direction*self.delta_y_mm*(self.num_y-1)/2
+
+        positions=[]
+        x_direction=x_scan_direction
+        for i in range(self.num_y):
+            y=base_y+y_scan_direction*i*self.delta_y_mm
+            for j in range(self.num_x):
+                j_actual=j if x_direction==x_scan_direction else self.num_x-1-j
+                positions.append((base_x+x_scan_direction*j_actual*self.delta_x_mm,y))
+            x_direction=-x_direction
+
+        return positions
+
+@TypecheckClass
+class WellVisit:
+    row:int
+    column:int
+    well_name:str
+    x_scan_direction:int
+    """ direction of the first row scan in the well (1 = left to right) """
+    y_scan_direction:int
+    """ direction in which rows are scanned (1 = top to bottom) """
+
+    @property
+    def entry_corner(self)->str:
+        return ("top" if self.y_scan_direction==1 else "bottom")+"-"+("left" if self.x_scan_direction==1 else "right")
+
+@TypecheckClass
+class AcquisitionRoute:
+    """ order in which wells are visited, and where each well is entered """
+
+    well_order:WellOrder
+    visits:List[WellVisit]
+    estimate:PathEstimate
+
+    def as_text(self)->str:
+        return f"{self.well_order.value}: {len(self.visits)} wells, {self.estimate.length_mm:.1f}mm travel, {self.estimate.time_s:.1f}s travel time, {self.estimate.num_direction_reversals} direction reversals"
+
+# corners a well can be entered at, as (x_scan_direction,y_scan_direction)
+WELL_ENTRY_CORNERS:List[Tuple[int,int]]=[(1,1),(-1,1),(1,-1),(-1,-1)]
+
+@TypecheckFunction
+def order_wells(
+    wells:List[Tuple[int,int]],
+    well_order:WellOrder,
+    wellplate_format:WellplateFormatPhysical,
+    motion_model:StageMotionModel,
+    start_position_mm:Optional[Tuple[float,float]]=None,
+)->List[Tuple[int,int]]:
+    """ order wells (row,column) """
+
+    if well_order==WellOrder.AS_GIVEN or len(wells)<=2:
+        return list(wells)
+
+    if well_order in (WellOrder.SERPENTINE_ROWS,WellOrder.SERPENTINE_COLUMNS):
+        # group wells by row (or column), and alternate the direction in which each group is traversed
+        major=0 if well_order==WellOrder.SERPENTINE_ROWS else 1
+        groups:Dict[int,List[Tuple[int,int]]]={}
+        for well in wells:
+            groups.setdefault(well[major],[]).append(well)
+
+        ordered=[]
+        for group_index,key in enumerate(sorted(groups.keys())):
+            ordered+=sorted(groups[key],key=lambda well:well[1-major],reverse=group_index%2==1)
+        return ordered
+
+    assert well_order==WellOrder.SHORTEST_PATH, well_order
+
+    centers=[wellplate_format.well_index_to_mm(row,column) for row,column in wells]
+    num_wells=len(wells)
+    cost=[[motion_model.move_time_s(centers[j][0]-centers[i][0],centers[j][1]-centers[i][1]) for j in range(num_wells)] for i in range(num_wells)]
+
+    # nearest neighbour tour, starting at the well closest to the start position (or the top left well)
+    if start_position_mm is None:
+        current=min(range(num_wells),key=lambda i:wells[i])
+    else:
+        current=min(range(num_wells),key=lambda i:motion_model.move_time_s(centers[i][0]-start_position_mm[0],centers[i][1]-start_position_mm[1]))
+    tour=[current]
+    remaining=set(range(num_wells))-{current}
+    while len(remaining)>0:
+        current=min(remaining,key=lambda i:(cost[current][i],wells[i]))
+        tour.append(current)
+        remaining.remove(current)
+
+    # 2-opt on the open path (the first well stays fixed): reverse tour[i:j+1] if that shortens the path
+    improved=True
+    while improved:
+        improved=False
+        for i in range(1,num_wells-1):
+            for j in range(i+1,num_wells):
+                a,b=tour[i-1],tour[i]
+                c=tour[j]
+                d=tour[j+1] if j+1<num_wells else None
+
+                old_cost=cost[a][b]+(cost[c][d] if not d is None else 0.0)
+                new_cost=cost[a][c]+(cost[b][d] if not d is None else 0.0)
+                if new_cost<old_cost-1e-9:
+                    tour[i:j+1]=reversed(tour[i:j+1])
+                    improved=True
+
+    return [wells[i] for i in tour]
+
+@TypecheckFunction
+def choose_entry_corners(
+    wells:List[Tuple[int,int]],
+    wellplate_format:WellplateFormatPhysical,
+    grid:WellGridGeometry,
+    motion_model:StageMotionModel,
+    start_position_mm:Optional[Tuple[float,float]]=None,
+)->List[Tuple[int,int]]:
+    """
+    choose the entry corner (x_scan_direction,y_scan_direction) of each well, for wells visited in the given order
+
+    minimizes the time spent moving between wells, including direction reversals, exactly for the given order (dynamic programming over the four corners of each well).
+    """
+
+    if len(wells)==0:
+        return []
+
+    centers=[wellplate_format.well_index_to_mm(row,column) for row,column in wells]
+
+    def head(well_index:int,corner:Tuple[int,int])->List[Tuple[float,float]]:
+        return grid.positions(centers[well_index],*corner)[:2]
+    def tail(well_index:int,corner:Tuple[int,int])->List[Tuple[float,float]]:
+        return grid.positions(centers[well_index],*corner)[-2:]
+
+    # the movement inside each well takes the same time for every corner, so only the transitions (incl. reversals at the transitions) are compared
+    def transition_time_s(points:List[Tuple[float,float]])->float:
+        return estimate_path(points,motion_model).time_s
+
+    start=[start_position_mm] if not start_position_mm is None else []
+    total_cost=[transition_time_s(start+head(0,corner)) for corner in WELL_ENTRY_CORNERS]
+    predecessors:List[List[int]]=[]
+
+    for well_index in range(1,len(wells)):
+        new_total_cost=[]
+        well_predecessors=[]
+        for corner in WELL_ENTRY_CORNERS:
+            candidates=[
+                total_cost[p]+transition_time_s(tail(well_index-1,previous_corner)+head(well_index,corner))
+                for p,previous_corner in enumerate(WELL_ENTRY_CORNERS)
+            ]
+            best=min(range(len(candidates)),key=lambda p:candidates[p])
+            new_total_cost.append(candidates[best])
+            well_predecessors.append(best)
+        total_cost=new_total_cost
+        predecessors.append(well_predecessors)
+
+    corner_indices=[min(range(len(total_cost)),key=lambda c:total_cost[c])]
+    for well_predecessors in reversed(predecessors):
+        corner_indices.append(well_predecessors[corner_indices[-1]])
+    corner_indices.reverse()
+
+    return [WELL_ENTRY_CORNERS[c] for c in corner_indices]
+
+@TypecheckFunction
+def estimate_route(
+    visits:List[WellVisit],
+    wellplate_format:WellplateFormatPhysical,
+    grid:WellGridGeometry,
+    motion_model:StageMotionModel,
+    start_position_mm:Optional[Tuple[float,float]]=None,
+)->PathEstimate:
+    points=[start_position_mm] if not start_position_mm is None else []
+    for visit in visits:
+        points+=grid.positions(wellplate_format.well_index_to_mm(visit.row,visit.column),visit.x_scan_direction,visit.y_scan_direction)
+    return estimate_path(points,motion_model)
+
+@TypecheckFunction
+def plan_route(
+    wells:List[Tuple[int,int]],
+    wellplate_format:WellplateFormatPhysical,
+    grid:WellGridGeometry,
+    well_order:WellOrder,
+    start_position_mm:Optional[Tuple[float,float]]=None,
+    motion_model:Optional[StageMotionModel]=None,
+    optimize_entry_corners:bool=True,
+)->AcquisitionRoute:
+    """
+    plan the route of an acquisition across the plate
+
+    without optimize_entry_corners, every well is entered at its top left corner (which is what the multipoint worker used to do).
+    """
+
+    motion_model=motion_model or StageMotionModel.from_machine_config()
+
+    ordered_wells=order_wells(wells,well_order,wellplate_format,motion_model,start_position_mm=start_position_mm)
+    if optimize_entry_corners:
+        corners=choose_entry_corners(ordered_wells,wellplate_format,grid,motion_model,start_position_mm=start_position_mm)
+    else:
+        corners=[(1,1) for _ in ordered_wells]
+
+    visits=[
+        WellVisit(
+            row=row,
+            column=column,
+            well_name=wellplate_format.well_index_to_name(row,column,check_valid=False),
+            x_scan_direction=x_scan_direction,
+            y_scan_direction=y_scan_direction,
+        )
+        for (row,column),(x_scan_direction,y_scan_direction) in zip(ordered_wells,corners)
+    ]
+
+    return AcquisitionRoute(
+        well_order=well_order,
+        visits=visits,
+        estimate=estimate_route(visits,wellplate_format,grid,motion_model,start_position_mm=start_position_mm),
+    )
+
+@TypecheckFunction
+def route_report(route:AcquisitionRoute,naive_route:AcquisitionRoute)->str:
+    """ dry-run comparison of a planned route against the naive route (wells in the given order, each entered at the top left corner) """
+
+    def saved(naive:float,planned:float)->str:
+        if naive<=0.0:
+            return "n/a"
+        return f"{(1-planned/naive)*100:.1f}%"
+
+    lines=[
+        f"naive   - {naive_route.as_text()}",
+        f"planned - {route.as_text()}",
+        f"saves {naive_route.estimate.length_mm-route.estimate.length_mm:.1f}mm ({saved(naive_route.estimate.length_mm,route.estimate.length_mm)}) of travel "
+        f"and {naive_route.estimate.time_s-route.estimate.time_s:.1f}s ({saved(naive_route.estimate.time_s,route.estimate.time_s)}) of travel time",
+        "well order: "+" ".join(f"{visit.well_name}({visit.entry_corner})" for visit in route.visits),
+    ]
+    return "\n".join(lines)
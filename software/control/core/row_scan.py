@@ -0,0 +1,212 @@
+from control._def import *
+
+import math
+import time
+
+from typing import Optional, List, Callable
+from qtpy.QtWidgets import QApplication
+from control.typechecker import TypecheckFunction, TypecheckClass
+from control.microcontroller import Microcontroller
+
+# in a continuous row scan, the stage moves along a row of the grid at constant velocity, and the microcontroller sends a hardware trigger
+# (camera trigger plus an illumination pulse of the length of the exposure) whenever the stage passes a field of view.
+# the row starts one ramp distance before the first field of view, so that the stage has accelerated to the scan velocity when it gets there.
+#
+#   x
+#   ^                              ____ decelerate, then move back to the last field of view
+#   |                      ______/
+#   |              ______/         <- constant velocity, one trigger per field of view
+#   |     ______/
+#   |____/                         <- accelerate
+#   +--------------------------------> t
+#
+# the stage moves during the exposure, which blurs the image along the row. the scan velocity is limited so that the blur stays below
+# Acquisition.ROW_SCAN_MAX_BLUR_PX, and so that the camera has finished reading out a frame before the next field of view is reached.
+
+MIN_ROW_SCAN_VELOCITY_MM_PER_S:float=0.01
+""" resolution (and smallest non-zero value) of the velocity that can be set on the microcontroller, see Microcontroller.set_max_velocity_acceleration """
+
+@TypecheckFunction
+def pixel_size_in_focus_plane_um()->float:
+    """ size of a camera pixel in the focus plane, with the configured camera sensor and default objective """
+    objective=OBJECTIVES[MACHINE_CONFIG.MUTABLE_STATE.DEFAULT_OBJECTIVE]
+    objective_focal_length_mm=objective.tube_lens_f_mm/objective.magnification
+    return CAMERA_PIXEL_SIZE_UM[MACHINE_CONFIG.CAMERA_SENSOR]/(MACHINE_CONFIG.TUBE_LENS_MM/objective_focal_length_mm)
+
+@TypecheckClass
+class RowScanPlan:
+    """ velocity and timing of a continuous scan along one row of fields of view """
+
+    num_fovs:int
+    fov_spacing_mm:float
+    exposure_time_s:float
+    """ length of the illumination pulse (the camera exposure is at least as long) """
+    velocity_mm_per_s:float
+    acceleration_mm_per_s2:float
+    pixel_size_um:float
+    """ pixel size in the focus plane """
+
+    @property
+    def frame_interval_s(self)->float:
+        return self.fov_spacing_mm/self.velocity_mm_per_s
+
+    @property
+    def ramp_distance_mm(self)->float:
+        """ distance required to accelerate to (or decelerate from) the scan velocity """
+        return self.velocity_mm_per_s**2/(2*self.acceleration_mm_per_s2)
+
+    @property
+    def total_distance_mm(self)->float:
+        """ distance from the start of the ramp before the first field of view to the end of the ramp after the last one """
+        return self.ramp_distance_mm+(self.num_fovs-1)*self.fov_spacing_mm+self.ramp_distance_mm
+
+    @property
+    def blur_px(self)->float:
+        """ distance the stage moves during one exposure, in pixels """
+        return self.velocity_mm_per_s*self.exposure_time_s*1000/self.pixel_size_um
+
+    @TypecheckFunction
+    def fov_time_s(self,fov_index:int)->float:
+        """ time after the start of the movement at which the stage passes the field of view (index in scan order) """
+        return self.velocity_mm_per_s/self.acceleration_mm_per_s2+fov_index*self.fov_spacing_mm/self.velocity_mm_per_s
+
+    @TypecheckFunction
+    def trigger_time_s(self,fov_index:int)->float:
+        """ time after the start of the movement at which to trigger the image of a field of view, so that the exposure is centered on it """
+        return self.fov_time_s(fov_index)-self.exposure_time_s/2
+
+    @property
+    def duration_s(self)->float:
+        return self.fov_time_s(self.num_fovs-1)+self.velocity_mm_per_s/self.acceleration_mm_per_s2
+
+    def validate(self)->List[str]:
+        """ list of reasons why the plan cannot be executed as planned (empty if it can) """
+        issues=[]
+        if self.blur_px>Acquisition.ROW_SCAN_MAX_BLUR_PX+1e-9:
+            issues.append(f"motion blur of {self.blur_px:.2f}px exceeds the limit of {Acquisition.ROW_SCAN_MAX_BLUR_PX:.2f}px")
+        if self.frame_interval_s<self.exposure_time_s+Acquisition.ROW_SCAN_FRAME_OVERHEAD_S-1e-9:
+            issues.append(f"frame interval of {self.frame_interval_s*1000:.1f}ms is shorter than exposure time plus readout ({(self.exposure_time_s+Acquisition.ROW_SCAN_FRAME_OVERHEAD_S)*1000:.1f}ms)")
+        if self.velocity_mm_per_s>MACHINE_CONFIG.MAX_VELOCITY_X_mm+1e-9:
+            issues.append(f"scan velocity of {self.velocity_mm_per_s:.2f}mm/s exceeds the maximum stage velocity of {MACHINE_CONFIG.MAX_VELOCITY_X_mm:.2f}mm/s")
+        if self.velocity_mm_per_s<MIN_ROW_SCAN_VELOCITY_MM_PER_S:
+            issues.append(f"scan velocity of {self.velocity_mm_per_s:.4f}mm/s is below the velocity resolution of the microcontroller")
+        return issues
+
+    def as_text(self)->str:
+        return (
+            f"row scan: {self.num_fovs} fields of view {self.fov_spacing_mm:.3f}mm apart at {self.velocity_mm_per_s:.2f}mm/s, "
+            f"{self.exposure_time_s*1000:.2f}ms pulse ({self.blur_px:.2f}px blur), {self.frame_interval_s*1000:.1f}ms between frames, {self.duration_s:.2f}s per row"
+        )
+
+@TypecheckFunction
+def stop_and_go_row_time_s(num_fovs:int,fov_spacing_mm:float,exposure_time_s:float)->float:
+    """ estimated time to image a row by moving to each field of view, waiting for the stage to settle, then imaging it """
+
+    velocity=MACHINE_CONFIG.MAX_VELOCITY_X_mm
+    acceleration=MACHINE_CONFIG.MAX_ACCELERATION_X_mm
+    if fov_spacing_mm<velocity**2/acceleration:
+        move_time_s=2*math.sqrt(fov_spacing_mm/acceleration)
+    else:
+        move_time_s=fov_spacing_mm/velocity+velocity/acceleration
+
+    time_per_fov_s=MACHINE_CONFIG.SCAN_STABILIZATION_TIME_MS_X/1000+exposure_time_s+Acquisition.ROW_SCAN_FRAME_OVERHEAD_S
+    return (num_fovs-1)*move_time_s+num_fovs*time_per_fov_s
+
+@TypecheckFunction
+def plan_row_scan(num_fovs:int,fov_spacing_mm:float,exposure_time_ms:float,pixel_size_um:Optional[float]=None)->Optional[RowScanPlan]:
+    """
+    plan a continuous scan through num_fovs fields of view, spaced fov_spacing_mm apart along x
+
+    returns None if no scan is possible (the exposure is too long for the slowest possible scan), or if it would not be faster than stop-and-go.
+    """
+
+    if num_fovs<2 or fov_spacing_mm<=0.0:
+        return None
+
+    if pixel_size_um is None:
+        pixel_size_um=pixel_size_in_focus_plane_um()
+
+    exposure_time_s=exposure_time_ms/1000
+    min_frame_interval_s=exposure_time_s+Acquisition.ROW_SCAN_FRAME_OVERHEAD_S
+
+    velocity=min(
+        fov_spacing_mm/min_frame_interval_s,
+        Acquisition.ROW_SCAN_MAX_BLUR_PX*pixel_size_um/1000/exposure_time_s if exposure_time_s>0.0 else float("inf"),
+        MACHINE_CONFIG.MAX_VELOCITY_X_mm,
+    )
+    # round down to the velocity resolution of the microcontroller, a slower scan only reduces blur and increases the time between frames
+    velocity=math.floor(velocity/MIN_ROW_SCAN_VELOCITY_MM_PER_S)*MIN_ROW_SCAN_VELOCITY_MM_PER_S
+    if velocity<MIN_ROW_SCAN_VELOCITY_MM_PER_S:
+        return None
+
+    plan=RowScanPlan(
+        num_fovs=num_fovs,
+        fov_spacing_mm=fov_spacing_mm,
+        exposure_time_s=exposure_time_s,
+        velocity_mm_per_s=velocity,
+        acceleration_mm_per_s2=MACHINE_CONFIG.MAX_ACCELERATION_X_mm,
+        pixel_size_um=pixel_size_um,
+    )
+
+    assert len(plan.validate())==0, plan.validate()
+
+    if plan.duration_s>=stop_and_go_row_time_s(num_fovs,fov_spacing_mm,exposure_time_s):
+        return None
+
+    return plan
+
+def execute_row_scan(
+    plan:RowScanPlan,
+    microcontroller:Microcontroller,
+    direction:int,
+    fov_indices:List[int],
+    on_trigger:Callable[[int,float],None],
+    abort_requested:Callable[[],bool],
+)->bool:
+    """
+    move along the row and send a hardware trigger at each field of view in fov_indices (indices in scan order, ascending)
+
+    the stage must be at rest one ramp distance before the first field of view of the row, and ends up one ramp distance after the last one.
+    on_trigger(fov_index,timestamp) is called right after each trigger (with the time.monotonic() at which it was sent), e.g. to read the frame from the camera.
+    the max velocity/acceleration of the x axis are restored when the stage has come to a halt. returns False if the scan was aborted.
+    """
+
+    completed=True
+
+    microcontroller.set_max_velocity_acceleration(AXIS.X,plan.velocity_mm_per_s,plan.acceleration_mm_per_s2)
+    microcontroller.wait_till_operation_is_completed()
+
+    scan_start_time=time.monotonic()
+    try:
+        microcontroller.move_x_usteps(microcontroller.mm_to_ustep_x(direction*plan.total_distance_mm))
+        scan_start_time=time.monotonic()
+
+        illumination_on_time_us=int(plan.exposure_time_s*1e6)
+        for fov_index in fov_indices:
+            trigger_time=scan_start_time+plan.trigger_time_s(fov_index)
+            while (remaining_time_s:=trigger_time-time.monotonic())>0:
+                if abort_requested():
+                    completed=False
+                    break
+                time.sleep(min(remaining_time_s,0.002))
+            if not completed:
+                break
+
+            triggered_at=time.monotonic()
+            if triggered_at-trigger_time>plan.exposure_time_s/2:
+                MAIN_LOG.log(f"warning - row scan trigger for field of view {fov_index} sent {(triggered_at-trigger_time)*1000:.1f}ms late")
+
+            microcontroller.send_hardware_trigger(control_illumination=True,illumination_on_time_us=illumination_on_time_us)
+            on_trigger(fov_index,triggered_at)
+
+    finally:
+        # the microcontroller only reports completion of the most recent command (i.e. the last trigger), so wait for the planned end of the move first
+        while (remaining_time_s:=scan_start_time+plan.duration_s-time.monotonic())>0:
+            QApplication.processEvents()
+            time.sleep(min(remaining_time_s,MACHINE_CONFIG.SLEEP_TIME_S))
+        microcontroller.wait_till_operation_is_completed()
+
+        microcontroller.set_max_velocity_acceleration(AXIS.X,MACHINE_CONFIG.MAX_VELOCITY_X_mm,MACHINE_CONFIG.MAX_ACCELERATION_X_mm)
+        microcontroller.wait_till_operation_is_completed()
+
+    return completed
@@ -0,0 +1,221 @@
+from control._def import *
+
+import os
+import time
+import zlib
+import traceback
+from queue import Queue, Empty
+from threading import Thread, Lock
+
+from typing import Optional, List
+from control.typechecker import TypecheckFunction, TypecheckClass
+from control.core.directory_sharding import shard_directory_name
+
+@TypecheckClass
+class StorageMigratorStats:
+    """ progress of a storage migrator """
+
+    num_files_migrated:int=0
+    num_bytes_migrated:int=0
+    num_failed_attempts:int=0
+    num_files_pending:int=0
+
+    def as_text(self)->str:
+        return f"migrated {self.num_files_migrated} files ({self.num_bytes_migrated/1024**2:.1f}MB), {self.num_files_pending} files pending, {self.num_failed_attempts} failed attempts"
+
+class StorageMigrator:
+    """
+    moves files from a (fast, local) staging directory to their final (e.g. network) location in the background
+
+    files are copied with bounded bandwidth, so that the migration does not compete with saving new images for disk or network bandwidth.
+    every copy is verified (by reading it back and comparing its checksum to the original) before the staged file is deleted.
+    if copying fails (e.g. because the network share is temporarily unavailable), the file stays in the staging directory and copying is retried later.
+
+    directory_sharding and num_shard_buckets are the policy the image paths follow (see control.core.directory_sharding), so that only the
+    shard directories of a well are searched for its files.
+    """
+
+    @TypecheckFunction
+    def __init__(self,
+        staging_path:str,
+        output_path:str,
+        bandwidth_mb_per_s:float=Acquisition.STAGING_MIGRATION_BANDWIDTH_MB_PER_S,
+        max_attempts:int=10,
+        directory_sharding:DirectorySharding=DirectorySharding.NONE,
+        num_shard_buckets:int=1,
+    ):
+        self.staging_path:str=staging_path
+        self.output_path:str=output_path
+        self.directory_sharding:DirectorySharding=directory_sharding
+        self.num_shard_buckets:int=num_shard_buckets
+        self.bandwidth_bytes_per_s:float=bandwidth_mb_per_s*1024**2
+        self.max_attempts:int=max_attempts
+        self.chunk_size:int=4*1024**2
+
+        self.stats:StorageMigratorStats=StorageMigratorStats()
+        self.stats_lock:Lock=Lock()
+
+        # relative paths of files to migrate
+        self.queue:Queue=Queue()
+        self.stop_signal_received:bool=False
+        self.thread:Thread=Thread(target=self.process_queue)
+        self.thread.start()
+
+    @TypecheckFunction
+    def files_of_well(self,relative_directory:str,well_name:str,sites:List[int])->List[str]:
+        """
+        relative paths of all files in the staging directory that belong to the well (images, per-well files and zarr arrays)
+
+        sites are the sites of the well that images have been saved for, which determine the shard directories that are searched.
+        """
+
+        relative_paths=[]
+
+        def belongs_to_well(file_name:str)->bool:
+            return file_name.startswith(f"{well_name}_") or file_name.startswith(f"{well_name}.")
+
+        # files that are not sharded (e.g. per-well files), and the images if sharding is disabled
+        directory=os.path.join(self.staging_path,relative_directory)
+        if os.path.isdir(directory):
+            for entry in sorted(os.scandir(directory),key=lambda entry:entry.name):
+                if entry.is_file() and belongs_to_well(entry.name):
+                    relative_paths.append(os.path.join(relative_directory,entry.name))
+
+        # a well has its own shard directory, or its sites are spread over a few of the hashed buckets that are shared by several wells
+        if self.directory_sharding!=DirectorySharding.NONE:
+            shard_directory_names=sorted({shard_directory_name(self.directory_sharding,well_name,site,self.num_shard_buckets) for site in sites})
+            for shard_name in shard_directory_names:
+                shard_directory=os.path.join(directory,shard_name)
+                if not os.path.isdir(shard_directory):
+                    continue
+                for file_name in sorted(os.listdir(shard_directory)):
+                    if self.directory_sharding==DirectorySharding.PER_WELL or belongs_to_well(file_name):
+                        relative_paths.append(os.path.join(relative_directory,shard_name,file_name))
+
+        relative_paths+=self._files_below(os.path.join(ZARR_STORE_NAME,well_name))
+
+        return relative_paths
+
+    def _files_below(self,relative_directory:str)->List[str]:
+        relative_paths=[]
+        for directory,_,file_names in os.walk(os.path.join(self.staging_path,relative_directory)):
+            for file_name in sorted(file_names):
+                relative_paths.append(os.path.relpath(os.path.join(directory,file_name),self.staging_path))
+        return relative_paths
+
+    @TypecheckFunction
+    def migrate_well(self,relative_directory:str,well_name:str,sites:List[int]):
+        """ schedule all staged files of a well for migration (all images of the well must have been written), see files_of_well """
+        self._submit(self.files_of_well(relative_directory,well_name,sites))
+
+    @TypecheckFunction
+    def migrate_remaining(self):
+        """ schedule all files that are still in the staging directory for migration """
+        self._submit(self._files_below(""))
+
+    def _submit(self,relative_paths:List[str]):
+        with self.stats_lock:
+            self.stats.num_files_pending+=len(relative_paths)
+        for relative_path in relative_paths:
+            self.queue.put([relative_path,0])
+
+    def _copy_with_bandwidth_limit(self,source_path:str,destination_path:str)->int:
+        """ copy file, returns checksum of the copied data """
+
+        os.makedirs(os.path.dirname(destination_path),exist_ok=True)
+
+        checksum=0
+        num_bytes_copied=0
+        start_time=time.monotonic()
+        with open(source_path,"rb") as source_file, open(destination_path,"wb") as destination_file:
+            while len(chunk:=source_file.read(self.chunk_size))>0:
+                destination_file.write(chunk)
+                checksum=zlib.crc32(chunk,checksum)
+                num_bytes_copied+=len(chunk)
+
+                # wait until the transferred amount of data is within budget again
+                earliest_time_for_next_chunk=start_time+num_bytes_copied/self.bandwidth_bytes_per_s
+                remaining_time_s=earliest_time_for_next_chunk-time.monotonic()
+                if remaining_time_s>0:
+                    time.sleep(remaining_time_s)
+
+            destination_file.flush()
+            os.fsync(destination_file.fileno())
+
+        return checksum
+
+    def _checksum_of(self,path:str)->int:
+        checksum=0
+        with open(path,"rb") as file:
+            while len(chunk:=file.read(self.chunk_size))>0:
+                checksum=zlib.crc32(chunk,checksum)
+        return checksum
+
+    @TypecheckFunction
+    def migrate_file(self,relative_path:str):
+        """ copy file to output path, verify the copy, then delete the staged file """
+
+        source_path=os.path.join(self.staging_path,relative_path)
+        destination_path=os.path.join(self.output_path,relative_path)
+        # copy to a temporary file first, so that an interrupted copy never looks like a complete file
+        temporary_destination_path=destination_path+".migrating"
+
+        num_bytes=os.path.getsize(source_path)
+        source_checksum=self._copy_with_bandwidth_limit(source_path,temporary_destination_path)
+
+        destination_checksum=self._checksum_of(temporary_destination_path)
+        if destination_checksum!=source_checksum:
+            os.remove(temporary_destination_path)
+            raise IOError(f"checksum mismatch after copying {relative_path} ({source_checksum:08x} != {destination_checksum:08x})")
+
+        os.replace(temporary_destination_path,destination_path)
+        os.remove(source_path)
+
+        with self.stats_lock:
+            self.stats.num_files_migrated+=1
+            self.stats.num_bytes_migrated+=num_bytes
+
+    @TypecheckFunction
+    def process_queue(self):
+        while True:
+            try:
+                [relative_path,num_failed_attempts]=self.queue.get(timeout=0.1)
+            except Empty:
+                if self.stop_signal_received:
+                    return
+                continue
+
+            try:
+                # a file may be submitted more than once (e.g. zarr metadata that is updated later on), and may already be gone
+                if os.path.exists(os.path.join(self.staging_path,relative_path)):
+                    self.migrate_file(relative_path)
+
+                with self.stats_lock:
+                    self.stats.num_files_pending-=1
+
+            except Exception:
+                with self.stats_lock:
+                    self.stats.num_failed_attempts+=1
+
+                num_failed_attempts+=1
+                if num_failed_attempts<self.max_attempts:
+                    MAIN_LOG.log(f"warning - failed to migrate {relative_path} (attempt {num_failed_attempts}/{self.max_attempts}), will retry: {traceback.format_exc()}")
+                    # back off, the target storage might be (temporarily) unavailable
+                    time.sleep(min(30.0,2.0**num_failed_attempts))
+                    self.queue.put([relative_path,num_failed_attempts])
+                else:
+                    MAIN_LOG.log(f"error - giving up on migrating {relative_path}, the file remains in {self.staging_path}")
+                    with self.stats_lock:
+                        self.stats.num_files_pending-=1
+
+            finally:
+                self.queue.task_done()
+
+    @TypecheckFunction
+    def close(self):
+        """ wait for all scheduled files to be migrated """
+        self.queue.join()
+        self.stop_signal_received=True
+        self.thread.join()
+
+        MAIN_LOG.log(f"storage migrator from {self.staging_path} to {self.output_path}: {self.stats.as_text()}")
@@ -0,0 +1,70 @@
+from control._def import *
+
+from typing import Optional
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+@TypecheckClass
+class StorageProjection:
+    """ projection of the storage an acquisition will use in total, based on the images that have been saved so far """
+
+    num_images_saved:int
+    num_bytes_saved:int
+    num_raw_bytes_saved:int
+    """ size of the saved images in memory, i.e. before compression """
+    num_images_remaining:int
+    """ images that have not been saved yet, including those that are still waiting in the image saver queue """
+    free_space_bytes:int
+    write_rate_bytes_per_s:float
+
+    @property
+    def compression_ratio(self)->float:
+        if self.num_bytes_saved==0:
+            return 1.0
+        return self.num_raw_bytes_saved/self.num_bytes_saved
+
+    @property
+    def bytes_per_image(self)->float:
+        if self.num_images_saved==0:
+            return 0.0
+        return self.num_bytes_saved/self.num_images_saved
+
+    @property
+    def projected_remaining_bytes(self)->float:
+        return self.num_images_remaining*self.bytes_per_image
+
+    @property
+    def projected_total_bytes(self)->float:
+        return self.num_bytes_saved+self.projected_remaining_bytes
+
+    @property
+    def time_to_full_s(self)->float:
+        """ time until the storage device is full at the current write rate """
+        if self.write_rate_bytes_per_s<=0.0:
+            return float("inf")
+        return self.free_space_bytes/self.write_rate_bytes_per_s
+
+    @TypecheckFunction
+    def fits(self,reserve_bytes:int)->bool:
+        """ check if the remaining images fit on the storage device, while leaving reserve_bytes free """
+        return self.projected_remaining_bytes+reserve_bytes<=self.free_space_bytes
+
+    def as_text(self)->str:
+        return (
+            f"storage projection: {self.num_images_saved} images saved ({self.num_bytes_saved/1024**3:.3f}GB, compression ratio {self.compression_ratio:.2f}), "
+            f"{self.num_images_remaining} remaining ({self.projected_remaining_bytes/1024**3:.3f}GB projected, {self.projected_total_bytes/1024**3:.3f}GB in total), "
+            f"{self.free_space_bytes/1024**3:.3f}GB free, full in {self.time_to_full_s/60:.1f}min at {self.write_rate_bytes_per_s/1024**2:.1f}MB/s"
+        )
+
+@TypecheckFunction
+def initial_storage_estimate_bytes(num_images:int,image_width:int,image_height:int,bytes_per_pixel:float,file_format:ImageFormat)->float:
+    """
+    storage estimate before any image has been acquired
+
+    compressed formats are assumed to compress by Acquisition.STORAGE_ESTIMATE_COMPRESSION_RATIO until the actual ratio has been measured on the first images.
+    """
+
+    raw_bytes=num_images*image_width*image_height*bytes_per_pixel
+
+    if file_format in (ImageFormat.TIFF_COMPRESSED,ImageFormat.ZARR):
+        return raw_bytes/Acquisition.STORAGE_ESTIMATE_COMPRESSION_RATIO
+    return raw_bytes
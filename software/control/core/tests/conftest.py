@@ -0,0 +1,47 @@
+import json
+import pytest
+from qtpy.QtCore import QCoreApplication
+
+@pytest.fixture
+def acquisition_config_json()->dict:
+    """ acquisition config as saved by AcquisitionConfig.as_json, before directory sharding, well order and per-well intervals were added """
+    return {
+        "output_path":"/tmp/experiment",
+        "project_name":"project",
+        "plate_name":"plate",
+        "cell_line":"U2OS",
+
+        "image_file_format":"TIFF",
+        "trigger_mode":"Software",
+        "pixel_format":"MONO12",
+        "plate_type":"Generic 96",
+
+        "af_software_channel":None,
+        "af_laser_on":False,
+        "af_laser_reference":None,
+
+        "grid_config":{
+            "x":{"d":0.9,"N":2,"unit":"mm"},
+            "y":{"d":0.9,"N":2,"unit":"mm"},
+            "z":{"d":0.0015,"N":1,"unit":"mm"},
+            "t":{"d":3600.0,"N":1,"unit":"s"},
+            "mask":[[True,True],[True,True]],
+        },
+        "channels_ordered":["Fluorescence 405 nm Ex","Fluorescence 488 nm Ex"],
+        "channels_config":[
+            {"ID":5,"Name":"Fluorescence 405 nm Ex","IlluminationSource":11,"ExposureTime":20.0,"AnalogGain":0.0,"IlluminationIntensity":100.0,"CameraSN":"","RelativeZOffsetUM":0.0},
+            {"ID":6,"Name":"Fluorescence 488 nm Ex","IlluminationSource":12,"ExposureTime":30.0,"AnalogGain":0.0,"IlluminationIntensity":100.0,"CameraSN":"","RelativeZOffsetUM":0.0},
+        ],
+        "well_list":["D05","B02","C03"],
+    }
+
+@pytest.fixture
+def acquisition_config_path(tmp_path,acquisition_config_json)->str:
+    path=tmp_path/"parameters.json"
+    path.write_text(json.dumps(acquisition_config_json))
+    return str(path)
+
+@pytest.fixture
+def qt_app():
+    """ event loop for tests of objects that deliver through queued qt signals (call processEvents to run it) """
+    return QCoreApplication.instance() or QCoreApplication([])
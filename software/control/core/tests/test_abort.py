@@ -0,0 +1,77 @@
+import threading
+import time
+import types
+
+import pytest
+
+from control._def import *
+from control.camera import CameraSimulation
+from control.microcontroller import MicrocontrollerSimulation
+from control.core import StreamingCamera
+from control.core.configuration import Configuration
+from control.core.live import LiveController
+
+MAX_ABORT_LATENCY_S=0.2
+""" time after the abort has been requested by which the waits below must have returned """
+
+def cancel_after(delay_s:float)->threading.Event:
+    """ event that is set from another thread after delay_s """
+    cancel_event=threading.Event()
+    threading.Timer(delay_s,cancel_event.set).start()
+    return cancel_event
+
+@pytest.fixture
+def microcontroller(qt_app):
+    microcontroller=MicrocontrollerSimulation()
+    yield microcontroller
+    microcontroller.close()
+
+@pytest.fixture
+def camera(qt_app)->CameraSimulation:
+    camera=CameraSimulation()
+    camera.ROI_width,camera.ROI_height=64,64
+    camera.open()
+    camera.set_software_triggered_acquisition()
+    return camera
+
+def test_wait_for_the_microcontroller_is_aborted(microcontroller):
+    # a move across the whole plate, which takes a few seconds
+    microcontroller.move_x_usteps(int(100.0/microcontroller.mm_per_ustep_x))
+
+    cancel_event=cancel_after(0.05)
+    start_time=time.monotonic()
+    with pytest.raises(AbortAcquisitionException):
+        microcontroller.wait_till_operation_is_completed(timeout_limit_s=30.0,cancel_event=cancel_event)
+    assert time.monotonic()-start_time<0.05+MAX_ABORT_LATENCY_S
+
+def test_wait_for_a_frame_is_aborted(camera):
+    camera.set_exposure_time(2000.0)
+    camera.send_trigger()
+
+    cancel_event=cancel_after(0.05)
+    start_time=time.monotonic()
+    with pytest.raises(AbortAcquisitionException):
+        camera.read_frame(timeout_overhead_s=5.0,cancel_event=cancel_event)
+    assert time.monotonic()-start_time<0.05+MAX_ABORT_LATENCY_S
+
+    # the frame that was being exposed is discarded, so that it is not returned by the next read
+    assert camera.camera.data_stream[0].frames==[]
+
+def test_frame_is_read_without_abort(camera):
+    camera.set_exposure_time(5.0)
+    camera.send_trigger()
+    assert camera.read_frame(cancel_event=threading.Event()).shape==(64,64)
+
+def test_aborted_snap_turns_the_illumination_off(camera,microcontroller):
+    camera.wrapper=types.SimpleNamespace(ensure_streaming=lambda:StreamingCamera(camera))
+    live_controller=LiveController(core=None,camera=camera,microcontroller=microcontroller,configuration_manager=None,stream_handler=None)
+    config=Configuration(mode_id=0,name="BF LED matrix full",camera_sn="",exposure_time_ms=2000.0,analog_gain=0.0,illumination_source=0,illumination_intensity=20.0)
+
+    cancel_event=cancel_after(0.05)
+    start_time=time.monotonic()
+    with pytest.raises(AbortAcquisitionException):
+        live_controller.snap(config,cancel_event=cancel_event)
+    assert time.monotonic()-start_time<0.05+MAX_ABORT_LATENCY_S
+
+    assert not live_controller.illumination_on
+    assert microcontroller.last_command[1]==CMD_SET.TURN_OFF_ILLUMINATION
@@ -0,0 +1,44 @@
+import json
+
+from control._def import *
+from control.core import AcquisitionConfig
+
+def test_new_modes_are_opt_in():
+    assert Acquisition.PIPELINED_ACQUISITION==False
+    assert Acquisition.WELL_ORDER==WellOrder.AS_GIVEN
+    assert Acquisition.TIMELAPSE_SCHEDULING==TimelapseScheduling.TIME_POINTS
+    assert Acquisition.DIRECTORY_SHARDING==DirectorySharding.NONE
+
+def test_legacy_config_is_replayed_as_acquired(acquisition_config_path):
+    config=AcquisitionConfig.from_json(acquisition_config_path)
+
+    assert config.well_list==[(3,4),(1,1),(2,2)]
+    assert config.well_order==WellOrder.AS_GIVEN
+    assert config.directory_sharding==DirectorySharding.NONE
+    assert config.well_time_point_intervals_s=={}
+
+    # wells in the order of the well list, each entered at the top left corner
+    route,naive_route=config.plan_route(start_position_mm=(0.0,0.0))
+    assert [visit.well_name for visit in route.visits]==["D05","B02","C03"]
+    assert all(visit.entry_corner==naive_visit.entry_corner for visit,naive_visit in zip(route.visits,naive_route.visits))
+
+def test_config_round_trip(tmp_path,acquisition_config_json):
+    path=tmp_path/"config.json"
+    path.write_text(json.dumps({
+        **acquisition_config_json,
+        "directory_sharding":DirectorySharding.HASHED.value,
+        "well_order":WellOrder.SERPENTINE_ROWS.value,
+        "well_time_point_intervals_s":{"B02":60.0},
+    }))
+    config=AcquisitionConfig.from_json(path)
+
+    assert config.directory_sharding==DirectorySharding.HASHED
+    assert config.well_order==WellOrder.SERPENTINE_ROWS
+    assert config.well_time_point_intervals_s=={"B02":60.0}
+
+    config.save_json(tmp_path/"saved.json",well_index_to_name=True)
+    saved_config=AcquisitionConfig.from_json(tmp_path/"saved.json")
+    assert saved_config.as_json()==config.as_json()
+
+    route,_naive_route=config.plan_route(start_position_mm=(0.0,0.0))
+    assert [visit.well_name for visit in route.visits]==["B02","C03","D05"]
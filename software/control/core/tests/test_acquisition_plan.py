@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from control._def import *
+from control.core import AcquisitionConfig
+from control.core.acquisition_plan import AcquisitionCostModel, AcquisitionPlan, MeasuredLatencies, MeasuredLatency, PlanActionKind
+from control.core.channel_order import ChannelSwitchCostModel
+from control.core.route_planner import StageMotionModel
+
+@pytest.fixture
+def cost_model()->AcquisitionCostModel:
+    return AcquisitionCostModel(
+        stage=StageMotionModel(
+            max_velocity_x_mm_per_s=20.0,
+            max_velocity_y_mm_per_s=20.0,
+            max_acceleration_x_mm_per_s2=100.0,
+            max_acceleration_y_mm_per_s2=100.0,
+            stabilization_time_s=0.01,
+            direction_reversal_time_s=0.0,
+        ),
+        channel_switch=ChannelSwitchCostModel(
+            camera_settings_time_s=0.01,
+            illumination_command_time_s=0.02,
+            z_velocity_mm_per_s=1.0,
+            z_acceleration_mm_per_s2=10.0,
+            z_move_overhead_s=0.05,
+            clear_z_backlash_mm=0.01,
+            z_move_threshold_um=0.3,
+        ),
+        laser_autofocus_time_s=0.3,
+        software_autofocus_time_s=2.0,
+        snap_overhead_s=0.005,
+    )
+
+def compile_plan(tmp_path,acquisition_config_json:dict)->AcquisitionPlan:
+    path=tmp_path/"config.json"
+    path.write_text(json.dumps(acquisition_config_json))
+    return AcquisitionConfig.from_json(path).compile_plan(start_position_mm=(0.0,0.0))
+
+def test_plan_follows_the_route(tmp_path,acquisition_config_json):
+    plan=compile_plan(tmp_path,acquisition_config_json)
+
+    assert [well.well_name for well in plan.wells]==["D05","B02","C03"]
+    # serpentine through the grid, starting at the top left corner
+    assert [(site.i,site.j) for site in plan.wells[0].sites]==[(0,0),(0,1),(1,1),(1,0)]
+    assert plan.num_sites==12
+    assert plan.num_images_per_time_point==24
+
+    snaps=[action for action in plan.actions if action.kind==PlanActionKind.SNAP]
+    assert len(snaps)==plan.num_images_per_time_point
+    assert len({action.save_path for action in snaps})==len(snaps)
+    assert not any(action.kind==PlanActionKind.AUTOFOCUS for action in plan.actions)
+
+def test_masked_sites_are_not_imaged(tmp_path,acquisition_config_json):
+    acquisition_config_json["grid_config"]["mask"]=[[True,False],[True,True]]
+    acquisition_config_json["af_laser_on"]=True
+    plan=compile_plan(tmp_path,acquisition_config_json)
+
+    assert all(len(well.sites)==3 for well in plan.wells)
+    assert not any(site.site==2 for well in plan.wells for site in well.sites)
+    assert sum(action.kind==PlanActionKind.AUTOFOCUS for action in plan.actions)==9
+
+def test_plan_round_trip(tmp_path,acquisition_config_json):
+    plan=compile_plan(tmp_path,acquisition_config_json)
+
+    path=str(tmp_path/"plan.json")
+    plan.save(path)
+    loaded_plan=AcquisitionPlan.load(path)
+    assert loaded_plan.as_json()==plan.as_json()
+
+def test_estimate(tmp_path,acquisition_config_json,cost_model):
+    acquisition_config_json["grid_config"]["t"]={"d":60.0,"N":3,"unit":"s"}
+    plan=compile_plan(tmp_path,acquisition_config_json)
+    estimate=cost_model.estimate(plan)
+
+    # 12 sites with a 20ms and a 30ms exposure each
+    assert estimate.exposure_s==pytest.approx(12*0.05)
+    assert estimate.snap_overhead_s==pytest.approx(24*0.005)
+    assert estimate.autofocus_s==0.0
+    assert estimate.stage_s>0.0
+    assert estimate.time_point_s==pytest.approx(estimate.stage_s+estimate.channel_switch_s+estimate.exposure_s+estimate.snap_overhead_s)
+    # the last time point starts 2 intervals after the first one
+    assert estimate.total_s==pytest.approx(2*60.0+estimate.time_point_s)
+    assert estimate.waiting_s==pytest.approx(estimate.total_s-3*estimate.time_point_s)
+
+def test_laser_autofocus_is_estimated_per_site(tmp_path,acquisition_config_json,cost_model):
+    acquisition_config_json["af_laser_on"]=True
+    assert cost_model.estimate(compile_plan(tmp_path,acquisition_config_json)).autofocus_s==pytest.approx(12*0.3)
+
+def test_measured_latencies(tmp_path):
+    measured_latencies=MeasuredLatencies(max_count=4)
+    assert measured_latencies.mean_s(MeasuredLatency.LASER_AUTOFOCUS) is None
+    for duration_s in (1.0,1.0,1.0,1.0,3.0):
+        measured_latencies.record(MeasuredLatency.LASER_AUTOFOCUS,duration_s)
+    # older measurements are weighted down
+    assert measured_latencies.count[MeasuredLatency.LASER_AUTOFOCUS]==4
+    assert measured_latencies.mean_s(MeasuredLatency.LASER_AUTOFOCUS)==pytest.approx(7.0/5)
+
+    path=str(tmp_path/"latencies.json")
+    assert MeasuredLatencies.load(path).mean_s(MeasuredLatency.LASER_AUTOFOCUS) is None
+    measured_latencies.save_merged(path)
+    measured_latencies.save_merged(path)
+    assert MeasuredLatencies.load(path).mean_s(MeasuredLatency.LASER_AUTOFOCUS)==pytest.approx(7.0/5)
+    assert MeasuredLatencies.load(path).count[MeasuredLatency.LASER_AUTOFOCUS]==8
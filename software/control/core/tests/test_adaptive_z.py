@@ -0,0 +1,39 @@
+import numpy
+
+from control._def import *
+from control.core.adaptive_z import AdaptiveZStack
+
+def make_stack(max_num_planes:int=20)->AdaptiveZStack:
+    return AdaptiveZStack(max_num_planes=max_num_planes,min_num_planes=3,decay_fraction=0.5,focus_measure_operator=FocusMeasureOperators.GLVA,downsample_factor=1)
+
+def plane(sharpness:float)->numpy.ndarray:
+    """ image whose focus measure grows with sharpness """
+    image=numpy.full((32,32),100.0)
+    image[::2,::2]+=sharpness
+    return image.astype(numpy.uint16)
+
+def acquire(stack:AdaptiveZStack,sharpness_per_plane)->int:
+    """ number of planes acquired before the stack is done """
+    for sharpness in sharpness_per_plane:
+        if stack.done:
+            break
+        stack.add_plane(plane(sharpness))
+    return stack.num_planes
+
+def test_stack_stops_once_the_focus_measure_has_decayed_on_both_sides():
+    sharpness_per_plane=[10,30,80,100,80,30,10,5,5,5]
+    assert acquire(make_stack(),sharpness_per_plane)==6
+
+def test_stack_starting_at_the_peak_continues_until_it_has_decayed_below_it():
+    # nothing has been acquired below the peak
+    sharpness_per_plane=[100,80,30,10,5]
+    assert acquire(make_stack(max_num_planes=5),sharpness_per_plane)==5
+
+def test_stack_without_decay_acquires_all_planes():
+    assert acquire(make_stack(max_num_planes=8),[100]*20)==8
+
+def test_minimum_number_of_planes():
+    stack=make_stack()
+    stack.add_plane(plane(0))
+    stack.add_plane(plane(100))
+    assert not stack.done
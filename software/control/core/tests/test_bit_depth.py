@@ -0,0 +1,50 @@
+import numpy
+import pytest
+
+from control._def import *
+from control.core.bit_depth import pack_12bit, unpack_12bit, to_native_bit_depth, from_native_bit_depth, storage_representation, restore_from_storage, read_tiff_image
+from control.core.image_saver import ImageSaver
+
+def camera_image(shape,bit_depth:int=12)->numpy.ndarray:
+    """ random image shifted into the high bits, like the camera returns it """
+    native_image=numpy.random.default_rng(0).integers(0,2**bit_depth,size=shape,dtype=numpy.uint16)
+    return from_native_bit_depth(native_image,bit_depth)
+
+@pytest.mark.parametrize("shape",[(4,6),(3,5),(1,1)])
+def test_pack_12bit_round_trip(shape):
+    image=to_native_bit_depth(camera_image(shape),12)
+    packed=pack_12bit(image)
+    assert packed.dtype==numpy.uint8
+    assert packed.size==(image.size+image.size%2)*3//2
+    assert numpy.array_equal(unpack_12bit(packed,list(shape)),image)
+
+def test_pack_12bit_layout():
+    # same layout as GenICam Mono12p
+    packed=pack_12bit(numpy.array([0xABC,0x123],dtype=numpy.uint16))
+    assert packed.tolist()==[0xBC,0x3A,0x12]
+
+@pytest.mark.parametrize("mode",list(ImageBitDepthMode))
+def test_storage_representation_round_trip(mode):
+    image=camera_image((6,8))
+    stored,metadata=storage_representation(image,12,mode)
+    assert numpy.array_equal(restore_from_storage(stored,metadata,shifted=True),image)
+    assert numpy.array_equal(restore_from_storage(stored,metadata),to_native_bit_depth(image,12))
+
+def test_packing_falls_back_to_native_bit_depth():
+    image=camera_image((6,8))
+    stored,metadata=storage_representation(image,12,ImageBitDepthMode.PACKED,allow_packing=False)
+    assert metadata["bit_depth_mode"]==ImageBitDepthMode.NATIVE.value
+    assert numpy.array_equal(stored,to_native_bit_depth(image,12))
+
+@pytest.mark.parametrize("mode",list(ImageBitDepthMode))
+@pytest.mark.parametrize("shape",[(64,48),(5,7)])
+def test_tiff_write_read_round_trip(tmp_path,mode,shape):
+    image=camera_image(shape)
+
+    path=str(tmp_path/"image")
+    ImageSaver.save_image(path,image,ImageFormat.TIFF,bit_depth=12,bit_depth_mode=mode)
+
+    restored=read_tiff_image(path+".tiff",shifted=True)
+    assert restored.dtype==numpy.uint16
+    assert restored.shape==shape
+    assert numpy.array_equal(restored,image)
@@ -0,0 +1,60 @@
+import pytest
+
+from control._def import *
+from control.core.configuration import Configuration
+from control.core.channel_order import ChannelSwitchCostModel, channel_needs_backlash_compensation, channel_order_for_position, optimize_channel_order
+
+@pytest.fixture
+def cost_model()->ChannelSwitchCostModel:
+    return ChannelSwitchCostModel(
+        camera_settings_time_s=0.01,
+        illumination_command_time_s=0.02,
+        z_velocity_mm_per_s=1.0,
+        z_acceleration_mm_per_s2=10.0,
+        z_move_overhead_s=0.05,
+        clear_z_backlash_mm=0.01,
+        z_move_threshold_um=0.3,
+    )
+
+def configuration(mode_id:int,exposure_time_ms:float=10.0,channel_z_offset:float=0.0)->Configuration:
+    return Configuration(mode_id=mode_id,name=f"channel {mode_id}",camera_sn="",exposure_time_ms=exposure_time_ms,analog_gain=0.0,illumination_source=mode_id,illumination_intensity=100.0,channel_z_offset=channel_z_offset)
+
+def test_switch_time(cost_model):
+    a=configuration(1)
+    b=configuration(2,exposure_time_ms=20.0,channel_z_offset=2.0)
+
+    # nothing to change
+    assert cost_model.switch_time_s(a,a,1,0.0)==(0.0,0.0)
+    # camera settings, illumination and a z move up (in one step)
+    time_s,z_deviation_um=cost_model.switch_time_s(b,a,1,0.0)
+    assert time_s==pytest.approx(0.01+0.02+cost_model.z_move_time_s(0.002))
+    assert z_deviation_um==2.0
+    # moves below the threshold are skipped
+    assert cost_model.switch_time_s(configuration(1,channel_z_offset=0.2),a,1,0.0)==(0.0,0.0)
+
+def test_backlash_compensation():
+    assert channel_needs_backlash_compensation(0,1.0)
+    assert channel_needs_backlash_compensation(1,-1.0)
+    assert not channel_needs_backlash_compensation(1,1.0)
+
+def test_channels_with_the_same_z_offset_are_grouped(cost_model):
+    configurations=[configuration(1,channel_z_offset=0.0),configuration(2,channel_z_offset=5.0),configuration(3,channel_z_offset=0.0),configuration(4,channel_z_offset=5.0)]
+
+    order=optimize_channel_order(configurations,cost_model)
+    assert sorted(order)==[0,1,2,3]
+    assert cost_model.alternating_time_s(configurations,order)<cost_model.alternating_time_s(configurations,[0,1,2,3])
+
+    offsets=[configurations[i].channel_z_offset for i in order]
+    assert offsets[0]==offsets[1] and offsets[2]==offsets[3]
+
+    # pairwise swapping finds an order that is as good as the exhaustive search here
+    swapped_order=optimize_channel_order(configurations,cost_model,max_num_channels_exhaustive=0)
+    assert cost_model.alternating_time_s(configurations,swapped_order)==pytest.approx(cost_model.alternating_time_s(configurations,order))
+
+def test_given_order_is_kept_if_nothing_is_gained(cost_model):
+    configurations=[configuration(1),configuration(2),configuration(3)]
+    assert optimize_channel_order(configurations,cost_model)==[0,1,2]
+
+def test_order_alternates_between_positions():
+    assert channel_order_for_position([2,0,1],0)==[2,0,1]
+    assert channel_order_for_position([2,0,1],1)==[1,0,2]
@@ -0,0 +1,52 @@
+import csv
+
+from control._def import *
+from control.core.coordinate_log import CoordinateLog, COORDINATE_LOG_COLUMNS
+
+def row(i:int)->dict:
+    return {'i':i,'j':0,'k':0,'x (mm)':1.5,'y (mm)':2.5,'z (um)':3000.0}
+
+def read_rows(path)->list:
+    with open(path,newline="") as file:
+        return list(csv.DictReader(file))
+
+def test_rows_are_written_in_batches(tmp_path):
+    path=str(tmp_path/"coordinates.csv")
+    coordinate_log=CoordinateLog(path,flush_num_rows=3,flush_interval_s=3600.0)
+
+    coordinate_log.append([row(0),row(1)])
+    assert read_rows(path)==[]
+    coordinate_log.append([row(2)])
+    assert [r['i'] for r in read_rows(path)]==['0','1','2']
+
+    coordinate_log.append([{**row(3),'skipped':'target object count reached'}])
+    coordinate_log.close()
+    coordinate_log.close()
+
+    rows=read_rows(path)
+    assert [r['i'] for r in rows]==['0','1','2','3']
+    assert rows[0]['skipped']==''
+    assert rows[3]['skipped']=='target object count reached'
+    assert list(rows[0].keys())==COORDINATE_LOG_COLUMNS
+
+def test_resumed_log_is_appended_to(tmp_path):
+    path=str(tmp_path/"coordinates.csv")
+    # a log with the columns of an older version, and a row that was cut off by a crash
+    with open(path,"w") as file:
+        file.write("i,j,k,x (mm),y (mm),z (um)\n0,0,0,1.5,2.5,3000.0\n1,0,0,1.5")
+
+    with CoordinateLog(path,append=True) as coordinate_log:
+        coordinate_log.append([row(1)])
+
+    rows=read_rows(path)
+    assert [r['i'] for r in rows]==['0','1']
+    assert list(rows[0].keys())==['i','j','k','x (mm)','y (mm)','z (um)']
+
+def test_log_is_replaced_unless_appending(tmp_path):
+    path=str(tmp_path/"coordinates.csv")
+    with CoordinateLog(path) as coordinate_log:
+        coordinate_log.append([row(0)])
+    with CoordinateLog(path) as coordinate_log:
+        coordinate_log.append([row(1)])
+
+    assert [r['i'] for r in read_rows(path)]==['1']
@@ -0,0 +1,31 @@
+from control._def import *
+from control.core.directory_sharding import num_shard_buckets, shard_directory_name
+
+def test_shard_directory_name():
+    assert shard_directory_name(DirectorySharding.NONE,"B02",1)==""
+    assert shard_directory_name(DirectorySharding.PER_WELL,"B02",1)=="B02"
+
+    bucket=shard_directory_name(DirectorySharding.HASHED,"B02",1,num_buckets=16)
+    assert bucket.startswith("bucket_") and 0<=int(bucket[len("bucket_"):])<16
+    # stable across calls (and processes), so that a resumed acquisition finds the same directories
+    assert shard_directory_name(DirectorySharding.HASHED,"B02",1,num_buckets=16)==bucket
+
+def test_hashed_buckets_stay_below_the_folder_limit():
+    max_num_images_per_folder=1000
+    num_images_per_site=10
+    sites=[(f"{row}{column:02}",site) for row in "BCDEFGHIJKLMNO" for column in range(2,24) for site in range(1,10)]
+
+    num_buckets=num_shard_buckets(len(sites)*num_images_per_site,max_num_images_per_folder)
+    assert num_buckets>=len(sites)*num_images_per_site/max_num_images_per_folder
+
+    num_images_per_bucket={}
+    for well_name,site in sites:
+        bucket=shard_directory_name(DirectorySharding.HASHED,well_name,site,num_buckets)
+        num_images_per_bucket[bucket]=num_images_per_bucket.get(bucket,0)+num_images_per_site
+    assert len(num_images_per_bucket)==num_buckets
+    assert max(num_images_per_bucket.values())<=max_num_images_per_folder
+
+def test_num_shard_buckets():
+    assert num_shard_buckets(0,1000)==1
+    assert num_shard_buckets(1000,1000)==2
+    assert num_shard_buckets(10_000,1000)==12
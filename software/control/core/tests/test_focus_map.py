@@ -0,0 +1,74 @@
+import numpy
+import pytest
+
+from control._def import *
+from control.core.focus_map import FocusMap, FocusMapPoint, fit_focus_surface, select_prescan_points, well_prescan_points
+
+def tilted_plane_z_mm(x_mm:float,y_mm:float)->float:
+    return 1.0+0.002*x_mm-0.001*y_mm
+
+def grid_points(z_mm=tilted_plane_z_mm)->list:
+    return [FocusMapPoint(x_mm=float(x),y_mm=float(y),z_mm=z_mm(float(x),float(y))) for x in range(0,40,10) for y in range(0,30,10)]
+
+@pytest.mark.parametrize("model",[FocusSurfaceModel.PLANE,FocusSurfaceModel.THIN_PLATE_SPLINE])
+def test_tilted_plane_is_predicted(model):
+    surface=fit_focus_surface(grid_points(),model)
+    assert float(surface.predict(numpy.array(15.0),numpy.array(5.0)))==pytest.approx(tilted_plane_z_mm(15.0,5.0),abs=1e-9)
+
+def test_spline_interpolates_curved_surfaces():
+    def z_mm(x_mm:float,y_mm:float)->float:
+        return 1.0+0.00001*(x_mm-15)**2
+
+    points=grid_points(z_mm)
+    spline=fit_focus_surface(points,FocusSurfaceModel.THIN_PLATE_SPLINE)
+    for p in points:
+        assert float(spline.predict(numpy.array(p.x_mm),numpy.array(p.y_mm)))==pytest.approx(p.z_mm,abs=1e-9)
+
+    # a plane cannot follow the curvature
+    plane=fit_focus_surface(points,FocusSurfaceModel.PLANE)
+    assert max(abs(float(plane.predict(numpy.array(p.x_mm),numpy.array(p.y_mm)))-p.z_mm) for p in points)>1e-3
+
+def test_few_points_give_a_constant_z():
+    surface=fit_focus_surface([FocusMapPoint(x_mm=0.0,y_mm=0.0,z_mm=1.0),FocusMapPoint(x_mm=10.0,y_mm=0.0,z_mm=1.002)],FocusSurfaceModel.THIN_PLATE_SPLINE)
+    assert surface.model==FocusSurfaceModel.PLANE
+    assert float(surface.predict(numpy.array(50.0),numpy.array(50.0)))==pytest.approx(1.001)
+
+def test_outlier_is_rejected():
+    focus_map=FocusMap(model=FocusSurfaceModel.PLANE,outlier_threshold_um=5.0)
+    for point in grid_points():
+        focus_map.add_point(point,refit=False)
+    # e.g. the autofocus locked onto the wrong interface
+    outlier=FocusMapPoint(x_mm=15.0,y_mm=15.0,z_mm=tilted_plane_z_mm(15.0,15.0)+0.1)
+    focus_map.add_point(outlier)
+
+    assert focus_map.outliers==[outlier]
+    assert focus_map.predict(15.0,15.0)==pytest.approx(tilted_plane_z_mm(15.0,15.0),abs=1e-9)
+    assert max(abs(residual_um) for residual_um in focus_map.residuals_um())<1e-6
+
+def test_focus_map_round_trip(tmp_path):
+    focus_map=FocusMap(model=FocusSurfaceModel.THIN_PLATE_SPLINE,outlier_threshold_um=5.0)
+    for point in grid_points():
+        focus_map.add_point(point,refit=False)
+    focus_map.fit()
+
+    path=str(tmp_path/"focus_map.json")
+    focus_map.save(path)
+    loaded_focus_map=FocusMap.load(path)
+
+    assert loaded_focus_map.model==focus_map.model
+    assert [p.as_json() for p in loaded_focus_map.points]==[p.as_json() for p in focus_map.points]
+    assert loaded_focus_map.predict(12.0,7.0)==pytest.approx(focus_map.predict(12.0,7.0))
+
+def test_prescan_points_cover_the_area():
+    positions=[(float(x),float(y)) for y in range(5) for x in range(5)]
+    selected=select_prescan_points(positions,5)
+
+    assert selected==sorted(selected)
+    # the center, then the four corners
+    assert {positions[i] for i in selected}=={(2.0,2.0),(0.0,0.0),(4.0,0.0),(0.0,4.0),(4.0,4.0)}
+    assert select_prescan_points(positions,100)==list(range(25))
+    assert select_prescan_points(positions,0)==[]
+
+def test_well_prescan_points():
+    assert well_prescan_points((10.0,20.0),2.0,4.0)==[(9.0,18.0),(11.0,18.0),(11.0,22.0),(9.0,22.0),(10.0,20.0)]
+    assert well_prescan_points((10.0,20.0),0.0,0.0)==[(10.0,20.0)]
@@ -0,0 +1,56 @@
+import numpy
+import pytest
+import tifffile
+
+from control._def import *
+from control.core.image_codecs import ImageCodec, get_codec, list_codecs, register_codec
+
+def test_lzw_is_written_in_strips():
+    kwargs=get_codec("lzw").tiff_kwargs(tile_size=512,num_threads=2)
+    assert kwargs["compression"]==tifffile.COMPRESSION.LZW
+    assert not "tile" in kwargs
+
+def test_tiled_codecs_are_tiled_only_if_a_tile_size_is_set():
+    assert get_codec("zstd-3").tiff_kwargs(tile_size=256,num_threads=2)["tile"]==(256,256)
+    assert not "tile" in get_codec("zstd-3").tiff_kwargs(tile_size=0,num_threads=2)
+
+def test_default_tile_size_only_tiles_codecs_that_support_it():
+    assert get_codec("zstd-3").tiff_kwargs(tile_size=Acquisition.IMAGE_CODEC_TILE_SIZE,num_threads=2)["tile"]==(512,512)
+    assert get_codec("deflate-6").tiff_kwargs(tile_size=Acquisition.IMAGE_CODEC_TILE_SIZE,num_threads=2)["tile"]==(512,512)
+    assert not "tile" in get_codec("lzw").tiff_kwargs(tile_size=Acquisition.IMAGE_CODEC_TILE_SIZE,num_threads=2)
+
+def test_uncompressed_codec_has_no_kwargs():
+    assert get_codec("none").tiff_kwargs(tile_size=512,num_threads=2)=={}
+
+def test_codecs_that_cannot_be_used_raise():
+    with pytest.raises(ValueError):
+        get_codec("lz4").tiff_kwargs(tile_size=0,num_threads=1)
+    with pytest.raises(ValueError):
+        get_codec("lzw").blosc_compressor()
+    with pytest.raises(ValueError):
+        get_codec("does-not-exist")
+
+def test_register_codec():
+    register_codec(ImageCodec(name="test-deflate",tiff_compression="ADOBE_DEFLATE",blosc_cname=None,level=1))
+    assert "test-deflate" in list_codecs()
+    assert get_codec("test-deflate").level==1
+
+def test_uncompressed_tiff_round_trip(tmp_path):
+    image=numpy.random.default_rng(0).integers(0,4096,size=(300,200),dtype=numpy.uint16)
+
+    path=str(tmp_path/"image.tiff")
+    tifffile.imwrite(path,image,**get_codec("none").tiff_kwargs(tile_size=128,num_threads=2))
+    assert numpy.array_equal(tifffile.imread(path),image)
+
+@pytest.mark.parametrize("codec_name,is_tiled",[("lzw",False),("deflate-6",True),("zstd-3",True)])
+def test_compressed_tiff_round_trip(tmp_path,codec_name,is_tiled):
+    # tifffile requires imagecodecs for these compression schemes
+    pytest.importorskip("imagecodecs")
+
+    image=numpy.random.default_rng(0).integers(0,4096,size=(300,200),dtype=numpy.uint16)
+
+    path=str(tmp_path/"image.tiff")
+    tifffile.imwrite(path,image,**get_codec(codec_name).tiff_kwargs(tile_size=128,num_threads=2))
+    with tifffile.TiffFile(path) as tiff_file:
+        assert tiff_file.pages[0].is_tiled==is_tiled
+        assert numpy.array_equal(tiff_file.asarray(),image)
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy
+import pytest
+from control._def import *
+from control.core.image_consumer import ImageConsumer, ImageDispatcher
+
+def image_data(index:int)->AcquisitionImageData:
+    return AcquisitionImageData(image=numpy.zeros((4,4),dtype=numpy.uint16),path=f"image_{index}",config=None)
+
+def process_events_until(qt_app,condition,timeout_s:float=2.0):
+    end_time=time.monotonic()+timeout_s
+    while not condition() and time.monotonic()<end_time:
+        qt_app.processEvents()
+        time.sleep(0.001)
+
+def test_block_delivers_every_image():
+    paths=[]
+    consumer=ImageConsumer(name="analysis",callback=lambda image_data:paths.append(image_data.path),policy=ImageConsumerPolicy.BLOCK,max_queue_size=2)
+    for index in range(20):
+        consumer.submit(image_data(index))
+    consumer.close()
+
+    assert paths==[f"image_{index}" for index in range(20)]
+    assert consumer.metrics.num_delivered==20
+    assert consumer.metrics.num_dropped==0
+
+def test_slow_consumer_does_not_delay_submission():
+    release=threading.Event()
+    paths=[]
+    def callback(image_data:AcquisitionImageData):
+        release.wait(timeout=2.0)
+        paths.append(image_data.path)
+
+    dispatcher=ImageDispatcher()
+    dispatcher.add_consumer(ImageConsumer(name="display",callback=callback,policy=ImageConsumerPolicy.LATEST_ONLY))
+    dispatcher.add_consumer(ImageConsumer(name="drop",callback=lambda image_data:release.wait(timeout=2.0),policy=ImageConsumerPolicy.DROP,max_queue_size=1))
+
+    start_time=time.monotonic()
+    for index in range(10):
+        dispatcher.submit(image_data(index))
+    assert time.monotonic()-start_time<1.0
+
+    release.set()
+    metrics=dispatcher.metrics()
+    dispatcher.remove_consumer("display")
+    dispatcher.remove_consumer("drop")
+
+    # the last image is always delivered to a latest-only consumer
+    assert paths[-1]=="image_9"
+    assert len(paths)+metrics["display"].num_dropped==10
+    assert metrics["drop"].num_dropped>0
+
+def test_failing_callback_is_counted():
+    def callback(image_data:AcquisitionImageData):
+        raise RuntimeError("analysis failed")
+
+    consumer=ImageConsumer(name="analysis",callback=callback,policy=ImageConsumerPolicy.BLOCK)
+    consumer.submit(image_data(0))
+    consumer.close()
+
+    assert consumer.metrics.num_failed==1
+
+def test_qt_consumer_started_off_the_qt_thread(qt_app):
+    # e.g. an acquisition started by the web service, which runs on a plain thread without an event loop
+    delivery_threads=[]
+    consumers=[]
+    def start_acquisition():
+        consumer=ImageConsumer(name="image_return",callback=lambda image_data:delivery_threads.append(threading.get_ident()),policy=ImageConsumerPolicy.BLOCK,qt_thread=qt_app.thread())
+        consumers.append(consumer)
+        for index in range(3):
+            consumer.submit(image_data(index))
+
+    acquisition_thread=threading.Thread(target=start_acquisition)
+    acquisition_thread.start()
+    process_events_until(qt_app,lambda:len(delivery_threads)==3 and not acquisition_thread.is_alive())
+    acquisition_thread.join()
+    consumers[0].close()
+
+    assert delivery_threads==[threading.get_ident()]*3
+
+def test_blocking_qt_consumer_on_its_own_thread_is_called_directly(qt_app):
+    paths=[]
+    consumer=ImageConsumer(name="image_return",callback=lambda image_data:paths.append(image_data.path),policy=ImageConsumerPolicy.BLOCK,max_queue_size=1,qt_thread=qt_app.thread())
+    for index in range(3):
+        consumer.submit(image_data(index))
+    consumer.close()
+
+    assert paths==["image_0","image_1","image_2"]
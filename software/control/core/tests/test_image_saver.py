@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+import numpy
+import pytest
+import tifffile
+
+from control._def import *
+from control.core.image_saver import ImageSaver, ImageSaverBackpressureEventType
+from control.core.manifest import MANIFEST_FILE_NAME
+
+MB_IMAGE_SHAPE=(512,1024)
+""" shape of a uint16 image of 1MB """
+
+@pytest.fixture
+def slow_image_saver():
+    """ image saver with a queue budget of two 1MB images, that saves images only once release is set """
+    image_saver=ImageSaver(image_format=ImageFormat.TIFF,num_workers=1,use_process_pool=False,queue_budget_mb=2.0)
+
+    release=threading.Event()
+    saved_paths=[]
+    def save_image(path,image,file_format,location,codec_name)->int:
+        release.wait(timeout=5.0)
+        saved_paths.append(path)
+        return image.nbytes
+    image_saver._save_image_with_backend=save_image
+
+    yield image_saver,release,saved_paths
+
+    release.set()
+    image_saver.close()
+
+def test_enqueue_blocks_while_the_budget_is_exhausted(qt_app,slow_image_saver):
+    image_saver,release,saved_paths=slow_image_saver
+    events=[]
+    image_saver.backpressure.connect(lambda event:events.append(event.type))
+
+    image=numpy.zeros(MB_IMAGE_SHAPE,dtype=numpy.uint16)
+    image_saver.enqueue("image_0",image,ImageFormat.TIFF)
+    image_saver.enqueue("image_1",image,ImageFormat.TIFF)
+    assert image_saver.queue_stats().queued_bytes==2*image.nbytes
+
+    third_enqueue=threading.Thread(target=image_saver.enqueue,args=("image_2",image,ImageFormat.TIFF))
+    third_enqueue.start()
+    time.sleep(0.2)
+    assert third_enqueue.is_alive()
+    # (backpressure events are emitted on the acquisition thread, and delivered to this thread through the event loop)
+    qt_app.processEvents()
+    assert events==[ImageSaverBackpressureEventType.Blocked]
+
+    release.set()
+    third_enqueue.join(timeout=5.0)
+    assert not third_enqueue.is_alive()
+    qt_app.processEvents()
+    assert events==[ImageSaverBackpressureEventType.Blocked,ImageSaverBackpressureEventType.Resumed]
+
+    image_saver.queues[0].join()
+    assert saved_paths==["image_0","image_1","image_2"]
+    assert image_saver.queue_stats().queued_bytes==0
+
+def test_image_larger_than_the_budget_is_accepted_into_an_empty_queue(slow_image_saver):
+    image_saver,release,saved_paths=slow_image_saver
+
+    image_saver.enqueue("large_image",numpy.zeros((3*MB_IMAGE_SHAPE[0],MB_IMAGE_SHAPE[1]),dtype=numpy.uint16),ImageFormat.TIFF)
+    assert image_saver.queue_stats().queued_bytes==3*1024**2
+
+def test_images_are_saved(tmp_path):
+    image_saver=ImageSaver(image_format=ImageFormat.TIFF,num_workers=2,use_process_pool=False)
+    images=[numpy.random.default_rng(index).integers(0,4096,size=(16,16),dtype=numpy.uint16) for index in range(4)]
+    for index,image in enumerate(images):
+        image_saver.enqueue(str(tmp_path/f"image_{index}"),image,ImageFormat.TIFF)
+    image_saver.close()
+
+    for index,image in enumerate(images):
+        assert numpy.array_equal(tifffile.imread(str(tmp_path/f"image_{index}.tiff")),image)
+    assert image_saver.acquisition_stats.num_images==4
+
+def test_aborted_staged_acquisition_is_resumed_from_the_migrated_manifest(tmp_path):
+    output_path=str(tmp_path/"output")
+    staging_path=str(tmp_path/"staging")
+    layout=AcquisitionLayout(channel_names=["c0"],num_z=1,num_time_points=1)
+    image_saver=ImageSaver(image_format=ImageFormat.TIFF,num_workers=1,use_process_pool=False)
+
+    image_saver.begin_acquisition(output_path,layout,ImageFormat.TIFF,staging_path=staging_path)
+    os.makedirs(os.path.join(staging_path,"0"))
+    location=ImageLocation(well_name="B02",site=1,x=0,y=0,z=0,time_point=0,channel_name="c0",channel_index=0)
+    image_saver.enqueue(os.path.join(staging_path,"0","B02_s1_z0_c0"),numpy.zeros((16,16),dtype=numpy.uint16),ImageFormat.TIFF,location=location)
+    # aborting ends the acquisition, which moves all files (including the manifest) to the output path in the background
+    image_saver.end_acquisition()
+
+    # resuming right away must still see the site that was completed before the abort
+    image_saver.begin_acquisition(output_path,layout,ImageFormat.TIFF,staging_path=staging_path)
+    assert image_saver.manifest.completed_sites(time_point=0,num_images_per_site=1)=={("B02",1)}
+    assert os.path.exists(os.path.join(output_path,"0","B02_s1_z0_c0.tiff"))
+
+    image_saver.close()
+    assert os.path.exists(os.path.join(output_path,MANIFEST_FILE_NAME))
+    assert not os.path.exists(os.path.join(staging_path,MANIFEST_FILE_NAME))
+
+def test_images_with_the_same_ordering_key_are_written_in_order():
+    image_saver=ImageSaver(image_format=ImageFormat.TIFF,num_workers=4,use_process_pool=False)
+
+    written_paths={}
+    written_paths_lock=threading.Lock()
+    def save_image(path,image,file_format,location,codec_name)->int:
+        # vary the time taken per image, so that writes would be reordered if images of one key were handled by more than one worker
+        time.sleep(0.001*(hash(path)%5))
+        with written_paths_lock:
+            written_paths.setdefault(path.split("/")[0],[]).append(path)
+        return image.nbytes
+    image_saver._save_image_with_backend=save_image
+
+    image=numpy.zeros((4,4),dtype=numpy.uint16)
+    ordering_keys=[f"site_{site}" for site in range(3)]
+    for index in range(20):
+        for ordering_key in ordering_keys:
+            image_saver.enqueue(f"{ordering_key}/image_{index}",image,ImageFormat.TIFF,ordering_key=ordering_key)
+    image_saver.close()
+
+    for ordering_key in ordering_keys:
+        assert written_paths[ordering_key]==[f"{ordering_key}/image_{index}" for index in range(20)]
+
+def test_images_are_saved_in_the_process_pool(tmp_path):
+    image_saver=ImageSaver(image_format=ImageFormat.TIFF,num_workers=2,use_process_pool=True)
+    images=[numpy.random.default_rng(index).integers(0,4096,size=(16,16),dtype=numpy.uint16) for index in range(4)]
+    for index,image in enumerate(images):
+        image_saver.enqueue(str(tmp_path/f"image_{index}"),image,ImageFormat.TIFF)
+    image_saver.end_acquisition()
+
+    # the pool would be dropped (and images saved in threads instead) if the worker processes had failed
+    assert not image_saver.process_pool is None
+    image_saver.close()
+
+    for index,image in enumerate(images):
+        assert numpy.array_equal(tifffile.imread(str(tmp_path/f"image_{index}.tiff")),image)
@@ -0,0 +1,68 @@
+import pytest
+
+from control._def import *
+from control.core.laser_af_policy import AdaptiveLaserAFPolicy, LaserAFDecision
+
+def plate_z_mm(x_mm:float,y_mm:float)->float:
+    return 1.0+0.001*x_mm+0.0005*y_mm
+
+def make_policy(max_consecutive_skips:int=3)->AdaptiveLaserAFPolicy:
+    return AdaptiveLaserAFPolicy(skip_uncertainty_um=1.0,single_image_uncertainty_um=3.0,max_consecutive_skips=max_consecutive_skips,uncertainty_um_per_mm=1.0)
+
+def image_well(policy:AdaptiveLaserAFPolicy,well_name:str,positions)->list:
+    """ decisions at the positions, as the multipoint worker would make them """
+    policy.start_well(well_name)
+    decisions=[]
+    for x_mm,y_mm in positions:
+        decision,predicted_z_mm=policy.decide(x_mm,y_mm)
+        decisions.append(decision)
+        if decision==LaserAFDecision.SKIP:
+            # (within the uncertainty the skip was decided with)
+            assert predicted_z_mm==pytest.approx(plate_z_mm(x_mm,y_mm),abs=policy.skip_uncertainty_um/1000)
+            policy.record_skip()
+        else:
+            policy.record_measurement(x_mm,y_mm,plate_z_mm(x_mm,y_mm),predicted_z_mm)
+    return decisions
+
+def grid(x0_mm:float)->list:
+    return [(x0_mm+0.5*i,0.5*j) for j in range(4) for i in range(4)]
+
+def test_first_position_of_each_well_is_measured():
+    policy=make_policy()
+    assert policy.decide(0.0,0.0)==(LaserAFDecision.FULL,None)
+
+    image_well(policy,"B02",grid(0.0))
+    assert image_well(policy,"B03",grid(9.0))[0]==LaserAFDecision.FULL
+
+def test_predictable_surface_skips_measurements():
+    policy=make_policy()
+    image_well(policy,"B02",grid(0.0))
+    decisions=image_well(policy,"B03",grid(9.0))
+
+    assert decisions.count(LaserAFDecision.SKIP)>0
+    # never more than max_consecutive_skips in a row
+    num_consecutive_skips=0
+    for decision in decisions:
+        num_consecutive_skips=num_consecutive_skips+1 if decision==LaserAFDecision.SKIP else 0
+        assert num_consecutive_skips<=3
+
+def test_nothing_is_skipped_before_predictions_have_been_checked():
+    policy=make_policy()
+    policy.start_well("B02")
+    policy.record_measurement(0.0,0.0,plate_z_mm(0.0,0.0),None)
+
+    predicted_z_mm,uncertainty_um=policy.predict(0.5,0.0)
+    assert predicted_z_mm==pytest.approx(plate_z_mm(0.0,0.0))
+    assert uncertainty_um==float("inf")
+    assert policy.decide(0.5,0.0)[0]==LaserAFDecision.FULL
+
+def test_inaccurate_predictions_are_measured():
+    policy=make_policy()
+    policy.start_well("B02")
+    for x_mm in (0.0,0.5,1.0):
+        policy.record_measurement(x_mm,0.0,plate_z_mm(x_mm,0.0),plate_z_mm(x_mm,0.0)+0.002)
+    policy.record_measurement(0.0,0.5,plate_z_mm(0.0,0.5),None)
+
+    # previous predictions were off by 2um
+    assert policy.decide(0.5,0.5)[0]==LaserAFDecision.SINGLE_IMAGE
+    assert "1 measured with a single image" in policy.as_text()
@@ -0,0 +1,62 @@
+from control._def import *
+from control.core.manifest import AcquisitionManifest, ManifestEntry
+
+def entry(well_name:str,site:int,z:int,channel_name:str,time_point:int=0)->ManifestEntry:
+    return ManifestEntry(
+        path=f"{time_point}/{well_name}_s{site}_z{z}_{channel_name}",
+        well_name=well_name,
+        site=site,
+        x=0,
+        y=0,
+        z=z,
+        time_point=time_point,
+        channel_name=channel_name,
+        timestamp="",
+        num_bytes=1,
+        checksum="crc32:00000000",
+    )
+
+def site_entries(well_name:str,site:int,num_z:int,channel_names=("c0","c1"),time_point:int=0):
+    return [entry(well_name,site,z,channel_name,time_point) for z in range(num_z) for channel_name in channel_names]
+
+def test_completed_sites(tmp_path):
+    manifest=AcquisitionManifest(str(tmp_path))
+    manifest.add(site_entries("B02",1,num_z=2))
+    # one image missing
+    manifest.add(site_entries("B02",2,num_z=2)[:-1])
+    manifest.add(site_entries("B03",1,num_z=2,time_point=1))
+
+    assert manifest.completed_sites(0,num_images_per_site=4)=={("B02",1)}
+    assert manifest.completed_sites(1,num_images_per_site=4)=={("B03",1)}
+    assert manifest.num_images()==11
+
+def test_rewritten_images_are_counted_once(tmp_path):
+    manifest=AcquisitionManifest(str(tmp_path))
+    manifest.add(site_entries("B02",1,num_z=1))
+    manifest.add(site_entries("B02",1,num_z=1))
+
+    assert manifest.num_images()==2
+    assert manifest.completed_sites(0,num_images_per_site=2)=={("B02",1)}
+    assert manifest.completed_sites(0,num_images_per_site=3)==set()
+
+def test_completed_sites_with_early_stopped_z_stacks(tmp_path):
+    manifest=AcquisitionManifest(str(tmp_path))
+    manifest.add(site_entries("B02",1,num_z=3))
+    manifest.set_num_z_planes(0,"B02",1,3)
+    manifest.add(site_entries("B02",2,num_z=2))
+    manifest.set_num_z_planes(0,"B02",2,3)
+
+    assert manifest.num_z_planes(0)=={("B02",1):3,("B02",2):3}
+    assert manifest.completed_sites(0,num_images_per_site=10,num_images_per_z_plane=2)=={("B02",1)}
+
+def test_manifest_is_reopened_on_resume(tmp_path):
+    manifest=AcquisitionManifest(str(tmp_path))
+    manifest.add(site_entries("B02",1,num_z=1))
+    manifest.set_metadata("directory_sharding","per_well")
+    manifest.close()
+
+    manifest=AcquisitionManifest(str(tmp_path))
+    assert manifest.completed_sites(0,num_images_per_site=2)=={("B02",1)}
+    assert manifest.get_metadata("directory_sharding")=="per_well"
+    assert manifest.get_metadata("does_not_exist") is None
+    manifest.close()
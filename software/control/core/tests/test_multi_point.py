@@ -0,0 +1,84 @@
+import threading
+import time
+import types
+
+import numpy
+import pytest
+
+from control._def import *
+from control.core.acquisition_plan import AcquisitionPlan
+from control.core.image_consumer import IMAGE_RETURN_CONSUMER_NAME
+from control.core.multi_point import MultiPointController, MultiPointWorker
+
+def process_events_until(qt_app,condition,timeout_s:float=2.0):
+    end_time=time.monotonic()+timeout_s
+    while not condition() and time.monotonic()<end_time:
+        qt_app.processEvents()
+        time.sleep(0.001)
+
+def empty_plan()->AcquisitionPlan:
+    return AcquisitionPlan(
+        plate_type="Generic 96",
+        num_x=1,
+        num_y=1,
+        delta_x_mm=0.9,
+        delta_y_mm=0.9,
+        num_z=1,
+        delta_z_mm=0.0015,
+        num_time_points=1,
+        time_point_interval_s=0.0,
+        channels=[],
+        wells=[],
+        actions=[],
+    )
+
+@pytest.fixture
+def multipoint_controller(qt_app)->MultiPointController:
+    """ controller without hardware, which can start (and reject) acquisitions """
+    return MultiPointController(
+        camera=None,
+        navigationController=types.SimpleNamespace(microcontroller=None),
+        liveController=types.SimpleNamespace(currentConfiguration=None),
+        autofocusController=None,
+        laserAutofocusController=None,
+        configuration_manager=None,
+        image_saver=None,
+    )
+
+def test_returned_images_are_delivered_on_the_controller_thread(qt_app,multipoint_controller):
+    delivery_threads=[]
+    # an acquisition without wells is rejected, after the image_return consumer has been set up
+    with pytest.raises(ValueError):
+        multipoint_controller.run_experiment(empty_plan(),on_new_acquisition=None,image_return=lambda image_data:delivery_threads.append(threading.get_ident()))
+
+    # images are submitted on the worker thread
+    image_data=AcquisitionImageData(image=numpy.zeros((4,4),dtype=numpy.uint16),path="image",config=None)
+    worker_thread=threading.Thread(target=multipoint_controller.image_dispatcher.submit,args=(image_data,))
+    worker_thread.start()
+    process_events_until(qt_app,lambda:len(delivery_threads)==1)
+    worker_thread.join()
+
+    assert delivery_threads==[threading.get_ident()]
+    multipoint_controller.image_dispatcher.remove_consumer(IMAGE_RETURN_CONSUMER_NAME)
+
+def test_abort_reaches_the_worker_while_it_waits_for_the_next_time_point(multipoint_controller):
+    # the worker shares the abort event of the controller that started it
+    worker=types.SimpleNamespace(abort_event=multipoint_controller.abort_event)
+    threading.Timer(0.05,multipoint_controller.request_abort_aquisition).start()
+
+    start_time=time.monotonic()
+    with pytest.raises(AbortAcquisitionException):
+        MultiPointWorker.wait_until(worker,time.time()+30.0)
+    assert time.monotonic()-start_time<0.25
+    assert multipoint_controller.abort_latency_s()<0.2
+
+def test_staging_is_not_used_for_zarr(multipoint_controller,monkeypatch,tmp_path):
+    monkeypatch.setattr(Acquisition,"STAGING_PATH",str(tmp_path/"staging"))
+    output_path=str(tmp_path/"output"/"plate_1")
+
+    assert multipoint_controller.staging_path_for(output_path,ImageFormat.TIFF)==str(tmp_path/"staging"/"plate_1")
+    # the metadata of the zarr hierarchy would miss the wells that have been migrated before it is written
+    assert multipoint_controller.staging_path_for(output_path,ImageFormat.ZARR) is None
+
+    monkeypatch.setattr(Acquisition,"STAGING_PATH",None)
+    assert multipoint_controller.staging_path_for(output_path,ImageFormat.TIFF) is None
@@ -0,0 +1,51 @@
+import numpy
+
+from control._def import *
+from control.core.prescan import PrescanResult, PrescanSite, SiteSelector
+
+def make_selector(min_num_sites_per_well:int=1)->SiteSelector:
+    return SiteSelector(downsample_factor=2,threshold_num_mad=5.0,min_object_area_px=4,min_num_objects=2,min_num_sites_per_well=min_num_sites_per_well)
+
+def image_with_objects(num_objects:int)->numpy.ndarray:
+    """ noisy background with num_objects bright squares """
+    image=numpy.random.default_rng(num_objects).normal(100.0,5.0,size=(256,256))
+    for object_index in range(num_objects):
+        y,x=40+(object_index//4)*50,40+(object_index%4)*50
+        image[y:y+12,x:x+12]=1000.0
+    return image.clip(0,4095).astype(numpy.uint16)
+
+def test_objects_are_counted():
+    selector=make_selector()
+    assert selector.count_objects(image_with_objects(0))==0
+    assert selector.count_objects(image_with_objects(3))==3
+    assert selector.count_objects(image_with_objects(7))==7
+
+def test_small_objects_are_ignored():
+    image=image_with_objects(0)
+    image[100:102,100:102]=1000
+    assert make_selector().count_objects(image)==0
+
+def test_sites_with_objects_are_selected():
+    sites=[PrescanSite(site=1+index,i=0,j=index,num_objects=num_objects) for index,num_objects in enumerate([0,5,1,2])]
+    well_prescan=make_selector().select("B02",sites)
+
+    assert well_prescan.selected_site_indices=={2,4}
+    assert well_prescan.grid_mask(num_x=4,num_y=1).tolist()==[[False,True,False,True]]
+
+def test_minimum_number_of_sites_per_well():
+    sites=[PrescanSite(site=1+index,i=0,j=index,num_objects=num_objects) for index,num_objects in enumerate([0,1,0,0])]
+    assert make_selector(min_num_sites_per_well=1).select("B02",sites).selected_site_indices=={2}
+
+def test_prescan_result_round_trip(tmp_path):
+    selector=make_selector()
+    result=PrescanResult(num_x=2,num_y=1,channel_name="Fluorescence 405 nm Ex",wells=[
+        selector.select("B02",[PrescanSite(site=1,i=0,j=0,num_objects=3),PrescanSite(site=2,i=0,j=1,num_objects=0)]),
+        selector.select("B03",[PrescanSite(site=1,i=0,j=0,num_objects=0),PrescanSite(site=2,i=0,j=1,num_objects=0)]),
+    ])
+    assert result.num_selected_sites==2
+
+    path=str(tmp_path/"prescan.json")
+    result.save(path)
+    loaded_result=PrescanResult.load(path)
+    assert loaded_result.as_json()==result.as_json()
+    assert loaded_result.as_json()["wells"][0]["grid_mask"]==[[True,False]]
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from control._def import *
+from control.core.route_planner import StageMotionModel, WellGridGeometry, estimate_path, order_wells, plan_route
+
+WELLPLATE_FORMAT=WELLPLATE_FORMATS["Generic 96"]
+
+@pytest.fixture
+def motion_model()->StageMotionModel:
+    return StageMotionModel(
+        max_velocity_x_mm_per_s=20.0,
+        max_velocity_y_mm_per_s=20.0,
+        max_acceleration_x_mm_per_s2=100.0,
+        max_acceleration_y_mm_per_s2=100.0,
+        stabilization_time_s=0.01,
+        direction_reversal_time_s=0.05,
+    )
+
+def test_move_time(motion_model):
+    # too short to reach max velocity: triangular profile
+    assert motion_model.axis_travel_time_s(1.0,20.0,100.0)==pytest.approx(0.2)
+    # trapezoidal profile
+    assert motion_model.axis_travel_time_s(10.0,20.0,100.0)==pytest.approx(0.7)
+    assert motion_model.move_time_s(0.0,0.0)==0.0
+    assert motion_model.move_time_s(1.0,-10.0)==pytest.approx(0.2+0.7+0.01)
+
+def test_estimate_path_counts_direction_reversals(motion_model):
+    estimate=estimate_path([(0.0,0.0),(1.0,0.0),(1.0,1.0),(0.0,1.0)],motion_model)
+    assert estimate.length_mm==pytest.approx(3.0)
+    assert estimate.num_direction_reversals==1
+
+def test_well_grid_is_scanned_in_serpentine_rows():
+    grid=WellGridGeometry(num_x=2,num_y=2,delta_x_mm=1.0,delta_y_mm=1.0)
+    assert grid.positions((0.0,0.0),1,1)==[(-0.5,-0.5),(0.5,-0.5),(0.5,0.5),(-0.5,0.5)]
+    assert grid.positions((0.0,0.0),-1,-1)==[(0.5,0.5),(-0.5,0.5),(-0.5,-0.5),(0.5,-0.5)]
+
+def test_order_wells_serpentine(motion_model):
+    wells=[(1,3),(0,0),(1,1),(0,2)]
+    assert order_wells(wells,WellOrder.SERPENTINE_ROWS,WELLPLATE_FORMAT,motion_model)==[(0,0),(0,2),(1,3),(1,1)]
+    assert order_wells(wells,WellOrder.SERPENTINE_COLUMNS,WELLPLATE_FORMAT,motion_model)==[(0,0),(1,1),(0,2),(1,3)]
+    assert order_wells(wells,WellOrder.AS_GIVEN,WELLPLATE_FORMAT,motion_model)==wells
+
+def test_planned_route_is_not_slower_than_the_naive_route(motion_model):
+    wells=random.Random(0).sample([(row,column) for row in range(8) for column in range(12)],20)
+    grid=WellGridGeometry(num_x=3,num_y=2,delta_x_mm=0.9,delta_y_mm=0.9)
+
+    naive_route=plan_route(wells,WELLPLATE_FORMAT,grid,WellOrder.AS_GIVEN,motion_model=motion_model,optimize_entry_corners=False)
+    assert all(visit.entry_corner=="top-left" for visit in naive_route.visits)
+
+    for well_order in (WellOrder.SERPENTINE_ROWS,WellOrder.SHORTEST_PATH):
+        route=plan_route(wells,WELLPLATE_FORMAT,grid,well_order,motion_model=motion_model)
+        assert sorted((visit.row,visit.column) for visit in route.visits)==sorted(wells)
+        assert route.estimate.time_s<naive_route.estimate.time_s
+
+    # entry corners alone never make a route slower
+    route=plan_route(wells,WELLPLATE_FORMAT,grid,WellOrder.AS_GIVEN,motion_model=motion_model)
+    assert route.estimate.time_s<=naive_route.estimate.time_s
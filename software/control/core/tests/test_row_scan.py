@@ -0,0 +1,35 @@
+import pytest
+
+from control._def import *
+from control.core.row_scan import RowScanPlan, plan_row_scan, MIN_ROW_SCAN_VELOCITY_MM_PER_S
+
+def test_row_scan_timing():
+    plan=RowScanPlan(num_fovs=4,fov_spacing_mm=0.5,exposure_time_s=0.001,velocity_mm_per_s=5.0,acceleration_mm_per_s2=500.0,pixel_size_um=0.5)
+
+    assert plan.frame_interval_s==pytest.approx(0.1)
+    assert plan.ramp_distance_mm==pytest.approx(0.025)
+    assert plan.total_distance_mm==pytest.approx(0.025+1.5+0.025)
+    # 5mm/s during 1ms is 5um, i.e. 10 pixels
+    assert plan.blur_px==pytest.approx(10.0)
+    assert plan.fov_time_s(0)==pytest.approx(0.01)
+    assert plan.trigger_time_s(2)==pytest.approx(0.01+0.2-0.0005)
+    assert plan.duration_s==pytest.approx(0.01+0.3+0.01)
+
+def test_plan_that_blurs_too_much_is_invalid():
+    plan=RowScanPlan(num_fovs=4,fov_spacing_mm=0.5,exposure_time_s=0.001,velocity_mm_per_s=5.0,acceleration_mm_per_s2=500.0,pixel_size_um=0.5)
+    assert any("blur" in issue for issue in plan.validate())
+
+def test_planned_scan_is_valid():
+    plan=plan_row_scan(num_fovs=10,fov_spacing_mm=0.5,exposure_time_ms=0.05,pixel_size_um=0.3)
+    if plan is None:
+        pytest.skip("a row scan is not faster than stop-and-go on this machine config")
+
+    assert plan.validate()==[]
+    assert plan.blur_px<=Acquisition.ROW_SCAN_MAX_BLUR_PX+1e-9
+    assert plan.velocity_mm_per_s/MIN_ROW_SCAN_VELOCITY_MM_PER_S==pytest.approx(round(plan.velocity_mm_per_s/MIN_ROW_SCAN_VELOCITY_MM_PER_S))
+
+def test_no_scan_if_impossible():
+    assert plan_row_scan(num_fovs=1,fov_spacing_mm=0.5,exposure_time_ms=0.5,pixel_size_um=0.3) is None
+    assert plan_row_scan(num_fovs=10,fov_spacing_mm=0.0,exposure_time_ms=0.5,pixel_size_um=0.3) is None
+    # the blur limit would require a velocity below the resolution of the microcontroller
+    assert plan_row_scan(num_fovs=10,fov_spacing_mm=0.5,exposure_time_ms=1000.0,pixel_size_um=0.3) is None
@@ -0,0 +1,78 @@
+import os
+
+from control._def import *
+from control.core.directory_sharding import shard_directory_name
+from control.core.storage_migrator import StorageMigrator
+
+def write_file(path,content:bytes=b"image"):
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    with open(path,"wb") as file:
+        file.write(content)
+
+def test_files_of_well_without_sharding(tmp_path):
+    staging_path=tmp_path/"staging"
+    write_file(staging_path/"0"/"B02_s1_z0_c0.tiff")
+    write_file(staging_path/"0"/"B02.tiff")
+    write_file(staging_path/"0"/"B020_s1_z0_c0.tiff")
+    write_file(staging_path/"0"/"B03_s1_z0_c0.tiff")
+    write_file(staging_path/ZARR_STORE_NAME/"B02"/"1"/".zattrs")
+
+    migrator=StorageMigrator(staging_path=str(staging_path),output_path=str(tmp_path/"output"))
+    try:
+        assert migrator.files_of_well("0","B02",[1])==[
+            os.path.join("0","B02.tiff"),
+            os.path.join("0","B02_s1_z0_c0.tiff"),
+            os.path.join(ZARR_STORE_NAME,"B02","1",".zattrs"),
+        ]
+    finally:
+        migrator.close()
+
+def test_files_of_well_per_well_sharding(tmp_path):
+    staging_path=tmp_path/"staging"
+    write_file(staging_path/"0"/"B02"/"B02_s1_z0_c0.tiff")
+    write_file(staging_path/"0"/"B02"/"B02.tiff")
+    write_file(staging_path/"0"/"B03"/"B03_s1_z0_c0.tiff")
+
+    migrator=StorageMigrator(staging_path=str(staging_path),output_path=str(tmp_path/"output"),directory_sharding=DirectorySharding.PER_WELL)
+    try:
+        assert migrator.files_of_well("0","B02",[1])==[os.path.join("0","B02","B02.tiff"),os.path.join("0","B02","B02_s1_z0_c0.tiff")]
+    finally:
+        migrator.close()
+
+def test_files_of_well_only_searches_the_buckets_of_the_well(tmp_path):
+    staging_path=tmp_path/"staging"
+    num_buckets=64
+    for well_name in ("B02","B03"):
+        for site in range(1,5):
+            bucket=shard_directory_name(DirectorySharding.HASHED,well_name,site,num_buckets)
+            write_file(staging_path/"0"/bucket/f"{well_name}_s{site}_z0_c0.tiff")
+
+    # a file of the well in a bucket that none of its sites hash to is not found, because that bucket is not searched
+    well_buckets={shard_directory_name(DirectorySharding.HASHED,"B02",site,num_buckets) for site in range(1,5)}
+    other_bucket=next(f"bucket_{bucket:04}" for bucket in range(num_buckets) if not f"bucket_{bucket:04}" in well_buckets)
+    write_file(staging_path/"0"/other_bucket/"B02_s9_z0_c0.tiff")
+
+    migrator=StorageMigrator(staging_path=str(staging_path),output_path=str(tmp_path/"output"),directory_sharding=DirectorySharding.HASHED,num_shard_buckets=num_buckets)
+    try:
+        assert sorted(migrator.files_of_well("0","B02",[1,2,3,4]))==sorted(
+            os.path.join("0",shard_directory_name(DirectorySharding.HASHED,"B02",site,num_buckets),f"B02_s{site}_z0_c0.tiff")
+            for site in range(1,5)
+        )
+    finally:
+        migrator.close()
+
+def test_migrated_files_are_moved(tmp_path):
+    staging_path=tmp_path/"staging"
+    output_path=tmp_path/"output"
+    write_file(staging_path/"0"/"B02_s1_z0_c0.tiff",b"a"*100_000)
+    write_file(staging_path/"0"/"B03_s1_z0_c0.tiff",b"b")
+
+    migrator=StorageMigrator(staging_path=str(staging_path),output_path=str(output_path))
+    migrator.migrate_well("0","B02",[1])
+    migrator.close()
+
+    assert (output_path/"0"/"B02_s1_z0_c0.tiff").read_bytes()==b"a"*100_000
+    assert not (staging_path/"0"/"B02_s1_z0_c0.tiff").exists()
+    assert (staging_path/"0"/"B03_s1_z0_c0.tiff").exists()
+    assert migrator.stats.num_files_migrated==1
+    assert migrator.stats.num_files_pending==0
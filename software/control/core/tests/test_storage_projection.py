@@ -0,0 +1,40 @@
+import pytest
+
+from control._def import *
+from control.core.storage_projection import StorageProjection, initial_storage_estimate_bytes
+
+def projection(**kwargs)->StorageProjection:
+    return StorageProjection(**{
+        "num_images_saved":100,
+        "num_bytes_saved":100*1024**2,
+        "num_raw_bytes_saved":250*1024**2,
+        "num_images_remaining":400,
+        "free_space_bytes":1024**3,
+        "write_rate_bytes_per_s":10.0*1024**2,
+        **kwargs,
+    })
+
+def test_projection_from_measured_compression():
+    p=projection()
+    assert p.compression_ratio==pytest.approx(2.5)
+    assert p.bytes_per_image==pytest.approx(1024**2)
+    assert p.projected_remaining_bytes==pytest.approx(400*1024**2)
+    assert p.projected_total_bytes==pytest.approx(500*1024**2)
+    assert p.time_to_full_s==pytest.approx(102.4)
+
+def test_fits_keeps_the_reserve_free():
+    assert projection().fits(reserve_bytes=600*1024**2)
+    assert not projection().fits(reserve_bytes=700*1024**2)
+    assert not projection(num_images_remaining=2000).fits(reserve_bytes=0)
+
+def test_projection_before_any_image_was_saved():
+    p=projection(num_images_saved=0,num_bytes_saved=0,num_raw_bytes_saved=0,write_rate_bytes_per_s=0.0)
+    assert p.compression_ratio==1.0
+    assert p.projected_remaining_bytes==0.0
+    assert p.time_to_full_s==float("inf")
+
+def test_initial_storage_estimate():
+    assert initial_storage_estimate_bytes(10,100,50,2.0,ImageFormat.TIFF)==100_000
+    assert initial_storage_estimate_bytes(10,100,50,2.0,ImageFormat.TIFF_COMPRESSED)==pytest.approx(100_000/Acquisition.STORAGE_ESTIMATE_COMPRESSION_RATIO)
+    # packed 12 bit images
+    assert initial_storage_estimate_bytes(10,100,50,1.5,ImageFormat.TIFF)==75_000
@@ -0,0 +1,76 @@
+import pytest
+
+from control._def import *
+from control.core.timelapse_scheduler import ScheduledRegion, TimelapseScheduler
+
+def run_schedule(scheduler:TimelapseScheduler,visit_duration_s)->list:
+    """ simulate the acquisition loop, returns (region name, visit index, start time) of all visits in the order they were run """
+
+    now=scheduler.start_time
+    visits=[]
+    while not scheduler.done:
+        visit=scheduler.next_visit(now)
+        if visit is None:
+            now=scheduler.next_release_time()
+            continue
+
+        scheduler.begin_visit(visit,now)
+        visits.append((visit.region.name,visit.visit_index,now))
+        now+=visit_duration_s(visit.region.name,visit.visit_index)
+        scheduler.end_visit(visit,now)
+
+    return visits
+
+def test_equal_periods_image_time_point_by_time_point():
+    regions=[ScheduledRegion(name=name,index=index,period_s=10.0,num_visits=2) for index,name in enumerate(["B02","B03","B04"])]
+    visits=run_schedule(TimelapseScheduler(regions,start_time=100.0),lambda name,visit_index:1.0)
+
+    assert visits==[("B02",0,100.0),("B03",0,101.0),("B04",0,102.0),("B02",1,110.0),("B03",1,111.0),("B04",1,112.0)]
+
+def test_shorter_periods_are_interleaved():
+    regions=[
+        ScheduledRegion(name="fast",index=0,period_s=10.0,num_visits=6,group="fast"),
+        ScheduledRegion(name="slow",index=1,period_s=30.0,num_visits=2,group="slow"),
+    ]
+    scheduler=TimelapseScheduler(regions,start_time=0.0)
+    visits=run_schedule(scheduler,lambda name,visit_index:2.0)
+
+    assert [start_time for name,_visit_index,start_time in visits if name=="fast"]==[0.0,10.0,20.0,30.0,40.0,50.0]
+    assert [start_time for name,_visit_index,start_time in visits if name=="slow"]==[2.0,32.0]
+
+    report=scheduler.report()
+    assert report.num_missed_deadlines==0
+    assert report.max_jitter_s==pytest.approx(2.0)
+    assert "fast: 1 regions, 6 visits" in report.as_text()
+
+def test_delayed_visit_does_not_delay_later_releases():
+    regions=[ScheduledRegion(name="B02",index=0,period_s=10.0,num_visits=4)]
+    scheduler=TimelapseScheduler(regions,start_time=0.0)
+    visits=run_schedule(scheduler,lambda name,visit_index:15.0 if visit_index==1 else 1.0)
+
+    assert [start_time for _name,_visit_index,start_time in visits]==[0.0,10.0,25.0,30.0]
+    report=scheduler.report()
+    assert report.num_missed_deadlines==1
+    assert report.regions[0].max_jitter_s==pytest.approx(5.0)
+
+def test_regions_without_period_fill_the_gaps():
+    regions=[
+        ScheduledRegion(name="periodic",index=0,period_s=10.0,num_visits=2),
+        ScheduledRegion(name="continuous",index=1,period_s=0.0,num_visits=3),
+    ]
+    visits=run_schedule(TimelapseScheduler(regions,start_time=0.0),lambda name,visit_index:3.0)
+
+    assert visits==[("periodic",0,0.0),("continuous",0,3.0),("continuous",1,6.0),("continuous",2,9.0),("periodic",1,12.0)]
+
+def test_pending_visits_per_time_point():
+    regions=[ScheduledRegion(name=name,index=index,period_s=10.0,num_visits=1) for index,name in enumerate(["B02","B03"])]
+    scheduler=TimelapseScheduler(regions,start_time=0.0)
+
+    visit=scheduler.next_visit(0.0)
+    scheduler.begin_visit(visit,0.0)
+    assert scheduler.end_visit(visit,1.0)==1
+    visit=scheduler.next_visit(1.0)
+    scheduler.begin_visit(visit,1.0)
+    assert scheduler.end_visit(visit,2.0)==0
+    assert scheduler.done
+    assert scheduler.next_release_time() is None
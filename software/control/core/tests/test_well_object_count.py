@@ -0,0 +1,38 @@
+import numpy
+
+from control._def import *
+from control.core.acquisition_plan import PlannedSite
+from control.core.prescan import SiteSelector
+from control.core.well_object_count import WellObjectCounter, center_out_order
+
+def grid_sites(num_x:int,num_y:int)->list:
+    return [PlannedSite(site=1+j+i*num_x,i=i,j=j,x_mm=float(j),y_mm=float(i)) for i in range(num_y) for j in range(num_x)]
+
+def test_center_out_order():
+    ordered_sites=center_out_order(grid_sites(3,3),num_x=3,num_y=3,delta_x_mm=1.0,delta_y_mm=1.0)
+
+    # the centre, then the edges, then the corners
+    assert [site.site for site in ordered_sites]==[5,2,4,6,8,1,3,7,9]
+
+def test_center_out_order_respects_the_grid_spacing():
+    ordered_sites=center_out_order(grid_sites(3,3),num_x=3,num_y=3,delta_x_mm=1.0,delta_y_mm=2.0)
+    assert [site.site for site in ordered_sites][:3]==[5,4,6]
+
+def test_objects_are_counted_per_well():
+    selector=SiteSelector(downsample_factor=1,threshold_num_mad=5.0,min_object_area_px=4,min_num_objects=1,min_num_sites_per_well=1)
+    counter=WellObjectCounter(channel_name="Fluorescence 405 nm Ex",target_num_objects=3,selector=selector)
+
+    image=numpy.full((64,64),100,dtype=numpy.uint16)
+    image[10:20,10:20]=1000
+    image[40:50,40:50]=1000
+
+    counter.submit(0,"B02",image)
+    counter.submit(0,"B03",image)
+    counter.submit(0,"B02",image)
+    counter.shutdown()
+
+    assert counter.num_objects(0,"B02")==4
+    assert counter.num_objects(0,"B03")==2
+    assert counter.num_objects(1,"B02")==0
+    assert counter.target_reached(0,"B02")
+    assert not counter.target_reached(0,"B03")
@@ -0,0 +1,55 @@
+import os
+
+import numpy
+import pytest
+import tifffile
+
+from control._def import *
+from control.core.well_tiff_writer import WellTiffWriter, read_well_tiff_index, read_well_tiff_image, WELL_TIFF_INDEX_SUFFIX
+
+def location(well_name:str,site:int,z:int,channel_index:int)->ImageLocation:
+    return ImageLocation(well_name=well_name,site=site,x=site-1,y=0,z=z,time_point=0,channel_name=f"c{channel_index}",channel_index=channel_index)
+
+def test_well_tiff_round_trip(tmp_path):
+    writer=WellTiffWriter()
+
+    images={}
+    for site in (1,2):
+        for z in range(2):
+            for channel_index in range(2):
+                image=numpy.random.default_rng(len(images)).integers(0,4096,size=(16,24),dtype=numpy.uint16)
+                path=str(tmp_path/f"B02_s{site}_x{site-1}_y0_z{z}_c{channel_index}")
+                assert writer.write(path,location("B02",site,z,channel_index),image,{"bit_depth":12})==image.nbytes
+                images[(site,z,f"c{channel_index}")]=image
+    writer.write(str(tmp_path/"B03_s1"),location("B03",1,0,0),numpy.ones((16,24),dtype=numpy.uint16),{})
+
+    file_path=WellTiffWriter.file_path_for(str(tmp_path),"B02")
+    # the index is only written once the well is finished
+    assert not os.path.exists(file_path+WELL_TIFF_INDEX_SUFFIX)
+    writer.finish_well(str(tmp_path),"B02")
+    assert os.path.exists(file_path+WELL_TIFF_INDEX_SUFFIX)
+
+    pages=read_well_tiff_index(file_path)
+    assert len(pages)==8
+    assert [page.page for page in pages]==list(range(8))
+    assert pages[0].file_ID=="B02_s1_x0_y0_z0_c0"
+
+    for (site,z,channel_name),image in images.items():
+        assert numpy.array_equal(read_well_tiff_image(file_path,site,z,channel_name),image)
+
+    # regular tiff readers see one page per image
+    with tifffile.TiffFile(file_path) as tiff_file:
+        assert tiff_file.is_bigtiff
+        assert len(tiff_file.pages)==8
+        assert numpy.array_equal(tiff_file.pages[pages[5].page].asarray(),images[(pages[5].site,pages[5].z,pages[5].channel_name)])
+
+    writer.close()
+    assert len(read_well_tiff_index(WellTiffWriter.file_path_for(str(tmp_path),"B03")))==1
+
+def test_missing_image_raises(tmp_path):
+    writer=WellTiffWriter()
+    writer.write(str(tmp_path/"B02_s1"),location("B02",1,0,0),numpy.ones((4,4),dtype=numpy.uint16),{})
+    writer.close()
+
+    with pytest.raises(ValueError):
+        read_well_tiff_image(WellTiffWriter.file_path_for(str(tmp_path),"B02"),1,1,"c0")
@@ -0,0 +1,42 @@
+import pytest
+
+from control._def import *
+from control.core.z_sweep import ZSweepPlan, interpolate_position, plan_z_sweep, MIN_Z_SWEEP_VELOCITY_MM_PER_S
+
+def test_sweep_timing():
+    plan=ZSweepPlan(num_planes=5,plane_spacing_mm=0.002,exposure_time_s=0.01,velocity_mm_per_s=0.02,acceleration_mm_per_s2=1.0,clear_backlash_mm=0.005)
+
+    assert plan.frame_interval_s==pytest.approx(0.1)
+    assert plan.ramp_distance_mm==pytest.approx(0.0002)
+    assert plan.lead_in_distance_mm==pytest.approx(0.0052)
+    assert plan.total_distance_mm==pytest.approx(0.0052+0.008+0.0002)
+    # accelerate for 0.02s, then travel the backlash distance at sweep velocity
+    assert plan.plane_time_s(0)==pytest.approx(0.02+0.25)
+    assert plan.plane_time_s(4)-plan.plane_time_s(0)==pytest.approx(4*plan.frame_interval_s)
+    # the exposure is centered on the plane
+    assert plan.trigger_time_s(1)==pytest.approx(plan.plane_time_s(1)-0.005)
+    assert plan.duration_s==pytest.approx(plan.plane_time_s(4)+0.02)
+
+def test_planned_sweep_respects_blur_and_frame_rate():
+    plan=plan_z_sweep(num_planes=20,plane_spacing_mm=0.0015,exposure_time_ms=5.0,clear_backlash_mm=0.005)
+    if plan is None:
+        pytest.skip("a z sweep is not faster than moving to each plane on this machine config")
+
+    assert plan.exposure_time_s*plan.velocity_mm_per_s<=Acquisition.Z_SWEEP_MAX_BLUR_FRACTION*plan.plane_spacing_mm+1e-12
+    assert plan.frame_interval_s>=plan.exposure_time_s+Acquisition.Z_SWEEP_FRAME_OVERHEAD_S-1e-9
+    # the velocity can be set on the microcontroller exactly
+    assert plan.velocity_mm_per_s/MIN_Z_SWEEP_VELOCITY_MM_PER_S==pytest.approx(round(plan.velocity_mm_per_s/MIN_Z_SWEEP_VELOCITY_MM_PER_S))
+
+def test_no_sweep_if_impossible():
+    assert plan_z_sweep(num_planes=1,plane_spacing_mm=0.0015,exposure_time_ms=5.0,clear_backlash_mm=0.005) is None
+    assert plan_z_sweep(num_planes=10,plane_spacing_mm=0.0,exposure_time_ms=5.0,clear_backlash_mm=0.005) is None
+    # the blur limit would require a velocity below the resolution of the microcontroller
+    assert plan_z_sweep(num_planes=10,plane_spacing_mm=0.0015,exposure_time_ms=1000.0,clear_backlash_mm=0.005) is None
+
+def test_interpolate_position():
+    history=[(1.0,100),(2.0,200),(3.0,200)]
+    assert interpolate_position(history,1.5)==pytest.approx(150.0)
+    assert interpolate_position(history,2.5)==pytest.approx(200.0)
+    assert interpolate_position(history,0.5) is None
+    assert interpolate_position(history,3.5) is None
+    assert interpolate_position(history[:1],1.0) is None
@@ -0,0 +1,57 @@
+import numpy
+import pytest
+
+zarr=pytest.importorskip("zarr")
+if not hasattr(zarr,"DirectoryStore"):
+    pytest.skip("the zarr image format requires zarr<3",allow_module_level=True)
+
+from control._def import *
+from control.core.zarr_writer import ZarrImageWriter
+
+def location(well_name:str,site:int,z:int,channel_index:int)->ImageLocation:
+    return ImageLocation(well_name=well_name,site=site,x=0,y=0,z=z,time_point=0,channel_name=f"c{channel_index}",channel_index=channel_index)
+
+def test_images_round_trip(tmp_path):
+    layout=AcquisitionLayout(channel_names=["c0","c1"],num_z=2,num_time_points=1)
+    writer=ZarrImageWriter(str(tmp_path),layout,compressor=None)
+
+    images={}
+    for z in range(2):
+        for channel_index in range(2):
+            image=numpy.random.default_rng(z*2+channel_index).integers(1,4096,size=(16,24),dtype=numpy.uint16)
+            assert writer.write(location("B02",1,z,channel_index),image,{})>0
+            images[(channel_index,z)]=image
+    writer.close()
+
+    array=zarr.open(str(tmp_path/ZARR_STORE_NAME),mode="r")["B02/1/0"]
+    assert array.shape==(1,2,2,16,24)
+    for (channel_index,z),image in images.items():
+        assert numpy.array_equal(array[0,channel_index,z],image)
+
+def test_acquired_planes_are_stored_when_the_well_is_finished(tmp_path):
+    layout=AcquisitionLayout(channel_names=["c0"],num_z=3,num_time_points=1)
+    writer=ZarrImageWriter(str(tmp_path),layout,compressor=None)
+
+    image=numpy.ones((8,8),dtype=numpy.uint16)
+    writer.write(location("B02",1,0,0),image,{})
+    writer.write(location("B02",1,2,0),image,{})
+    writer.write(location("B03",1,1,0),image,{})
+
+    # not written per image
+    assert not "acquired_planes" in writer.arrays[("B02",1)].attrs
+
+    writer.finish_well("B02")
+    assert writer.arrays[("B02",1)].attrs["acquired_planes"]==[[0,0,0],[0,0,2]]
+    assert not "acquired_planes" in writer.arrays[("B03",1)].attrs
+
+    writer.close()
+    root=zarr.open(str(tmp_path/ZARR_STORE_NAME),mode="r")
+    assert root["B03/1/0"].attrs["acquired_planes"]==[[0,0,1]]
+
+def test_empty_image_does_not_fail(tmp_path):
+    layout=AcquisitionLayout(channel_names=["c0"],num_z=1,num_time_points=1)
+    writer=ZarrImageWriter(str(tmp_path),layout,compressor=None)
+
+    # zarr may skip chunks that only contain the fill value
+    assert writer.write(location("B02",1,0,0),numpy.zeros((8,8),dtype=numpy.uint16),{})>=0
+    writer.close()
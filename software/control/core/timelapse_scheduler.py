@@ -0,0 +1,219 @@
+from control._def import *
+
+import json
+import math
+
+from typing import Optional, List, Dict, Tuple
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# in a time-lapse acquisition, each region (well) is imaged periodically. the n-th visit of a region is released (may start) at
+#   start_time + offset_s + n*period_s
+# and should be done before the next one is released (its deadline). visits are run earliest deadline first, so that
+#   - a visit that has been delayed (e.g. because a previous one took longer than expected) does not delay the releases of later visits,
+#   - regions with a shorter period are interleaved with the visits of regions with a longer period, and
+#   - regions of several groups (e.g. well sets with different periods) share the instrument in one run.
+# when all regions have the same period, this images all regions in order, then waits for the next time point (like a plain time-lapse loop).
+
+@TypecheckClass
+class ScheduledRegion:
+    """ region that is imaged periodically """
+
+    name:str
+    """ e.g. the well name """
+    index:int
+    """ index of the region in the order it is imaged within a time point, used to break ties between visits with the same deadline """
+    period_s:float
+    """ time between the releases of two consecutive visits. 0 means the region is imaged as often as possible, without deadlines. """
+    num_visits:int
+    offset_s:float=0.0
+    """ release of the first visit, relative to the start of the acquisition """
+    group:str=""
+    """ e.g. the protocol the region belongs to, used to summarize the schedule """
+
+@TypecheckClass
+class RegionVisit:
+    """ one visit of a region, and when it has actually been run """
+
+    region:ScheduledRegion
+    visit_index:int
+    release_time:float
+    deadline:Optional[float]
+    """ None if the region has no period """
+    start_time:Optional[float]=None
+    end_time:Optional[float]=None
+
+    @property
+    def jitter_s(self)->float:
+        """ how late the visit started """
+        if self.start_time is None:
+            return float("nan")
+        return self.start_time-self.release_time
+
+    @property
+    def missed_deadline(self)->bool:
+        return not self.deadline is None and not self.end_time is None and self.end_time>self.deadline
+
+class TimelapseScheduler:
+    """ earliest deadline first schedule of periodic region visits """
+
+    def __init__(self,regions:List[ScheduledRegion],start_time:float):
+        self.regions=regions
+        self.start_time=start_time
+
+        self.next_visit_index:Dict[str,int]={region.name:0 for region in regions}
+        """ index of the next visit of each region that has not been started yet """
+        self.visits:List[RegionVisit]=[]
+        """ visits that have been started """
+        self.num_pending_visits_by_index:Dict[int,int]={}
+        """ number of visits with a given visit index (i.e. time point) that have not been completed yet """
+        for region in regions:
+            for visit_index in range(region.num_visits):
+                self.num_pending_visits_by_index[visit_index]=self.num_pending_visits_by_index.get(visit_index,0)+1
+
+    @property
+    def done(self)->bool:
+        return all(self.next_visit_index[region.name]>=region.num_visits for region in self.regions)
+
+    def _visit(self,region:ScheduledRegion,visit_index:int)->RegionVisit:
+        release_time=self.start_time+region.offset_s+visit_index*region.period_s
+        return RegionVisit(
+            region=region,
+            visit_index=visit_index,
+            release_time=release_time,
+            deadline=release_time+region.period_s if region.period_s>0 else None,
+        )
+
+    def _pending_visits(self)->List[RegionVisit]:
+        """ next visit of each region that has not been imaged completely """
+        return [
+            self._visit(region,self.next_visit_index[region.name])
+            for region in self.regions
+            if self.next_visit_index[region.name]<region.num_visits
+        ]
+
+    def next_visit(self,now:float)->Optional[RegionVisit]:
+        """ the released visit with the earliest deadline, or None if no visit has been released yet (see next_release_time) """
+
+        released_visits=[visit for visit in self._pending_visits() if visit.release_time<=now]
+        if len(released_visits)==0:
+            return None
+
+        # visits without deadline are run after those with one, in visit order (i.e. time point by time point)
+        return min(released_visits,key=lambda visit:(
+            visit.deadline if not visit.deadline is None else math.inf,
+            visit.visit_index,
+            visit.region.index,
+        ))
+
+    def next_release_time(self)->Optional[float]:
+        """ release time of the visit that is released next (None if all visits have been started) """
+
+        pending_visits=self._pending_visits()
+        if len(pending_visits)==0:
+            return None
+        return min(visit.release_time for visit in pending_visits)
+
+    def begin_visit(self,visit:RegionVisit,now:float):
+        assert self.next_visit_index[visit.region.name]==visit.visit_index
+
+        visit.start_time=now
+        self.visits.append(visit)
+        self.next_visit_index[visit.region.name]+=1
+
+    def end_visit(self,visit:RegionVisit,now:float):
+        """ record that the visit is complete. returns the number of visits with the same visit index that are still pending. """
+
+        visit.end_time=now
+        self.num_pending_visits_by_index[visit.visit_index]-=1
+
+        if visit.missed_deadline:
+            MAIN_LOG.log(f"warning - visit {visit.visit_index} of region {visit.region.name} missed its deadline by {visit.end_time-visit.deadline:.3f}s (started {visit.jitter_s:.3f}s after its release)")
+
+        return self.num_pending_visits_by_index[visit.visit_index]
+
+    def report(self)->"TimelapseReport":
+        regions:List[TimelapseRegionReport]=[]
+        for region in self.regions:
+            visits=[visit for visit in self.visits if visit.region.name==region.name and not visit.end_time is None]
+            jitters_s=[visit.jitter_s for visit in visits]
+            durations_s=[visit.end_time-visit.start_time for visit in visits]
+
+            regions.append(TimelapseRegionReport(
+                name=region.name,
+                group=region.group,
+                period_s=region.period_s,
+                num_visits=len(visits),
+                num_missed_deadlines=sum(1 for visit in visits if visit.missed_deadline),
+                mean_jitter_s=sum(jitters_s)/len(jitters_s) if len(jitters_s)>0 else 0.0,
+                max_jitter_s=max(jitters_s,default=0.0),
+                mean_visit_duration_s=sum(durations_s)/len(durations_s) if len(durations_s)>0 else 0.0,
+            ))
+
+        return TimelapseReport(regions=regions)
+
+@TypecheckClass
+class TimelapseRegionReport:
+    name:str
+    group:str
+    period_s:float
+    num_visits:int
+    """ completed visits """
+    num_missed_deadlines:int
+    mean_jitter_s:float
+    max_jitter_s:float
+    mean_visit_duration_s:float
+
+    def as_json(self)->dict:
+        return {
+            "name":self.name,
+            "group":self.group,
+            "period_s":self.period_s,
+            "num_visits":self.num_visits,
+            "num_missed_deadlines":self.num_missed_deadlines,
+            "mean_jitter_s":self.mean_jitter_s,
+            "max_jitter_s":self.max_jitter_s,
+            "mean_visit_duration_s":self.mean_visit_duration_s,
+        }
+
+@TypecheckClass
+class TimelapseReport:
+    """ how well the schedule has been kept, per region """
+
+    regions:List[TimelapseRegionReport]
+
+    @property
+    def num_missed_deadlines(self)->int:
+        return sum(region.num_missed_deadlines for region in self.regions)
+
+    @property
+    def max_jitter_s(self)->float:
+        return max((region.max_jitter_s for region in self.regions),default=0.0)
+
+    def as_text(self)->str:
+        lines=[f"time-lapse schedule: {self.num_missed_deadlines} missed deadlines, max. jitter {self.max_jitter_s:.3f}s"]
+
+        groups:Dict[str,List[TimelapseRegionReport]]={}
+        for region in self.regions:
+            groups.setdefault(region.group,[]).append(region)
+
+        for group_name,regions in groups.items():
+            num_visits=sum(region.num_visits for region in regions)
+            mean_jitter_s=sum(region.mean_jitter_s*region.num_visits for region in regions)/max(num_visits,1)
+            lines.append(
+                f"  {group_name or 'regions'}: {len(regions)} regions, {num_visits} visits, "
+                f"{sum(region.num_missed_deadlines for region in regions)} missed deadlines, "
+                f"jitter mean {mean_jitter_s:.3f}s max {max(region.max_jitter_s for region in regions):.3f}s"
+            )
+
+        return "\n".join(lines)
+
+    def as_json(self)->dict:
+        return {
+            "num_missed_deadlines":self.num_missed_deadlines,
+            "max_jitter_s":self.max_jitter_s,
+            "regions":[region.as_json() for region in self.regions],
+        }
+
+    def save(self,path:str):
+        with open(path,"w",encoding="utf-8") as file:
+            json.dump(self.as_json(),file,indent=2)
@@ -0,0 +1,69 @@
+from control._def import *
+
+import threading
+import numpy
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Tuple
+from control.typechecker import TypecheckFunction
+from control.core.acquisition_plan import PlannedSite
+from control.core.prescan import SiteSelector
+
+# for assays that need a certain number of objects (e.g. cells) per well rather than a fixed area, imaging a well can stop once enough
+# objects have been counted. the images of one channel are counted (like in the prescan, see control.core.prescan) on a background
+# thread while the acquisition continues, and the sites are visited from the centre of the well outwards, so that the imaged sites are
+# representative of the well, and edge effects (meniscus, uneven seeding) are only reached when the well is sparse.
+# counting lags behind the acquisition by a few images, so the target may be exceeded by the objects of the sites imaged in the meantime.
+
+@TypecheckFunction
+def center_out_order(sites:List[PlannedSite],num_x:int,num_y:int,delta_x_mm:float,delta_y_mm:float)->List[PlannedSite]:
+    """ sites ordered by their distance to the centre of the grid (ties in site order) """
+
+    center_x_mm=delta_x_mm*(num_x-1)/2
+    center_y_mm=delta_y_mm*(num_y-1)/2
+    return sorted(sites,key=lambda site:((site.j*delta_x_mm-center_x_mm)**2+(site.i*delta_y_mm-center_y_mm)**2,site.site))
+
+class WellObjectCounter:
+    """ counts the objects in images of one channel on a background thread, and accumulates the counts per well, see Acquisition.WELL_TARGET_NUM_OBJECTS """
+
+    def __init__(self,channel_name:str,target_num_objects:int,selector:SiteSelector):
+        self.channel_name=channel_name
+        self.target_num_objects=target_num_objects
+        self.selector=selector
+
+        self.lock=threading.Lock()
+        self.num_objects_by_well:Dict[Tuple[int,str],int]={}
+        """ objects counted so far, by time point and well name """
+        self.pending_counts:List[Future]=[]
+        self.executor=ThreadPoolExecutor(max_workers=1,thread_name_prefix="well_object_counter")
+
+    def submit(self,time_point:int,well_name:str,image:numpy.ndarray):
+        """ count the objects in image in the background (the image must not be modified afterwards) """
+
+        self.pending_counts=[future for future in self.pending_counts if not future.done()]
+        self.pending_counts.append(self.executor.submit(self._count,time_point,well_name,image))
+
+    def _count(self,time_point:int,well_name:str,image:numpy.ndarray):
+        num_objects=self.selector.count_objects(image)
+        with self.lock:
+            key=(time_point,well_name)
+            self.num_objects_by_well[key]=self.num_objects_by_well.get(key,0)+num_objects
+
+    def num_objects(self,time_point:int,well_name:str)->int:
+        """ objects counted in the well so far (images that are still being counted are not included) """
+
+        with self.lock:
+            return self.num_objects_by_well.get((time_point,well_name),0)
+
+    def target_reached(self,time_point:int,well_name:str)->bool:
+        return self.num_objects(time_point,well_name)>=self.target_num_objects
+
+    def shutdown(self):
+        """ wait for pending counts (which raises the first exception raised while counting), and stop the background thread """
+
+        try:
+            for future in self.pending_counts:
+                future.result()
+        finally:
+            self.pending_counts.clear()
+            self.executor.shutdown(wait=True)
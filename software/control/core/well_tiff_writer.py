@@ -0,0 +1,160 @@
+from control._def import *
+
+import os
+import json
+from threading import Lock
+import numpy
+import tifffile
+
+from typing import Optional, Dict, List
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+WELL_TIFF_INDEX_SUFFIX:str=".index.json"
+""" suffix appended to the path of a well tiff file to get the path of its page index """
+
+@TypecheckClass
+class WellTiffPage:
+    """ entry in the page index of a well tiff file """
+
+    page:int
+    site:int
+    x:int
+    y:int
+    z:int
+    channel_name:str
+    channel_index:int
+    file_ID:str
+    """ name the image would have had if it were saved as an individual file """
+    shape:List[int]
+    dtype:str
+    offset:Optional[int]=None
+    """ byte offset of the (uncompressed, contiguous) pixel data in the file """
+    bytecount:Optional[int]=None
+
+    def to_json(self)->dict:
+        return dict(
+            page=self.page,
+            site=self.site,
+            x=self.x,
+            y=self.y,
+            z=self.z,
+            channel_name=self.channel_name,
+            channel_index=self.channel_index,
+            file_ID=self.file_ID,
+            shape=self.shape,
+            dtype=self.dtype,
+            offset=self.offset,
+            bytecount=self.bytecount,
+        )
+
+    def from_json(d:dict)->"WellTiffPage":
+        return WellTiffPage(**d)
+
+class _OpenWellTiff:
+    def __init__(self,file_path:str):
+        self.file_path=file_path
+        self.writer=tifffile.TiffWriter(file_path,bigtiff=True)
+        self.pages:List[WellTiffPage]=[]
+        self.bit_depth_metadata:dict={}
+
+class WellTiffWriter:
+    """
+    appends all images of a well (all sites, z planes and channels) to a single BigTIFF file, {directory}/{well_name}.tiff
+
+    the file stays open until finish_well is called for the well (i.e. until the acquisition has moved on to the next well), so that the
+    cost of opening a file and writing its header is paid once per well instead of once per image.
+    when the file is closed, a page index is written next to it ({well_name}.tiff.index.json), mapping (site,z,channel) to the page in the file
+    and to the byte offset of its pixel data, so that readers can seek to an image directly instead of parsing all image file directories.
+
+    images are stored uncompressed, which is what makes the byte offsets in the index usable for memory mapping.
+
+    the images of a well must be written from a single thread (different wells can be written from different threads).
+    """
+
+    def __init__(self):
+        self.files_lock:Lock=Lock()
+        self.open_files:Dict[str,_OpenWellTiff]={}
+
+    @TypecheckFunction
+    def file_path_for(directory:str,well_name:str)->str:
+        return os.path.join(directory,f"{well_name}.tiff")
+
+    @TypecheckFunction
+    def write(self,path:str,location:ImageLocation,image:numpy.ndarray,bit_depth_metadata:dict)->int:
+        """ append image to the file of its well, returns number of bytes written. bit_depth_metadata is stored in the page index. """
+
+        file_path=WellTiffWriter.file_path_for(os.path.dirname(path),location.well_name)
+
+        with self.files_lock:
+            open_file=self.open_files.get(file_path)
+            if open_file is None:
+                open_file=_OpenWellTiff(file_path)
+                open_file.bit_depth_metadata=bit_depth_metadata
+                self.open_files[file_path]=open_file
+
+        offset_and_bytecount=open_file.writer.write(image,contiguous=False,metadata=None,returnoffset=True)
+        offset,bytecount=offset_and_bytecount if not offset_and_bytecount is None else (None,None)
+
+        open_file.pages.append(WellTiffPage(
+            page=len(open_file.pages),
+            site=location.site,
+            x=location.x,
+            y=location.y,
+            z=location.z,
+            channel_name=location.channel_name,
+            channel_index=location.channel_index,
+            file_ID=os.path.basename(path),
+            shape=list(image.shape),
+            dtype=str(image.dtype),
+            offset=offset,
+            bytecount=bytecount,
+        ))
+
+        return image.nbytes
+
+    @TypecheckFunction
+    def finish_well(self,directory:str,well_name:str):
+        """ close the file of a well (if it is open) and write its page index """
+
+        file_path=WellTiffWriter.file_path_for(directory,well_name)
+        with self.files_lock:
+            open_file=self.open_files.pop(file_path,None)
+
+        if not open_file is None:
+            WellTiffWriter._close_file(open_file)
+
+    def _close_file(open_file:_OpenWellTiff):
+        open_file.writer.close()
+
+        index_path=open_file.file_path+WELL_TIFF_INDEX_SUFFIX
+        with open(index_path+".tmp","w",encoding="utf-8") as index_file:
+            json.dump({**open_file.bit_depth_metadata,"pages":[page.to_json() for page in open_file.pages]},index_file,indent=2)
+        os.replace(index_path+".tmp",index_path)
+
+    @TypecheckFunction
+    def close(self):
+        """ close all files that are still open """
+        with self.files_lock:
+            open_files=list(self.open_files.values())
+            self.open_files.clear()
+
+        for open_file in open_files:
+            WellTiffWriter._close_file(open_file)
+
+@TypecheckFunction
+def read_well_tiff_index(file_path:str)->List[WellTiffPage]:
+    with open(file_path+WELL_TIFF_INDEX_SUFFIX,"r",encoding="utf-8") as index_file:
+        return [WellTiffPage.from_json(page) for page in json.load(index_file)["pages"]]
+
+@TypecheckFunction
+def read_well_tiff_image(file_path:str,site:int,z:int,channel_name:str)->numpy.ndarray:
+    """ read a single image from a well tiff file, using its page index (pixel values are returned as stored, see bit_depth in the index) """
+
+    for page in read_well_tiff_index(file_path):
+        if page.site==site and page.z==z and page.channel_name==channel_name:
+            # map the pixel data directly if possible, without parsing any image file directory
+            if not page.offset is None:
+                return numpy.memmap(file_path,dtype=numpy.dtype(page.dtype),mode="r",offset=page.offset,shape=tuple(page.shape))
+            return tifffile.imread(file_path,key=page.page)
+
+    raise ValueError(f"no image for site {site}, z {z}, channel {channel_name} in {file_path}")
@@ -0,0 +1,138 @@
+from control._def import *
+
+import math
+import numpy
+
+from typing import Optional, List, Tuple
+from control.typechecker import TypecheckFunction, TypecheckClass
+
+# in a z sweep, the objective moves through all planes of a z stack at constant velocity, and an image is triggered whenever it passes a plane.
+# the sweep starts below the lowest plane, so that the stage has accelerated to the sweep velocity (and cleared the backlash) when it reaches the first plane.
+#
+#   z
+#   ^                                  ____ decelerate
+#   |                          ______/
+#   |                  ______/         <- constant velocity, one image per plane
+#   |          ______/
+#   |     ___/                         <- accelerate
+#   |____/                             <- clear backlash
+#   +------------------------------------> t
+
+MIN_Z_SWEEP_VELOCITY_MM_PER_S:float=0.01
+""" resolution (and smallest non-zero value) of the velocity that can be set on the microcontroller, see Microcontroller.set_max_velocity_acceleration """
+
+@TypecheckClass
+class ZSweepPlan:
+    """ velocity and timing of a z sweep """
+
+    num_planes:int
+    plane_spacing_mm:float
+    exposure_time_s:float
+    velocity_mm_per_s:float
+    acceleration_mm_per_s2:float
+    clear_backlash_mm:float
+
+    @property
+    def frame_interval_s(self)->float:
+        return self.plane_spacing_mm/self.velocity_mm_per_s
+
+    @property
+    def ramp_distance_mm(self)->float:
+        """ distance required to accelerate to (or decelerate from) the sweep velocity """
+        return self.velocity_mm_per_s**2/(2*self.acceleration_mm_per_s2)
+
+    @property
+    def lead_in_distance_mm(self)->float:
+        """ distance between the start of the movement and the first plane """
+        return self.clear_backlash_mm+self.ramp_distance_mm
+
+    @property
+    def total_distance_mm(self)->float:
+        return self.lead_in_distance_mm+(self.num_planes-1)*self.plane_spacing_mm+self.ramp_distance_mm
+
+    @TypecheckFunction
+    def plane_time_s(self,plane_index:int)->float:
+        """ time after the start of the movement at which the objective passes the plane (index in sweep order) """
+        acceleration_time_s=self.velocity_mm_per_s/self.acceleration_mm_per_s2
+        return acceleration_time_s+(self.clear_backlash_mm+plane_index*self.plane_spacing_mm)/self.velocity_mm_per_s
+
+    @TypecheckFunction
+    def trigger_time_s(self,plane_index:int)->float:
+        """ time after the start of the movement at which to trigger the image of a plane, so that the exposure is centered on it """
+        return self.plane_time_s(plane_index)-self.exposure_time_s/2
+
+    @property
+    def duration_s(self)->float:
+        return self.plane_time_s(self.num_planes-1)+self.velocity_mm_per_s/self.acceleration_mm_per_s2
+
+@TypecheckFunction
+def stepwise_z_stack_time_s(num_planes:int,plane_spacing_mm:float,exposure_time_s:float)->float:
+    """ estimated time to image one channel at all planes of a z stack by moving to each plane and waiting for the stage to settle """
+
+    velocity=MACHINE_CONFIG.MAX_VELOCITY_Z_mm
+    acceleration=MACHINE_CONFIG.MAX_ACCELERATION_Z_mm
+    if plane_spacing_mm<velocity**2/acceleration:
+        move_time_s=2*math.sqrt(plane_spacing_mm/acceleration)
+    else:
+        move_time_s=plane_spacing_mm/velocity+velocity/acceleration
+
+    time_per_plane_s=move_time_s+MACHINE_CONFIG.SCAN_STABILIZATION_TIME_MS_Z/1000+exposure_time_s+Acquisition.Z_SWEEP_FRAME_OVERHEAD_S
+    return num_planes*time_per_plane_s
+
+@TypecheckFunction
+def plan_z_sweep(num_planes:int,plane_spacing_mm:float,exposure_time_ms:float,clear_backlash_mm:float)->Optional[ZSweepPlan]:
+    """
+    plan a z sweep through num_planes planes, spaced plane_spacing_mm apart
+
+    the sweep velocity is limited by the blur during an exposure (Acquisition.Z_SWEEP_MAX_BLUR_FRACTION of the plane spacing) and by the time
+    the camera needs per frame. returns None if no sweep is possible (the exposure is too long for the slowest possible sweep) or if a sweep
+    would not be faster than moving to each plane.
+    """
+
+    if num_planes<2 or plane_spacing_mm<=0.0:
+        return None
+
+    exposure_time_s=exposure_time_ms/1000
+    acceleration=MACHINE_CONFIG.MAX_ACCELERATION_Z_mm
+
+    min_frame_interval_s=max(
+        exposure_time_s+Acquisition.Z_SWEEP_FRAME_OVERHEAD_S,
+        exposure_time_s/Acquisition.Z_SWEEP_MAX_BLUR_FRACTION,
+    )
+    velocity=min(plane_spacing_mm/min_frame_interval_s,MACHINE_CONFIG.MAX_VELOCITY_Z_mm)
+    # round down to the velocity resolution of the microcontroller, a slower sweep only increases the time between frames
+    velocity=math.floor(velocity/MIN_Z_SWEEP_VELOCITY_MM_PER_S)*MIN_Z_SWEEP_VELOCITY_MM_PER_S
+    if velocity<MIN_Z_SWEEP_VELOCITY_MM_PER_S:
+        return None
+
+    plan=ZSweepPlan(
+        num_planes=num_planes,
+        plane_spacing_mm=plane_spacing_mm,
+        exposure_time_s=exposure_time_s,
+        velocity_mm_per_s=velocity,
+        acceleration_mm_per_s2=acceleration,
+        clear_backlash_mm=clear_backlash_mm,
+    )
+
+    if plan.duration_s>=stepwise_z_stack_time_s(num_planes,plane_spacing_mm,exposure_time_s):
+        return None
+
+    return plan
+
+@TypecheckFunction
+def interpolate_position(history:List[Tuple[float,int]],timestamp:float)->Optional[float]:
+    """
+    position at timestamp, linearly interpolated between the (timestamp,position) samples in history (e.g. Microcontroller.z_pos_history)
+
+    returns None if timestamp is not covered by history (the position is only known while packets are being received).
+    """
+
+    if len(history)<2:
+        return None
+
+    timestamps=numpy.array([sample[0] for sample in history])
+    positions=numpy.array([sample[1] for sample in history],dtype=float)
+    if timestamp<timestamps[0] or timestamp>timestamps[-1]:
+        return None
+
+    return float(numpy.interp(timestamp,timestamps,positions))
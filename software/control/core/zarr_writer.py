@@ -0,0 +1,136 @@
+from control._def import *
+
+import os
+from threading import Lock
+import numpy
+
+from typing import Optional, Dict, List, Tuple
+from control.typechecker import TypecheckFunction
+
+# zarr is an optional dependency, only required if images are saved as ImageFormat.ZARR
+import zarr
+
+class ZarrImageWriter:
+    """
+    streams images into an OME-Zarr (NGFF v0.4) hierarchy while they are being acquired
+
+    each site gets its own 5D array with axes (t,c,z,y,x) at {root}/{well_name}/{site}/0. one chunk holds exactly one image,
+    so every incoming image is compressed and written on its own, in whatever order it arrives.
+    the list of planes that have actually been written is kept in memory, and stored in the attributes of the site arrays once the well
+    is finished (see finish_well) and when the writer is closed. images written before an interruption remain readable from their chunks.
+
+    the arrays of different sites can be written to concurrently, but the images of a single site must be written from a single thread.
+    """
+
+    @TypecheckFunction
+    def __init__(self,output_path:str,layout:AcquisitionLayout,compressor:Any):
+        self.root_path:str=os.path.join(output_path,ZARR_STORE_NAME)
+        self.layout:AcquisitionLayout=layout
+
+        self.store=zarr.DirectoryStore(self.root_path,dimension_separator="/")
+        self.root=zarr.group(store=self.store)
+        self.root.attrs["acquisition_layout"]={
+            "channel_names":layout.channel_names,
+            "num_z":layout.num_z,
+            "num_time_points":layout.num_time_points,
+        }
+
+        self.compressor=compressor
+
+        # creating groups modifies shared metadata, so only one thread may do that at a time
+        self.hierarchy_lock:Lock=Lock()
+        self.arrays:Dict[Tuple[str,int],Any]={}
+        self.acquired_planes:Dict[Tuple[str,int],List[List[int]]]={}
+
+    def _ome_metadata(self,location:ImageLocation)->dict:
+        return {
+            "multiscales":[{
+                "version":"0.4",
+                "name":f"{location.well_name}_s{location.site}",
+                "axes":[
+                    {"name":"t","type":"time","unit":"second"},
+                    {"name":"c","type":"channel"},
+                    {"name":"z","type":"space","unit":"micrometer"},
+                    {"name":"y","type":"space","unit":"micrometer"},
+                    {"name":"x","type":"space","unit":"micrometer"},
+                ],
+                "datasets":[{
+                    "path":"0",
+                    "coordinateTransformations":[{"type":"scale","scale":[self.layout.time_step_s,1.0,self.layout.z_step_um,1.0,1.0]}],
+                }],
+            }],
+            "omero":{
+                "channels":[{"label":channel_name,"active":True} for channel_name in self.layout.channel_names],
+            },
+            "site":{"well":location.well_name,"site":location.site,"x":location.x,"y":location.y},
+        }
+
+    def _array_for(self,location:ImageLocation,image:numpy.ndarray,bit_depth_metadata:dict):
+        key=(location.well_name,location.site)
+        array=self.arrays.get(key)
+        if not array is None:
+            return array
+
+        with self.hierarchy_lock:
+            site_group=self.root.require_group(location.well_name).require_group(str(location.site))
+            site_group.attrs.update(self._ome_metadata(location))
+            site_group.attrs.update(bit_depth_metadata)
+
+            height,width=image.shape
+            array=site_group.require_dataset(
+                "0",
+                shape=(self.layout.num_time_points,len(self.layout.channel_names),self.layout.num_z,height,width),
+                chunks=(1,1,1,height,width),
+                dtype=image.dtype,
+                compressor=self.compressor,
+                fill_value=0,
+                dimension_separator="/",
+                exact=True,
+            )
+
+            self.arrays[key]=array
+            self.acquired_planes[key]=[]
+
+        return array
+
+    @TypecheckFunction
+    def write(self,location:ImageLocation,image:numpy.ndarray,bit_depth_metadata:dict)->int:
+        """ write image to its chunk, returns number of bytes written to disk. bit_depth_metadata is stored in the attributes of the site. """
+
+        if image.ndim!=2:
+            raise ValueError(f"zarr image format only supports single channel images, but got image with shape {image.shape}")
+        if not location.time_point<self.layout.num_time_points or not location.z<self.layout.num_z:
+            raise ValueError(f"image location {location} is outside of acquisition layout {self.layout}")
+
+        array=self._array_for(location,image,bit_depth_metadata)
+
+        t,c,z=location.time_point,location.channel_index,location.z
+        array[t,c,z]=image
+
+        self.acquired_planes[(location.well_name,location.site)].append([t,c,z])
+
+        # zarr does not write chunks that only contain the fill value
+        chunk_path=os.path.join(self.root_path,location.well_name,str(location.site),"0",str(t),str(c),str(z),"0","0")
+        try:
+            return os.path.getsize(chunk_path)
+        except FileNotFoundError:
+            return 0
+
+    def _flush_acquired_planes(self,keys:List[Tuple[str,int]]):
+        for key in keys:
+            self.arrays[key].attrs["acquired_planes"]=self.acquired_planes[key]
+
+    @TypecheckFunction
+    def finish_well(self,well_name:str):
+        """ store the planes written so far for all sites of the well (no more images of the well are written until the next time point) """
+
+        with self.hierarchy_lock:
+            self._flush_acquired_planes([key for key in self.arrays.keys() if key[0]==well_name])
+
+    @TypecheckFunction
+    def close(self):
+        with self.hierarchy_lock:
+            self._flush_acquired_planes(list(self.arrays.keys()))
+            zarr.consolidate_metadata(self.store)
+            self.arrays.clear()
+            self.acquired_planes.clear()
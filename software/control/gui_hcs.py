@@ -434,13 +434,19 @@ class Gui(QMainWindow):
                 )
 
             @web_service.expose
-            def acquire():
+            def acquire(resume_path: Optional[str]=None):
+                # resume_path is the output folder of an interrupted acquisition, which is then continued instead of starting a new one
                 if (ok := self.interactive_enabled):
                     web_service.set_status(progress_data={})
                     web_service.set_status(progress_bar_text='')
-                    Thread(target=lambda: self.start_experiment()).start()
+                    Thread(target=lambda: self.start_experiment(resume_path=resume_path)).start()
                 return ok
 
+            @web_service.expose
+            def estimate_duration(file_path: str):
+                # compiles the acquisition plan of the protocol, without loading it into the gui
+                return self.core.estimate_duration(AcquisitionConfig.from_json(file_path)).as_json()
+
             @web_service.expose
             def list_protocols():
                 return sorted(map(str, Path('.').glob('protocols/**/*.json')))
@@ -479,9 +485,13 @@ class Gui(QMainWindow):
             self.core.navigation.loading_position_leave()
             self.set_all_interactible_enabled(set_enabled=True)
 
-    def start_experiment(self,dry:bool=False)->Union[AcquisitionStartResult,AcquisitionConfig]:
+    def start_experiment(self,dry:bool=False,resume_path:Optional[str]=None)->Union[AcquisitionStartResult,AcquisitionConfig]:
+        """ resume_path is the output folder of an interrupted acquisition, which is continued with its own config (instead of the config in the gui) """
 
-        whole_acquisition_config:AcquisitionConfig=self.get_all_config(dry=dry)
+        if resume_path is None:
+            whole_acquisition_config:AcquisitionConfig=self.get_all_config(dry=dry)
+        else:
+            whole_acquisition_config=self.core.interrupted_acquisition_config(resume_path)
 
         if dry:
             return AcquisitionStartResult(whole_acquisition_config,"dry")
@@ -502,6 +512,8 @@ class Gui(QMainWindow):
 
                 on_new_acquisition=self.on_step_completed,
                 image_return=self.handle_acquired_image,
+
+                resume=not resume_path is None,
             )
         
         except Exception as e:
@@ -5,13 +5,15 @@ import time
 import numpy as np
 import threading
 import inspect
+import collections
+import math
 from crc import CrcCalculator, Crc8
 import traceback
 
-from control._def import MACHINE_CONFIG, ControllerType, MicrocontrollerDef, CMD_SET, AXIS, HOME_OR_ZERO, CMD_EXECUTION_STATUS, BIT_POS_JOYSTICK_BUTTON, BIT_POS_SWITCH, MCU_PINS, MAIN_LOG
+from control._def import MACHINE_CONFIG, ControllerType, MicrocontrollerDef, CMD_SET, AXIS, HOME_OR_ZERO, CMD_EXECUTION_STATUS, BIT_POS_JOYSTICK_BUTTON, BIT_POS_SWITCH, MCU_PINS, MAIN_LOG, AbortAcquisitionException
 from control.camera import retry_on_failure
 
-from control.typechecker import TypecheckFunction, ClosedRange, ClosedSet
+from control.typechecker import TypecheckFunction, TypecheckClass, ClosedRange, ClosedSet
 import typing as tp
 from typing import Union, Any, Tuple, List, Optional
 
@@ -55,6 +57,10 @@ class Microcontroller:
         self.y_pos = 0 # unit: microstep or encoder resolution
         self.z_pos = 0 # unit: microstep or encoder resolution
         self.theta_pos = 0 # unit: microstep or encoder resolution
+        self.x_pos_history:collections.deque = collections.deque(maxlen=1024)
+        """ recent (time.monotonic(),x_pos) pairs, one per received packet, to look up the x position at a given time while x is moving """
+        self.z_pos_history:collections.deque = collections.deque(maxlen=1024)
+        """ recent (time.monotonic(),z_pos) pairs, one per received packet, to look up the z position at a given time while z is moving """
         self.button_and_switch_state = 0
         self.joystick_button_pressed:int = 0
         """ indicates whether the joystick button is pressed """
@@ -79,6 +85,9 @@ class Microcontroller:
 
         self.last_command_str=""
 
+        self.illumination_setting:tp.Optional[tuple]=None
+        """ last illumination source and intensity that have been set (None if unknown, e.g. after a reconnection) """
+
         self.has_been_initialized_at_least_once=False
 
         self.attempt_connection()
@@ -98,6 +107,8 @@ class Microcontroller:
         """
 
         first_connection=not self.has_been_initialized_at_least_once
+        # the microcontroller may have been reset, so the illumination needs to be set again
+        self.illumination_setting=None
 
         call_stack=inspect.stack()
         formatted_stack=" <- ".join(f"{frame.function} in ({frame.filename}:{frame.lineno})" for frame in call_stack)
@@ -152,6 +163,7 @@ class Microcontroller:
     @write_command_name
     def reset(self):
         self._cmd_id = 0
+        self.illumination_setting=None
         cmd = bytearray(self.tx_buffer_length)
         cmd[1] = CMD_SET.RESET
         self.send_command(cmd)
@@ -185,6 +197,7 @@ class Microcontroller:
         cmd[3] = int((intensity/100)*65535) >> 8
         cmd[4] = int((intensity/100)*65535) & 0xff
         self.send_command(cmd)
+        self.illumination_setting=(illumination_source,intensity)
 
     @write_command_name
     def set_illumination_led_matrix(self,illumination_source:int,r:float,g:float,b:float):
@@ -195,6 +208,7 @@ class Microcontroller:
         cmd[4] = min(int(g*255),255)
         cmd[5] = min(int(b*255),255)
         self.send_command(cmd)
+        self.illumination_setting=(illumination_source,r,g,b)
 
     @write_command_name
     def send_hardware_trigger(self,control_illumination:bool=False,illumination_on_time_us:int=0,trigger_output_ch:int=0):
@@ -708,6 +722,9 @@ class Microcontroller:
                 self.x_pos = self._payload_to_int(msg[2:6],MicrocontrollerDef.N_BYTES_POS) # unit: microstep or encoder resolution
                 self.y_pos = self._payload_to_int(msg[6:10],MicrocontrollerDef.N_BYTES_POS) # unit: microstep or encoder resolution
                 self.z_pos = self._payload_to_int(msg[10:14],MicrocontrollerDef.N_BYTES_POS) # unit: microstep or encoder resolution
+                packet_timestamp=time.monotonic()
+                self.x_pos_history.append((packet_timestamp,self.x_pos))
+                self.z_pos_history.append((packet_timestamp,self.z_pos))
                 self.theta_pos = self._payload_to_int(msg[14:18],MicrocontrollerDef.N_BYTES_POS) # unit: microstep or encoder resolution
                 
                 self.button_and_switch_state = msg[18]
@@ -753,8 +770,14 @@ class Microcontroller:
         self,
         timeout_limit_s:Optional[Union[float,int]]=3.0,
         time_step:Optional[float]=None,
-        timeout_msg:str='Error - microcontroller timeout, the program will exit'
+        timeout_msg:str='Error - microcontroller timeout, the program will exit',
+        cancel_event:Optional[threading.Event]=None,
     ):
+        """
+        wait for the microcontroller to complete the last command
+
+        if cancel_event is set while waiting, AbortAcquisitionException is raised. the command is not stopped, i.e. the microcontroller may still be busy afterwards.
+        """
         time_step=time_step or MACHINE_CONFIG.SLEEP_TIME_S
         timeout_limit_s=timeout_limit_s or 3.0 # there should never actually be no limit on command execution
 
@@ -789,7 +812,11 @@ class Microcontroller:
                         # process GUI events
                         QApplication.processEvents()
                         # wait for a short while (should be in single digit millisecond range)
-                        time.sleep(time_step)
+                        if cancel_event is None:
+                            time.sleep(time_step)
+                        elif cancel_event.wait(time_step):
+                            MAIN_LOG.log("waiting for microcontroller cancelled")
+                            raise AbortAcquisitionException()
                         if not timeout_limit_s is None:
                             # check if max wait time has been reached and raise exception if so
                             wait_time_test=time.time() - timestamp_start
@@ -931,3 +958,163 @@ class Microcontroller:
     @property
     def clear_z_backlash_mm(self)->float:
         return self.clear_z_backlash_usteps*self.mm_per_ustep_z
+
+
+@TypecheckClass
+class SimulatedMove:
+    """ move of one axis with a trapezoidal velocity profile (triangular if the distance is too short to reach the max velocity) """
+
+    start_time:float
+    """ time.monotonic() at which the move started """
+    start_pos:float
+    distance:float
+    max_velocity:float
+    max_acceleration:float
+
+    @property
+    def peak_velocity(self)->float:
+        return min(self.max_velocity,math.sqrt(abs(self.distance)*self.max_acceleration))
+
+    @property
+    def duration_s(self)->float:
+        if self.peak_velocity==0.0:
+            return 0.0
+        ramp_time_s=self.peak_velocity/self.max_acceleration
+        ramp_distance=self.peak_velocity**2/(2*self.max_acceleration)
+        return 2*ramp_time_s+(abs(self.distance)-2*ramp_distance)/self.peak_velocity
+
+    def position(self,timestamp:float)->float:
+        t=timestamp-self.start_time
+        if t<=0.0:
+            return self.start_pos
+        if t>=self.duration_s:
+            return self.start_pos+self.distance
+
+        v=self.peak_velocity
+        a=self.max_acceleration
+        ramp_time_s=v/a
+        ramp_distance=v**2/(2*a)
+        constant_time_s=(abs(self.distance)-2*ramp_distance)/v
+
+        if t<ramp_time_s:
+            distance=a*t**2/2
+        elif t<ramp_time_s+constant_time_s:
+            distance=ramp_distance+v*(t-ramp_time_s)
+        else:
+            t_decelerating=t-ramp_time_s-constant_time_s
+            distance=ramp_distance+v*constant_time_s+v*t_decelerating-a*t_decelerating**2/2
+
+        return self.start_pos+math.copysign(distance,self.distance)
+
+@TypecheckClass
+class SimulatedHardwareTrigger:
+    timestamp:float
+    """ time.monotonic() at which the trigger was received """
+    x_pos:int
+    y_pos:int
+    z_pos:int
+    control_illumination:bool
+    illumination_on_time_us:int
+
+class MicrocontrollerSimulation(Microcontroller):
+    """
+    stand-in for Microcontroller without hardware, e.g. to check the timing of continuous scans (see tools/simulate_row_scan.py)
+
+    commands are executed in real time: moves follow a trapezoidal velocity profile with the max velocity/acceleration that has been set for the axis,
+    position packets are generated every packet_interval_s, and hardware triggers are recorded together with the stage position when they were received.
+    positions are in microsteps (no encoders).
+    """
+
+    packet_interval_s:float=0.01
+
+    def __init__(self,version:ControllerType=ControllerType.DUE,sn:Optional[str]=None,parent:Any=None):
+        self.max_velocity_mm={AXIS.X:MACHINE_CONFIG.MAX_VELOCITY_X_mm,AXIS.Y:MACHINE_CONFIG.MAX_VELOCITY_Y_mm,AXIS.Z:MACHINE_CONFIG.MAX_VELOCITY_Z_mm}
+        self.max_acceleration_mm={AXIS.X:MACHINE_CONFIG.MAX_ACCELERATION_X_mm,AXIS.Y:MACHINE_CONFIG.MAX_ACCELERATION_Y_mm,AXIS.Z:MACHINE_CONFIG.MAX_ACCELERATION_Z_mm}
+        self.simulated_moves:tp.Dict[int,SimulatedMove]={}
+        self.simulated_busy_until:float=0.0
+        """ time.monotonic() at which the last command has been executed """
+        self.hardware_triggers:List[SimulatedHardwareTrigger]=[]
+
+        super().__init__(version=version,sn=sn,parent=parent)
+
+    def attempt_connection(self)->bool:
+        self.illumination_setting=None
+        if not self.has_been_initialized_at_least_once:
+            MAIN_LOG.log('startup - using simulated microcontroller')
+        self.has_been_initialized_at_least_once=True
+        return True
+
+    def close(self):
+        self.terminate_reading_received_packet_thread = True
+        self.thread_read_received_packet.join()
+
+    def mm_per_ustep(self,axis:int)->float:
+        return {AXIS.X:self.mm_per_ustep_x,AXIS.Y:self.mm_per_ustep_y,AXIS.Z:self.mm_per_ustep_z}[axis]
+
+    def simulated_position(self,axis:int,timestamp:float)->int:
+        current_pos={AXIS.X:self.x_pos,AXIS.Y:self.y_pos,AXIS.Z:self.z_pos}[axis]
+        if not axis in self.simulated_moves:
+            return current_pos
+        return int(round(self.simulated_moves[axis].position(timestamp)))
+
+    def start_simulated_move(self,axis:int,distance_usteps:int):
+        now=time.monotonic()
+        mm_per_ustep=self.mm_per_ustep(axis)
+        move=SimulatedMove(
+            start_time=now,
+            start_pos=float(self.simulated_position(axis,now)),
+            distance=float(distance_usteps),
+            max_velocity=self.max_velocity_mm[axis]/mm_per_ustep,
+            max_acceleration=self.max_acceleration_mm[axis]/mm_per_ustep,
+        )
+        self.simulated_moves[axis]=move
+        self.simulated_busy_until=now+move.duration_s
+
+    def write_command_to_serial(self,command:bytearray):
+        now=time.monotonic()
+        self.simulated_busy_until=now
+
+        move_axis={CMD_SET.MOVE_X:AXIS.X,CMD_SET.MOVE_Y:AXIS.Y,CMD_SET.MOVE_Z:AXIS.Z}
+        moveto_axis={CMD_SET.MOVETO_X:AXIS.X,CMD_SET.MOVETO_Y:AXIS.Y,CMD_SET.MOVETO_Z:AXIS.Z}
+
+        if command[1] in move_axis:
+            self.start_simulated_move(move_axis[command[1]],self._payload_to_int(list(command[2:6]),4))
+        elif command[1] in moveto_axis:
+            axis=moveto_axis[command[1]]
+            self.start_simulated_move(axis,self._payload_to_int(list(command[2:6]),4)-self.simulated_position(axis,now))
+        elif command[1]==CMD_SET.SET_MAX_VELOCITY_ACCELERATION:
+            self.max_velocity_mm[command[2]]=((command[3]<<8)+command[4])/100
+            self.max_acceleration_mm[command[2]]=((command[5]<<8)+command[6])/10
+        elif command[1]==CMD_SET.SEND_HARDWARE_TRIGGER:
+            self.hardware_triggers.append(SimulatedHardwareTrigger(
+                timestamp=now,
+                x_pos=self.simulated_position(AXIS.X,now),
+                y_pos=self.simulated_position(AXIS.Y,now),
+                z_pos=self.simulated_position(AXIS.Z,now),
+                control_illumination=(command[2]>>7)==1,
+                illumination_on_time_us=(command[3]<<24)+(command[4]<<16)+(command[5]<<8)+command[6],
+            ))
+        # all other commands (illumination, homing, driver configuration etc.) complete immediately and have no simulated effect
+
+    def resend_last_command(self):
+        self.mcu_cmd_execution_in_progress = True
+        self.timeout_counter = 0
+        self.retry = self.retry + 1
+
+    def read_received_packet(self):
+        while self.terminate_reading_received_packet_thread == False:
+            packet_timestamp=time.monotonic()
+
+            self.x_pos=self.simulated_position(AXIS.X,packet_timestamp)
+            self.y_pos=self.simulated_position(AXIS.Y,packet_timestamp)
+            self.z_pos=self.simulated_position(AXIS.Z,packet_timestamp)
+            self.x_pos_history.append((packet_timestamp,self.x_pos))
+            self.z_pos_history.append((packet_timestamp,self.z_pos))
+
+            if self.mcu_cmd_execution_in_progress and packet_timestamp>=self.simulated_busy_until:
+                self.mcu_cmd_execution_in_progress = False
+
+            if self.new_packet_callback_external is not None:
+                self.new_packet_callback_external(self)
+
+            time.sleep(self.packet_interval_s)
@@ -1,6 +1,6 @@
 from ast import Assert
 import collections
-from typing import Union, Optional, List, TypeVar, Generic, Tuple, Any, ClassVar, Callable
+from typing import Union, Optional, List, Set, TypeVar, Generic, Tuple, Any, ClassVar, Callable
 NoneType=type(None)
 from dataclasses import Field, field, dataclass, _MISSING_TYPE
 from functools import wraps
@@ -62,12 +62,14 @@ def type_match(et,v,_vt:Any=None)->TypeCheckResult:
     try:
         et_type_is_union=et.__origin__==Union
         et_type_is_list=et.__origin__==list
+        et_type_is_set=et.__origin__==set
         et_type_is_tuple=et.__origin__==tuple
         et_type_is_dict=et.__origin__==dict
         et_type_is_callable=et.__origin__==collections.abc.Callable # this is really how this works
     except:
         et_type_is_union=False
         et_type_is_list=False
+        et_type_is_set=False
         et_type_is_tuple=False
         et_type_is_dict=False
         et_type_is_callable=False
@@ -87,6 +89,16 @@ def type_match(et,v,_vt:Any=None)->TypeCheckResult:
             if not type_match(et_list_item_type,v):
                 return TypeCheckResult(False,msg=f"list item type mismatch {type_name(et_list_item_type)} != {type_name(v)} at index {i}")
 
+        return TypeCheckResult(True)
+    elif et_type_is_set:
+        if set!=vt:
+            return TypeCheckResult(False,msg=f"{type_name(vt)} is not a set")
+
+        et_set_item_type=et.__args__[0]
+        for set_item in v:
+            if not type_match(et_set_item_type,set_item):
+                return TypeCheckResult(False,msg=f"set item type mismatch {type_name(et_set_item_type)} != {type_name(type(set_item))}")
+
         return TypeCheckResult(True)
     elif et_type_is_tuple:
         if tuple!=vt:
@@ -193,7 +205,8 @@ def TypecheckClass(_t:Optional[type]=None,*,check_defaults:bool=True,create_init
                 if is_protected_symbol(symbol):
                     continue
 
-                if callable(t.__dict__[symbol]):
+                # methods and properties (computed from the fields) have no default value
+                if callable(t.__dict__[symbol]) or isinstance(t.__dict__[symbol],property):
                     continue
 
                 if not symbol in t_attributes and not symbol in t_class_attributes:
@@ -522,6 +535,10 @@ if __name__=="__main__":
     test( type_match(List[Optional[float]],[3.0,None,2.0]), should_fail=False)
     test( type_match(List[Optional[float]],[]),             should_fail=False)
     test( type_match(List[float],[]),                       should_fail=False)
+    test( type_match(Set[int],{3}),                         should_fail=False)
+    test( type_match(Set[int],set()),                       should_fail=False)
+    test( type_match(Set[int],{3.0}),                       should_fail=True)
+    test( type_match(Set[int],[3]),                         should_fail=True)
 
     test( type_match(ClosedRange[float](1.0,2.0),1.5), should_fail=False)
     test( type_match(ClosedRange[float](1.0,2.0),1.0), should_fail=False)
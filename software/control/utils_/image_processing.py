@@ -228,6 +228,18 @@ def YTracking_Objective_Function(image, color):
     else:
         return 0
 
+def count_objects(image_gray, threshold, min_area=0, max_area=None):
+    # counts bright objects on a dark background (pixels >= threshold, small blobs removed, see threshold_image_gray)
+    # objects are counted by their outer contour, holes inside an object do not count as separate objects
+    imgMask = threshold_image_gray(image_gray, threshold, np.inf)
+    contours = cv2.findContours(imgMask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    count = 0
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        if area >= min_area and (max_area is None or area <= max_area):
+            count += 1
+    return count
+
 def calculate_focus_measure(image):
     if len(image.shape) == 3:
         image = cv2.cvtColor(image,cv2.COLOR_RGB2GRAY) # optional
@@ -22,6 +22,13 @@ import numpy
 class ComponentLabels(str,Enum):
     BUTTON_START_ACQUISITION_IDLE_TEXT="Start Acquisition"
     BUTTON_START_ACQUISITION_RUNNING_TEXT="Cancel Acquisition"
+    BUTTON_RESUME_ACQUISITION_TEXT="Resume Acquisition"
+    BUTTON_RESUME_ACQUISITION_TOOLTIP="""
+    Continue an interrupted acquisition in its output folder (select the folder).
+
+    The acquisition uses the settings it was started with (saved in parameters.json in the folder), not the current settings.
+    Sites that have already been imaged completely (as recorded in manifest.sqlite in the folder) are skipped.
+    """
 
     IMAGE_FORMAT_TOOLTIP="change file format for images acquired with the multi point acquisition function"
     COMPRESSION_TOOLTIP="Enable (lossless) image file compression (only supported by TIF)"
@@ -204,7 +211,7 @@ class MultiPointWidget(QObject):
         self.lineEdit_cellLine.setText(DEFAULT_CELL_LINE_STR)
 
         self.image_format_widget=Dropdown(
-            items=["BMP","TIF","TIF (compr.)"],
+            items=["BMP","TIF","TIF (compr.)","OME-Zarr","TIF (per well)"],
             current_index=list(ImageFormat).index(Acquisition.IMAGE_FORMAT),
             tooltip=ComponentLabels.IMAGE_FORMAT_TOOLTIP,
         ).widget
@@ -392,12 +399,14 @@ class MultiPointWidget(QObject):
         ).widget
 
         self.btn_startAcquisition = Button(ComponentLabels.BUTTON_START_ACQUISITION_IDLE_TEXT,on_clicked=self.toggle_acquisition).widget
+        self.btn_resumeAcquisition = Button(ComponentLabels.BUTTON_RESUME_ACQUISITION_TEXT,tooltip=ComponentLabels.BUTTON_RESUME_ACQUISITION_TOOLTIP,on_clicked=self.resume_acquisition).widget
 
         grid_multipoint_acquisition_config=Grid(
             #[self.checkbox_withAutofocus], # see software Autofocus comment above
             #[self.af_channel_dropdown],
             [self.interactive_widgets.checkbox_laserAutofocus],
             [self.btn_startAcquisition],
+            [self.btn_resumeAcquisition],
 
             with_margins=False,
         ).widget
@@ -633,36 +642,50 @@ class MultiPointWidget(QObject):
         if not self.acquisition_is_running:
             # make sure all the parameters are fine
             _=self.start_experiment(dry=True)
-            
-            self.acquisition_is_running=True
-
-            self.btn_startAcquisition.setText(ComponentLabels.BUTTON_START_ACQUISITION_RUNNING_TEXT)
-
-            self.experiment_finished_signal=self.start_experiment(dry=False)
-            self.experiment_config_data=self.experiment_finished_signal.acquisition_config
 
-            if self.experiment_finished_signal.type=="done":
-                self.acquisition_is_finished()
-                return
-            elif self.experiment_finished_signal.type=="exception":
-                self.acquisition_is_running=False
-                self.btn_startAcquisition.setText(ComponentLabels.BUTTON_START_ACQUISITION_IDLE_TEXT)
-                return
-
-            # else: self.experiment_finished_signal.type=="async"
-
-            self.experiment_finished_signal.connect(self.acquisition_is_finished)
-
-            QApplication.processEvents()
+            self.run_acquisition()
         else:
             # try this because multipoint worker may run synchronously, in which case there is no signal to disconnect (so disconnecting will throw)
             try:
-                self.experiment_finished_signal.disconnect(self.acquisition_is_finished)
+                self.experiment_finished_signal.async_signal_on_finish.disconnect(self.acquisition_is_finished)
             except:
                 pass
             
             self.acquisition_is_finished(aborted=True)
 
+    @TypecheckFunction
+    def resume_acquisition(self,_pressed:bool):
+        if self.acquisition_is_running:
+            return
+
+        resume_path=FileDialog(mode="open_dir",caption="Select folder of the interrupted acquisition").run()
+        if resume_path=="":
+            return
+
+        self.run_acquisition(resume_path=resume_path)
+
+    def run_acquisition(self,resume_path:Optional[str]=None):
+        self.acquisition_is_running=True
+
+        self.btn_startAcquisition.setText(ComponentLabels.BUTTON_START_ACQUISITION_RUNNING_TEXT)
+
+        self.experiment_finished_signal=self.start_experiment(dry=False,resume_path=resume_path)
+        self.experiment_config_data=self.experiment_finished_signal.acquisition_config
+
+        if self.experiment_finished_signal.type=="done":
+            self.acquisition_is_finished()
+            return
+        elif self.experiment_finished_signal.type=="exception":
+            self.acquisition_is_running=False
+            self.btn_startAcquisition.setText(ComponentLabels.BUTTON_START_ACQUISITION_IDLE_TEXT)
+            return
+
+        # else: self.experiment_finished_signal.type=="async"
+
+        self.experiment_finished_signal.async_signal_on_finish.connect(self.acquisition_is_finished)
+
+        QApplication.processEvents()
+
     @TypecheckFunction
     def acquisition_is_finished(self,aborted:bool=False):
         self.acquisition_is_running=False
@@ -687,6 +710,7 @@ class MultiPointWidget(QObject):
             self.checkbox_withAutofocus,
             self.af_channel_dropdown,
             self.btn_startAcquisition,
+            self.btn_resumeAcquisition,
             self.list_configurations,
 
             *([self.interactive_widgets.checkbox_laserAutofocus] if self.is_laser_af_initialized else []),
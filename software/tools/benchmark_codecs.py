@@ -0,0 +1,102 @@
+"""
+compare the image codecs available for saving images (see control.core.image_codecs)
+
+run from the software directory, e.g.
+
+    python3 -m tools.benchmark_codecs                           # on synthetic 12 bit frames
+    python3 -m tools.benchmark_codecs image1.tiff image2.tiff   # on frames from a previous acquisition
+
+reports compression throughput (MB of raw pixel data per second) and compression ratio of each codec, for tiff files and zarr arrays,
+to help choose the codec for each channel (Acquisition.IMAGE_CODEC, Acquisition.IMAGE_CODEC_PER_CHANNEL).
+"""
+
+import argparse
+import io
+import time
+import numpy
+
+from control._def import *
+from control.core.image_codecs import get_codec, list_codecs
+
+def synthetic_frames(num_frames:int,height:int,width:int)->List[numpy.ndarray]:
+    """ 12 bit frames (shifted into the high bits of uint16, as returned by the camera), dim background with noise and some bright blobs """
+    rng=numpy.random.default_rng(seed=0)
+    yy,xx=numpy.mgrid[0:height,0:width]
+
+    frames=[]
+    for _ in range(num_frames):
+        frame=rng.normal(loc=100.0,scale=8.0,size=(height,width))
+        for _ in range(50):
+            y,x=rng.integers(0,height),rng.integers(0,width)
+            radius=rng.uniform(5.0,30.0)
+            frame+=rng.uniform(200.0,3000.0)*numpy.exp(-((yy-y)**2+(xx-x)**2)/(2*radius**2))
+        frames.append((numpy.clip(frame,0,4095).astype(numpy.uint16)<<4))
+
+    return frames
+
+def load_frames(paths:List[str])->List[numpy.ndarray]:
+    import tifffile
+    return [tifffile.imread(path) for path in paths]
+
+def benchmark_tiff(codec_name:str,frames:List[numpy.ndarray])->Tuple[float,float]:
+    import tifffile
+
+    kwargs=get_codec(codec_name).tiff_kwargs(tile_size=Acquisition.IMAGE_CODEC_TILE_SIZE,num_threads=Acquisition.IMAGE_CODEC_NUM_THREADS)
+
+    raw_bytes=0
+    compressed_bytes=0
+    start_time=time.monotonic()
+    for frame in frames:
+        buffer=io.BytesIO()
+        tifffile.imwrite(buffer,frame,**kwargs)
+        raw_bytes+=frame.nbytes
+        compressed_bytes+=buffer.getbuffer().nbytes
+    duration_s=time.monotonic()-start_time
+
+    return raw_bytes/1024**2/duration_s, raw_bytes/compressed_bytes
+
+def benchmark_zarr(codec_name:str,frames:List[numpy.ndarray])->Tuple[float,float]:
+    compressor=get_codec(codec_name).blosc_compressor()
+
+    raw_bytes=0
+    compressed_bytes=0
+    start_time=time.monotonic()
+    for frame in frames:
+        raw_bytes+=frame.nbytes
+        compressed_bytes+=len(compressor.encode(frame))
+    duration_s=time.monotonic()-start_time
+
+    return raw_bytes/1024**2/duration_s, raw_bytes/compressed_bytes
+
+def main():
+    parser=argparse.ArgumentParser(description="compare image codecs on representative frames")
+    parser.add_argument("images",nargs="*",help="tiff images to use as test frames (synthetic frames are used if none are given)")
+    parser.add_argument("--num-frames",type=int,default=8,help="number of synthetic frames")
+    parser.add_argument("--size",type=int,default=2500,help="width and height of synthetic frames")
+    args=parser.parse_args()
+
+    if len(args.images)>0:
+        frames=load_frames(args.images)
+    else:
+        frames=synthetic_frames(args.num_frames,args.size,args.size)
+
+    print(f"{len(frames)} frames, {sum(frame.nbytes for frame in frames)/1024**2:.1f}MB in total")
+    print(f"{'codec':<12}{'container':<12}{'MB/s':>10}{'ratio':>10}")
+    for codec_name in list_codecs():
+        codec=get_codec(codec_name)
+        for container,available,benchmark in (
+            ("tiff",not codec.tiff_compression is None,benchmark_tiff),
+            ("zarr",not codec.blosc_cname is None,benchmark_zarr),
+        ):
+            if not available:
+                continue
+
+            try:
+                throughput_mb_per_s,ratio=benchmark(codec_name,frames)
+                print(f"{codec_name:<12}{container:<12}{throughput_mb_per_s:>10.1f}{ratio:>10.2f}")
+            except Exception as e:
+                # e.g. if the package that implements the codec is not installed
+                print(f"{codec_name:<12}{container:<12}  failed: {e}")
+
+if __name__ == "__main__":
+    main()
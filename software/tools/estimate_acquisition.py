@@ -0,0 +1,40 @@
+"""
+dry-run of an acquisition: compile its plan (see control.core.acquisition_plan) and estimate how long it takes
+
+run from the software directory, e.g.
+
+    python3 -m tools.estimate_acquisition parameters.json
+    python3 -m tools.estimate_acquisition parameters.json --save-plan acquisition_plan.json
+
+the config can be any acquisition config file, e.g. the parameters.json of a previous acquisition.
+the estimate uses the latencies measured in previous acquisitions on this machine (Acquisition.MEASURED_LATENCIES_PATH), if there are any.
+"""
+
+import argparse
+
+from control._def import *
+from control.core import AcquisitionConfig
+from control.core.acquisition_plan import AcquisitionCostModel, MeasuredLatencies
+
+def main():
+    parser=argparse.ArgumentParser(description="estimate the duration of an acquisition")
+    parser.add_argument("config",help="acquisition config file")
+    parser.add_argument("--start",type=float,nargs=2,metavar=("X_MM","Y_MM"),default=None,help="stage position at the start of the acquisition")
+    parser.add_argument("--save-plan",default=None,help="save the compiled acquisition plan to this file")
+    args=parser.parse_args()
+
+    config=AcquisitionConfig.from_json(args.config)
+    start_position_mm=tuple(args.start) if not args.start is None else None
+
+    plan=config.compile_plan(start_position_mm=start_position_mm)
+    print(plan.as_text())
+
+    measured_latencies=MeasuredLatencies.load()
+    print(measured_latencies.as_text())
+    print(AcquisitionCostModel.from_machine_config(measured_latencies).estimate(plan).as_text())
+
+    if not args.save_plan is None:
+        plan.save(args.save_plan)
+
+if __name__ == "__main__":
+    main()
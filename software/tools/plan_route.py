@@ -0,0 +1,38 @@
+"""
+dry-run of the route an acquisition takes across the plate (see control.core.route_planner)
+
+run from the software directory, e.g.
+
+    python3 -m tools.plan_route parameters.json                     # well order from the config
+    python3 -m tools.plan_route parameters.json --all-orders        # compare all well orders
+
+the config can be any acquisition config file, e.g. the parameters.json of a previous acquisition.
+reports stage travel distance, travel time and direction reversals of the planned route against the naive route,
+i.e. visiting the wells in the order of the well list and entering each well at its top left corner.
+"""
+
+import argparse
+
+from control._def import *
+from control.core import AcquisitionConfig
+from control.core.route_planner import route_report
+
+def main():
+    parser=argparse.ArgumentParser(description="compare the planned route of an acquisition against the naive route")
+    parser.add_argument("config",help="acquisition config file")
+    parser.add_argument("--all-orders",action="store_true",help="report all well orders, instead of only the one in the config")
+    parser.add_argument("--start",type=float,nargs=2,metavar=("X_MM","Y_MM"),default=None,help="stage position at the start of the acquisition")
+    args=parser.parse_args()
+
+    config=AcquisitionConfig.from_json(args.config)
+    start_position_mm=tuple(args.start) if not args.start is None else None
+
+    well_orders=list(WellOrder) if args.all_orders else [config.well_order]
+    for well_order in well_orders:
+        config.well_order=well_order
+        route,naive_route=config.plan_route(start_position_mm=start_position_mm)
+        print(route_report(route,naive_route))
+        print()
+
+if __name__ == "__main__":
+    main()
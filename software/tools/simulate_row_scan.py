@@ -0,0 +1,67 @@
+"""
+run a continuous row scan (see control.core.row_scan) against the simulated microcontroller, without any hardware
+
+run from the software directory, e.g.
+
+    python3 -m tools.simulate_row_scan --num-fovs 12 --spacing 0.9 --exposure 2.0
+
+reports the planned scan velocity, motion blur and time per row against stop-and-go, and the position error of each hardware trigger,
+i.e. how far the (simulated) stage was from the center of the field of view at the center of the exposure.
+"""
+
+import argparse
+import time
+
+from control._def import *
+from control.microcontroller import MicrocontrollerSimulation
+from control.core.row_scan import plan_row_scan, execute_row_scan, stop_and_go_row_time_s, pixel_size_in_focus_plane_um
+
+def main():
+    parser=argparse.ArgumentParser(description="run a continuous row scan against the simulated microcontroller")
+    parser.add_argument("--num-fovs",type=int,default=10,help="number of fields of view in the row")
+    parser.add_argument("--spacing",type=float,default=0.9,help="distance between fields of view, in mm")
+    parser.add_argument("--exposure",type=float,default=2.0,help="exposure time (length of the illumination pulse), in ms")
+    parser.add_argument("--pixel-size",type=float,default=None,help="pixel size in the focus plane in um (default: from the machine config)")
+    parser.add_argument("--direction",type=int,choices=(1,-1),default=1,help="scan direction along x")
+    args=parser.parse_args()
+
+    pixel_size_um=args.pixel_size or pixel_size_in_focus_plane_um()
+    plan=plan_row_scan(num_fovs=args.num_fovs,fov_spacing_mm=args.spacing,exposure_time_ms=args.exposure,pixel_size_um=pixel_size_um)
+    stop_and_go_time_s=stop_and_go_row_time_s(args.num_fovs,args.spacing,args.exposure/1000)
+    if plan is None:
+        print(f"no continuous scan possible (or not faster than stop-and-go, which takes {stop_and_go_time_s:.2f}s per row)")
+        return
+
+    print(plan.as_text())
+    print(f"stop-and-go: {stop_and_go_time_s:.2f}s per row")
+
+    microcontroller=MicrocontrollerSimulation()
+    try:
+        # the first field of view is at x=0, the row starts one ramp distance before it
+        microcontroller.move_x_usteps(microcontroller.mm_to_ustep_x(-args.direction*plan.ramp_distance_mm))
+        microcontroller.wait_till_operation_is_completed()
+
+        row_start_time=time.monotonic()
+        execute_row_scan(
+            plan=plan,
+            microcontroller=microcontroller,
+            direction=args.direction,
+            fov_indices=list(range(plan.num_fovs)),
+            on_trigger=lambda fov_index,timestamp:None,
+            abort_requested=lambda:False,
+        )
+        row_time_s=time.monotonic()-row_start_time
+    finally:
+        microcontroller.close()
+
+    print(f"row took {row_time_s:.2f}s (simulated)")
+    print("fov   target (mm)   x at exposure center (mm)   error (um)   error (px)")
+    for fov_index,trigger in enumerate(microcontroller.hardware_triggers):
+        target_mm=args.direction*fov_index*plan.fov_spacing_mm
+        # position at the center of the exposure, i.e. half a pulse after the trigger
+        x_mm=microcontroller.ustep_to_mm_x(trigger.x_pos)+args.direction*plan.velocity_mm_per_s*plan.exposure_time_s/2
+        error_um=(x_mm-target_mm)*1000
+        print(f"{fov_index:3d}   {target_mm:11.4f}   {x_mm:25.4f}   {error_um:10.2f}   {error_um/pixel_size_um:10.2f}")
+
+if __name__ == "__main__":
+    main()